@@ -5,7 +5,7 @@ AI搜索API路由
 from fastapi import APIRouter, HTTPException, Query
 from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Literal, Optional
+from typing import List, Literal, Optional
 import asyncio
 import base64
 import json
@@ -14,6 +14,7 @@ from urllib.parse import quote
 
 from .ai_service import ai_service, get_index_weights_for_display
 from .monitoring import get_monitoring
+from .cache_admin import namespace_info
 
 logger = logging.getLogger(__name__)
 
@@ -64,6 +65,7 @@ class SearchOnlyRequest(BaseModel):
     burden_description: Optional[str] = Field(None, max_length=300)
     special_needs: Optional[str] = Field(None, max_length=300)
     audience: Optional[str] = Field(None, max_length=200)
+    speculative: Optional[bool] = Field(None, description="是否在返回来源的同时开始生成（默认按服务端配置）")
 
 
 class GenerateOnlyRequest(BaseModel):
@@ -141,7 +143,7 @@ async def ai_search_step1(request: SearchOnlyRequest):
     """
     方案A 第一步：仅执行 ES 搜索，快速返回引用来源。
     用户可在等待 AI 生成期间浏览这些来源。
-    返回 search_id 供第二步使用。
+    返回 search_id 供第二步使用；开启投机生成时后台已同时开始生成答案。
     """
     try:
         metadata = _extract_metadata(request)
@@ -150,6 +152,7 @@ async def ai_search_step1(request: SearchOnlyRequest):
             request.question,
             request.depth or "general",
             metadata,
+            request.speculative,
         )
         if result.get("error"):
             raise HTTPException(status_code=400, detail=result.get("message", "搜索失败"))
@@ -165,7 +168,7 @@ async def ai_search_step1(request: SearchOnlyRequest):
 async def ai_search_step2(request: GenerateOnlyRequest):
     """
     方案A 第二步：使用 search_id 从 Redis 获取上下文，调用 Claude 生成答案。
-    search_id 有效期为 5 分钟。
+    若第一步已开始投机生成，则直接等待其结果。search_id 有效期为 5 分钟。
     """
     try:
         metadata = _extract_metadata(request)
@@ -684,15 +687,50 @@ async def reset_stats():
 
 
 @router.post("/ai_search/cache/clear", summary="清理 AI 搜索缓存")
-async def clear_cache():
+async def clear_cache(
+    namespace: Optional[List[str]] = Query(None, description="缓存命名空间，可多选；默认 all（所有 ai_search:* 键）"),
+):
     """
-    清空 AI 搜索的 Redis 缓存（所有 ai_search:* 键）。
+    在后台清理 AI 搜索的 Redis 缓存（SCAN + UNLINK 分批删除，不阻塞 Redis）。
 
+    - **namespace**：answers / translations / contexts / speculative / inflight / search_results / all
+    - 返回任务 id，进度通过 GET /ai_search/cache/jobs/{job_id} 查询。
     清理后，相同问题将重新调用 Claude 生成答案。
     """
     try:
-        result = ai_service.clear_cache()
+        result = ai_service.clear_cache(namespace)
         return {"status": "success", "data": result}
+    except ValueError as e:
+        return {"status": "error", "data": None, "message": str(e)}
     except Exception as e:
         logger.error(f"清理缓存失败: {e}", exc_info=True)
         return {"status": "error", "data": None, "message": str(e)}
+
+
+@router.post("/ai_search/cache/count", summary="统计 AI 搜索缓存键数")
+async def count_cache(
+    namespace: Optional[List[str]] = Query(None, description="缓存命名空间，可多选；默认 all"),
+):
+    """在后台按命名空间统计键数（SCAN，不删除），返回任务 id。"""
+    try:
+        result = ai_service.count_cache(namespace)
+        return {"status": "success", "data": result}
+    except ValueError as e:
+        return {"status": "error", "data": None, "message": str(e)}
+    except Exception as e:
+        logger.error(f"统计缓存失败: {e}", exc_info=True)
+        return {"status": "error", "data": None, "message": str(e)}
+
+
+@router.get("/ai_search/cache/jobs/{job_id}", summary="缓存任务进度")
+async def get_cache_job(job_id: str):
+    """返回任务状态（running / done / failed）、已扫描与已删除键数、各命名空间键数。"""
+    job = ai_service.get_cache_job(job_id)
+    if job is None:
+        return {"status": "error", "data": None, "message": "任务不存在或已过期"}
+    return {"status": "success", "data": job}
+
+
+@router.get("/ai_search/cache/namespaces", summary="缓存命名空间")
+async def get_cache_namespaces():
+    return {"status": "success", "data": namespace_info()}
@@ -14,6 +14,7 @@ from datetime import datetime
 from io import BytesIO
 import re
 import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # 抑制「Elasticsearch built-in security features are not enabled」的警告（本地开发常见）
 try:
@@ -29,6 +30,36 @@ from dotenv import load_dotenv
 from pathlib import Path
 
 from .monitoring import get_monitoring
+from .context_packer import estimate_tokens, filter_near_duplicates, pack_context
+from .gemini_cache import GeminiInstructionCache, is_cache_error
+from .single_flight import SingleFlight
+from .cache_admin import (
+    ANSWER_PREFIX,
+    CONTEXT_PREFIX,
+    SPECULATIVE_OWNER_PREFIX,
+    SPECULATIVE_PREFIX,
+    TRANSLATE_PREFIX,
+    CacheJobs,
+)
+from .outline_system_prompt import OUTLINE_SYSTEM_PROMPT
+from database.map_sections import sections_from_inner_hits
+from search.analyzer import query_strategy
+from utils.tracing import traced
+from utils.metrics import (
+    executor_sampler,
+    instrument_call,
+    instrument_redis,
+    register_pool,
+    semaphore_sampler,
+    track,
+)
+from database.section_docs import (
+    SECTION_SOURCE_INDEXES,
+    message_index_name,
+    mget_sources,
+    reference_source,
+    section_index_name,
+)
 
 # 配置日志（必须在导入格式刷之前，因为导入失败时会使用 logger）
 logging.basicConfig(
@@ -71,6 +102,7 @@ try:
     import redis
     redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
     redis_client.ping()
+    instrument_redis(redis_client)
     logger.info("Redis 连接成功，缓存已启用")
 except Exception as e:
     logger.warning(f"Redis 未启用，将跳过缓存: {e}")
@@ -79,6 +111,7 @@ except Exception as e:
 try:
     claude_client = anthropic.Anthropic(api_key=CLAUDE_API_KEY) if CLAUDE_API_KEY else None
     if claude_client:
+        instrument_call(claude_client.messages, "create", "claude", "messages.create")
         logger.info("Claude 客户端初始化成功")
 except Exception as e:
     logger.error(f"Claude 客户端初始化失败: {e}")
@@ -95,6 +128,8 @@ if GEMINI_API_KEY:
         from google.genai import types
         from .gemini_translation_instruction import GEMINI_TRANSLATION_SYSTEM_INSTRUCTION
         gemini_client = genai.Client(api_key=GEMINI_API_KEY)
+        instrument_call(gemini_client.models, "generate_content", "gemini", "generate_content")
+        instrument_call(gemini_client.caches, "create", "gemini", "caches.create")
         _gemini_system_instruction = GEMINI_TRANSLATION_SYSTEM_INSTRUCTION
         try:
             from .gemini_translation_instruction_en2zh import GEMINI_TRANSLATION_SYSTEM_INSTRUCTION_EN2ZH
@@ -125,6 +160,43 @@ CLAUDE_SEMAPHORE = threading.Semaphore(CLAUDE_CONCURRENT_LIMIT)
 GEMINI_SEMAPHORE = threading.Semaphore(GEMINI_CONCURRENT_LIMIT)
 logger.info("API 并发限制: Claude=%s, Gemini=%s", CLAUDE_CONCURRENT_LIMIT, GEMINI_CONCURRENT_LIMIT)
 
+# 投机生成：search_only 返回来源的同时在后台线程池开始生成，generate_only 直接等待结果
+# 用户看完来源后未必调用 generate，未取用的生成照样计费，因此默认关闭（SPECULATIVE_GENERATION=1 开启，也可按请求开启）
+SPECULATIVE_GENERATION = os.getenv("SPECULATIVE_GENERATION", "0") == "1"
+SEARCH_CONTEXT_TTL = 300  # search_id 上下文有效期（秒），未在此时间内调用 generate 的投机生成将被取消
+SPECULATIVE_WAIT_TIMEOUT = 600  # generate_only 等待投机结果的最长时间（秒）
+SPECULATIVE_SWEEP_INTERVAL = 15  # 检查过期投机生成的间隔（秒）
+SPECULATIVE_DONE_MESSAGE = "done"  # 投机生成结束时在 ai_search:speculative:{search_id} 频道发布的消息
+# 投机生成不放进路由所用的 asyncio 默认线程池（asyncio.to_thread）：generate_only 在该池中阻塞等待投机结果，
+# 池被占满时会等待排在自己后面的任务。独立线程池按需起线程（关闭投机时不占线程），上限与 Claude 并发数一致
+SPECULATIVE_EXECUTOR = ThreadPoolExecutor(
+    max_workers=CLAUDE_CONCURRENT_LIMIT, thread_name_prefix="ai-speculative"
+)
+# 并发限制与投机线程池的占用写入 /metrics（pool_in_use / pool_capacity / pool_queued）
+register_pool("claude_semaphore", semaphore_sampler(CLAUDE_SEMAPHORE, CLAUDE_CONCURRENT_LIMIT))
+register_pool("gemini_semaphore", semaphore_sampler(GEMINI_SEMAPHORE, GEMINI_CONCURRENT_LIMIT))
+register_pool("speculative_executor", executor_sampler(SPECULATIVE_EXECUTOR, CLAUDE_CONCURRENT_LIMIT))
+
+# Gemini 翻译术语表使用 cached content（GEMINI_CONTEXT_CACHE=0 关闭），有效期 GEMINI_CACHE_TTL 秒
+GEMINI_CACHE_TTL = _parse_concurrent_limit("GEMINI_CACHE_TTL", 3600)
+gemini_instruction_cache = None
+if gemini_client and os.getenv("GEMINI_CONTEXT_CACHE", "1") != "0":
+    gemini_instruction_cache = GeminiInstructionCache(
+        gemini_client,
+        GEMINI_MODEL,
+        types,
+        ttl_seconds=GEMINI_CACHE_TTL,
+        on_create=lambda tokens: get_monitoring(redis_client).record_prompt_cache("gemini", cache_write_tokens=tokens),
+    )
+
+# 上下文 token 预算（按 token 打包上下文，取代按字数截断）
+# 一般模式：最多 50 条，总预算约 90K tokens，单条上限 3750 tokens（≈2500 中文字）
+# 深度模式：最多 200 条，总预算约 190K tokens（留出 system prompt 余量，保持在 200K 标准价区内），单条上限 1500 tokens（≈1000 中文字）
+CONTEXT_TOKEN_BUDGET_GENERAL = _parse_concurrent_limit("CONTEXT_TOKEN_BUDGET_GENERAL", 90000)
+CONTEXT_TOKEN_BUDGET_DEEP = _parse_concurrent_limit("CONTEXT_TOKEN_BUDGET_DEEP", 190000)
+CONTEXT_ITEM_TOKENS_GENERAL = 3750
+CONTEXT_ITEM_TOKENS_DEEP = 1500
+
 # 纲目翻译时与原文一起发送的 prompt（【需要翻译的文章】+ 以下说明）
 OUTLINE_TRANSLATE_PROMPT_ZH2EN = (
     "请将文章翻译为英文，严格使用System instructions中的专用术语表进行翻译。"
@@ -240,6 +312,15 @@ class AISearchService:
         self.redis = redis_client
         self.claude = claude_client
         self.cache_ttl = 3600  # 缓存1小时
+        # 本进程内进行中的投机生成：search_id -> {"future", "cancel", "cache_key", "started_at"}
+        self._speculative: Dict[str, Dict] = {}
+        self._speculative_lock = threading.Lock()
+        # 到期清理线程（首次投机时启动，全进程一个）
+        self._speculative_sweeper: Optional[threading.Thread] = None
+        # 相同问题（同答案缓存 key）的并发请求合并
+        self._single_flight = SingleFlight(self.redis)
+        # 按命名空间后台清理 / 统计缓存键（SCAN + UNLINK）
+        self.cache_jobs = CacheJobs(self.redis)
 
         logger.info("AISearchService初始化完成")
 
@@ -308,87 +389,14 @@ class AISearchService:
                     logger.debug(f"监控记录失败: {_e}")
                 return cached_result
 
-            # 3. 搜索Elasticsearch（根据深度参数决定上下文数量）
-            search_start = time.time()
-            # 根据深度参数决定上下文数量：一般50条，深度200条
-            context_size = 50 if depth == "general" else 200
-            fetch_size = context_size  # 直接使用设定的上下文数量
-            outline_nature = (normalized_metadata or {}).get("special_needs", "")
-            search_results = self._multi_index_search(question, fetch_size, outline_nature)
-            search_time = (time.time() - search_start) * 1000
-
-            if not search_results:
-                return {
-                    "answer": "抱歉，没有找到相关的经文内容。建议：\n1. 尝试使用不同的关键词\n2. 检查是否有拼写错误\n3. 使用更具体的描述",
-                    "sources": [],
-                    "cached": False,
-                    "search_time": search_time
-                }
-
-            logger.info(f"ES检索完成: {len(search_results)}条结果, 耗时{search_time:.0f}ms")
-
-            # 4. 调用Claude生成答案
-            if not self.claude:
-                return {
-                    "answer": "AI 服务未配置（请设置 CLAUDE_API_KEY）。",
-                    "sources": self._extract_sources(search_results[:50]),
-                    "cached": False,
-                    "search_time": round(search_time, 0),
-                    "error": True
-                }
-            ai_start = time.time()
-            context_items = self._build_context_from_hits(search_results, context_size)
-            if not context_items:
-                context_items = self._fallback_context_from_hits(search_results, context_size)
-            ai_response = self._generate_answer(
+            # 3~6. 检索、生成并写入缓存；相同问题的并发请求合并为一次（见 _run_single_flight）
+            return self._run_single_flight(
+                cache_key,
+                lambda: self._search_uncached(question, depth, normalized_metadata, cache_key, start_time),
                 question,
-                context_items,
-                context_size,
-                normalized_metadata
+                normalized_metadata,
+                start_time,
             )
-            ai_time = (time.time() - ai_start) * 1000
-
-            logger.info(f"AI生成完成: 耗时{ai_time:.0f}ms")
-
-            # 5. 构造返回结果（引用来源最多 50 条）
-            result = {
-                "answer": ai_response["answer"],
-                "sources": self._extract_sources_from_context(context_items[:50]),
-                "cached": False,
-                "tokens": ai_response.get("tokens"),
-                "claude_payload": ai_response.get("claude_payload"),
-                "search_time": round(search_time, 0),
-                "ai_time": round(ai_time, 0),
-                "total_time": round((time.time() - start_time) * 1000, 0),
-                "timestamp": datetime.now().isoformat()
-            }
-
-            # 6. 写入缓存
-            self._save_to_cache(cache_key, result)
-
-            # 监控：记录成功查询（未命中缓存）
-            try:
-                tokens = result.get("tokens") or {}
-                input_tok = int(tokens.get("input", 0) or 0)
-                output_tok = int(tokens.get("output", 0) or 0)
-                if not input_tok and not output_tok:
-                    answer_text = result.get("answer", "") or ""
-                    input_tok = int((len(question) + len(answer_text)) * 1.3)
-                    output_tok = int(len(answer_text) * 1.3)
-                get_monitoring(self.redis).record_query(
-                    question=question[:500],
-                    response_time_ms=result["total_time"],
-                    cache_hit=False,
-                    input_tokens=input_tok,
-                    output_tokens=output_tok,
-                    cost=tokens.get("cost"),
-                    special_needs=normalized_metadata.get("special_needs"),
-                )
-            except Exception as _e:
-                logger.debug(f"监控记录失败: {_e}")
-
-            logger.info(f"搜索完成: 总耗时{result['total_time']}ms")
-            return result
 
         except Exception as e:
             logger.error(f"搜索失败: {e}", exc_info=True)
@@ -407,15 +415,152 @@ class AISearchService:
                 "error": True
             }
 
+    def _run_single_flight(
+        self,
+        cache_key: str,
+        fn: Callable[[], Dict],
+        question: str,
+        normalized_metadata: Dict[str, str],
+        start_time: float,
+        context_key: Optional[str] = None,
+    ) -> Dict:
+        """
+        以答案缓存 key 合并并发的相同问题：leader 执行 fn，其余请求等待 leader 的结果，
+        按缓存命中返回并记入监控，不再重复检索与调用 Claude。
+        """
+        result, is_leader = self._single_flight.run(
+            cache_key, fn, lambda: self._get_from_cache(cache_key)
+        )
+        if is_leader:
+            return result
+        result = dict(result)
+        result.pop("claude_payload", None)
+        result["cached"] = True
+        result["coalesced"] = True
+        if context_key:
+            try:
+                self.redis.delete(context_key)
+            except Exception:
+                pass
+        try:
+            monitoring = get_monitoring(self.redis)
+            tokens = result.get("tokens") or {}
+            monitoring.record_query(
+                question=question[:500],
+                response_time_ms=int((time.time() - start_time) * 1000),
+                cache_hit=True,
+                input_tokens=int(tokens.get("input", 0) or 0),
+                output_tokens=int(tokens.get("output", 0) or 0),
+                cost=tokens.get("cost"),
+                special_needs=normalized_metadata.get("special_needs"),
+            )
+            monitoring.record_coalesced()
+        except Exception as _e:
+            logger.debug(f"监控记录失败: {_e}")
+        return result
+
+    @traced()
+    def _search_uncached(
+        self,
+        question: str,
+        depth: str,
+        normalized_metadata: Dict[str, str],
+        cache_key: str,
+        start_time: float,
+    ) -> Dict:
+        """search() 未命中缓存时的检索 + 生成 + 写缓存。"""
+        # 3. 搜索Elasticsearch（根据深度参数决定上下文数量）
+        search_start = time.time()
+        # 根据深度参数决定上下文数量：一般50条，深度200条
+        context_size = 50 if depth == "general" else 200
+        fetch_size = context_size  # 直接使用设定的上下文数量
+        outline_nature = (normalized_metadata or {}).get("special_needs", "")
+        retrieval_stats = {}
+        search_results = self._multi_index_search(question, fetch_size, outline_nature, retrieval_stats)
+        search_time = (time.time() - search_start) * 1000
+
+        if not search_results:
+            return {
+                "answer": "抱歉，没有找到相关的经文内容。建议：\n1. 尝试使用不同的关键词\n2. 检查是否有拼写错误\n3. 使用更具体的描述",
+                "sources": [],
+                "cached": False,
+                "search_time": search_time
+            }
+
+        logger.info(f"ES检索完成: {len(search_results)}条结果, 耗时{search_time:.0f}ms")
+
+        # 4. 调用Claude生成答案
+        if not self.claude:
+            return {
+                "answer": "AI 服务未配置（请设置 CLAUDE_API_KEY）。",
+                "sources": self._extract_sources(search_results[:50]),
+                "cached": False,
+                "search_time": round(search_time, 0),
+                "error": True
+            }
+        context_items, ai_response, ai_time = self._generate_from_context(
+            question,
+            search_results,
+            context_size,
+            retrieval_stats.get("total", len(search_results)),
+            normalized_metadata,
+        )
+
+        logger.info(f"AI生成完成: 耗时{ai_time:.0f}ms")
+
+        # 5. 构造返回结果（引用来源最多 50 条）
+        result = {
+            "answer": ai_response["answer"],
+            "sources": self._extract_sources_from_context(context_items[:50]),
+            "cached": False,
+            "tokens": ai_response.get("tokens"),
+            "claude_payload": ai_response.get("claude_payload"),
+            "search_time": round(search_time, 0),
+            "ai_time": round(ai_time, 0),
+            "total_time": round((time.time() - start_time) * 1000, 0),
+            "timestamp": datetime.now().isoformat()
+        }
+
+        # 6. 写入缓存
+        self._save_to_cache(cache_key, result)
+
+        # 监控：记录成功查询（未命中缓存）
+        try:
+            tokens = result.get("tokens") or {}
+            input_tok = int(tokens.get("input", 0) or 0)
+            output_tok = int(tokens.get("output", 0) or 0)
+            if not input_tok and not output_tok:
+                answer_text = result.get("answer", "") or ""
+                input_tok = int((len(question) + len(answer_text)) * 1.3)
+                output_tok = int(len(answer_text) * 1.3)
+            get_monitoring(self.redis).record_query(
+                question=question[:500],
+                response_time_ms=result["total_time"],
+                cache_hit=False,
+                input_tokens=input_tok,
+                output_tokens=output_tok,
+                cost=tokens.get("cost"),
+                special_needs=normalized_metadata.get("special_needs"),
+                depth=depth,
+                stage_times=dict(ai_response.get("timings") or {}, retrieval=search_time, total=result["total_time"]),
+            )
+        except Exception as _e:
+            logger.debug(f"监控记录失败: {_e}")
+
+        logger.info(f"搜索完成: 总耗时{result['total_time']}ms")
+        return result
+
     def search_only(
         self,
         question: str,
         depth: str = "general",
-        metadata: Optional[Dict[str, str]] = None
+        metadata: Optional[Dict[str, str]] = None,
+        speculative: Optional[bool] = None,
     ) -> Dict:
         """
         方案A - 第一步：仅执行ES搜索，返回引用来源，将完整结果存入Redis供generate使用。
         若缓存命中，直接返回完整结果（含 answer），前端无需再调 generate。
+        speculative（默认取 SPECULATIVE_GENERATION）：同时在后台开始生成，generate_only 直接等待其结果。
 
         Returns:
             {"sources": [...], "search_id": str, "search_time": float} 或
@@ -456,8 +601,10 @@ class AISearchService:
             context_size = 50 if depth == "general" else 200
             search_start = time.time()
             outline_nature = (normalized_metadata or {}).get("special_needs", "")
-            search_results = self._multi_index_search(question, context_size, outline_nature)
+            retrieval_stats = {}
+            search_results = self._multi_index_search(question, context_size, outline_nature, retrieval_stats)
             search_time = (time.time() - search_start) * 1000
+            get_monitoring(self.redis).record_latencies(depth, {"retrieval": search_time})
 
             if not search_results:
                 return {
@@ -469,20 +616,24 @@ class AISearchService:
                 }
 
             search_id = str(uuid.uuid4())
-            context_key = f"ai_search:context:{search_id}"
+            context_key = f"{CONTEXT_PREFIX}{search_id}"
             context_data = {
                 "question": question,
                 "depth": depth,
                 "search_results": search_results,
                 "context_size": context_size,
+                "retrieved_total": retrieval_stats.get("total", len(search_results)),
                 "metadata": normalized_metadata,
             }
             self.redis.setex(
                 context_key,
-                300,  # 5分钟过期
+                SEARCH_CONTEXT_TTL,  # 5分钟过期
                 json.dumps(context_data, ensure_ascii=False, default=str)
             )
 
+            if (SPECULATIVE_GENERATION if speculative is None else speculative) and self.claude:
+                self._start_speculative(search_id, context_data, cache_key)
+
             sources = self._extract_sources(search_results[:50])
             logger.info(f"search_only 完成: search_id={search_id}, {len(sources)}条来源, 耗时{search_time:.0f}ms")
             return {
@@ -515,7 +666,7 @@ class AISearchService:
             if not self.claude:
                 return {"answer": "AI 服务未配置", "sources": [], "cached": False, "error": True}
 
-            context_key = f"ai_search:context:{search_id}"
+            context_key = f"{CONTEXT_PREFIX}{search_id}"
             raw = self.redis.get(context_key)
             if not raw:
                 return {
@@ -526,10 +677,8 @@ class AISearchService:
                 }
 
             ctx = json.loads(raw)
-            search_results = ctx.get("search_results", [])
             stored_question = ctx.get("question", "")
             stored_depth = ctx.get("depth", "general")
-            context_size = ctx.get("context_size", 200)
 
             # 检查缓存
             ctx_metadata = ctx.get("metadata") or {}
@@ -561,6 +710,44 @@ class AISearchService:
                     logger.debug(f"监控记录失败: {_e}")
                 return cached
 
+            # 生成并写入缓存；相同问题的并发请求合并为一次（见 _run_single_flight）
+            return self._run_single_flight(
+                cache_key,
+                lambda: self._generate_uncached(
+                    question, search_id, max_results, ctx, normalized_metadata, cache_key, start_time
+                ),
+                question or stored_question,
+                normalized_metadata,
+                start_time,
+                context_key,
+            )
+        except Exception as e:
+            logger.error(f"generate_only 失败: {e}", exc_info=True)
+            return {"answer": f"生成失败: {str(e)}", "sources": [], "cached": False, "error": True}
+
+    def _generate_uncached(
+        self,
+        question: str,
+        search_id: str,
+        max_results: int,
+        ctx: Dict,
+        normalized_metadata: Dict[str, str],
+        cache_key: str,
+        start_time: float,
+    ) -> Dict:
+        """generate_only 未命中缓存时的生成 + 写缓存（优先取投机生成结果）。"""
+        context_key = f"{CONTEXT_PREFIX}{search_id}"
+        search_results = ctx.get("search_results", [])
+        stored_question = ctx.get("question", "")
+        context_size = ctx.get("context_size", 200)
+
+        # 投机生成已开始（或已完成）时直接等待其结果
+        spec = self._await_speculative(search_id, cache_key, start_time)
+        if spec:
+            ai_response = spec["ai_response"]
+            ai_time = spec["ai_time"]
+            sources = spec["sources"][:max_results]
+        else:
             if not search_results:
                 return {
                     "answer": "未找到相关上下文",
@@ -568,60 +755,323 @@ class AISearchService:
                     "cached": False,
                     "error": True
                 }
-
-            ai_start = time.time()
-            context_items = self._build_context_from_hits(search_results, context_size)
-            if not context_items:
-                context_items = self._fallback_context_from_hits(search_results, context_size)
-            ai_response = self._generate_answer(
+            context_items, ai_response, ai_time = self._generate_from_context(
                 question or stored_question,
-                context_items,
+                search_results,
                 context_size,
-                normalized_metadata
+                ctx.get("retrieved_total", len(search_results)),
+                normalized_metadata,
             )
-            ai_time = (time.time() - ai_start) * 1000
-
             sources = self._extract_sources_from_context(context_items[:max_results])
-            total_time = (time.time() - start_time) * 1000
+        total_time = (time.time() - start_time) * 1000
+
+        result = {
+            "answer": ai_response["answer"],
+            "sources": sources,
+            "cached": False,
+            "tokens": ai_response.get("tokens"),
+            "claude_payload": ai_response.get("claude_payload"),
+            "search_time": 0,
+            "ai_time": round(ai_time, 0),
+            "total_time": round(total_time, 0),
+            "timestamp": datetime.now().isoformat()
+        }
 
-            result = {
-                "answer": ai_response["answer"],
-                "sources": sources,
-                "cached": False,
-                "tokens": ai_response.get("tokens"),
-                "claude_payload": ai_response.get("claude_payload"),
-                "search_time": 0,
-                "ai_time": round(ai_time, 0),
-                "total_time": round(total_time, 0),
-                "timestamp": datetime.now().isoformat()
+        # 写入缓存（与一步接口共用 key）
+        self._save_to_cache(cache_key, result)
+
+        try:
+            self.redis.delete(context_key)
+        except Exception:
+            pass
+
+        try:
+            tokens = result.get("tokens") or {}
+            get_monitoring(self.redis).record_query(
+                question=(question or stored_question)[:500],
+                response_time_ms=result["total_time"],
+                cache_hit=False,
+                input_tokens=int(tokens.get("input", 0) or 0),
+                output_tokens=int(tokens.get("output", 0) or 0),
+                cost=tokens.get("cost"),
+                special_needs=normalized_metadata.get("special_needs"),
+                depth=ctx.get("depth"),
+                # 检索阶段已在 search_only 中记录
+                stage_times=dict(ai_response.get("timings") or {}, total=result["total_time"]),
+            )
+        except Exception as _e:
+            logger.debug(f"监控记录失败: {_e}")
+
+        return result
+
+    def _generate_from_context(
+        self,
+        question: str,
+        search_results: List[Dict],
+        context_size: int,
+        retrieved_total: int,
+        metadata: Dict[str, str],
+        cancel_event: Optional[threading.Event] = None,
+    ) -> Tuple[List[Dict], Optional[Dict], float]:
+        """
+        由检索结果构建、打包上下文并调用 Claude，返回 (context_items, ai_response, ai_time_ms)。
+        cancel_event 在调用 Claude 前已被设置时不再调用，ai_response 为 None。
+        """
+        ai_start = time.time()
+        # 全部命中都构建为候选，条数由 _pack_context 去重后按 context_size 截取
+        context_items = self._build_context_from_hits(search_results)
+        if not context_items:
+            context_items = self._fallback_context_from_hits(search_results)
+        context_items = self._pack_context(question, context_items, context_size, retrieved_total)
+        context_ms = (time.time() - ai_start) * 1000
+        if cancel_event is not None and cancel_event.is_set():
+            return context_items, None, (time.time() - ai_start) * 1000
+        ai_response = self._generate_answer(question, context_items, context_size, metadata)
+        ai_response.setdefault("timings", {})["context"] = context_ms
+        return context_items, ai_response, (time.time() - ai_start) * 1000
+
+    def _speculative_key(self, search_id: str) -> str:
+        return f"{SPECULATIVE_PREFIX}{search_id}"
+
+    def _start_speculative(self, search_id: str, context_data: Dict, cache_key: str) -> None:
+        """
+        在投机线程池中开始投机生成，SEARCH_CONTEXT_TTL 后仍未被 generate_only 取走则由清理线程取消。
+        同一答案缓存 key 只投机一次：后到的相同问题不再投机，其 generate_only 由 single-flight 合并到先到者。
+        """
+        try:
+            if not self.redis.set(f"{SPECULATIVE_OWNER_PREFIX}{cache_key}", search_id, nx=True, ex=SEARCH_CONTEXT_TTL):
+                logger.info(f"相同问题已在投机生成，跳过: search_id={search_id}")
+                return
+        except Exception as e:
+            logger.debug(f"投机生成去重失败: {e}")
+        cancel_event = threading.Event()
+        started_at = time.time()
+        try:
+            self.redis.setex(
+                self._speculative_key(search_id),
+                SEARCH_CONTEXT_TTL,
+                json.dumps({"status": "pending", "cache_key": cache_key, "started_at": started_at}),
+            )
+        except Exception as e:
+            logger.debug(f"写入投机生成状态失败: {e}")
+        future = SPECULATIVE_EXECUTOR.submit(
+            self._run_speculative, search_id, context_data, cache_key, started_at, cancel_event
+        )
+        with self._speculative_lock:
+            self._speculative[search_id] = {
+                "future": future,
+                "cancel": cancel_event,
+                "cache_key": cache_key,
+                "started_at": started_at,
             }
+        self._ensure_speculative_sweeper()
+        logger.info(f"投机生成已开始: search_id={search_id}")
+
+    def _ensure_speculative_sweeper(self) -> None:
+        """启动到期清理线程（只启动一次），代替每次投机各起一个 Timer 线程。"""
+        with self._speculative_lock:
+            if self._speculative_sweeper is not None:
+                return
+            self._speculative_sweeper = threading.Thread(
+                target=self._sweep_speculative, name="ai-speculative-sweeper", daemon=True
+            )
+        self._speculative_sweeper.start()
+
+    def _sweep_speculative(self) -> None:
+        """每 SPECULATIVE_SWEEP_INTERVAL 秒把开始超过 SEARCH_CONTEXT_TTL 仍未被取走的投机生成交给 _expire_speculative。"""
+        while True:
+            time.sleep(SPECULATIVE_SWEEP_INTERVAL)
+            deadline = time.time() - SEARCH_CONTEXT_TTL
+            with self._speculative_lock:
+                expired = [sid for sid, entry in self._speculative.items() if entry["started_at"] <= deadline]
+            for search_id in expired:
+                try:
+                    self._expire_speculative(search_id)
+                except Exception as e:
+                    logger.warning(f"清理过期投机生成失败: search_id={search_id}, {e}")
+
+    def _run_speculative(
+        self,
+        search_id: str,
+        context_data: Dict,
+        cache_key: str,
+        started_at: float,
+        cancel_event: threading.Event,
+    ) -> Optional[Dict]:
+        """后台线程：生成答案并把结果写入 ai_search:speculative:{search_id}，供任一 worker 的 generate_only 取用。"""
+        try:
+            search_results = context_data.get("search_results", [])
+            context_items, ai_response, ai_time = self._generate_from_context(
+                context_data.get("question", ""),
+                search_results,
+                context_data.get("context_size", 200),
+                context_data.get("retrieved_total", len(search_results)),
+                context_data.get("metadata") or {},
+                cancel_event,
+            )
+        except Exception as e:
+            logger.warning(f"投机生成失败: search_id={search_id}, {e}")
+            self._publish_speculative(search_id, {"status": "failed"})
+            return None
+        if ai_response is None:
+            self._publish_speculative(search_id, {"status": "cancelled"})
+            return None
+        payload = {
+            "status": "done",
+            "cache_key": cache_key,
+            "started_at": started_at,
+            "finished_at": time.time(),
+            "ai_time": round(ai_time, 0),
+            "ai_response": ai_response,
+            # generate_only 的 max_results 上限为 50
+            "sources": self._extract_sources_from_context(context_items[:50]),
+        }
+        self._publish_speculative(search_id, payload)
+        logger.info(f"投机生成完成: search_id={search_id}, 耗时{ai_time:.0f}ms")
+        return payload
+
+    def _publish_speculative(self, search_id: str, data: Dict) -> None:
+        """写入投机生成的最终状态，并在同名频道 publish，唤醒其他 worker 中等待的 generate_only。"""
+        key = self._speculative_key(search_id)
+        try:
+            self.redis.setex(key, SEARCH_CONTEXT_TTL, json.dumps(data, ensure_ascii=False, default=str))
+            self.redis.publish(key, SPECULATIVE_DONE_MESSAGE)
+        except Exception as e:
+            logger.debug(f"写入投机生成状态失败: {e}")
 
-            # 写入缓存（与一步接口共用 key）
-            self._save_to_cache(cache_key, result)
+    def _wait_speculative_result(self, search_id: str, cache_key: str) -> Optional[Dict]:
+        """
+        等待其他 worker 的投机生成结果（与 single-flight 相同：订阅完成通知，先订阅再检查，避免错过两者之间发出的通知）。
+        最多每 5 秒重新检查一次状态。返回最后读到的状态（超时时仍为 pending）；状态 key 不存在、问题不一致或
+        Redis 不可用时返回 None。
+        """
+        key = self._speculative_key(search_id)
+        pubsub = None
+        data = None
+        try:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(key)
+            deadline = time.time() + SPECULATIVE_WAIT_TIMEOUT
+            while time.time() < deadline:
+                raw = self.redis.get(key)
+                if not raw:
+                    return None
+                data = json.loads(raw)
+                if data.get("status") != "pending":
+                    break
+                if data.get("cache_key") != cache_key:
+                    return None
+                pubsub.get_message(timeout=min(5.0, max(0.0, deadline - time.time())))
+        except Exception as e:
+            logger.debug(f"等待投机生成结果失败: {e}")
+            return None
+        finally:
+            if pubsub is not None:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+        return data
 
+    def _await_speculative(self, search_id: str, cache_key: str, requested_at: float) -> Optional[Dict]:
+        """
+        取投机生成结果：本进程内的直接等待 future，其他 worker 发起的订阅其完成通知后从 Redis 读取。
+        问题 / 元数据与投机时不一致、生成失败或被取消时返回 None，由调用方正常生成。
+        """
+        with self._speculative_lock:
+            entry = self._speculative.pop(search_id, None)
+        if not entry:
+            # 本 search_id 未投机（相同问题已由先到者投机）：改为取先到者的投机结果
             try:
-                self.redis.delete(context_key)
+                if not self.redis.exists(self._speculative_key(search_id)):
+                    owner = self.redis.get(f"{SPECULATIVE_OWNER_PREFIX}{cache_key}")
+                    if owner and owner != search_id:
+                        search_id = owner
+                        with self._speculative_lock:
+                            entry = self._speculative.pop(search_id, None)
             except Exception:
                 pass
-
+        payload = None
+        if entry:
+            if entry["cache_key"] != cache_key:
+                entry["cancel"].set()
+                entry["future"].cancel()
+                self._record_speculative("discarded")
+                return None
             try:
-                tokens = result.get("tokens") or {}
-                get_monitoring(self.redis).record_query(
-                    question=(question or stored_question)[:500],
-                    response_time_ms=result["total_time"],
-                    cache_hit=False,
-                    input_tokens=int(tokens.get("input", 0) or 0),
-                    output_tokens=int(tokens.get("output", 0) or 0),
-                    cost=tokens.get("cost"),
-                    special_needs=normalized_metadata.get("special_needs"),
-                )
-            except Exception as _e:
-                logger.debug(f"监控记录失败: {_e}")
+                payload = entry["future"].result(timeout=SPECULATIVE_WAIT_TIMEOUT)
+            except Exception as e:
+                logger.warning(f"等待投机生成失败: search_id={search_id}, {e}")
+                payload = None
+        else:
+            data = self._wait_speculative_result(search_id, cache_key)
+            if data is None:
+                return None
+            payload = data if data.get("status") == "done" else None
+        try:
+            if entry:
+                self.redis.delete(self._speculative_key(search_id))
+            else:
+                # 标记已被其他 worker 取走，发起投机的 worker 到期时不再当作未取用处理
+                self.redis.setex(self._speculative_key(search_id), SEARCH_CONTEXT_TTL, json.dumps({"status": "consumed"}))
+        except Exception:
+            pass
+        if not payload or payload.get("cache_key") != cache_key:
+            self._record_speculative("miss")
+            return None
+        # 与客户端往返重叠的时间：从投机开始到 generate 请求到达（不超过生成完成）
+        saved_ms = max(0.0, min(requested_at, payload["finished_at"]) - payload["started_at"]) * 1000
+        logger.info(f"投机生成命中: search_id={search_id}, 节省约{saved_ms:.0f}ms")
+        self._record_speculative("hit", saved_ms)
+        return payload
+
+    def _expire_speculative(self, search_id: str) -> None:
+        """SEARCH_CONTEXT_TTL 到期仍未被取走：取消排队中的生成；已完成 / 进行中的结果写入答案缓存，不浪费已付出的调用。"""
+        with self._speculative_lock:
+            entry = self._speculative.pop(search_id, None)
+        if not entry:
+            return
+        try:
+            raw = self.redis.get(self._speculative_key(search_id))
+            if raw and json.loads(raw).get("status") == "consumed":
+                return
+        except Exception:
+            pass
+        entry["cancel"].set()
+        future = entry["future"]
+        if future.cancel():
+            # 排队中即被取消，_run_speculative 不会执行：由此写入终态，唤醒其他 worker 的等待
+            self._publish_speculative(search_id, {"status": "cancelled"})
+            self._record_speculative("cancelled")
+            return
+
+        def _save(f):
+            try:
+                payload = f.result()
+            except Exception:
+                payload = None
+            if payload and not (payload["ai_response"].get("tokens") or {}).get("error"):
+                self._save_to_cache(entry["cache_key"], {
+                    "answer": payload["ai_response"]["answer"],
+                    "sources": payload["sources"],
+                    "cached": False,
+                    "tokens": payload["ai_response"].get("tokens"),
+                    "claude_payload": payload["ai_response"].get("claude_payload"),
+                    "search_time": 0,
+                    "ai_time": payload["ai_time"],
+                    "total_time": payload["ai_time"],
+                    "timestamp": datetime.now().isoformat(),
+                })
 
-            return result
-        except Exception as e:
-            logger.error(f"generate_only 失败: {e}", exc_info=True)
-            return {"answer": f"生成失败: {str(e)}", "sources": [], "cached": False, "error": True}
+        future.add_done_callback(_save)
+        self._record_speculative("expired")
+        logger.info(f"投机生成未被取用已过期: search_id={search_id}")
+
+    def _record_speculative(self, outcome: str, saved_ms: float = 0.0) -> None:
+        try:
+            get_monitoring(self.redis).record_speculative(outcome, saved_ms)
+        except Exception as _e:
+            logger.debug(f"监控记录失败: {_e}")
 
     def _validate_input(self, question: str, max_results: int) -> Dict:
         """
@@ -650,8 +1100,9 @@ class AISearchService:
 
         return {"valid": True, "message": ""}
 
+    @traced()
     def _multi_index_search(
-        self, query: str, size: int, outline_nature: str = ""
+        self, query: str, size: int, outline_nature: str = "", stats: Optional[Dict] = None
     ) -> List[Dict]:
         """
         多索引搜索并按权重排序
@@ -660,6 +1111,7 @@ class AISearchService:
             query: 搜索关键词
             size: 返回结果数量
             outline_nature: 纲目性质（高真理浓度/高生命浓度/重实行应用），影响各索引权重
+            stats: 若传入，写入 {"total": 总检索条数}，供上下文打包后记录检索统计
 
         Returns:
             加权排序后的搜索结果列表
@@ -668,6 +1120,9 @@ class AISearchService:
             outline_nature, INDEXES_CONFIG_BY_NATURE["一般性"]
         )
         all_results = []
+        # 精确命中（boost 2.5）需排在 fuzziness 命中之前。单个词（英文单词或单字）时 match_phrase 与不带 fuzziness
+        # 的 match 等价，用后者省去位置比对；分词结果有缓存
+        exact_type = "match_phrase" if query_strategy(query, standard_field=True) == "phrase" else "match"
 
         for index_name, config in indexes_config.items():
             weight = config["weight"]
@@ -685,7 +1140,7 @@ class AISearchService:
                                             "query": {
                                                 "bool": {
                                                     "should": [
-                                                        {"match_phrase": {"msg.text": {"query": query, "boost": 2.5}}},
+                                                        {exact_type: {"msg.text": {"query": query, "boost": 2.5}}},
                                                         {"match": {"msg.text": {"query": query, "fuzziness": "AUTO", "boost": 2.0}}},
                                                         {"match": {"msg.type": {"query": query, "boost": 1.5}}}
                                                     ],
@@ -697,14 +1152,16 @@ class AISearchService:
                                             },
                                             "inner_hits": {
                                                 "name": "matched_msg",
-                                                "size": 50
+                                                "size": 50,
+                                                # 只取导入时预计算的小节范围与正文，不回传整个 msg 数组
+                                                "_source": ["msg.sec_end", "msg.sec_text", "msg.source"]
                                             }
                                         }
                                     },
                                     {
                                         "bool": {
                                             "should": [
-                                                {"match_phrase": {"text": {"query": query, "boost": 2.5}}},
+                                                {exact_type: {"text": {"query": query, "boost": 2.5}}},
                                                 {"match": {"text": {"query": query, "fuzziness": "AUTO", "boost": 2.0}}}
                                             ],
                                             "minimum_should_match": 1
@@ -715,7 +1172,7 @@ class AISearchService:
                             }
                         },
                         "size": int(size * weight),
-                        "_source": ["id", "text", "msg", "source", "sn", "bookname", "title", "bookname2"]
+                        "_source": ["id", "text", "ot_text", "msg_ref", "source", "sn", "bookname", "title", "bookname2"]
                     }
                 else:
                     # 其他索引：查顶层 text
@@ -723,7 +1180,7 @@ class AISearchService:
                         "query": {
                             "bool": {
                                 "should": [
-                                    {"match_phrase": {"text": {"query": query, "boost": 2.5}}},
+                                    {exact_type: {"text": {"query": query, "boost": 2.5}}},
                                     {"match": {"text": {"query": query, "fuzziness": "AUTO", "boost": 2.0}}}
                                 ],
                                 "minimum_should_match": 1
@@ -770,18 +1227,75 @@ class AISearchService:
         # 按加权分数排序
         all_results.sort(key=lambda x: x['_weighted_score'], reverse=True)
 
-        # 检索统计：总检索条数、使用条数、浪费率，打日志并写入监控供后台展示
+        # 检索统计：总检索条数打日志；实际使用条数与 token 数在上下文打包后写入监控（见 _pack_context）
         total = len(all_results)
-        used = min(size, total)
-        waste_rate = round((total - used) / total * 100, 1) if total else 0.0
         question_preview = (query[:30] + "…") if len(query) > 30 else query
-        logger.info(f"检索统计 - 问题:{question_preview} | 总检索:{total}条 | 使用:{used}条 | 浪费率:{waste_rate}%")
+
+        # 跨索引近重复折叠：map_note / cwwl / life / others 常引用相同语句，只保留加权分数最高的一条，空出名额给其他内容
+        dedup_start = time.time()
+        results, removed, removed_tokens = filter_near_duplicates(
+            all_results, self._hit_passage_text, limit=size
+        )
+        logger.info(
+            f"检索统计 - 问题:{question_preview} | 总检索:{total}条 | 候选:{len(results)}条 | "
+            f"近重复去除:{removed}条, 约节省{removed_tokens} tokens, 耗时{(time.time() - dedup_start) * 1000:.0f}ms"
+        )
+        if stats is not None:
+            stats["total"] = total
+            stats["near_duplicates"] = removed
+            stats["near_duplicate_tokens"] = removed_tokens
+
+        return results
+
+    def _hit_passage_text(self, hit: Dict) -> str:
+        """近重复比较用的段落正文（不发起额外 ES 请求）：map 类取预计算的命中小节，其余取 text。"""
+        source = hit.get("_source", {})
+        if hit.get("_index_name", hit.get("_index", "")) in self._MAP_LIKE_INDICES:
+            inner = hit.get("inner_hits", {}).get("matched_msg", {})
+            inner_hits_list = inner.get("hits", {}).get("hits", [])
+            if inner_hits_list:
+                return sections_from_inner_hits(inner_hits_list) or ""
+            return source.get("text") or source.get("ot_text") or ""
+        return source.get("text", "")
+
+    @traced()
+    def _pack_context(
+        self,
+        question: str,
+        context_items: List[Dict],
+        context_size: int,
+        retrieved_total: int,
+    ) -> List[Dict]:
+        """
+        按 token 预算打包上下文（去近重复、按分数从高到低贪心填充），并把预算与实际 token 数写入检索统计。
+        context_size >= 150 视为深度模式。
+        """
+        deep = context_size >= 150
+        budget = CONTEXT_TOKEN_BUDGET_DEEP if deep else CONTEXT_TOKEN_BUDGET_GENERAL
+        max_item_tokens = CONTEXT_ITEM_TOKENS_DEEP if deep else CONTEXT_ITEM_TOKENS_GENERAL
+        packed, stats = pack_context(context_items, budget, max_item_tokens, context_size)
+
+        total = max(retrieved_total, stats["candidates"])
+        used = stats["packed"]
+        waste_rate = round((total - used) / total * 100, 1) if total else 0.0
+        question_preview = (question[:30] + "…") if len(question) > 30 else question
+        logger.info(
+            f"上下文打包 - 问题:{question_preview} | 总检索:{total}条 | 候选:{stats['candidates']}条 | "
+            f"使用:{used}条 | 去重:{stats['deduped']}条 | 截断:{stats['truncated']}条 | "
+            f"tokens:{stats['tokens']}/{budget} | 浪费率:{waste_rate}%"
+        )
         try:
-            get_monitoring(self.redis).record_retrieval_stats(question_preview, total, used, waste_rate)
+            get_monitoring(self.redis).record_retrieval_stats(
+                question_preview,
+                total,
+                used,
+                waste_rate,
+                token_budget=budget,
+                context_tokens=stats["tokens"],
+            )
         except Exception as _e:
             logger.debug(f"记录检索统计失败: {_e}")
-
-        return all_results[:size]
+        return packed
 
     # 按 type 分类：取整节 / 只取该段 / 不取
     _HEADING_TYPES = frozenset({"heading", "heading_1", "heading_2", "heading_3", "heading_4"})
@@ -818,15 +1332,38 @@ class AISearchService:
             end_idx += 1
         return (start_idx, end_idx)
 
-    def _get_map_note_full_content(self, source: Dict) -> str:
+    def _load_map_msg(self, source: Dict, hit: Dict) -> List[Dict]:
         """
-        获取 map 类文档的全篇内容：优先用外层 text，否则拼接所有 ot1~ot4。
+        取 map 类文档的 msg 数组。检索时 _source 不再包含 msg，仅对尚未预计算小节的旧数据按 id 补取一次。
+        """
+        if "msg" in source:
+            return source.get("msg") or []
+        msg_list = []
+        try:
+            resp = self.es.search(
+                index=hit.get("_index") or hit.get("_index_name"),
+                body={"query": {"ids": {"values": [hit.get("_id")]}}, "_source": ["msg"], "size": 1},
+                request_timeout=10,
+            )
+            hits = resp.get("hits", {}).get("hits", [])
+            if hits:
+                msg_list = (hits[0].get("_source") or {}).get("msg") or []
+        except Exception as e:
+            logger.warning(f"补取 msg 失败: {e}")
+        source["msg"] = msg_list
+        return msg_list
+
+    def _get_map_note_full_content(self, source: Dict, hit: Optional[Dict] = None) -> str:
+        """
+        获取 map 类文档的全篇内容：优先用外层 text，其次导入时预计算的 ot_text，否则拼接所有 ot1~ot4。
         当命中来自外层 text 相关度高时，用于发送全篇给 Claude。
         """
         outer_text = (source.get("text") or "").strip()
         if outer_text:
             return outer_text
-        msg_list = source.get("msg") or []
+        if source.get("ot_text"):
+            return source["ot_text"]
+        msg_list = self._load_map_msg(source, hit) if hit is not None else (source.get("msg") or [])
         parts = []
         for m in msg_list:
             if m.get("type") in self._MAP_NOTE_MSG_TYPES and m.get("text"):
@@ -839,17 +1376,23 @@ class AISearchService:
         """
         从 inner_hits 获取命中的 msg 索引，按小节提取并拼接，多个 ot1 小节分别提取后拼接。
         若无 inner_hits（命中来自外层 text）：返回全篇内容，供 Claude 使用。
+        导入时已预计算小节（sec_end / sec_text）的文档直接由 inner_hits 还原，不需要 msg 数组。
         """
-        msg_list = source.get("msg") or []
-        if not msg_list:
-            return source.get("text", "")
-
         inner = hit.get("inner_hits", {}).get("matched_msg", {})
         inner_hits_list = inner.get("hits", {}).get("hits", [])
 
         if not inner_hits_list:
             # 无 inner_hits：命中来自外层 text，相关度够高，发送全篇内容
-            return self._get_map_note_full_content(source)
+            return self._get_map_note_full_content(source, hit)
+
+        precomputed = sections_from_inner_hits(inner_hits_list)
+        if precomputed is not None:
+            return precomputed or source.get("ot_text") or source.get("text", "")
+
+        # 旧数据（未预计算）：取 msg 数组逐项扫描
+        msg_list = self._load_map_msg(source, hit)
+        if not msg_list:
+            return source.get("text", "")
 
         matched_indices = set()
         for ih in inner_hits_list:
@@ -899,6 +1442,7 @@ class AISearchService:
             seg = 0
         return (prefix, seg)
 
+    @traced()
     def _fetch_message_docs(self, index_name: str, message_prefix: str) -> List[Dict]:
         """从 ES 获取同一篇（message）内的所有文档，按段号排序"""
         try:
@@ -923,6 +1467,39 @@ class AISearchService:
             logger.warning(f"获取 message 文档失败: {e}")
             return []
 
+    @traced()
+    def _prefetch_sections(self, search_results: List[Dict]) -> Dict[tuple, Dict]:
+        """
+        一次 mget 从伴生索引 <index>_sections 取回所有 heading 命中的预组装小节。
+        返回 {(index_name, heading_id): section_source}；伴生索引缺失或请求失败时返回空 dict，调用方回退逐段拼装。
+        """
+        docs = []
+        seen = set()
+        for hit in search_results:
+            index_name = hit.get("_index_name", hit.get("_index", ""))
+            source = hit.get("_source", {})
+            doc_id = source.get("id") or hit.get("_id", "")
+            if index_name not in SECTION_SOURCE_INDEXES or source.get("type", "") not in self._HEADING_TYPES:
+                continue
+            key = (index_name, doc_id)
+            if doc_id and key not in seen:
+                seen.add(key)
+                docs.append({"_index": section_index_name(index_name), "_id": doc_id})
+        if not docs:
+            return {}
+        try:
+            resp = self.es.mget(body={"docs": docs}, request_timeout=10)
+        except Exception as e:
+            logger.debug(f"预组装小节 mget 失败，回退逐段拼装: {e}")
+            return {}
+        out = {}
+        for d in resp.get("docs", []):
+            if d.get("found") and d.get("_source"):
+                src_index = d.get("_index", "")
+                if src_index.endswith("_sections"):
+                    out[(src_index[: -len("_sections")], d["_id"])] = d["_source"]
+        return out
+
     def _get_section_from_heading(
         self, docs: List[Dict], heading_idx: int
     ) -> tuple:
@@ -952,26 +1529,20 @@ class AISearchService:
                 break
         return ("\n".join(parts), section_ids)
 
-    def _build_context_from_hits(
-        self, search_results: List[Dict], context_size: int
-    ) -> List[Dict]:
+    @traced()
+    def _build_context_from_hits(self, search_results: List[Dict]) -> List[Dict]:
         """
         根据 type 规则构建上下文：heading 取整节，text/ot1-4 只取该段，其他不取。
-        去重：已被整节覆盖的段落不再单独加入。
+        去重：已被整节覆盖的段落不再单独加入。不限条数：近重复去除在 _pack_context 中进行，先截断会使去重后条数不足。
         返回 [{"reference": str, "content": str, "source_type": str, "score": float}, ...]
         """
         included_ids = set()
         context_items = []
         seen_sections = set()
-        # 深度模式：限制单条内容长度，防止总 tokens 超限（Claude API 1M 限制）
-        # 实测发现中文 token 转换率约 1:1.5（1字≈1.5 tokens）
-        # 深度模式(200条)：每条1000字 ≈ 1500 tokens，总计约300K tokens（高价区，可接受）
-        # 一般模式(50条)：每条2500字 ≈ 3750 tokens，总计约187K tokens（标准区）
-        max_content_length = 1000 if context_size >= 150 else 2500
+        # 单条长度与总 tokens 不在此处截断，由 _pack_context 按 token 预算统一处理
+        prefetched_sections = self._prefetch_sections(search_results)
 
         for hit in search_results:
-            if len(context_items) >= context_size:
-                break
             source = hit.get("_source", {})
             doc_id = source.get("id") or hit.get("_id", "")
             dtype = source.get("type", "")
@@ -986,9 +1557,6 @@ class AISearchService:
                 content = self._extract_map_note_sections_from_inner_hits(source, hit)
                 if not content:
                     continue
-                # 限制单条长度
-                if len(content) > max_content_length:
-                    content = content[:max_content_length] + "..."
                 ref = self._get_map_note_reference_from_hit(source, hit, index_name)
                 context_items.append({
                     "reference": ref,
@@ -1006,27 +1574,32 @@ class AISearchService:
                 section_key = (index_name, prefix)
                 if section_key in seen_sections:
                     continue
-                docs = self._fetch_message_docs(index_name, prefix)
-                if not docs:
-                    continue
-                heading_idx = next(
-                    (i for i, d in enumerate(docs) if d.get("id") == doc_id),
-                    -1,
-                )
-                if heading_idx < 0:
-                    continue
-                content, section_ids = self._get_section_from_heading(
-                    docs, heading_idx
-                )
+                section = prefetched_sections.get((index_name, doc_id))
+                if section:
+                    # 伴生索引中已预组装好的小节
+                    content = section.get("text", "")
+                    section_ids = section.get("ids") or [doc_id]
+                    ref_source = reference_source(section)
+                else:
+                    docs = self._fetch_message_docs(index_name, prefix)
+                    if not docs:
+                        continue
+                    heading_idx = next(
+                        (i for i, d in enumerate(docs) if d.get("id") == doc_id),
+                        -1,
+                    )
+                    if heading_idx < 0:
+                        continue
+                    content, section_ids = self._get_section_from_heading(
+                        docs, heading_idx
+                    )
+                    ref_source = docs[0]
                 if not content:
                     continue
-                # 限制单条长度
-                if len(content) > max_content_length:
-                    content = content[:max_content_length] + "..."
                 seen_sections.add(section_key)
                 for sid in section_ids:
                     included_ids.add(sid)
-                ref = self._format_reference(docs[0] if docs else source)
+                ref = self._format_reference(ref_source)
                 context_items.append({
                     "reference": ref,
                     "content": content,
@@ -1039,9 +1612,6 @@ class AISearchService:
                 text = source.get("text", "")
                 if not text:
                     continue
-                # 限制单条长度
-                if len(text) > max_content_length:
-                    text = text[:max_content_length] + "..."
                 ref = self._format_reference(source)
                 context_items.append({
                     "reference": ref,
@@ -1053,15 +1623,10 @@ class AISearchService:
 
         return context_items
 
-    def _fallback_context_from_hits(
-        self, search_results: List[Dict], context_size: int
-    ) -> List[Dict]:
+    def _fallback_context_from_hits(self, search_results: List[Dict]) -> List[Dict]:
         """当 _build_context_from_hits 无结果时回退：按原逻辑取 text 构建上下文（如 bib/hymn 等）"""
         items = []
-        # 深度模式限制单条长度，防止总 tokens 超限（实测中文约 1字≈1.5 tokens）
-        max_content_length = 1000 if context_size >= 150 else 2500
-        
-        for hit in search_results[:context_size]:
+        for hit in search_results:
             source = hit.get("_source", {})
             index_name = hit.get("_index_name", hit.get("_index", ""))
             if index_name in self._MAP_LIKE_INDICES:
@@ -1071,9 +1636,6 @@ class AISearchService:
                 text = source.get("text", "")
             if not text:
                 continue
-            # 限制单条长度
-            if len(text) > max_content_length:
-                text = text[:max_content_length] + "..."
             ref = self._get_map_note_reference_from_hit(source, hit, index_name) if index_name in self._MAP_LIKE_INDICES else self._format_reference(source)
             items.append({
                 "reference": ref,
@@ -1101,6 +1663,7 @@ class AISearchService:
             })
         return sources
 
+    @traced()
     def _generate_answer(
         self,
         question: str,
@@ -1131,160 +1694,7 @@ class AISearchService:
         context = "\n".join(context_parts)
 
         # 构建prompt
-        system_prompt = """你是一个资深的圣经研究学者，更是一位专业的倪柝声、李常受神学的研究者，请基于提供的内容，生成一篇纲目。
-
-【最高优先级原则】
-逐字引用（verbatim quotes）是最核心的要求，优先级高于所有其他要求。当任何要求与"逐字引用"冲突时，优先保证逐字引用。
-
-【纲目的属灵目标】
-申言就是为神说话，说出神来，并将基督说到人里面；将基督的丰富供应到人里面，乃是最高的说话。一篇好的纲目，不只让人认识真理，乃是带人进入真理的实际。文以载道，借着精粹、洗练的职事信息所整理出来的纲目，将活的基督陈明出来并构成到人里面。
-
-【格式规范】
-1. 纲目层级序号规则：
-    - 第一级使用大写中文数字：壹、贰、叁（不可用"参"）、肆、伍、陆、柒、捌、玖、拾、拾壹、拾贰、拾叁、拾肆、拾伍、拾陆、拾柒、拾捌、拾玖、贰壹、贰贰、贰叁……贰玖、叁壹、叁贰……
-    （说明：21写作"贰壹"而非"贰拾壹"或"二十一"）
-    - 第二级使用小写中文数字：一、二、三、四、五、六、七、八、九、十、十一、十二、十三、十四、十五、十六、十七、十八、十九、二一、二二、二三……二九、三一、三二……
-    （说明：21写作"二一"而非"二十一"）
-    - 第三级使用阿拉伯数字：1、2、3、4……
-    - 第四级使用小写英文字母：a、b、c、d……
-    
-    【缩进与换行规则】：
-    - 第一级（壹、贰、叁）：顶格，无缩进
-    - 第二级（一、二、三）：一个 Tab 键缩进
-    - 第三级（1、2、3）：两个 Tab 键缩进
-    - 第四级（a、b、c）：三个 Tab 键缩进
-    - 序号与纲目内容之间用一个 Tab 键连接
-    - 每条纲目之间不要空行，紧密排列
-    - 每条纲目结束后直接换行，不要额外的空行
-    
-    格式示例：
-    壹	第一条大纲内容—创一1：
-    	一	第一条中纲内容—创一2：
-    		1	第一条小纲内容—创一3：
-    			a	第四级纲目内容—创一4。
-    			b	第四级纲目内容—创一5。
-    		2	第二条小纲内容—创一6。
-    	二	第二条中纲内容—创一7。
-    贰	第二条大纲内容—创一8。
-
-2. 纲目的标点符号规则：
-    - 每个纲目的内容之后用—连接圣经经节出处
-    - 若该纲目有下一级纲目，则在经节出处之后加冒号
-    - 若该纲目无下一级纲目，则在经节出处之后加句号
-    
-    格式示例：
-    有下级：壹	纲目内容—创一1：
-    无下级：一	纲目内容—创一1。
-
-3. 圣经经节格式规则：
-    - 每条纲目后面只能加圣经经节出处，不可加文集、生命读经等参考资料出处
-    - 经节格式：创世记一章一节为"创一1"，其他书卷依次类推
-    - 同一书卷多个出处应合并，如"启三1，四7"，同章不同节用顿号隔开
-    - 所有纲目层级（壹、一、1、a）都需要加经节出处
-    - 两个数字之间需要用全角的～连接
-    
-    【重要】纲目后的出处规则：
-    ✅ 正确：壹	召会是基督的身体—弗一22～23：
-    ❌ 错误：壹	召会是基督的身体—李常受文集一九五〇至一九五一年第一册，在于灵不在于字句，第七章：
-    ❌ 错误：一	基督的扩大就是召会—弗一23，李常受文集第一册：
-    
-    说明：文集、生命读经等出处只在最后"参考与参读资料"部分列出，不加在纲目后面。
-
-【内容规范】
-1. 你的回答必须以原文的 verbatim quotes（逐字引用）为核心内容，所有实质性观点、论述和纲目都必须直接从原文提取，不可改写、总结、概括或重述。verbatim quote（逐字引用）比例越高越好。
-    【可以做的】：
-    - 从原文中选择哪些句子
-    - 调整句子的排列顺序
-    - 可以使用最简短的连接语来组织结构（如"而"、"并且"、"所以"等），但尽量减少使用，除非到了不加关联词无法表述的情况，才加关联词，且不可改写原文的实质内容
-
-    【绝对不可以做的】：
-    - 改变原文的任何用词
-    - 用自己的话"换一种说法"
-    - 合并多个句子的意思成一句话
-    - 提炼、归纳、概括原文的意思
-    - 添加原文中没有的解释
-
-    【检查方法】：
-    生成纲目后，每一条纲目都应该能在原文中找到完全对应的句子。
-
-2. 【纲目长度与大纲特别要求】每个纲目必须是一个完整的阐述，不可用短句。每一个大纲和中纲不可太短，要有大约一行的长度。
-    
-    【特别强调：大纲的逐字引用原则】
-    大纲（壹、贰、叁等）最容易被改写总结，必须特别注意：
-    - 大纲必须直接从原文中提取完整句子，不可为了"概括下级纲目"而自己总结
-    - 大纲应该选择原文中最核心、最能统领该主题的一句话，而不是自己归纳
-    - 宁可选用原文的长句作为大纲，也不要自己编写简短的总结句
-    - 如果原文中没有合适的统领性句子，可以选择该部分开头或结尾的关键句
-
-    示例：
-    ❌ 错误：壹	神将生命分赐给人的过程—创一1
-    ✅ 正确：壹	神的生命是永远的生命，就是神自己分赐到我们里面，作我们的生命和生命的供应—约一4，十10
-
-3. 每个纲目如果有下一级纲目，下一级纲目至少需要 2 个。
-
-4. 输出的纲目中不可有重复内容，不可出现两条一样的纲目。
-
-5. 回答需综合文章的所有相关要点，结构清晰，逻辑合理，不是简单按顺序罗列。
-    
-    【内容选择原则】
-    虽然必须逐字引用，但在选择引用哪些句子时，应优先选择：
-    - 具有神学深度和启示性的句子
-    - 表达核心真理和关键经历的句子
-    - 带有属灵亮光和生命供应的句子
-    - 能够摸着读者灵和带来生命感觉的句子
-
-    示例对比：
-    ❌ 枯燥：壹	神有生命—约一4
-    ✅ 精彩：壹	神的生命是永远的生命，就是神自己分赐到我们里面，作我们的生命和生命的供应，使我们在生命和性情上与神一样—约一4，十10，彼后一4
-
-    原则：在保持逐字引用的前提下，要选择原文中最有"分量"、最能供应生命的句子。
-
-6. 如果所提供的内容不足以回答问题，请诚实说明，而不是编造答案。
-    
-7. 纲目的逻辑顺序应符合原文的神学论述逻辑，而非仅按原文出现的先后顺序排列。
-
-8. 纲目大点的排列顺序主要为真理启示→生命经历→生活应用；真理启示的话也需要点出现有的缺失与危机；启示带进经历，需要有内里的、主观的生命经历；生活的应用，要落实到目前能够实行的具体要点。涉及主观经历的条目数量占比约15%的篇幅；涉及实行应用的条目数量占比约15%的篇幅。
-
-9. 纲目的开头要强、要扎心、要吸引人；结尾要拔高、要令人鼓舞，使人达到高峰。
-
-【输出规范】
-1. 在整个纲目最前面写出"读经：........"，从目标文章中提取 8～10 个重要的经节出处，按圣经书卷顺序排列，同一书卷内按章节顺序。同一书卷的经节用顿号隔开，不同书卷用逗号隔开。
-   示例：读经：创一1，26～28，二7，约一1，14，罗八2，29，启二一2
-
-2. 纲目中不可使用双引号。所有单引号必须用中文状态下的单引号，不可用英文状态下的单引号。
-
-3. 纲目句中若有句号，需将句号改成分号，仅指纲目内容中间出现的句号，末尾句号不受此规则影响。
-
-4. 用纯文本作答，不使用 Markdown 格式（不用 #、*、** 等符号）。
-
-5. 请不要写 python 代码来生成纲目，不要生成 txt 或 docx，而是直接生成纲目。
-
-6. 纲目篇幅严格限制为A4纸一页半(必须在35~38行之间)
-
-【完整格式示例】
-    读经：创一1，26～28，二7，约一1，14，罗八2，29
-
-    壹	神的生命是永远的生命，就是神自己分赐到我们里面，作我们的生命和生命的供应—约一4，十10：
-        一	生命就是三一神分赐到我们里面，使我们与神有生机的联结—约一4：
-            1	神的生命使我们在生命和性情上与神一样，却无分于神格—彼后一4。
-            2	这生命是非受造的，是永远、神圣、属灵的生命—约壹五11～12。
-        二	我们需要天天经历基督作生命树，使我们在生命里长大—启二7：
-            1	生命树表征三一神在基督里作我们的生命和生命的供应—启二二2，14。
-            2	我们借着吃基督作生命树，就能在神圣的生命里长大成熟—来五12～14。
-    贰	基督作为赐生命的灵，住在我们的灵里，作我们的生命—罗八2，10：
-        一	那灵就是基督自己在复活里成为赐生命的灵—林前十五45下。
-        二	我们需要操练灵，接触这位是灵的基督—提后四22，罗八4。
-
-【最后检查清单】
-    生成纲目后，请确认：
-    ✓ 每条纲目都能在原文中找到对应的原句
-    ✓ 大纲（壹、贰、叁）没有被总结改写
-    ✓ 所有经节格式正确（如"创一1"）
-    ✓ 序号格式正确（壹贰叁、一二三、123、abc）
-    ✓ 缩进正确（第一级顶格，第二级1个Tab，第三级2个Tab，第四级3个Tab）
-    ✓ 标点符号正确（有下级用冒号，无下级用句号）
-    ✓ 纲目之间无空行，紧密排列
-"""
+        system_prompt = OUTLINE_SYSTEM_PROMPT
 
         metadata_lines = []
         if metadata:
@@ -1314,11 +1724,14 @@ class AISearchService:
         }
 
         # 调用Claude API（并发限制：超出时排队等待，减少 429）
-        estimated_input_tokens = int((len(system_prompt) + len(user_prompt)) * 0.7)
+        estimated_input_tokens = estimate_tokens(system_prompt) + estimate_tokens(user_prompt)
         context_count = len(context_items[:context_size])
         logger.info(f"准备调用 Claude - 上下文数: {context_count}条, 预估输入tokens: {estimated_input_tokens}")
 
+        queue_start = time.time()
         with CLAUDE_SEMAPHORE:
+            queue_ms = (time.time() - queue_start) * 1000
+            generation_start = time.time()
             try:
                 # 硬性上限 1M tokens（超过会失败），保守提示 900K
                 if estimated_input_tokens > 900000:
@@ -1326,11 +1739,18 @@ class AISearchService:
                 elif estimated_input_tokens > 200000:
                     logger.info(f"ℹ️ 输入超过200K，将使用高价区定价: ${estimated_input_tokens / 1000000 * 6:.3f}")
 
+                # system prompt 固定不变，以 cache_control 块发送：5 分钟内的后续调用按缓存读取计费（约 1/10 输入价）
                 message = self.claude.messages.create(
                     model="claude-sonnet-4-20250514",
                     max_tokens=4000,
                     temperature=0.3,  # 降低温度提高准确性
-                    system=system_prompt,
+                    system=[
+                        {
+                            "type": "text",
+                            "text": system_prompt,
+                            "cache_control": {"type": "ephemeral"},
+                        }
+                    ],
                     messages=[
                         {"role": "user", "content": user_prompt}
                     ]
@@ -1343,23 +1763,44 @@ class AISearchService:
                         "tokens": {"error": "empty_content"}
                     }
                 answer = message.content[0].text
+                # usage.input_tokens 不含缓存部分；input 统计口径保持为全部输入 token
+                cache_read = int(getattr(message.usage, "cache_read_input_tokens", 0) or 0)
+                cache_write = int(getattr(message.usage, "cache_creation_input_tokens", 0) or 0)
+                uncached_input = message.usage.input_tokens
+                input_total = uncached_input + cache_read + cache_write
                 tokens = {
-                    "input": message.usage.input_tokens,
+                    "input": input_total,
                     "output": message.usage.output_tokens,
-                    "total": message.usage.input_tokens + message.usage.output_tokens
+                    "total": input_total + message.usage.output_tokens,
+                    "cache_read": cache_read,
+                    "cache_write": cache_write,
                 }
 
-                # 计算费用
-                cost = (tokens["input"] / 1_000_000) * 3 + \
+                # 计算费用（缓存写入 1.25 倍、缓存读取 0.1 倍输入价）
+                cost = (uncached_input / 1_000_000) * 3 + \
+                       (cache_write / 1_000_000) * 3.75 + \
+                       (cache_read / 1_000_000) * 0.3 + \
                        (tokens["output"] / 1_000_000) * 15
                 tokens["cost"] = round(cost, 6)
 
-                logger.info(f"Claude调用成功: 实际输入={tokens['input']} tokens, 总计={tokens['total']}, 费用=${tokens['cost']}")
+                try:
+                    get_monitoring(self.redis).record_prompt_cache(
+                        "claude", cache_read_tokens=cache_read, cache_write_tokens=cache_write
+                    )
+                except Exception as _e:
+                    logger.debug(f"监控记录失败: {_e}")
+
+                logger.info(
+                    f"Claude调用成功: 实际输入={tokens['input']} tokens（缓存读取={cache_read}, 缓存写入={cache_write}）, "
+                    f"总计={tokens['total']}, 费用=${tokens['cost']}"
+                )
 
                 return {
                     "answer": answer,
                     "tokens": tokens,
-                    "claude_payload": claude_payload
+                    "claude_payload": claude_payload,
+                    # 各阶段耗时（毫秒），写入监控的延迟直方图
+                    "timings": {"queue": queue_ms, "generation": (time.time() - generation_start) * 1000},
                 }
 
             except anthropic.RateLimitError as e:
@@ -1406,9 +1847,15 @@ class AISearchService:
 
         # map_dictionary：引用 = 第一个bookname + ", " + title + ", " + 第二个bookname（从 msg 中取）
         if index_name == "map_dictionary":
-            msg_list = source.get("msg") or []
-            booknames = [str(m.get("text") or "").strip() for m in msg_list if (m.get("type") or "") == "bookname"]
-            titles = [str(m.get("text") or "").strip() for m in msg_list if (m.get("type") or "") == "title"]
+            msg_ref = source.get("msg_ref")
+            if msg_ref:
+                # 导入时预计算的 bookname / title
+                booknames = msg_ref.get("booknames") or []
+                titles = msg_ref.get("titles") or []
+            else:
+                msg_list = self._load_map_msg(source, hit)
+                booknames = [str(m.get("text") or "").strip() for m in msg_list if (m.get("type") or "") == "bookname"]
+                titles = [str(m.get("text") or "").strip() for m in msg_list if (m.get("type") or "") == "title"]
             b1 = booknames[0] if len(booknames) >= 1 else ""
             t = titles[0] if titles else ""
             b2 = booknames[1] if len(booknames) >= 2 else ""
@@ -1570,7 +2017,7 @@ class AISearchService:
             meta_str = "|".join(f"{k}={v}" for k, v in meta_items)
             cache_content = f"{cache_content}:{meta_str}"
         question_hash = hashlib.md5(cache_content.encode()).hexdigest()
-        return f"ai_search:{question_hash}"
+        return f"{ANSWER_PREFIX}{question_hash}"
 
     def _get_from_cache(self, cache_key: str) -> Optional[Dict]:
         """从Redis获取缓存"""
@@ -1605,6 +2052,41 @@ class AISearchService:
             logger.warning(f"保存缓存失败: {e}")
             return False
 
+    def _gemini_generate(self, contents: str, system_instruction: str):
+        """
+        调用 Gemini generate_content：优先使用术语表的 cached content，缓存失效时丢弃并以 system_instruction 重试一次。
+        成功后把缓存读取 token 数写入监控。调用方需已持有 GEMINI_SEMAPHORE。
+        """
+        use_cache = False
+        if gemini_instruction_cache:
+            config, use_cache = gemini_instruction_cache.config_for(system_instruction)
+        else:
+            config = types.GenerateContentConfig(system_instruction=system_instruction)
+        try:
+            response = gemini_client.models.generate_content(
+                model=GEMINI_MODEL,
+                contents=contents,
+                config=config,
+            )
+        except Exception as e:
+            if not (use_cache and is_cache_error(e)):
+                raise
+            logger.warning("Gemini cached content 不可用，回退 system_instruction: %s", e)
+            gemini_instruction_cache.invalidate(system_instruction)
+            response = gemini_client.models.generate_content(
+                model=GEMINI_MODEL,
+                contents=contents,
+                config=types.GenerateContentConfig(system_instruction=system_instruction),
+            )
+        usage = getattr(response, "usage_metadata", None)
+        cached_tokens = int(getattr(usage, "cached_content_token_count", 0) or 0)
+        if cached_tokens:
+            try:
+                get_monitoring(self.redis).record_prompt_cache("gemini", cache_read_tokens=cached_tokens)
+            except Exception as _e:
+                logger.debug(f"监控记录失败: {_e}")
+        return response
+
     def translate_outline(
         self,
         chinese_outline: str,
@@ -1626,7 +2108,7 @@ class AISearchService:
         if len(outline) > MAX_OUTLINE_LENGTH:
             return {"answer_en": None, "title_en": None, "error": f"中文纲目过长（最多 {MAX_OUTLINE_LENGTH} 字）"}
 
-        cache_key = f"ai_search:translate:{hashlib.sha256(outline.encode()).hexdigest()[:32]}"
+        cache_key = f"{TRANSLATE_PREFIX}{hashlib.sha256(outline.encode()).hexdigest()[:32]}"
         if use_cache and self.redis:
             try:
                 cached = self.redis.get(cache_key)
@@ -1641,13 +2123,7 @@ class AISearchService:
                             def _translate_title_for_cache(retry_count: int = 0) -> Optional[str]:
                                 with GEMINI_SEMAPHORE:
                                     try:
-                                        title_response = gemini_client.models.generate_content(
-                                            model=GEMINI_MODEL,
-                                            contents=topic,
-                                            config=types.GenerateContentConfig(
-                                                system_instruction=_gemini_system_instruction,
-                                            ),
-                                        )
+                                        title_response = self._gemini_generate(topic, _gemini_system_instruction)
                                         if title_response and getattr(title_response, "text", None):
                                             raw_title = title_response.text.strip()
                                             title_en_clean = raw_title
@@ -1696,13 +2172,7 @@ class AISearchService:
         def _call_gemini(retry_count: int = 0) -> Optional[str]:
             with GEMINI_SEMAPHORE:
                 try:
-                    response = gemini_client.models.generate_content(
-                        model=GEMINI_MODEL,
-                        contents=contents_zh2en,
-                        config=types.GenerateContentConfig(
-                            system_instruction=_gemini_system_instruction,
-                        ),
-                    )
+                    response = self._gemini_generate(contents_zh2en, _gemini_system_instruction)
                     if response and getattr(response, "text", None):
                         return response.text.strip()
                     else:
@@ -1737,13 +2207,7 @@ class AISearchService:
                 """翻译标题，带重试逻辑"""
                 with GEMINI_SEMAPHORE:
                     try:
-                        title_response = gemini_client.models.generate_content(
-                            model=GEMINI_MODEL,
-                            contents=topic,
-                            config=types.GenerateContentConfig(
-                                system_instruction=_gemini_system_instruction,
-                            ),
-                        )
+                        title_response = self._gemini_generate(topic, _gemini_system_instruction)
                         if title_response and getattr(title_response, "text", None):
                             raw_title = title_response.text.strip()
                             # 清理可能的提示词前缀
@@ -1830,13 +2294,7 @@ class AISearchService:
         def _call_gemini(retry_count: int = 0) -> Optional[str]:
             with GEMINI_SEMAPHORE:
                 try:
-                    response = gemini_client.models.generate_content(
-                        model=GEMINI_MODEL,
-                        contents=contents_en2zh,
-                        config=types.GenerateContentConfig(
-                            system_instruction=_gemini_system_instruction_en2zh,
-                        ),
-                    )
+                    response = self._gemini_generate(contents_en2zh, _gemini_system_instruction_en2zh)
                     if response and getattr(response, "text", None):
                         return response.text.strip()
                     logger.warning("Gemini 英翻中返回空响应（重试次数: %s）", retry_count)
@@ -1990,18 +2448,21 @@ class AISearchService:
                 
                 # 使用 PDF/A-2b 导出，会嵌入全部字体，避免移动端打开乱码
                 pdf_export_opts = 'pdf:writer_pdf_Export:{"SelectPdfVersion":{"type":"long","value":"2"}}'
-                convert_result = subprocess.run(
-                    [
-                        "libreoffice",
-                        "--headless",
-                        "--convert-to", pdf_export_opts,
-                        "--outdir", temp_output_dir,
-                        docx_path
-                    ],
-                    capture_output=True,
-                    text=True,
-                    timeout=60
-                )
+                with track("libreoffice", "convert") as call:
+                    convert_result = subprocess.run(
+                        [
+                            "libreoffice",
+                            "--headless",
+                            "--convert-to", pdf_export_opts,
+                            "--outdir", temp_output_dir,
+                            docx_path
+                        ],
+                        capture_output=True,
+                        text=True,
+                        timeout=60
+                    )
+                    if convert_result.returncode != 0:
+                        call.outcome = "error"
                 
                 if convert_result.returncode == 0:
                     # LibreOffice 会在输出目录生成 PDF，文件名基于输入文件名
@@ -2863,6 +3324,16 @@ class AISearchService:
                     current_batch.append((label, title, content))
                     current_size += item_size
             else:
+                # 整篇优先从伴生索引 <index>_messages 批量 mget，缺失的再逐篇拼装
+                prefixes = [
+                    self._parse_doc_id(str((h.get("_source") or {}).get("id") or h.get("_id", "")))[0]
+                    for h in hits
+                ]
+                prebuilt_messages = (
+                    mget_sources(self.es, message_index_name(index_name), prefixes)
+                    if index_name in SECTION_SOURCE_INDEXES
+                    else {}
+                )
                 for h in hits:
                     source = h.get("_source", {})
                     doc_id = str(source.get("id") or h.get("_id", ""))
@@ -2871,16 +3342,21 @@ class AISearchService:
                         if (index_name, prefix) in seen_prefix:
                             continue
                         seen_prefix.add((index_name, prefix))
-                        docs = self._fetch_message_docs(index_name, prefix)
-                        if not docs:
-                            continue
-                        parts = []
-                        for d in docs:
-                            t = str(d.get("text") or "").strip()
-                            if t:
-                                parts.append(t)
-                        content = "\n".join(parts)
-                        doc_title = self._format_reference(docs[0])
+                        message = prebuilt_messages.get(prefix)
+                        if message:
+                            content = str(message.get("text") or "")
+                            doc_title = self._format_reference(reference_source(message))
+                        else:
+                            docs = self._fetch_message_docs(index_name, prefix)
+                            if not docs:
+                                continue
+                            parts = []
+                            for d in docs:
+                                t = str(d.get("text") or "").strip()
+                                if t:
+                                    parts.append(t)
+                            content = "\n".join(parts)
+                            doc_title = self._format_reference(docs[0])
                     else:
                         # id 无 "-" 时视为单条文档，不按 prefix 拉整篇
                         if (index_name, doc_id) in seen_prefix:
@@ -2963,20 +3439,19 @@ class AISearchService:
         log_message = f"共导出 {total_items} 条，已生成 {len(batches)} 个文件：{base_name}-1.docx ～ {base_name}-{len(batches)}.docx"
         return (files_list, None, log_message)
 
-    def clear_cache(self) -> Dict:
-        """清空 AI 搜索 Redis 缓存（所有 ai_search:* 键）。返回删除的键数量。"""
-        if not self.redis:
-            return {"cleared": 0, "message": "Redis 未启用"}
-        try:
-            keys = self.redis.keys("ai_search:*")
-            if keys:
-                self.redis.delete(*keys)
-            count = len(keys)
-            logger.info(f"AI 搜索缓存已清理，删除 {count} 条")
-            return {"cleared": count, "message": f"已清理 {count} 条缓存" if count else "缓存为空，无需清理"}
-        except Exception as e:
-            logger.warning(f"清理缓存失败: {e}")
-            return {"cleared": 0, "message": str(e)}
+    def clear_cache(self, namespaces: Optional[List[str]] = None) -> Dict:
+        """
+        在后台清理 AI 搜索缓存（默认 all，即所有 ai_search:* 键；可按命名空间清理，见 cache_admin.NAMESPACES）。
+        以 SCAN + UNLINK 分批删除，立即返回任务 id，进度通过 get_cache_job 查询。
+        """
+        return self.cache_jobs.start(namespaces, delete=True)
+
+    def count_cache(self, namespaces: Optional[List[str]] = None) -> Dict:
+        """在后台统计各命名空间的键数（SCAN，不删除）。"""
+        return self.cache_jobs.start(namespaces, delete=False)
+
+    def get_cache_job(self, job_id: str) -> Optional[Dict]:
+        return self.cache_jobs.get_job(job_id)
 
     def health_check(self) -> Dict:
         """健康检查"""
@@ -0,0 +1,227 @@
+"""
+AI 搜索缓存的命名空间与后台清理
+
+Redis 中的缓存键按用途分为命名空间，可分别统计与清理：
+
+- answers：问答结果缓存 ai_search:answer:*（旧版本的 ai_search:{md5} 键按 TTL 自然过期，清理 all 时一并删除）
+- translations：纲目翻译缓存 ai_search:translate:*
+- contexts：search_only 保存的检索上下文 ai_search:context:*
+- speculative：投机生成结果与归属 ai_search:speculative:* / ai_search:speculative_owner:*
+- inflight：single-flight 合并锁 ai_search:inflight:*
+- search_results：/api/search、/api/cws 结果缓存 search_cache:result:*
+- all：ai_search:* 全部键（与原 clear_cache 范围一致）
+
+清理与统计不使用 KEYS（会阻塞整个 Redis），而是以 SCAN 增量遍历、每批用 UNLINK（后台释放内存）删除，
+在后台线程中执行。任务进度写入 Redis hash cache_admin:job:{job_id}（不在任何命名空间内，清理 all 不会删掉它），
+任一 worker 都可查询；同一时刻只允许一个任务（Redis 锁 cache_admin:lock）。SCAN 可能重复返回个别键，统计数为近似值。
+"""
+import logging
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional
+
+from search.result_cache import KEY_RESULT_PREFIX as SEARCH_RESULT_PREFIX
+from .single_flight import LOCK_PREFIX as INFLIGHT_PREFIX
+
+logger = logging.getLogger("ai_search.cache_admin")
+
+ANSWER_PREFIX = "ai_search:answer:"
+TRANSLATE_PREFIX = "ai_search:translate:"
+CONTEXT_PREFIX = "ai_search:context:"
+SPECULATIVE_PREFIX = "ai_search:speculative:"
+SPECULATIVE_OWNER_PREFIX = "ai_search:speculative_owner:"
+
+# 命名空间 -> (说明, SCAN MATCH 模式列表)
+NAMESPACES: Dict[str, tuple] = {
+    "answers": ("问答结果", [ANSWER_PREFIX + "*"]),
+    "translations": ("纲目翻译", [TRANSLATE_PREFIX + "*"]),
+    "contexts": ("检索上下文", [CONTEXT_PREFIX + "*"]),
+    "speculative": ("投机生成", [SPECULATIVE_PREFIX + "*", SPECULATIVE_OWNER_PREFIX + "*"]),
+    "inflight": ("合并锁", [INFLIGHT_PREFIX + "*"]),
+    "search_results": ("搜索结果", [SEARCH_RESULT_PREFIX + "*"]),
+    "all": ("全部 AI 搜索键", ["ai_search:*"]),
+}
+DEFAULT_NAMESPACES = ("all",)
+
+KEY_JOB_PREFIX = "cache_admin:job:"
+KEY_LOCK = "cache_admin:lock"
+JOB_TTL = 24 * 3600  # 任务进度保留时间（秒）
+LOCK_TTL = 600  # 锁有效期（秒），任务运行中定期续期
+SCAN_COUNT = 1000  # 每次 SCAN 的 COUNT 提示
+UNLINK_BATCH = 500  # 每批 UNLINK 的键数
+BATCH_PAUSE = 0.005  # 批之间让出的时间（秒），避免长时间占满 Redis
+
+
+def namespace_info() -> List[Dict[str, object]]:
+    return [{"name": name, "label": label, "patterns": patterns} for name, (label, patterns) in NAMESPACES.items()]
+
+
+def normalize_namespaces(namespaces: Optional[Iterable[str]]) -> List[str]:
+    """校验命名空间；含 all 时只保留 all（其余都是它的子集）。"""
+    names = [n for n in (namespaces or []) if n]
+    unknown = [n for n in names if n not in NAMESPACES]
+    if unknown:
+        raise ValueError(f"未知的缓存命名空间: {', '.join(unknown)}")
+    if not names:
+        names = list(DEFAULT_NAMESPACES)
+    if "all" in names:
+        # search_results 不在 ai_search:* 下，需单独保留
+        return ["all"] + (["search_results"] if "search_results" in names else [])
+    return list(dict.fromkeys(names))
+
+
+class CacheJobs:
+    """后台执行 SCAN + UNLINK 的清理 / 统计任务。"""
+
+    def __init__(self, redis_client=None):
+        self.redis = redis_client
+        self._lock = threading.Lock()
+        self._running: Optional[str] = None
+        # 进度写 Redis 失败时的本进程备份
+        self._local: Dict[str, Dict[str, str]] = {}
+
+    # ---------- 任务状态 ----------
+
+    def _save(self, job_id: str, fields: Dict[str, object]) -> None:
+        data = {k: str(v) for k, v in fields.items()}
+        self._local.setdefault(job_id, {}).update(data)
+        if not self.redis:
+            return
+        try:
+            key = KEY_JOB_PREFIX + job_id
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hset(key, mapping=data)
+            pipe.expire(key, JOB_TTL)
+            pipe.execute()
+        except Exception as e:
+            logger.warning("写入缓存任务进度失败: %s", e)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, object]]:
+        raw = None
+        if self.redis:
+            try:
+                raw = self.redis.hgetall(KEY_JOB_PREFIX + job_id)
+            except Exception as e:
+                logger.warning("读取缓存任务进度失败: %s", e)
+        raw = raw or self._local.get(job_id)
+        if not raw:
+            return None
+        job: Dict[str, object] = dict(raw)
+        for k in ("scanned", "deleted"):
+            job[k] = int(job.get(k, 0) or 0)
+        for k in ("started_at", "finished_at"):
+            if job.get(k):
+                job[k] = float(job[k])
+        job["namespaces"] = [n for n in str(job.get("namespaces", "")).split(",") if n]
+        job["counts"] = {
+            n: int(raw.get(f"count:{n}", 0) or 0) for n in job["namespaces"]
+        }
+        for k in list(job):
+            if k.startswith("count:"):
+                job.pop(k)
+        return job
+
+    # ---------- 启动 ----------
+
+    def _acquire(self, job_id: str) -> bool:
+        with self._lock:
+            if self._running:
+                return False
+            if self.redis:
+                try:
+                    if not self.redis.set(KEY_LOCK, job_id, nx=True, ex=LOCK_TTL):
+                        return False
+                except Exception as e:
+                    logger.warning("获取缓存任务锁失败，仅做进程内互斥: %s", e)
+            self._running = job_id
+            return True
+
+    def _release(self, job_id: str) -> None:
+        with self._lock:
+            self._running = None
+        if self.redis:
+            try:
+                if self.redis.get(KEY_LOCK) == job_id:
+                    self.redis.delete(KEY_LOCK)
+            except Exception:
+                pass
+
+    def start(self, namespaces: Optional[Iterable[str]] = None, delete: bool = True) -> Dict[str, object]:
+        """
+        启动后台任务：delete=True 清理所给命名空间的键，False 只统计键数。
+        返回 {"job_id", "status", ...}；已有任务运行时返回 status=busy 与运行中任务 id。
+        """
+        names = normalize_namespaces(namespaces)
+        if not self.redis:
+            return {"job_id": None, "status": "disabled", "message": "Redis 未启用"}
+        job_id = uuid.uuid4().hex[:12]
+        if not self._acquire(job_id):
+            running = self._running
+            if not running and self.redis:
+                try:
+                    running = self.redis.get(KEY_LOCK)
+                except Exception:
+                    running = None
+            return {"job_id": running, "status": "busy", "message": "已有缓存任务在运行"}
+        self._save(job_id, {
+            "job_id": job_id,
+            "action": "clear" if delete else "count",
+            "namespaces": ",".join(names),
+            "status": "running",
+            "scanned": 0,
+            "deleted": 0,
+            "started_at": time.time(),
+        })
+        threading.Thread(
+            target=self._run, args=(job_id, names, delete), name=f"cache-job-{job_id}", daemon=True
+        ).start()
+        return {"job_id": job_id, "status": "running", "namespaces": names}
+
+    # ---------- 执行 ----------
+
+    def _unlink(self, keys: List[str]) -> int:
+        try:
+            return int(self.redis.unlink(*keys) or 0)
+        except Exception as e:
+            # Redis < 4.0 没有 UNLINK
+            if "unknown command" not in str(e).lower():
+                raise
+            return int(self.redis.delete(*keys) or 0)
+
+    def _run(self, job_id: str, names: List[str], delete: bool) -> None:
+        scanned = deleted = 0
+        last_flush = time.time()
+        try:
+            for name in names:
+                count = 0
+                for pattern in NAMESPACES[name][1]:
+                    cursor = 0
+                    while True:
+                        cursor, keys = self.redis.scan(cursor=cursor, match=pattern, count=SCAN_COUNT)
+                        scanned += len(keys)
+                        count += len(keys)
+                        if delete:
+                            for i in range(0, len(keys), UNLINK_BATCH):
+                                deleted += self._unlink(keys[i:i + UNLINK_BATCH])
+                        if time.time() - last_flush >= 1:
+                            last_flush = time.time()
+                            self._save(job_id, {"scanned": scanned, "deleted": deleted, f"count:{name}": count})
+                            self.redis.expire(KEY_LOCK, LOCK_TTL)
+                        if int(cursor) == 0:
+                            break
+                        if BATCH_PAUSE:
+                            time.sleep(BATCH_PAUSE)
+                self._save(job_id, {f"count:{name}": count})
+            self._save(job_id, {
+                "status": "done", "scanned": scanned, "deleted": deleted, "finished_at": time.time(),
+            })
+            logger.info("缓存任务 %s 完成: %s 扫描 %d 删除 %d", job_id, ",".join(names), scanned, deleted)
+        except Exception as e:
+            logger.warning("缓存任务 %s 失败: %s", job_id, e)
+            self._save(job_id, {
+                "status": "failed", "error": str(e)[:500], "scanned": scanned, "deleted": deleted,
+                "finished_at": time.time(),
+            })
+        finally:
+            self._release(job_id)
@@ -0,0 +1,224 @@
+"""
+按 token 预算打包 Claude 上下文
+
+取代原先「每条截断到固定字数 + 固定 50/200 条」的做法：
+- 本地近似计数 token（不调用 API）：中文约 1 字 ≈ 1.5 tokens（与实测一致），英文 / 数字约 4 字符 ≈ 1.3 tokens
+- 去掉规范化后完全相同或被其他条目包含的近重复段落
+- 按加权分数从高到低贪心填充预算：单条超过上限时截断，预算余量不足以放下整条时截断到余量（余量过小则跳过该条，
+  继续尝试后面较短的条目）；最终仍按原检索排序输出。不按「分数 / token」排序，否则短小的片段会挤掉分数更高的整节
+
+检索阶段另提供 filter_near_duplicates：跨索引合并后的命中按 MinHash（bottom-k）估算字符 shingle 的 Jaccard 相似度，
+折叠近重复段落，只保留加权分数最高的一条，空出的名额留给其他内容。
+"""
+import heapq
+import re
+import zlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 每字符的近似 token 开销
+_CJK_COST = 1.5
+_ALNUM_COST = 0.3
+_SPACE_COST = 0.1
+_OTHER_COST = 1.0
+
+_RE_CJK = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")
+_RE_ALNUM = re.compile(r"[A-Za-z0-9]")
+_RE_SPACE = re.compile(r"\s")
+# 规范化时去掉的字符：空白与常见中英文标点
+_RE_NORMALIZE = re.compile(r"[\s\u3000-\u303f\uff00-\uffef!-/:-@\[-`{-~\u2010-\u2027]+")
+
+# 截断后剩余预算少于此值时不再截断塞入，直接跳过该条
+MIN_TRUNCATED_TOKENS = 200
+ELLIPSIS = "..."
+
+# 近重复检测：字符 shingle 长度、MinHash 签名大小、相似度阈值；过短段落（如标题）不参与
+SHINGLE_SIZE = 4
+SKETCH_SIZE = 64
+NEAR_DUP_THRESHOLD = 0.75
+MIN_DEDUP_CHARS = 30
+# 只对段落前若干字符做签名，控制长小节的计算量
+MAX_SKETCH_CHARS = 2000
+
+
+def _char_cost(ch: str) -> float:
+    if _RE_CJK.match(ch):
+        return _CJK_COST
+    if ch.isascii() and ch.isalnum():
+        return _ALNUM_COST
+    if ch.isspace():
+        return _SPACE_COST
+    return _OTHER_COST
+
+
+def estimate_tokens(text: str) -> int:
+    """近似 token 数（本地计算，用于预算与日志，不追求与 API 计数完全一致）。"""
+    if not text:
+        return 0
+    cjk = len(_RE_CJK.findall(text))
+    alnum = len(_RE_ALNUM.findall(text))
+    space = len(_RE_SPACE.findall(text))
+    other = len(text) - cjk - alnum - space
+    return int(cjk * _CJK_COST + alnum * _ALNUM_COST + space * _SPACE_COST + other * _OTHER_COST) + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """截断到约 max_tokens 个 token，末尾加省略号。"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    budget = max_tokens - _OTHER_COST * len(ELLIPSIS)
+    used = 0.0
+    for i, ch in enumerate(text):
+        used += _char_cost(ch)
+        if used > budget:
+            return text[:i] + ELLIPSIS
+    return text
+
+
+def _normalize(text: str) -> str:
+    return _RE_NORMALIZE.sub("", text or "")
+
+
+def dedupe_items(items: List[Dict]) -> Tuple[List[Dict], int]:
+    """
+    去掉近重复段落：规范化（去空白与标点）后与已保留条目相同、或被已保留条目包含的条目丢弃。
+    items 需已按分数降序，先出现者优先保留。返回 (保留列表, 去掉条数)。
+    """
+    kept: List[Dict] = []
+    kept_norms: List[str] = []
+    seen = set()
+    removed = 0
+    for item in items:
+        norm = _normalize(item.get("content", ""))
+        if not norm:
+            continue
+        if norm in seen or any(norm in k for k in kept_norms if len(k) > len(norm)):
+            removed += 1
+            continue
+        seen.add(norm)
+        kept.append(item)
+        kept_norms.append(norm)
+    return kept, removed
+
+
+def pack_context(
+    items: List[Dict],
+    token_budget: int,
+    max_item_tokens: int,
+    max_items: int,
+) -> Tuple[List[Dict], Dict]:
+    """
+    在 token_budget 内挑选上下文条目。
+
+    Args:
+        items: [{"reference", "content", "source_type", "score"}, ...]，按检索排序（分数降序）
+        token_budget: 上下文总 token 预算
+        max_item_tokens: 单条上限，超出截断
+        max_items: 最多条数
+
+    Returns:
+        (packed_items, stats)；packed_items 保持原排序，每项增加 "tokens"。
+        stats: {"budget", "tokens", "candidates", "packed", "deduped", "truncated"}
+    """
+    candidates, deduped = dedupe_items(items)
+    prepared = []
+    for rank, item in enumerate(candidates):
+        content = item.get("content", "")
+        truncated = False
+        if estimate_tokens(content) > max_item_tokens:
+            content = truncate_to_tokens(content, max_item_tokens)
+            truncated = True
+        tokens = estimate_tokens(content)
+        prepared.append((rank, item, content, tokens, truncated))
+
+    # 按分数从高到低贪心；分数相同时保留原排序
+    by_score = sorted(prepared, key=lambda p: (-float(p[1].get("score") or 0), p[0]))
+    chosen = []
+    used = 0
+    truncated_count = 0
+    for rank, item, content, tokens, truncated in by_score:
+        if len(chosen) >= max_items:
+            break
+        remaining = token_budget - used
+        if tokens > remaining:
+            if remaining < MIN_TRUNCATED_TOKENS:
+                continue
+            content = truncate_to_tokens(content, remaining)
+            tokens = estimate_tokens(content)
+            truncated = True
+        used += tokens
+        truncated_count += int(truncated)
+        chosen.append((rank, {**item, "content": content, "tokens": tokens}))
+
+    chosen.sort(key=lambda x: x[0])
+    packed = [item for _, item in chosen]
+    stats = {
+        "budget": token_budget,
+        "tokens": used,
+        "candidates": len(items),
+        "packed": len(packed),
+        "deduped": deduped,
+        "truncated": truncated_count,
+    }
+    return packed, stats
+
+
+def minhash_sketch(text: str) -> Tuple[int, ...]:
+    """bottom-k MinHash 签名：规范化文本所有 shingle 的 crc32 中最小的 SKETCH_SIZE 个。"""
+    norm = _normalize(text)[:MAX_SKETCH_CHARS]
+    if len(norm) <= SHINGLE_SIZE:
+        return (zlib.crc32(norm.encode()),) if norm else ()
+    shingles = map("".join, zip(*(norm[i:] for i in range(SHINGLE_SIZE))))
+    hashes = set(map(zlib.crc32, map(str.encode, shingles)))
+    return tuple(heapq.nsmallest(SKETCH_SIZE, hashes))
+
+
+def sketch_similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    """由两个 bottom-k 签名估算 Jaccard 相似度。"""
+    if not a or not b:
+        return 0.0
+    k = min(SKETCH_SIZE, len(set(a) | set(b)))
+    union_k = sorted(set(a) | set(b))[:k]
+    both = set(a) & set(b)
+    return sum(1 for h in union_k if h in both) / k
+
+
+def filter_near_duplicates(
+    items: List[Dict],
+    text_fn: Callable[[Dict], str],
+    threshold: float = NEAR_DUP_THRESHOLD,
+    limit: Optional[int] = None,
+) -> Tuple[List[Dict], int, int]:
+    """
+    折叠近重复条目。items 需已按加权分数降序，先出现者作为代表保留。
+    候选对由共享签名值的倒排表产生，再用签名估算相似度确认。
+    limit：保留条数达到后即停止（之后的条目本就不会被使用），返回列表最多 limit 条。
+
+    Returns:
+        (保留列表, 去掉条数, 去掉条目的估算 token 数)
+    """
+    kept: List[Dict] = []
+    sketches: List[Tuple[int, ...]] = []
+    buckets: Dict[int, List[int]] = {}
+    removed = 0
+    removed_tokens = 0
+    for item in items:
+        if limit is not None and len(kept) >= limit:
+            break
+        text = text_fn(item) or ""
+        if len(text) < MIN_DEDUP_CHARS:
+            kept.append(item)
+            continue
+        sketch = minhash_sketch(text)
+        candidates = set()
+        for h in sketch:
+            candidates.update(buckets.get(h, ()))
+        if any(sketch_similarity(sketch, sketches[c]) >= threshold for c in candidates):
+            removed += 1
+            removed_tokens += estimate_tokens(text)
+            continue
+        idx = len(sketches)
+        sketches.append(sketch)
+        for h in sketch:
+            buckets.setdefault(h, []).append(idx)
+        kept.append(item)
+    return kept, removed, removed_tokens
@@ -0,0 +1,130 @@
+"""
+Gemini 翻译术语表的 cached content 管理
+
+中翻英 / 英翻中的 system_instruction 是几十 KB 的固定术语表，每次调用都原样发送。
+本模块为每份 instruction 创建一个 Gemini cached content（client.caches.create），
+后续调用只传 cached_content 名称，术语表按缓存读取计费。
+
+- 缓存到期前 CACHE_REFRESH_MARGIN 秒视为过期，下次调用时重建
+- 创建失败（模型不支持、token 数不足、配额等）时在 CREATE_RETRY_INTERVAL 秒内直接回退 system_instruction
+- 创建请求在锁外发出；同一 instruction 正在创建时，其他调用直接回退 system_instruction，不排队等待
+- 调用方遇到缓存相关错误时调用 invalidate()，并以 system_instruction 重试
+"""
+import hashlib
+import logging
+import re
+import threading
+import time
+from typing import Callable, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger("ai_search.gemini_cache")
+
+CACHE_REFRESH_MARGIN = 120
+CREATE_RETRY_INTERVAL = 600
+
+# cached content 失效 / 不存在 / 无权访问时，错误信息中会出现 CachedContent、cached content、cachedContents/<id> 等字样
+_RE_CACHE_ERROR = re.compile(r"cache[sd]?[\s_-]*contents?", re.IGNORECASE)
+
+
+def _instruction_key(instruction: str) -> str:
+    return hashlib.sha256(instruction.encode()).hexdigest()[:16]
+
+
+def is_cache_error(error: Exception) -> bool:
+    """
+    判断异常是否由 cached content 失效 / 不可用引起。
+    只认错误信息中指向 cached content 的情况：模型不存在（NOT_FOUND）、密钥无权限（PERMISSION_DENIED）等
+    其他错误以 system_instruction 重试同样会失败，应直接抛出。
+    """
+    return bool(_RE_CACHE_ERROR.search(str(error)))
+
+
+class GeminiInstructionCache:
+    """按 instruction 内容维护 Gemini cached content，线程安全。"""
+
+    def __init__(
+        self,
+        client,
+        model: str,
+        types_module,
+        ttl_seconds: int = 3600,
+        on_create: Optional[Callable[[int], None]] = None,
+    ):
+        """
+        :param client: google.genai.Client
+        :param model: 模型名（cached content 与模型绑定）
+        :param types_module: google.genai.types
+        :param ttl_seconds: 缓存有效期（秒）
+        :param on_create: 创建缓存后回调，参数为写入缓存的 token 数
+        """
+        self.client = client
+        self.model = model
+        self.types = types_module
+        self.ttl_seconds = ttl_seconds
+        self.on_create = on_create
+        self._lock = threading.Lock()
+        # instruction key -> (cached content 名称, 本地判定的过期时间戳)
+        self._entries: Dict[str, Tuple[str, float]] = {}
+        # instruction key -> 下次允许尝试创建的时间戳
+        self._create_backoff: Dict[str, float] = {}
+        # 正在创建的 instruction key
+        self._creating: Set[str] = set()
+
+    def _create(self, key: str, instruction: str) -> Optional[str]:
+        """调用 caches.create（不持有锁）；结果写回时加锁。"""
+        try:
+            cache = self.client.caches.create(
+                model=self.model,
+                config=self.types.CreateCachedContentConfig(
+                    display_name=f"translation-instruction-{key}",
+                    system_instruction=instruction,
+                    ttl=f"{self.ttl_seconds}s",
+                ),
+            )
+        except Exception as e:
+            logger.warning("创建 Gemini cached content 失败，暂时回退 system_instruction: %s", e)
+            with self._lock:
+                self._create_backoff[key] = time.time() + CREATE_RETRY_INTERVAL
+            return None
+        with self._lock:
+            self._entries[key] = (cache.name, time.time() + self.ttl_seconds - CACHE_REFRESH_MARGIN)
+        tokens = int(getattr(getattr(cache, "usage_metadata", None), "total_token_count", 0) or 0)
+        logger.info("Gemini cached content 已创建: %s（%s tokens）", cache.name, tokens)
+        if self.on_create:
+            try:
+                self.on_create(tokens)
+            except Exception as e:
+                logger.debug("cached content 回调失败: %s", e)
+        return cache.name
+
+    def get_name(self, instruction: str) -> Optional[str]:
+        """返回 instruction 对应的有效 cached content 名称；不可用或正由其他线程创建时返回 None。"""
+        if not instruction:
+            return None
+        key = _instruction_key(instruction)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > time.time():
+                return entry[0]
+            if key in self._creating or self._create_backoff.get(key, 0) > time.time():
+                return None
+            self._creating.add(key)
+        try:
+            return self._create(key, instruction)
+        finally:
+            with self._lock:
+                self._creating.discard(key)
+
+    def config_for(self, instruction: str):
+        """返回 (GenerateContentConfig, 是否使用了 cached content)。"""
+        name = self.get_name(instruction)
+        if name:
+            return self.types.GenerateContentConfig(cached_content=name), True
+        return self.types.GenerateContentConfig(system_instruction=instruction), False
+
+    def invalidate(self, instruction: str) -> None:
+        """丢弃 instruction 对应的本地缓存记录，下次调用重建。"""
+        if not instruction:
+            return
+        with self._lock:
+            self._entries.pop(_instruction_key(instruction), None)
@@ -10,16 +10,27 @@ Redis 数据结构：
 - Hash ai_monitoring:stats：全局累计（total_queries, cache_hits, total_response_time_ms, total_input_tokens, total_output_tokens, total_cost）
 - Hash ai_monitoring:daily:YYYY-MM-DD：当日统计（同上），设置 TTL=30 天
 - List ai_monitoring:errors：最近错误列表，每项为 JSON，最多保留 200 条
+- Hash ai_monitoring:stats 中的 coalesced_queries：被 single-flight 合并的相同问题请求数
+- Hash ai_monitoring:stats 中的 speculative_{hit,miss,discarded,cancelled,expired} / speculative_saved_ms：投机生成结果与节省时间
+- 上述 stats / daily hash 中的 {claude,gemini}_cache_read_tokens / _cache_write_tokens：prompt cache 读写 token 累计
+- Hash ai_monitoring:latency:YYYY-MM-DD：各阶段（检索 / 上下文构建 / Claude 排队 / 生成 / 总耗时）按深度的固定分桶延迟直方图，
+  字段 {stage}:{depth}:b{桶序号} / :count / :sum，TTL=30 天；多天直方图逐桶相加即可合并，get_stats 据此给出 p50/p95/p99
+
+get_stats 用一个 pipeline 读取全局、每日、延迟直方图与检索日志（一次往返），结果在进程内缓存 AI_STATS_CACHE_TTL 秒（默认 5）
 """
 import os
+import bisect
 import json
 import logging
+import threading
 import time
 from typing import Dict, List, Optional, Any
 from datetime import datetime, timedelta
 
 from dotenv import load_dotenv
 
+from utils.metrics import instrument_redis
+
 load_dotenv()
 
 logging.basicConfig(
@@ -41,10 +52,24 @@ KEY_STATS = "ai_monitoring:stats"  # 全局统计 hash
 KEY_DAILY_PREFIX = "ai_monitoring:daily:"  # 每日统计 hash，格式 ai_monitoring:daily:YYYY-MM-DD
 KEY_ERRORS = "ai_monitoring:errors"  # 最近错误 list
 KEY_RETRIEVAL_LOG = "ai_monitoring:retrieval_log"  # 检索统计日志 list
+KEY_LATENCY_PREFIX = "ai_monitoring:latency:"  # 每日延迟直方图 hash，格式 ai_monitoring:latency:YYYY-MM-DD
+PROMPT_CACHE_PROVIDERS = ("claude", "gemini")  # 记录 prompt cache 用量的模型提供方
+SPECULATIVE_OUTCOMES = ("hit", "miss", "discarded", "cancelled", "expired")  # 投机生成的去向
+# 延迟直方图：阶段、深度与桶上界（毫秒，最后一个桶为 +Inf）
+LATENCY_STAGES = ("retrieval", "context", "queue", "generation", "total")
+LATENCY_DEPTHS = ("general", "deep")
+LATENCY_BUCKETS_MS = (
+    10, 50, 100, 250, 500, 1000, 2000, 3000, 5000, 7500, 10000, 15000, 20000,
+    30000, 45000, 60000, 90000, 120000, 180000, 300000,
+)
+LATENCY_PERCENTILES = (50, 95, 99)
 MAX_ERRORS = 200  # 最多保留错误条数
 MAX_RETRIEVAL_LOG = 100  # 检索日志最多保留条数
 DAILY_TTL_DAYS = 30  # 每日统计保留天数
 DAILY_TTL_SECONDS = 30 * 24 * 3600  # 每日 key 的 TTL（秒）
+RETRIEVAL_LOG_LIMIT = 50  # get_stats 返回的检索日志条数
+# get_stats 结果在进程内缓存的秒数（管理后台轮询时多次刷新只读一次 Redis），0 关闭
+STATS_CACHE_TTL = float(os.getenv("AI_STATS_CACHE_TTL", "5") or 0)
 
 
 def _get_redis_client():
@@ -53,7 +78,7 @@ def _get_redis_client():
         import redis
         client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
         client.ping()
-        return client
+        return instrument_redis(client)
     except Exception as e:
         logger.warning(f"Redis 未启用，监控将不可用: {e}")
         return None
@@ -71,6 +96,9 @@ class AIMonitoring:
         :param redis_client: 可选，已连接的 Redis 客户端；为 None 时内部创建。
         """
         self.redis = redis_client if redis_client is not None else _get_redis_client()
+        # days -> (过期时间戳, get_stats 结果)
+        self._stats_cache: Dict[int, Any] = {}
+        self._stats_cache_lock = threading.Lock()
 
     def _today_str(self) -> str:
         """当前日期字符串，用于每日统计键。"""
@@ -106,6 +134,8 @@ class AIMonitoring:
         output_tokens: int = 0,
         cost: Optional[float] = None,
         special_needs: Optional[str] = None,
+        depth: Optional[str] = None,
+        stage_times: Optional[Dict[str, float]] = None,
     ) -> None:
         """
         记录一次 AI 查询。
@@ -116,6 +146,8 @@ class AIMonitoring:
         :param output_tokens: 输出 token 数
         :param cost: 费用（美元）；为 None 时根据 input/output tokens 计算
         :param special_needs: 纲目性质（一般性/高真理浓度/高生命浓度/重实行应用），用于统计占比
+        :param depth: 搜索深度（general/deep），与 stage_times 一起写入延迟直方图
+        :param stage_times: 各阶段耗时（毫秒），键为 LATENCY_STAGES 之一；与计数在同一个 pipeline 中写入
         """
         if not self.redis:
             return
@@ -146,10 +178,159 @@ class AIMonitoring:
             pipe.hincrby(day_key, "total_output_tokens", output_tokens)
             pipe.hincrbyfloat(day_key, "total_cost", round(cost, 6))
             pipe.expire(day_key, DAILY_TTL_SECONDS)
+            if stage_times:
+                self._add_latencies(pipe, depth, stage_times)
             pipe.execute()
         except Exception as e:
             logger.warning(f"记录查询统计失败: {e}")
 
+    def _normalize_depth(self, depth: Optional[str]) -> str:
+        return depth if depth in LATENCY_DEPTHS else "general"
+
+    def _add_latencies(self, pipe, depth: Optional[str], stage_times: Dict[str, float]) -> None:
+        """把各阶段耗时写入当日直方图（只追加到 pipe，不执行）。"""
+        depth = self._normalize_depth(depth)
+        key = KEY_LATENCY_PREFIX + self._today_str()
+        for stage, ms in stage_times.items():
+            if stage not in LATENCY_STAGES or ms is None:
+                continue
+            ms = max(float(ms), 0.0)
+            prefix = f"{stage}:{depth}"
+            pipe.hincrby(key, f"{prefix}:b{bisect.bisect_left(LATENCY_BUCKETS_MS, ms)}", 1)
+            pipe.hincrby(key, f"{prefix}:count", 1)
+            pipe.hincrbyfloat(key, f"{prefix}:sum", round(ms, 2))
+        pipe.expire(key, DAILY_TTL_SECONDS)
+
+    def record_latencies(self, depth: Optional[str], stage_times: Dict[str, float]) -> None:
+        """单独记录阶段耗时（如 search_only 的检索阶段），一个 pipeline 写入。"""
+        if not self.redis or not stage_times:
+            return
+        try:
+            pipe = self.redis.pipeline()
+            self._add_latencies(pipe, depth, stage_times)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"记录延迟直方图失败: {e}")
+
+    @staticmethod
+    def _percentile(buckets: List[int], count: int, pct: float) -> float:
+        """按固定分桶估算百分位：在目标桶内线性插值；落在 +Inf 桶时返回最后一个上界。"""
+        if count <= 0:
+            return 0.0
+        rank = pct / 100 * count
+        cumulative = 0
+        for i, n in enumerate(buckets):
+            if n and cumulative + n >= rank:
+                if i >= len(LATENCY_BUCKETS_MS):
+                    return float(LATENCY_BUCKETS_MS[-1])
+                lower = LATENCY_BUCKETS_MS[i - 1] if i > 0 else 0
+                upper = LATENCY_BUCKETS_MS[i]
+                return round(lower + (upper - lower) * (rank - cumulative) / n, 1)
+            cumulative += n
+        return float(LATENCY_BUCKETS_MS[-1])
+
+    def _latency_stats(self, day_hashes: List[Dict[str, Any]]) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """
+        合并多天的直方图，返回 {stage: {general|deep|all: {count, avg_ms, p50, p95, p99}}}。
+        """
+        n_buckets = len(LATENCY_BUCKETS_MS) + 1
+        merged: Dict[tuple, Dict[str, Any]] = {}
+        for stage in LATENCY_STAGES:
+            for depth in LATENCY_DEPTHS + ("all",):
+                merged[(stage, depth)] = {"buckets": [0] * n_buckets, "count": 0, "sum": 0.0}
+        for raw in day_hashes:
+            for field, value in (raw or {}).items():
+                parts = field.split(":")
+                if len(parts) != 3 or (parts[0], parts[1]) not in merged:
+                    continue
+                stage, depth, name = parts
+                for target in (merged[(stage, depth)], merged[(stage, "all")]):
+                    if name == "count":
+                        target["count"] += int(value or 0)
+                    elif name == "sum":
+                        target["sum"] += float(value or 0)
+                    elif name.startswith("b") and name[1:].isdigit() and int(name[1:]) < n_buckets:
+                        target["buckets"][int(name[1:])] += int(value or 0)
+        out: Dict[str, Dict[str, Dict[str, float]]] = {}
+        for (stage, depth), h in merged.items():
+            item = {
+                "count": h["count"],
+                "avg_ms": round(h["sum"] / h["count"], 1) if h["count"] else 0.0,
+            }
+            for pct in LATENCY_PERCENTILES:
+                item[f"p{pct}"] = self._percentile(h["buckets"], h["count"], pct)
+            out.setdefault(stage, {})[depth] = item
+        return out
+
+    def record_prompt_cache(
+        self,
+        provider: str,
+        cache_read_tokens: int = 0,
+        cache_write_tokens: int = 0,
+    ) -> None:
+        """
+        记录一次调用的 prompt cache 用量（Claude cache_control / Gemini cached content）。
+        :param provider: claude 或 gemini
+        :param cache_read_tokens: 命中缓存读取的输入 token 数
+        :param cache_write_tokens: 写入缓存的输入 token 数
+        """
+        if not self.redis or provider not in PROMPT_CACHE_PROVIDERS:
+            return
+        if not cache_read_tokens and not cache_write_tokens:
+            return
+        try:
+            day_key = KEY_DAILY_PREFIX + self._today_str()
+            pipe = self.redis.pipeline()
+            for key in (KEY_STATS, day_key):
+                pipe.hincrby(key, f"{provider}_cache_read_tokens", int(cache_read_tokens or 0))
+                pipe.hincrby(key, f"{provider}_cache_write_tokens", int(cache_write_tokens or 0))
+            pipe.expire(day_key, DAILY_TTL_SECONDS)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"记录 prompt cache 统计失败: {e}")
+
+    def record_speculative(self, outcome: str, saved_ms: float = 0.0) -> None:
+        """
+        记录一次投机生成的去向。
+        :param outcome: hit（generate 取用）/ miss（失败或未完成）/ discarded（问题变更）/ cancelled（排队中取消）/ expired（未取用，结果写入缓存）
+        :param saved_ms: 命中时与客户端往返重叠、节省的时间（毫秒）
+        """
+        if not self.redis or outcome not in SPECULATIVE_OUTCOMES:
+            return
+        try:
+            pipe = self.redis.pipeline()
+            pipe.hincrby(KEY_STATS, f"speculative_{outcome}", 1)
+            if saved_ms:
+                pipe.hincrbyfloat(KEY_STATS, "speculative_saved_ms", round(saved_ms, 2))
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"记录投机生成统计失败: {e}")
+
+    def record_coalesced(self) -> None:
+        """记录一次被合并的并发相同问题（等待其他请求的结果，未重复调用 Claude）。"""
+        if not self.redis:
+            return
+        try:
+            self.redis.hincrby(KEY_STATS, "coalesced_queries", 1)
+        except Exception as e:
+            logger.warning(f"记录合并请求失败: {e}")
+
+    def _speculative_stats(self, raw: Dict[str, Any]) -> Dict[str, Any]:
+        out = {k: int(raw.get(f"speculative_{k}", 0) or 0) for k in SPECULATIVE_OUTCOMES}
+        saved = float(raw.get("speculative_saved_ms", 0) or 0)
+        out["saved_ms_total"] = round(saved, 2)
+        out["avg_saved_ms"] = round(saved / out["hit"], 2) if out["hit"] else 0.0
+        return out
+
+    def _prompt_cache_stats(self, raw: Dict[str, Any]) -> Dict[str, Dict[str, int]]:
+        return {
+            p: {
+                "read_tokens": int(raw.get(f"{p}_cache_read_tokens", 0) or 0),
+                "write_tokens": int(raw.get(f"{p}_cache_write_tokens", 0) or 0),
+            }
+            for p in PROMPT_CACHE_PROVIDERS
+        }
+
     def record_error(self, error_message: str, extra: Optional[Dict[str, Any]] = None) -> None:
         """
         记录一条错误。
@@ -175,13 +356,17 @@ class AIMonitoring:
         total: int,
         used: int,
         waste_rate: float,
+        token_budget: Optional[int] = None,
+        context_tokens: Optional[int] = None,
     ) -> None:
         """
-        记录一次检索统计（总检索条数、使用条数、浪费率），用于后台展示。
+        记录一次检索统计（总检索条数、使用条数、浪费率、上下文 token），用于后台展示。
         :param question_preview: 问题摘要（如前30字）
         :param total: 总检索条数
         :param used: 实际使用条数
         :param waste_rate: 浪费率（百分比）
+        :param token_budget: 上下文 token 预算
+        :param context_tokens: 实际打包的上下文 token 数（本地估算）
         """
         if not self.redis:
             return
@@ -193,6 +378,10 @@ class AIMonitoring:
                 "used": used,
                 "waste_rate": waste_rate,
             }
+            if token_budget is not None:
+                item["token_budget"] = token_budget
+            if context_tokens is not None:
+                item["context_tokens"] = context_tokens
             self.redis.lpush(KEY_RETRIEVAL_LOG, json.dumps(item, ensure_ascii=False))
             self.redis.ltrim(KEY_RETRIEVAL_LOG, 0, MAX_RETRIEVAL_LOG - 1)
         except Exception as e:
@@ -202,29 +391,64 @@ class AIMonitoring:
         """
         获取最近检索统计日志。
         :param limit: 最多返回条数
-        :return: 列表，每项含 ts、question、total、used、waste_rate
+        :return: 列表，每项含 ts、question、total、used、waste_rate（新记录另含 token_budget、context_tokens）
         """
         if not self.redis:
             return []
         try:
-            raw_list = self.redis.lrange(KEY_RETRIEVAL_LOG, 0, limit - 1)
-            result = []
-            for s in raw_list:
-                try:
-                    result.append(json.loads(s))
-                except json.JSONDecodeError:
-                    result.append({"question": s, "ts": None, "total": 0, "used": 0, "waste_rate": 0})
-            return result
+            return self._parse_retrieval_log(self.redis.lrange(KEY_RETRIEVAL_LOG, 0, limit - 1))
         except Exception as e:
             logger.warning(f"获取检索日志失败: {e}")
             return []
 
+    @staticmethod
+    def _parse_retrieval_log(raw_list: List[str]) -> List[Dict[str, Any]]:
+        result = []
+        for s in raw_list:
+            try:
+                result.append(json.loads(s))
+            except json.JSONDecodeError:
+                result.append({"question": s, "ts": None, "total": 0, "used": 0, "waste_rate": 0})
+        return result
+
+    def _daily_stats(self, date_str: str, day_raw: Dict[str, Any]) -> Dict[str, Any]:
+        """单日统计条目。"""
+        q = int(day_raw.get("total_queries", 0) or 0)
+        ch = int(day_raw.get("cache_hits", 0) or 0)
+        tr = float(day_raw.get("total_response_time_ms", 0) or 0)
+        c = float(day_raw.get("total_cost", 0) or 0)
+        nc = q - ch  # 非缓存命中的查询数
+        return {
+            "date": date_str,
+            "queries": q,
+            "cache_hits": ch,
+            "avg_ms": round(tr / nc, 2) if nc > 0 else 0,
+            "cost": round(c, 4),
+            "prompt_cache": self._prompt_cache_stats(day_raw),
+        }
+
     def get_stats(self, days: int = 7) -> Dict[str, Any]:
         """
-        获取统计数据。
+        获取统计数据（结果在进程内缓存 STATS_CACHE_TTL 秒）。
         :param days: 包含的最近天数（用于每日统计列表）
         :return: 总查询数、缓存命中率、平均响应时间、总费用、每日统计列表
         """
+        if STATS_CACHE_TTL > 0 and self.redis:
+            with self._stats_cache_lock:
+                cached = self._stats_cache.get(days)
+            if cached and cached[0] > time.time():
+                return dict(cached[1])
+        stats = self._build_stats(days)
+        if STATS_CACHE_TTL > 0 and self.redis and "error" not in stats:
+            with self._stats_cache_lock:
+                self._stats_cache[days] = (time.time() + STATS_CACHE_TTL, stats)
+        return dict(stats)
+
+    def _build_stats(self, days: int) -> Dict[str, Any]:
+        """
+        汇总统计：全局 hash、最近 days 天的每日 hash 与延迟直方图、检索日志放在同一个 pipeline 中读取，
+        只需一次 Redis 往返。
+        """
         if not self.redis:
             return {
                 "total_queries": 0,
@@ -232,13 +456,29 @@ class AIMonitoring:
                 "avg_response_time_ms": 0.0,
                 "total_cost": 0.0,
                 "nature_counts": {k: 0 for k in AIMonitoring.NATURE_KEYS},
+                "prompt_cache": self._prompt_cache_stats({}),
+                "speculative": self._speculative_stats({}),
+                "latency": self._latency_stats([]),
                 "daily": [],
                 "retrieval_log": [],
                 "message": "Redis 未启用，无统计数据",
             }
         try:
-            # 从 Redis Hash 读取全局统计
-            raw = self.redis.hgetall(KEY_STATS)
+            today = datetime.utcnow().date()
+            dates = [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days)]
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hgetall(KEY_STATS)
+            for date_str in dates:
+                pipe.hgetall(KEY_DAILY_PREFIX + date_str)
+            for date_str in dates:
+                pipe.hgetall(KEY_LATENCY_PREFIX + date_str)
+            pipe.lrange(KEY_RETRIEVAL_LOG, 0, RETRIEVAL_LOG_LIMIT - 1)
+            results = pipe.execute()
+            raw = results[0] or {}
+            daily_raws = results[1:1 + days]
+            latency_raws = results[1 + days:1 + 2 * days]
+            retrieval_log = self._parse_retrieval_log(results[-1] or [])
+
             total_queries = int(raw.get("total_queries", 0) or 0)
             cache_hits = int(raw.get("cache_hits", 0) or 0)
             total_response_time_ms = float(raw.get("total_response_time_ms", 0) or 0)
@@ -249,27 +489,9 @@ class AIMonitoring:
             avg_response_time_ms = (total_response_time_ms / non_cache_queries) if non_cache_queries > 0 else 0.0
 
             # 每日统计（最近 days 天）
-            daily = []
-            for i in range(days):
-                d = datetime.utcnow().date() - timedelta(days=i)
-                day_key = KEY_DAILY_PREFIX + d.strftime("%Y-%m-%d")
-                day_raw = self.redis.hgetall(day_key)
-                if not day_raw:
-                    daily.append({"date": d.strftime("%Y-%m-%d"), "queries": 0, "cache_hits": 0, "avg_ms": 0, "cost": 0})
-                    continue
-                q = int(day_raw.get("total_queries", 0) or 0)
-                ch = int(day_raw.get("cache_hits", 0) or 0)
-                tr = float(day_raw.get("total_response_time_ms", 0) or 0)
-                c = float(day_raw.get("total_cost", 0) or 0)
-                nc = q - ch  # 非缓存命中的查询数
-                daily.append({
-                    "date": d.strftime("%Y-%m-%d"),
-                    "queries": q,
-                    "cache_hits": ch,
-                    "avg_ms": round(tr / nc, 2) if nc > 0 else 0,
-                    "cost": round(c, 4),
-                })
-            retrieval_log = self.get_recent_retrieval_log(limit=50)
+            daily = [self._daily_stats(date_str, day_raw or {}) for date_str, day_raw in zip(dates, daily_raws)]
+            # 延迟直方图：合并最近 days 天后计算百分位
+            latency = self._latency_stats([r or {} for r in latency_raws])
             # 纲目性质统计：四种性质的查询次数
             nature_counts = {k: int(raw.get(f"nature_{k}", 0) or 0) for k in self.NATURE_KEYS}
             return {
@@ -278,6 +500,10 @@ class AIMonitoring:
                 "avg_response_time_ms": round(avg_response_time_ms, 2),
                 "total_cost": round(total_cost, 4),
                 "nature_counts": nature_counts,
+                "prompt_cache": self._prompt_cache_stats(raw),
+                "speculative": self._speculative_stats(raw),
+                "coalesced_queries": int(raw.get("coalesced_queries", 0) or 0),
+                "latency": latency,
                 "daily": daily,
                 "retrieval_log": retrieval_log,
             }
@@ -290,6 +516,9 @@ class AIMonitoring:
                 "total_cost": 0.0,
                 "daily": [],
                 "nature_counts": {"一般性": 0, "高真理浓度": 0, "高生命浓度": 0, "重实行应用": 0},
+                "prompt_cache": self._prompt_cache_stats({}),
+                "speculative": self._speculative_stats({}),
+                "latency": self._latency_stats([]),
                 "retrieval_log": [],
                 "error": str(e),
             }
@@ -325,7 +554,11 @@ class AIMonitoring:
             for i in range(DAILY_TTL_DAYS + 1):
                 d = datetime.utcnow().date() - timedelta(days=i)
                 keys.append(KEY_DAILY_PREFIX + d.strftime("%Y-%m-%d"))
-            self.redis.delete(*keys)
+                keys.append(KEY_LATENCY_PREFIX + d.strftime("%Y-%m-%d"))
+            # UNLINK：大 hash / list 的内存在 Redis 后台线程释放，不阻塞其他请求
+            self.redis.unlink(*keys)
+            with self._stats_cache_lock:
+                self._stats_cache.clear()
             logger.info("AI 监控统计已重置")
         except Exception as e:
             logger.warning(f"重置统计失败: {e}")
@@ -0,0 +1,141 @@
+"""
+相同问题并发请求合并（single-flight）
+
+会议公布题目后，常有多人在几秒内提交相同的问题（同 depth、同元数据），各自未命中缓存，
+分别执行检索与一次数十秒、数美分的 Claude 生成。本模块以答案缓存 key 为键合并这些请求：
+
+- 进程内：进行中的 key 对应一个 Future，后到的线程直接等待该 Future
+- 跨 worker：以 Redis SET NX 锁选出 leader，完成后在 <prefix><key> 频道 publish；
+  其他 worker 订阅该频道，收到通知后从答案缓存读取结果
+- leader 失败、超时或结果未写入缓存时，follower 自行执行，不会因合并而拿不到结果
+"""
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger("ai_search.single_flight")
+
+LOCK_PREFIX = "ai_search:inflight:"
+DONE_MESSAGE = "done"
+
+# 原子释放：只删除自己持有的锁
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """按 key 合并并发调用；redis_client 为 None 时只做进程内合并。"""
+
+    def __init__(self, redis_client=None, lock_ttl: int = 600, wait_timeout: int = 600):
+        """
+        :param redis_client: decode_responses=True 的 Redis 客户端
+        :param lock_ttl: leader 锁有效期（秒），需覆盖一次完整生成
+        :param wait_timeout: follower 最长等待时间（秒）
+        """
+        self.redis = redis_client
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+
+    def run(
+        self,
+        key: str,
+        fn: Callable[[], Any],
+        load_result: Callable[[], Optional[Any]],
+    ) -> Tuple[Any, bool]:
+        """
+        执行或等待 key 对应的调用。
+
+        :param fn: 实际执行的函数（leader 调用）
+        :param load_result: 读取 leader 已写入的结果（通常为读答案缓存），无结果返回 None
+        :return: (结果, 本次调用是否由自己执行)
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                future = Future()
+                self._inflight[key] = future
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            logger.info("合并请求：等待本进程内相同问题的结果")
+            try:
+                return future.result(timeout=self.wait_timeout)
+            except Exception as e:
+                logger.warning("等待合并请求失败，改为自行执行: %s", e)
+                return fn(), True
+
+        try:
+            outcome = self._run_across_workers(key, fn, load_result)
+            future.set_result((outcome[0], False))
+            return outcome
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _run_across_workers(self, key, fn, load_result) -> Tuple[Any, bool]:
+        if not self.redis:
+            return fn(), True
+        lock_key = LOCK_PREFIX + key
+        token = uuid.uuid4().hex
+        try:
+            acquired = self.redis.set(lock_key, token, nx=True, ex=self.lock_ttl)
+        except Exception as e:
+            logger.debug("获取合并锁失败，直接执行: %s", e)
+            return fn(), True
+        if acquired:
+            try:
+                return fn(), True
+            finally:
+                self._release(lock_key, token)
+
+        result = self._wait_for_leader(lock_key, load_result)
+        if result is not None:
+            logger.info("合并请求：已取得其他 worker 的结果")
+            return result, False
+        logger.info("合并请求：leader 未产出结果，改为自行执行")
+        return fn(), True
+
+    def _release(self, lock_key: str, token: str) -> None:
+        try:
+            self.redis.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+            self.redis.publish(lock_key, DONE_MESSAGE)
+        except Exception as e:
+            logger.debug("释放合并锁失败: %s", e)
+
+    def _wait_for_leader(self, lock_key: str, load_result) -> Optional[Any]:
+        """订阅 leader 完成通知；先订阅再检查，避免错过在两者之间发出的通知。"""
+        pubsub = None
+        try:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(lock_key)
+            deadline = time.time() + self.wait_timeout
+            while time.time() < deadline:
+                result = load_result()
+                if result is not None:
+                    return result
+                if not self.redis.exists(lock_key):
+                    # leader 已结束（或锁过期）但没有可用结果
+                    return load_result()
+                pubsub.get_message(timeout=min(5.0, max(0.0, deadline - time.time())))
+        except Exception as e:
+            logger.debug("等待合并结果失败: %s", e)
+        finally:
+            if pubsub is not None:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+        return load_result()
@@ -0,0 +1,165 @@
+"""
+响应序列化与压缩基准：标准库 json 与 orjson 的序列化耗时，原始 / gzip / brotli 的传输字节数与压缩耗时。
+
+内置三类代表性载荷（可用 --file 追加实际接口返回的 JSON 文件）：
+- cws：/api/cws 一万条带高亮的结果
+- reading：/api/reading 整篇 pan_reading 文档（嵌套 cells、toc）
+- docx_b64：info_retrieval 多文件路径返回的 base64 DOCX
+
+用法：在 back_mic/backend 目录下执行
+    python bench_response.py
+    python bench_response.py -n 20 --file cws_dump.json
+"""
+import argparse
+import base64
+import gzip
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from utils.compression import COMPRESS_BROTLI_QUALITY, COMPRESS_GZIP_LEVEL
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+_ZH = "神的经纶是要将祂自己分赐到人里面作生命召会是基督的身体新人的实际在于基督与"
+_EN = "God's economy is to dispense Himself into man as life the church is the Body of Christ "
+
+
+def _zh(rng, n):
+    return "".join(rng.choice(_ZH) for _ in range(n))
+
+
+def _en(rng, n):
+    words = _EN.split()
+    return " ".join(rng.choice(words) for _ in range(n))
+
+
+def cws_payload(rng, hits=10000):
+    return {
+        "total": hits,
+        "msg": [
+            {
+                "id": f"cwwl-{i}",
+                "up": _zh(rng, 30) + "<em>神的经纶</em>" + _zh(rng, 40),
+                "down": _en(rng, 25),
+                "title": _zh(rng, 12),
+                "tags": ["cwwl", str(i % 80)],
+                "source": f"李常受文集{i % 70}册",
+            }
+            for i in range(hits)
+        ],
+    }
+
+
+def reading_payload(rng, sections=40, cells=30):
+    return {
+        "refid": "R-2024-01",
+        "zh": _zh(rng, 20),
+        "en": _en(rng, 10),
+        "type": "reading",
+        "bread": [{"zh": _zh(rng, 6), "en": _en(rng, 3)} for _ in range(3)],
+        "toc": [{"id": f"s{i}", "zh": _zh(rng, 12), "en": _en(rng, 6)} for i in range(sections)],
+        "cells": [
+            {"id": f"s{i}-{j}", "zh": _zh(rng, 120), "en": _en(rng, 60), "type": "p"}
+            for i in range(sections)
+            for j in range(cells)
+        ],
+    }
+
+
+def docx_payload(rng, files=3, size=2 * 1024 * 1024):
+    # DOCX 本身是 zip，内容接近随机字节
+    return {
+        "multiple": True,
+        "files": [
+            {"filename": f"检索结果_{i + 1}.docx", "content": base64.b64encode(os.urandom(size)).decode("ascii")}
+            for i in range(files)
+        ],
+        "log": base64.b64encode(_zh(rng, 400).encode("utf-8")).decode("ascii"),
+    }
+
+
+def timed(fn, repeat):
+    """返回 (结果, 耗时中位数 ms)"""
+    times = []
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return result, statistics.median(times)
+
+
+def std_dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def bench(name, payload, repeat):
+    body, t_json = timed(lambda: std_dumps(payload), repeat)
+    row = [name, len(body), t_json]
+    if orjson is not None:
+        _, t_orjson = timed(lambda: orjson.dumps(payload), repeat)
+        row.append(t_orjson)
+    else:
+        row.append(None)
+    gz, t_gz = timed(lambda: gzip.compress(body, compresslevel=COMPRESS_GZIP_LEVEL), repeat)
+    row += [len(gz), t_gz]
+    if brotli is not None:
+        br, t_br = timed(lambda: brotli.compress(body, quality=COMPRESS_BROTLI_QUALITY), repeat)
+        row += [len(br), t_br]
+    else:
+        row += [None, None]
+    return row
+
+
+def _fmt(v, unit=""):
+    if v is None:
+        return "-"
+    if isinstance(v, float):
+        return f"{v:.1f}{unit}"
+    return f"{v:,}{unit}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--repeat", type=int, default=5)
+    parser.add_argument("--file", action="append", default=[], help="追加一个实际返回的 JSON 文件作为载荷")
+    opts = parser.parse_args()
+
+    rng = random.Random(42)
+    payloads = [
+        ("cws", cws_payload(rng)),
+        ("reading", reading_payload(rng)),
+        ("docx_b64", docx_payload(rng)),
+    ]
+    for f in opts.file:
+        payloads.append((Path(f).name, json.loads(Path(f).read_text("utf-8"))))
+
+    print(f"\norjson: {'已安装' if orjson else '未安装'}，brotli: {'已安装' if brotli else '未安装'}，"
+          f"gzip level={COMPRESS_GZIP_LEVEL}，brotli quality={COMPRESS_BROTLI_QUALITY}\n")
+    header = ("载荷", "原始字节", "json", "orjson", "gzip 字节", "gzip", "br 字节", "br")
+    print(f"{header[0]:<14}{header[1]:>14}{header[2]:>10}{header[3]:>10}{header[4]:>14}{header[5]:>10}{header[6]:>14}{header[7]:>10}")
+    print("-" * 96)
+    for name, payload in payloads:
+        name, raw, t_json, t_orjson, gz, t_gz, br, t_br = bench(name, payload, opts.repeat)
+        print(
+            f"{name:<14}{_fmt(raw):>14}{_fmt(t_json, 'ms'):>10}{_fmt(t_orjson, 'ms'):>10}"
+            f"{_fmt(gz):>14}{_fmt(t_gz, 'ms'):>10}{_fmt(br):>14}{_fmt(t_br, 'ms'):>10}"
+        )
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+对比 /api/search 查询体优化前后的 ES 响应大小与 took。
+
+- before：返回完整 _source，zh/text/en/title 四个字段都做整段高亮（优化前的查询体）
+- after：search.search.build_body（_source 只取 clear_bib 用到的字段，只高亮匹配字段，unified/fvh）
+
+用法：在 back_mic/backend 目录下执行
+    python bench_search_payload.py                 # 使用内置查询
+    python bench_search_payload.py -n 10 -a b-a-b-1-50 神的经纶 "God's economy"
+"""
+import argparse
+import json
+import statistics
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from es_config import es
+from search.get_search_index import get_info
+from search.search import build_body, get_page
+
+DEFAULT_QUERIES = ["神的经纶", "生命", "召会", "基督的身体", "God's economy", "the church"]
+
+
+def legacy_body(index, matchs, field, page, pageSize):
+    return {
+        "size": pageSize,
+        "from": get_page(page, pageSize),
+        "query": {"bool": {"should": matchs, "minimum_should_match": 1}},
+        "highlight": {
+            "number_of_fragments": 0,
+            "fields": {"zh": {}, "text": {}, "en": {}, "title": {}},
+        },
+    }
+
+
+def run(index, body, repeat):
+    """返回 (took 中位数 ms, 响应字节数)；先执行一次预热。"""
+    es.search(index=index, body=body, ignore_unavailable=True, request_cache=False)
+    tooks = []
+    size = 0
+    for _ in range(repeat):
+        res = es.search(index=index, body=body, ignore_unavailable=True, request_cache=False)
+        res = dict(res)
+        tooks.append(res.get("took", 0))
+        size = len(json.dumps(res, ensure_ascii=False).encode())
+    return statistics.median(tooks), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("queries", nargs="*", default=DEFAULT_QUERIES)
+    parser.add_argument("-a", "--args", default="a-a-a-1-50", help="搜索参数 cat1-cat2-cat3-page-pageSize")
+    parser.add_argument("-n", "--repeat", type=int, default=5)
+    opts = parser.parse_args()
+
+    print(f"\n{'查询':<20} {'before took':>12} {'after took':>11} {'before 字节':>12} {'after 字节':>11} {'体积比':>7}")
+    print("-" * 80)
+    totals = [0, 0, 0, 0]
+    for q in opts.queries:
+        index, matchs, field, page, pageSize = get_info(opts.args, q)
+        if not index:
+            print(f"{q:<20} 参数 {opts.args} 无对应索引，跳过")
+            continue
+        b_took, b_size = run(index, legacy_body(index, matchs, field, page, pageSize), opts.repeat)
+        a_took, a_size = run(index, build_body(index, matchs, field, page, pageSize), opts.repeat)
+        for i, v in enumerate((b_took, a_took, b_size, a_size)):
+            totals[i] += v
+        ratio = a_size / b_size if b_size else 0
+        print(f"{q:<20} {b_took:>10}ms {a_took:>9}ms {b_size:>12} {a_size:>11} {ratio:>7.0%}")
+    print("-" * 80)
+    if totals[2]:
+        print(
+            f"{'合计':<20} {totals[0]:>10}ms {totals[1]:>9}ms {totals[2]:>12} {totals[3]:>11} "
+            f"{totals[3] / totals[2]:>7.0%}\n"
+        )
+
+
+if __name__ == "__main__":
+    main()
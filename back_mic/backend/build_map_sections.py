@@ -0,0 +1,74 @@
+"""
+为已导入的 map_note / map_7feasts / map_dictionary / map_pano 回填 ot1~ot4 小节预计算字段
+
+新导入的数据（import_all_data.py、import_map_data.py、replace_map_note.py、clear_and_reimport_map_7feasts_dictionary.py、
+/api/process、upopt）会在写入时自动预计算；本脚本用于一次性处理旧数据。未回填的文档 AI 检索仍可用，
+只是会额外补取一次 msg 数组。
+
+用法：
+  cd back_mic/backend
+  python build_map_sections.py                  # 回填全部 4 个索引
+  python build_map_sections.py --index map_note # 只回填指定索引（可多次指定）
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from elasticsearch import helpers
+from es_config import es
+from database.map_sections import MAP_MAPPING, MAP_SECTION_INDEXES, annotate_map_doc
+from search.result_cache import bump_index_versions
+
+
+def backfill_index(index_name: str) -> int:
+    """扫描索引全部文档，预计算后整篇覆盖写回，返回写入文档数。"""
+    # 先补上预计算字段的 mapping（不参与检索），避免动态 mapping 把 sec_text 建成可检索字段
+    es.indices.put_mapping(index=index_name, body=MAP_MAPPING["mappings"])
+
+    def _actions():
+        for h in helpers.scan(es, index=index_name, query={"query": {"match_all": {}}}, size=500):
+            yield {
+                "_index": index_name,
+                "_id": h["_id"],
+                "_source": annotate_map_doc(h.get("_source") or {}),
+            }
+
+    written, _ = helpers.bulk(es, _actions(), chunk_size=200, raise_on_error=False)
+    bump_index_versions([index_name])
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回填 map 类文档的小节预计算字段")
+    parser.add_argument(
+        "--index",
+        action="append",
+        choices=MAP_SECTION_INDEXES,
+        help="只回填指定索引（默认全部）",
+    )
+    args = parser.parse_args()
+    targets = args.index or list(MAP_SECTION_INDEXES)
+
+    print("=" * 60)
+    print("  回填 map 类小节预计算字段")
+    print("=" * 60)
+
+    for index_name in targets:
+        print(f"\n[{index_name}]")
+        if not es.indices.exists(index=index_name):
+            print(f"  ⚠ 索引不存在，跳过: {index_name}")
+            continue
+        start = time.time()
+        n = backfill_index(index_name)
+        print(f"  ✓ 共回填 {n} 条文档，耗时 {time.time() - start:.1f}s")
+
+    print("\n" + "=" * 60)
+    print("  完成")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+物化 cwwl / cwwn / life / others 的小节文档与整篇文档到伴生索引（<index>_sections、<index>_messages）
+
+导入或重新导入上述索引后运行一次，AI 上下文构建与信息检索导出即可用一次 mget 取得小节 / 整篇。
+通过 /api/process、upopt 导入的数据会自动增量更新，无需手动运行。
+
+用法：
+  cd back_mic/backend
+  python build_section_docs.py               # 物化全部 4 个索引
+  python build_section_docs.py --index cwwl  # 只物化指定索引（可多次指定）
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from es_config import es
+from database.section_docs import (
+    SECTION_SOURCE_INDEXES,
+    materialize_index,
+    message_index_name,
+    section_index_name,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="物化小节 / 整篇文档到伴生索引")
+    parser.add_argument(
+        "--index",
+        action="append",
+        choices=SECTION_SOURCE_INDEXES,
+        help="只物化指定源索引（默认全部）",
+    )
+    args = parser.parse_args()
+    targets = args.index or list(SECTION_SOURCE_INDEXES)
+
+    print("=" * 60)
+    print("  物化小节 / 整篇文档")
+    print("=" * 60)
+
+    for index_name in targets:
+        print(f"\n[{index_name}]")
+        if not es.indices.exists(index=index_name):
+            print(f"  ⚠ 源索引不存在，跳过: {index_name}")
+            continue
+        start = time.time()
+        messages, written = materialize_index(es, index_name)
+        print(f"  → {section_index_name(index_name)} / {message_index_name(index_name)}")
+        print(f"  ✓ 共 {messages} 篇，写入 {written} 条文档，耗时 {time.time() - start:.1f}s")
+
+    print("\n" + "=" * 60)
+    print("  完成")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
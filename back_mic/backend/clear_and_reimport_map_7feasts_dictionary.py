@@ -13,6 +13,8 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent))
 from es_config import es
+from database.map_sections import annotate_map_doc
+from search.result_cache import bump_index_versions
 
 SOURCE_DIRS = [
     (r"C:\Users\Administrator\Desktop\note、7feasts、dictionary、pano\map_7feasts", "map_7feasts"),
@@ -53,6 +55,8 @@ def import_json_dir(dir_path: str, index_name: str) -> int:
             if not idx:
                 continue
             body = {k: v for k, v in item.items() if k != "index"}
+            # 预计算 ot1~ot4 小节范围，供 AI 检索按 inner_hits 直接取小节
+            annotate_map_doc(body)
             try:
                 es.index(index=index_name, id=idx, body=body)
                 total += 1
@@ -73,6 +77,7 @@ def main():
         clear_index(index_name)
         print("  [2/2] 重新导入...")
         n = import_json_dir(dir_path, index_name)
+        bump_index_versions([index_name])
         print(f"  ✓ 共导入 {n} 条文档")
 
     print("\n" + "=" * 60)
@@ -1,4 +1,5 @@
 from es_config import es
+from search.result_cache import bump_index_versions
 
 
 def delete_and_recreate_index(index_name):
@@ -41,5 +42,6 @@ def datalist(index, opt):
         return {"datalist": get_all_indices(), "msg": "datalist"}
     elif opt == "del":
         tip = delete_and_recreate_index(index)
+        bump_index_versions([index])
         return {"tip": tip, "msg": ""}
     return
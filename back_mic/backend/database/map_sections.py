@@ -0,0 +1,118 @@
+"""
+map 类文档（map_note / map_7feasts / map_dictionary / map_pano）的纲目小节预计算
+
+查询时 AI 上下文构建需要根据 inner_hits 命中的 msg 项，沿 msg 数组向后扫描出该 ot1~ot4 小节的范围，
+再合并范围、拼接正文，因此必须取回整个 msg 数组。本模块在导入阶段把这些结果写进文档：
+
+- msg[i].sec_end：ot1~ot4 项所在小节的结束下标（不含），规则与 AISearchService._get_map_note_section_range 一致
+- msg[i].sec_text：该小节内 ot1~ot4 正文按行拼接
+- ot_text：全部 ot1~ot4 正文按行拼接（外层 text 为空时作为全篇内容）
+- msg_ref：msg 中的 bookname / title，供 map_dictionary 拼引用
+
+纲目小节天然是层级嵌套的（不相交或包含），因此查询端只需取 inner_hits 命中项的 sec_end / sec_text，
+保留最外层小节即可得到与原逐项扫描相同的结果，外层 _source 不再需要 msg。
+"""
+from typing import Dict, List
+
+MAP_SECTION_INDEXES = ("map_note", "map_7feasts", "map_dictionary", "map_pano")
+
+# 各层级遇到哪些 type 即结束小节（非 ot 项一律结束）
+_STOP_AT = {
+    "ot1": frozenset({"ot1"}),
+    "ot2": frozenset({"ot1", "ot2"}),
+    "ot3": frozenset({"ot1", "ot2", "ot3"}),
+    "ot4": frozenset({"ot1", "ot2", "ot3", "ot4"}),
+}
+
+MAP_MAPPING = {
+    "mappings": {
+        "properties": {
+            "id": {"type": "keyword"},
+            "text": {"type": "text"},
+            "msg": {
+                "type": "nested",
+                "properties": {
+                    "sec_end": {"type": "integer", "index": False},
+                    "sec_text": {"type": "text", "index": False},
+                },
+            },
+            "sn": {"type": "keyword"},
+            "source": {"type": "keyword"},
+            "ot_text": {"type": "text", "index": False},
+            "msg_ref": {"type": "object", "enabled": False},
+        }
+    }
+}
+
+
+def section_end(msg: List[Dict], start_idx: int) -> int:
+    """返回 msg[start_idx] 所在小节的结束下标（不含）；非 ot 项只占自身一项。"""
+    item_type = msg[start_idx].get("type", "")
+    stop_at = _STOP_AT.get(item_type)
+    if stop_at is None:
+        return start_idx + 1
+    end_idx = start_idx + 1
+    while end_idx < len(msg):
+        t = msg[end_idx].get("type", "")
+        if t in stop_at or t not in _STOP_AT:
+            break
+        end_idx += 1
+    return end_idx
+
+
+def _ot_texts(msg: List[Dict], start: int, end: int) -> List[str]:
+    return [m["text"] for m in msg[start:end] if m.get("type") in _STOP_AT and m.get("text")]
+
+
+def annotate_map_doc(body: Dict) -> Dict:
+    """就地为 map 类文档写入 sec_end / sec_text / ot_text / msg_ref，返回 body。"""
+    msg = body.get("msg")
+    if not isinstance(msg, list) or not msg:
+        return body
+    for i, m in enumerate(msg):
+        if not isinstance(m, dict) or m.get("type") not in _STOP_AT:
+            continue
+        end = section_end(msg, i)
+        m["sec_end"] = end
+        m["sec_text"] = "\n".join(_ot_texts(msg, i, end))
+    body["ot_text"] = "\n".join(_ot_texts(msg, 0, len(msg)))
+    body["msg_ref"] = {
+        "booknames": [str(m.get("text") or "").strip() for m in msg if isinstance(m, dict) and m.get("type") == "bookname"],
+        "titles": [str(m.get("text") or "").strip() for m in msg if isinstance(m, dict) and m.get("type") == "title"],
+    }
+    return body
+
+
+def maybe_annotate(index_name: str, body: Dict) -> Dict:
+    """导入入口统一调用：仅对 map 类索引做预计算。"""
+    if index_name in MAP_SECTION_INDEXES:
+        annotate_map_doc(body)
+    return body
+
+
+def sections_from_inner_hits(inner_hits_list: List[Dict]):
+    """
+    由 inner_hits（_source 只含 sec_end / sec_text）还原命中小节正文。
+    返回拼接后的正文；无有效命中项或任一命中项缺少预计算字段（旧数据）时返回 None，由调用方回退逐项扫描。
+    """
+    spans = []
+    for ih in inner_hits_list:
+        offset = (ih.get("_nested") or {}).get("offset")
+        src = ih.get("_source") or {}
+        if not isinstance(offset, int):
+            continue
+        if "sec_end" not in src:
+            return None
+        spans.append((offset, src["sec_end"], src.get("sec_text") or ""))
+    if not spans:
+        return None
+    spans.sort(key=lambda x: (x[0], -x[1]))
+    parts = []
+    covered_end = -1
+    for start, end, text in spans:
+        if start < covered_end:
+            continue  # 被外层小节包含
+        covered_end = end
+        if text:
+            parts.append(text)
+    return "\n".join(parts)
@@ -0,0 +1,264 @@
+"""
+预组装小节 / 整篇文档（导入阶段物化）
+
+cwwl、cwwn、life、others 的段落按 id（如 cwwl_1_1-4）逐段入库，查询时需要按前缀拉取整篇、
+按段号排序后再从 heading 向后扫描才能得到一个小节。本模块在导入阶段完成这一步，写入两个伴生索引：
+
+- <index>_sections：以 heading 段落 id 为文档 id，保存该小节的有序正文、段落 id 列表、段号范围与引用信息
+- <index>_messages：以 message 前缀（如 cwwl_1_1-）为文档 id，保存整篇正文与同样的元数据
+
+AI 上下文构建与信息检索导出只需一次 mget 即可取得小节 / 整篇；伴生索引缺失时调用方回退到原有的逐段拼装。
+"""
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("database.section_docs")
+
+# 需要物化的源索引（与 AI 检索 / 信息检索中按 message 拼装的索引一致）
+SECTION_SOURCE_INDEXES = ("cwwl", "cwwn", "life", "others")
+SECTION_INDEX_SUFFIX = "_sections"
+MESSAGE_INDEX_SUFFIX = "_messages"
+
+# 与 AISearchService._HEADING_TYPES 一致：heading 类段落取整节
+HEADING_TYPES = frozenset({"heading", "heading_1", "heading_2", "heading_3", "heading_4"})
+# 引用信息字段（取自整篇第一段，与 _format_reference(docs[0]) 一致）
+REFERENCE_FIELDS = ("title", "book", "chapter", "verse")
+SOURCE_FIELDS = ["id", "type", "text"] + list(REFERENCE_FIELDS)
+
+SECTION_MAPPING = {
+    "mappings": {
+        "properties": {
+            "id": {"type": "keyword"},
+            "message_id": {"type": "keyword"},
+            "type": {"type": "keyword"},
+            "text": {"type": "text", "index": False},
+            "ids": {"type": "keyword"},
+            "start_seg": {"type": "integer"},
+            "end_seg": {"type": "integer"},
+            "first_id": {"type": "keyword"},
+            "title": {"type": "keyword"},
+            "book": {"type": "keyword"},
+            "chapter": {"type": "keyword"},
+            "verse": {"type": "keyword"},
+        }
+    }
+}
+
+
+def section_index_name(index_name: str) -> str:
+    return index_name + SECTION_INDEX_SUFFIX
+
+
+def message_index_name(index_name: str) -> str:
+    return index_name + MESSAGE_INDEX_SUFFIX
+
+
+def parse_doc_id(doc_id: str) -> Tuple[str, int]:
+    """解析文档 id，提取 message 前缀和段号。如 others_1_1-4 -> (others_1_1-, 4)"""
+    if not doc_id or "-" not in doc_id:
+        return ("", 0)
+    last_dash = doc_id.rfind("-")
+    prefix = doc_id[: last_dash + 1]
+    try:
+        seg = int(doc_id[last_dash + 1 :])
+    except ValueError:
+        seg = 0
+    return (prefix, seg)
+
+
+def group_messages(docs: Iterable[Dict]) -> Dict[str, List[Dict]]:
+    """按 message 前缀分组并按段号排序；id 无 "-" 的单条文档不参与分组。"""
+    groups: Dict[str, List[Tuple[int, Dict]]] = {}
+    for src in docs:
+        prefix, seg = parse_doc_id(str(src.get("id") or ""))
+        if not prefix:
+            continue
+        groups.setdefault(prefix, []).append((seg, src))
+    out = {}
+    for prefix, items in groups.items():
+        items.sort(key=lambda x: x[0])
+        out[prefix] = [src for _, src in items]
+    return out
+
+
+def _reference_meta(first_doc: Dict) -> Dict:
+    meta = {k: first_doc.get(k) for k in REFERENCE_FIELDS if first_doc.get(k) not in (None, "")}
+    meta["first_id"] = first_doc.get("id", "")
+    return meta
+
+
+def reference_source(doc: Dict) -> Dict:
+    """由伴生文档还原出整篇第一段的引用字段，供 _format_reference 使用。"""
+    src = {k: doc.get(k) for k in REFERENCE_FIELDS if doc.get(k) not in (None, "")}
+    src["id"] = doc.get("first_id") or doc.get("id", "")
+    return src
+
+
+def build_section_docs(message_id: str, docs: List[Dict]) -> List[Dict]:
+    """
+    为一篇 message 的每个 heading 生成小节文档。
+    规则与 AISearchService._get_section_from_heading 相同：从 heading 起，取后续 type=text 的段落，
+    遇到第一个非 text 段落即止；空 text 段落跳过。
+    """
+    if not docs:
+        return []
+    meta = _reference_meta(docs[0])
+    sections = []
+    for i, doc in enumerate(docs):
+        if doc.get("type", "") not in HEADING_TYPES or not doc.get("text"):
+            continue
+        ids = [doc.get("id", "")]
+        parts = [doc["text"]]
+        for nxt in docs[i + 1 :]:
+            if not nxt.get("text"):
+                continue
+            if nxt.get("type", "") != "text":
+                break
+            ids.append(nxt.get("id", ""))
+            parts.append(nxt["text"])
+        sections.append({
+            "id": doc.get("id", ""),
+            "message_id": message_id,
+            "type": doc.get("type", ""),
+            "text": "\n".join(parts),
+            "ids": ids,
+            "start_seg": parse_doc_id(ids[0])[1],
+            "end_seg": parse_doc_id(ids[-1])[1],
+            **meta,
+        })
+    return sections
+
+
+def build_message_doc(message_id: str, docs: List[Dict]) -> Optional[Dict]:
+    """生成整篇文档：按段号顺序拼接所有非空段落。"""
+    kept = [d for d in docs if str(d.get("text") or "").strip()]
+    if not kept:
+        return None
+    ids = [d.get("id", "") for d in kept]
+    return {
+        "id": message_id,
+        "message_id": message_id,
+        "type": "message",
+        "text": "\n".join(str(d.get("text")).strip() for d in kept),
+        "ids": ids,
+        "start_seg": parse_doc_id(ids[0])[1],
+        "end_seg": parse_doc_id(ids[-1])[1],
+        **_reference_meta(docs[0]),
+    }
+
+
+def ensure_companion_indexes(es, index_name: str) -> None:
+    """若伴生索引不存在则创建。"""
+    for name in (section_index_name(index_name), message_index_name(index_name)):
+        if not es.indices.exists(index=name):
+            es.indices.create(index=name, body=SECTION_MAPPING)
+
+
+def _bulk_actions(index_name: str, groups: Dict[str, List[Dict]]):
+    sec_index = section_index_name(index_name)
+    msg_index = message_index_name(index_name)
+    for message_id, docs in groups.items():
+        for sec in build_section_docs(message_id, docs):
+            yield {"_index": sec_index, "_id": sec["id"], "_source": sec}
+        msg = build_message_doc(message_id, docs)
+        if msg:
+            yield {"_index": msg_index, "_id": message_id, "_source": msg}
+
+
+def materialize_index(es, index_name: str) -> Tuple[int, int]:
+    """
+    全量物化：扫描源索引全部段落，重建 <index>_sections / <index>_messages。
+    返回 (message 数, 写入文档数)。
+    """
+    from elasticsearch import helpers
+
+    for name in (section_index_name(index_name), message_index_name(index_name)):
+        if es.indices.exists(index=name):
+            es.indices.delete(index=name)
+    ensure_companion_indexes(es, index_name)
+
+    docs = (
+        h.get("_source", {})
+        for h in helpers.scan(
+            es,
+            index=index_name,
+            query={"query": {"match_all": {}}, "_source": SOURCE_FIELDS},
+            size=2000,
+        )
+    )
+    groups = group_messages(docs)
+    written, _ = helpers.bulk(es, _bulk_actions(index_name, groups), chunk_size=500, raise_on_error=False)
+    return (len(groups), written)
+
+
+def materialize_messages(es, index_name: str, message_ids: Iterable[str]) -> int:
+    """
+    增量物化：只重建指定 message（用于 /api/process、upopt 导入后），返回写入文档数。
+    旧的小节文档先按 message_id 删除，避免 heading 变动后残留。
+    """
+    from elasticsearch import helpers
+
+    message_ids = sorted({m for m in message_ids if m})
+    if index_name not in SECTION_SOURCE_INDEXES or not message_ids:
+        return 0
+    ensure_companion_indexes(es, index_name)
+    groups = {}
+    for message_id in message_ids:
+        resp = es.search(
+            index=index_name,
+            body={"query": {"prefix": {"id": message_id}}, "size": 500, "_source": SOURCE_FIELDS},
+            request_timeout=30,
+        )
+        hits = [h.get("_source", {}) for h in resp.get("hits", {}).get("hits", [])]
+        if hits:
+            # 与 _fetch_message_docs 一致：前缀命中的全部段落按段号排序
+            hits.sort(key=lambda src: parse_doc_id(str(src.get("id") or ""))[1])
+            groups[message_id] = hits
+    es.delete_by_query(
+        index=section_index_name(index_name),
+        body={"query": {"terms": {"message_id": message_ids}}},
+        conflicts="proceed",
+        refresh=True,
+    )
+    written, _ = helpers.bulk(es, _bulk_actions(index_name, groups), chunk_size=500, raise_on_error=False)
+    return written
+
+
+def mget_sources(es, index_name: str, ids: List[str], chunk_size: int = 500) -> Dict[str, Dict]:
+    """
+    一次（或按 chunk_size 分批）mget 取伴生索引文档，返回 {id: _source}。
+    索引不存在或请求失败时返回已取得的部分（可能为空），由调用方回退。
+    """
+    out: Dict[str, Dict] = {}
+    ids = [i for i in dict.fromkeys(ids) if i]
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start : start + chunk_size]
+        try:
+            resp = es.mget(index=index_name, body={"ids": chunk}, request_timeout=10)
+        except Exception:
+            return out
+        for d in resp.get("docs", []):
+            if d.get("found") and d.get("_source"):
+                out[d["_id"]] = d["_source"]
+    return out
+
+
+def mark_touched(touched: Dict[str, set], index_name: str, doc_id: str) -> None:
+    """导入时记录被写入的 message，供导入结束后 sync_touched_messages 增量物化。"""
+    if index_name not in SECTION_SOURCE_INDEXES:
+        return
+    prefix, _ = parse_doc_id(str(doc_id or ""))
+    if prefix:
+        touched.setdefault(index_name, set()).add(prefix)
+
+
+def sync_touched_messages(es, touched: Dict[str, set]) -> int:
+    """对导入中被写入的 message 做增量物化；失败不影响导入本身，返回写入文档数。"""
+    written = 0
+    for index_name, message_ids in touched.items():
+        try:
+            es.indices.refresh(index=index_name)
+            written += materialize_messages(es, index_name, message_ids)
+        except Exception as e:
+            logger.warning(f"增量物化 {index_name} 失败: {e}")
+    return written
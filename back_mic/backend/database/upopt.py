@@ -1,6 +1,10 @@
 import json
 from pathlib import Path as pt
 from es_config import es
+from database.map_sections import maybe_annotate
+from database.section_docs import mark_touched, sync_touched_messages
+from search.result_cache import bump_index_versions
+from utils.metrics import record_import
 
 basedir = pt(__file__).parent
 updir = basedir / "upload"
@@ -34,10 +38,17 @@ def ins_data(filename):
     files = get_dict_filelist()
     if filename in files:
         jd = json.loads(files[filename].read_text("utf"))
+        touched = {}
+        written = {}
         for item in jd:
             index = item.pop("index")
             idx = item["id"]
-            es.index(index=index, id=idx, body=item)
+            es.index(index=index, id=idx, body=maybe_annotate(index, item))
+            mark_touched(touched, index, idx)
+            written[index] = written.get(index, 0) + 1
+        sync_touched_messages(es, touched)
+        bump_index_versions(written)
+        record_import("upopt", written)
         return True
     return False
 
@@ -3,6 +3,7 @@
 用法：在 back_mic/backend 目录下执行  python delete_pano_indices.py
 """
 from es_config import es
+from search.result_cache import bump_index_versions
 
 PANO_INDICES = [
     "pano",
@@ -27,4 +28,5 @@ if __name__ == "__main__":
                 print(f"  不存在，跳过: {name}")
         except Exception as e:
             print(f"  失败 {name}: {e}")
+    bump_index_versions(PANO_INDICES)
     print("完成。")
@@ -1,14 +1,36 @@
 """
 Elasticsearch 统一配置
 修改 ES 连接地址只需改此文件中的 ES_HOSTS
+
+ES_BACKEND=memory 时不连接集群，请求由进程内的 utils.es_memory.MemoryBackend 应答（离线测试与基准用），
+ES_MEMORY_DATA 指定启动时载入的备份目录（import_all_data.py 的格式：<目录>/<索引名>/*.json）。
 """
+import os
+
 from elasticsearch import Elasticsearch
 
+from utils.es_stats import instrument_query_stats
+from utils.metrics import instrument_elasticsearch
+
 # ES 连接地址，后续修改只需改此处
 ES_HOSTS = ["http://localhost:9200"]
 
 # 请求超时（秒），建索引、删索引等操作可能较慢，默认 10 秒易超时
 ES_REQUEST_TIMEOUT = 60
 
-# 全局 ES 客户端实例
-es = Elasticsearch(hosts=ES_HOSTS, request_timeout=ES_REQUEST_TIMEOUT)
+# http：访问 ES_HOSTS；memory：进程内替身
+ES_BACKEND = os.getenv("ES_BACKEND", "http")
+ES_MEMORY_DATA = os.getenv("ES_MEMORY_DATA", "")
+
+_client = Elasticsearch(hosts=ES_HOSTS, request_timeout=ES_REQUEST_TIMEOUT)
+memory_backend = None
+if ES_BACKEND == "memory":
+    from utils.es_memory import MemoryBackend, attach
+
+    memory_backend = MemoryBackend()
+    if ES_MEMORY_DATA:
+        memory_backend.load_dump_dir(ES_MEMORY_DATA)
+    attach(_client, memory_backend)
+
+# 全局 ES 客户端实例（每次请求的次数与耗时记入 /metrics，查询指纹与慢查询样例见 /api/es_stats）
+es = instrument_query_stats(instrument_elasticsearch(_client))
@@ -1,4 +1,7 @@
 from es_config import es
+from database.map_sections import MAP_MAPPING
+from database.section_docs import SECTION_MAPPING
+from search.result_cache import bump_all_versions
 
 
 def get_mappings(tp):
@@ -20,12 +23,14 @@ def get_mappings(tp):
             "mappings": {
                 "properties": {
                     "id": {"type": "keyword"},
-                    "text": {"type": "text"},
+                    # term_vector 供 /api/search 使用 fvh 高亮（search/search.py 按 mapping 自动选择）
+                    "text": {"type": "text", "term_vector": "with_positions_offsets"},
                     "zh": {
                         "type": "text",
                         "analyzer": "ik_max_word",
+                        "term_vector": "with_positions_offsets",
                     },
-                    "en": {"type": "text"},
+                    "en": {"type": "text", "term_vector": "with_positions_offsets"},
                     "title": {"type": "keyword"},
                     "order": {"type": "keyword"},
                     "type": {"type": "keyword"},
@@ -34,17 +39,10 @@ def get_mappings(tp):
                 }
             }
         },
-        "map": {
-            "mappings": {
-                "properties": {
-                    "id": {"type": "keyword"},
-                    "text": {"type": "text"},
-                    "msg": {"type": "nested"},
-                    "sn": {"type": "keyword"},
-                    "source": {"type": "keyword"},
-                }
-            }
-        },
+        # map 类 mapping 含导入时预计算的小节字段（database/map_sections.py）
+        "map": MAP_MAPPING,
+        # 预组装小节 / 整篇（database/section_docs.py，由 build_section_docs.py 写入）
+        "section": SECTION_MAPPING,
     }
     return mappings[tp]
 
@@ -58,10 +56,14 @@ all_index = [
     ["cwwl_booknames", "index"],
     ["cwwl_headings", "index"],
     ["cwwl_titles", "index"],
+    ["cwwl_sections", "section"],
+    ["cwwl_messages", "section"],
     ["cwwn", "index"],
     ["cwwn_booknames", "index"],
     ["cwwn_headings", "index"],
     ["cwwn_titles", "index"],
+    ["cwwn_sections", "section"],
+    ["cwwn_messages", "section"],
     ["feasts", "index"],
     ["feasts_booknames", "index"],
     ["feasts_ot1", "index"],
@@ -71,6 +73,8 @@ all_index = [
     ["life", "index"],
     ["life_headings", "index"],
     ["life_titles", "index"],
+    ["life_sections", "section"],
+    ["life_messages", "section"],
     ["map_cont_bookname", "map"],
     ["map_cont_title", "map"],
     ["map_feasts_bookname", "map"],
@@ -87,6 +91,8 @@ all_index = [
     ["others_booknames", "index"],
     ["others_headings", "index"],
     ["others_titles", "index"],
+    ["others_sections", "section"],
+    ["others_messages", "section"],
     ["pan_reading", "read"],
 ]
 
@@ -105,3 +111,6 @@ for item in all_index:
 
     es.indices.create(index=index, body=mapping)
     print(f"create index {index}")
+
+# 索引已全部重建，使 /api/search、/api/cws 的结果缓存失效
+bump_all_versions()
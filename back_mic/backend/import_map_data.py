@@ -16,24 +16,14 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent))
 
 from es_config import es
+from database.map_sections import MAP_MAPPING, annotate_map_doc
+from search.result_cache import bump_index_versions
 
 # 数据源目录（按需修改）
 SOURCE_DIRS = [
     (r"C:\Users\Administrator\Desktop\note、7feasts、dictionary、pano\map_pano", "map_pano"),
 ]
 
-MAP_MAPPING = {
-    "mappings": {
-        "properties": {
-            "id": {"type": "keyword"},
-            "text": {"type": "text"},
-            "msg": {"type": "nested"},
-            "sn": {"type": "keyword"},
-            "source": {"type": "keyword"},
-        }
-    }
-}
-
 
 def clear_index(index_name: str) -> None:
     """删除索引（清空该索引内所有内容）"""
@@ -81,6 +71,8 @@ def import_json_dir(dir_path: str, index_name: str) -> int:
                 continue
             # 移除 index 字段，避免写入 ES
             body = {k: v for k, v in item.items() if k != "index"}
+            # 预计算 ot1~ot4 小节范围，供 AI 检索按 inner_hits 直接取小节
+            annotate_map_doc(body)
             try:
                 es.index(index=index_name, id=idx, body=body)
                 total += 1
@@ -113,6 +105,7 @@ def main():
             time.sleep(3)
         ensure_index(index_name)
         n = import_json_dir(dir_path, index_name)
+        bump_index_versions([index_name])
         print(f"  ✓ 共导入 {n} 条文档")
 
     print("\n" + "=" * 60)
@@ -0,0 +1,19 @@
+"""
+可复现的负载测试
+
+在进程内启动 FastAPI app（也可指向已部署的地址），把外部依赖替换为本地替身后按权重混合请求
+/api/search、/api/cws、/api/getvers、一步 AI 搜索、两步 AI 搜索（search → generate）与纲目翻译，
+统计吞吐、各接口延迟分位数与错误率，可与上一次的结果对比，延迟回退超出阈值时以非 0 退出：
+
+- Elasticsearch：--es real 使用 es_config.ES_HOSTS 指向的集群（可先用 --seed-es 导入 upload 格式的 JSON）；
+  --es record 同样访问真实集群并把每个响应录制到文件；--es replay（默认）不访问网络，按录制文件回放，
+  未录到的请求返回对应操作的空结果（见 stubs.EsReplay），指定 --es-data 时改由内存索引执行；
+  --es memory 不访问网络，由 utils.es_memory 的内存实现按 --es-data 载入的备份数据执行查询
+- Claude / Gemini：stubs.FakeClaude / FakeGemini，按配置的延迟与 token 用量返回固定格式的结果
+
+用法：在 back_mic/backend 目录下执行
+    python -m loadtest.run --es record --recording loadtest/es_recording.json -c 4 -d 60
+    python -m loadtest.run -c 16 -d 120 --json logs/loadtest.json
+    python -m loadtest.run --es memory --es-data /path/to/backup --seed-es database/upload/xxx.json -c 8 -d 60
+    python -m loadtest.run -c 16 -d 120 --baseline logs/loadtest.json --tolerance 0.2
+"""
@@ -0,0 +1,336 @@
+"""
+负载测试入口：python -m loadtest.run --help（在 back_mic/backend 目录下执行，说明见 loadtest/__init__.py）
+
+- 未指定 --url 时在进程内加载 main.app，经 httpx.ASGITransport 直接调用（中间件、线程池、Redis 均为真实的），
+  ES / Claude / Gemini 换成 loadtest.stubs 中的替身；指定 --url 时只作为 HTTP 客户端压测已启动的服务
+- 以 --concurrency 个并发"用户"按 --mix 权重循环选择场景，持续 --duration 秒或共发出 --requests 个场景
+- 报告：总吞吐（请求 / 秒）、各接口请求数、错误率（5xx 与连接错误；4xx 单列）、空结果数、p50 / p95 / p99 / max 延迟；
+  --json 写出完整结果，--baseline 与之前的结果比较，某接口 p95 超过基线 (1 + tolerance) 倍或错误率上升时以 1 退出
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from loadtest.scenarios import SCENARIOS, parse_mix  # noqa: E402
+
+logger = logging.getLogger("loadtest")
+
+DEFAULT_RECORDING = str(BACKEND_DIR / "loadtest" / "es_recording.json")
+ERROR_RATE_SLACK = 0.01  # 与基线比较时允许的错误率上升（绝对值）
+
+
+def percentile(values: List[float], p: float) -> float:
+    """最近秩法分位数；values 需已排序。"""
+    if not values:
+        return 0.0
+    k = math.ceil(p / 100 * len(values)) - 1
+    return values[max(0, min(len(values) - 1, k))]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.counts: Dict[str, Dict[str, int]] = defaultdict(lambda: {"requests": 0, "errors": 0, "4xx": 0, "empty": 0})
+        self.errors: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name: str, ms: float, status: Optional[int], empty: bool = False, error: str = "") -> None:
+        c = self.counts[name]
+        c["requests"] += 1
+        self.latencies[name].append(ms)
+        if status is None or status >= 500:
+            c["errors"] += 1
+            self.errors[name][error or str(status)] += 1
+        elif status >= 400:
+            c["4xx"] += 1
+            self.errors[name][str(status)] += 1
+        elif empty:
+            c["empty"] += 1
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        endpoints = {}
+        for name in sorted(self.counts):
+            lat = sorted(self.latencies[name])
+            c = self.counts[name]
+            endpoints[name] = {
+                **c,
+                "error_rate": round(c["errors"] / c["requests"], 4) if c["requests"] else 0.0,
+                "rps": round(c["requests"] / elapsed, 2) if elapsed else 0.0,
+                "mean_ms": round(sum(lat) / len(lat), 1) if lat else 0.0,
+                "p50_ms": round(percentile(lat, 50), 1),
+                "p95_ms": round(percentile(lat, 95), 1),
+                "p99_ms": round(percentile(lat, 99), 1),
+                "max_ms": round(lat[-1], 1) if lat else 0.0,
+                "error_kinds": dict(self.errors[name]),
+            }
+        total = sum(c["requests"] for c in self.counts.values())
+        errors = sum(c["errors"] for c in self.counts.values())
+        return {
+            "elapsed_s": round(elapsed, 2),
+            "requests": total,
+            "rps": round(total / elapsed, 2) if elapsed else 0.0,
+            "error_rate": round(errors / total, 4) if total else 0.0,
+            "endpoints": endpoints,
+        }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\n耗时 {report['elapsed_s']}s  请求 {report['requests']}  吞吐 {report['rps']}/s  "
+          f"错误率 {report['error_rate'] * 100:.2f}%")
+    header = f"{'接口':<22}{'请求':>7}{'rps':>8}{'错误':>6}{'4xx':>6}{'空':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}"
+    print(header)
+    print("-" * len(header))
+    for name, e in report["endpoints"].items():
+        print(f"{name:<22}{e['requests']:>7}{e['rps']:>8}{e['errors']:>6}{e['4xx']:>6}{e['empty']:>6}"
+              f"{e['p50_ms']:>9}{e['p95_ms']:>9}{e['p99_ms']:>9}{e['max_ms']:>9}")
+    for name, e in report["endpoints"].items():
+        if e["error_kinds"]:
+            print(f"  {name} 错误: {e['error_kinds']}")
+    for key in ("es", "claude", "gemini"):
+        if report.get(key):
+            print(f"{key} 替身: {report[key]}")
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """返回回退说明列表；基线中没有的接口不比较。"""
+    regressions = []
+    for name, e in report["endpoints"].items():
+        base = baseline.get("endpoints", {}).get(name)
+        if not base:
+            continue
+        if base["p95_ms"] and e["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {base['p95_ms']}ms -> {e['p95_ms']}ms")
+        if e["error_rate"] > base["error_rate"] + ERROR_RATE_SLACK:
+            regressions.append(f"{name}: 错误率 {base['error_rate']:.2%} -> {e['error_rate']:.2%}")
+    return regressions
+
+
+def make_token(username: Optional[str]) -> str:
+    from utils.jwt_op import jwt_encode
+
+    users = json.loads((BACKEND_DIR / "user" / "users.json").read_text("utf-8"))
+    username = username or next(iter(users))
+    if username not in users:
+        raise SystemExit(f"users.json 中没有用户 {username}")
+    exp = datetime.now(timezone.utc) + timedelta(hours=12)
+    return jwt_encode({"username": username, "role": users[username]["role"], "exp": int(exp.timestamp())})
+
+
+def seed_es(files: List[str]) -> int:
+    """按 /api/process 的方式把 database/upload 格式的 JSON（[{"index": [...], "id"/"refid": ..., ...}]）写入 ES。"""
+    from database.map_sections import maybe_annotate
+    from database.section_docs import mark_touched, sync_touched_messages
+    from es_config import es
+    from search.result_cache import bump_index_versions
+
+    written: Dict[str, int] = {}
+    touched: Dict[str, Any] = {}
+    for path in files:
+        n = 0
+        for item in json.loads(Path(path).read_text(encoding="utf-8")):
+            indexes = item.pop("index")
+            idx = item["refid"] if "refid" in item else item["id"]
+            for index in indexes:
+                es.index(index=index, id=idx, body=maybe_annotate(index, item))
+                mark_touched(touched, index, idx)
+                written[index] = written.get(index, 0) + 1
+                n += 1
+        print(f"已导入 {path}: {n} 条")
+    sync_touched_messages(es, touched)
+    bump_index_versions(written)
+    for index in written:
+        es.indices.refresh(index=index)
+    return sum(written.values())
+
+
+def setup_inprocess(opts):
+    """加载 main.app 并装入替身，返回 (app, 替身字典)。"""
+    import es_config
+
+    recorder = replay = memory = None
+    if opts.es in ("memory", "record", "replay"):
+        from utils.es_memory import connections
+        try:
+            connections(es_config.es)
+        except RuntimeError as e:
+            raise SystemExit(f"--es {opts.es}: {e}")
+    if opts.es_data or opts.es == "memory":
+        from utils.es_memory import MemoryBackend
+        memory = MemoryBackend()
+        if opts.es_data:
+            counts = memory.load_dump_dir(opts.es_data)
+            print(f"已从 {opts.es_data} 载入 {len(counts)} 个索引、{sum(counts.values())} 条文档")
+    if opts.es == "memory":
+        from utils.es_memory import attach
+        attach(es_config.es, memory)
+    elif opts.es == "record":
+        from loadtest.stubs import EsRecorder
+        recorder = EsRecorder(opts.recording)
+        recorder.attach(es_config.es)
+    elif opts.es == "replay":
+        from loadtest.stubs import EsReplay
+        path = opts.recording if Path(opts.recording).exists() else None
+        if path is None and memory is None:
+            print(f"未找到录制文件 {opts.recording}，ES 请求全部返回空结果（可先以 --es record 录制）")
+        replay = EsReplay(path, replay_latency=opts.es_latency_scale, synthetic_latency_ms=opts.es_latency_ms,
+                          fallback=memory.handle if memory is not None else None, seed=opts.seed)
+        replay.attach(es_config.es)
+    if opts.seed_es and opts.es == "replay":
+        raise SystemExit("--seed-es 需与 --es memory、--es real 或 --es record 一起使用")
+
+    from main import app
+    from loadtest.stubs import FakeClaude, FakeGemini, install
+
+    claude = FakeClaude(opts.claude_latency_ms, output_tokens=opts.claude_output_tokens,
+                        error_rate=opts.claude_error_rate, seed=opts.seed)
+    gemini = FakeGemini(opts.gemini_latency_ms, error_rate=opts.gemini_error_rate, seed=opts.seed)
+    install(claude, gemini)
+    if opts.seed_es:
+        seed_es(opts.seed_es)
+    return app, {"recorder": recorder, "replay": replay, "claude": claude, "gemini": gemini}
+
+
+async def drive(client, token: str, mix: Dict[str, float], opts) -> Dict[str, Any]:
+    stats = Stats()
+    headers = {"Authorization": f"Bearer {token}"}
+    names = [n for n, w in mix.items() if w > 0]
+    weights = [mix[n] for n in names]
+    deadline = time.monotonic() + opts.duration if opts.duration else None
+    budget = {"left": opts.requests or 0}
+
+    async def call(name, method, url, empty=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            resp = await client.request(method, url, headers=headers, **kwargs)
+        except Exception as e:
+            stats.record(name, (time.perf_counter() - start) * 1000, None, error=type(e).__name__)
+            return None
+        ms = (time.perf_counter() - start) * 1000
+        is_empty = False
+        if empty is not None and resp.status_code == 200:
+            try:
+                is_empty = bool(empty(resp.json()))
+            except ValueError:
+                is_empty = False
+        stats.record(name, ms, resp.status_code, is_empty)
+        return resp
+
+    def more() -> bool:
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+        if opts.requests:
+            if budget["left"] <= 0:
+                return False
+            budget["left"] -= 1
+        return True
+
+    async def user(i: int):
+        rng = random.Random(None if opts.seed is None else opts.seed + i)
+        if opts.ramp_up:
+            await asyncio.sleep(opts.ramp_up * i / opts.concurrency)
+        while more():
+            await SCENARIOS[rng.choices(names, weights)[0]](call, rng)
+            if opts.think_ms:
+                await asyncio.sleep(rng.uniform(0.5, 1.5) * opts.think_ms / 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(i) for i in range(opts.concurrency)))
+    return stats.report(time.perf_counter() - start)
+
+
+async def run(opts) -> int:
+    import httpx
+
+    mix = parse_mix(opts.mix)
+    stubs: Dict[str, Any] = {}
+    if opts.url:
+        client = httpx.AsyncClient(base_url=opts.url.rstrip("/"), timeout=opts.timeout)
+    else:
+        app, stubs = setup_inprocess(opts)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest",
+                                   timeout=opts.timeout)
+    token = opts.token or make_token(opts.user)
+    async with client:
+        if opts.warmup:
+            await drive(client, token, mix, argparse.Namespace(**{**vars(opts), "duration": 0,
+                                                                  "requests": opts.warmup, "ramp_up": 0}))
+        report = await drive(client, token, mix, opts)
+
+    report["mix"] = mix
+    report["concurrency"] = opts.concurrency
+    if stubs.get("replay"):
+        report["es"] = stubs["replay"].summary()
+    if stubs.get("recorder"):
+        report["es"] = {"recorded": stubs["recorder"].save()}
+    for key in ("claude", "gemini"):
+        if stubs.get(key):
+            report[key] = {"calls": stubs[key].calls, "errors": stubs[key].errors}
+    print_report(report)
+
+    if opts.json:
+        Path(opts.json).parent.mkdir(parents=True, exist_ok=True)
+        Path(opts.json).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"结果已写入 {opts.json}")
+    if opts.baseline:
+        baseline = json.loads(Path(opts.baseline).read_text(encoding="utf-8"))
+        regressions = compare(report, baseline, opts.tolerance)
+        if regressions:
+            print("\n相对基线的回退：")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\n未发现相对基线的回退")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="并发用户数")
+    parser.add_argument("-d", "--duration", type=float, default=60, help="持续秒数（0 表示只按 --requests）")
+    parser.add_argument("-n", "--requests", type=int, default=0, help="场景总数上限（0 不限）")
+    parser.add_argument("--mix", default="", help="场景权重，如 search=40,cws=25,ai_two_step=10（默认见 scenarios）")
+    parser.add_argument("--warmup", type=int, default=0, help="正式计时前先执行的场景数（不计入结果）")
+    parser.add_argument("--ramp-up", type=float, default=0, help="在该秒数内逐个启动并发用户")
+    parser.add_argument("--think-ms", type=float, default=0, help="每个用户两次场景之间的平均停顿")
+    parser.add_argument("--seed", type=int, default=None, help="固定随机种子，使请求序列可复现")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--url", help="压测已启动的服务（如 http://localhost:8000），不加载 app 与替身")
+    parser.add_argument("--user", help="签发 token 的 users.json 用户（默认第一个）")
+    parser.add_argument("--token", help="直接使用该 JWT")
+    parser.add_argument("--es", choices=("replay", "record", "real", "memory"), default="replay")
+    parser.add_argument("--recording", default=DEFAULT_RECORDING, help="ES 录制文件")
+    parser.add_argument("--es-latency-scale", type=float, default=1.0, help="回放时按录制耗时乘以该系数等待")
+    parser.add_argument("--es-latency-ms", type=float, default=5.0, help="未录制请求的模拟耗时")
+    parser.add_argument("--es-data", help="import_all_data.py 格式的备份目录，载入内存 ES（--es memory；"
+                                           "--es replay 时用于应答未录到的请求）")
+    parser.add_argument("--seed-es", nargs="*", help="测试前把这些 database/upload 格式的 JSON 导入 ES")
+    parser.add_argument("--claude-latency-ms", type=float, default=8000)
+    parser.add_argument("--claude-output-tokens", type=int, default=1500)
+    parser.add_argument("--claude-error-rate", type=float, default=0.0)
+    parser.add_argument("--gemini-latency-ms", type=float, default=5000)
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--json", help="把结果写入该文件")
+    parser.add_argument("--baseline", help="与该结果文件比较")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="p95 允许超出基线的比例")
+    opts = parser.parse_args()
+    if not opts.duration and not opts.requests:
+        parser.error("--duration 与 --requests 至少指定一个")
+
+    logging.basicConfig(level=os.getenv("LOADTEST_LOG_LEVEL", "WARNING"))
+    sys.exit(asyncio.run(run(opts)))
+
+
+if __name__ == "__main__":
+    main()
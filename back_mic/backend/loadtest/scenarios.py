@@ -0,0 +1,115 @@
+"""
+负载测试的请求场景与默认混合比例
+
+每个场景是 async 函数 (call, rng)，通过 call(name, method, url, empty=..., **httpx_kwargs) 发出一个或多个请求；
+call 负责计时、记录状态码与"空结果"（empty(data) 为真时计入，用于发现回放未命中导致的空响应），返回 httpx.Response
+（连接失败时为 None）。关键词、问题与纲目取自常见的使用方式，按 rng 随机选取，固定 --seed 时请求序列可复现。
+"""
+from typing import Dict
+
+SEARCH_KEYWORDS = [
+    "神的经纶", "生命的灵", "召会是基督的身体", "新耶路撒冷", "三一神", "神圣的分赐", "基督的丰富",
+    "新人", "国度的操练", "圣别", "复活的大能", "神的旨意", "祷告", "喫主", "economy of God",
+    "the Body of Christ", "the mingled spirit", "God's eternal purpose",
+]
+# cat1-cat2-cat3-page-pageSize：大多是第一页，少量翻页与全文检索
+SEARCH_ARGS = ["a-a-a-1-10"] * 5 + ["a-a-b-1-10", "b-a-a-1-20", "c-b-a-1-10", "a-a-c-1-10", "a-a-a-2-10"]
+CWS_INDEXES = ["3", "4", "5", "6", "7", "8"]
+CWS_FWDS = [" ", " ", " ", "神", "基督"]
+
+VERSE_OUTLINES = [
+    "壹　神的经纶是要将祂自己分赐到人里面\n读经：弗一3～14，三8～11，提前一4",
+    "一　召会是基督的身体，是那在万有中充满万有者的丰满——弗一22～23。",
+    "二　我们需要在灵里敬拜神——约四24，罗八4，16。",
+    "读经：创一26，二7～9，启二一2，10～11，二二1～2",
+    "三　新人是由基督与召会所构成的——西三10～11，弗二15。\n四　我们要凭着生命之灵的律而行——罗八2，4。",
+]
+
+AI_QUESTIONS = [
+    "什么是神的经纶？", "召会作为基督的身体有什么意义？", "如何在灵里敬拜神？", "生命的灵与律的关系是什么？",
+    "新耶路撒冷表征什么？", "三一神如何分赐到信徒里面？", "怎样实际地过召会生活？", "基督的丰富指什么？",
+    "什么是神圣的分赐？", "神永远的定旨是什么？", "国度的操练对信徒有什么意义？", "如何喫主而活？",
+]
+
+TRANSLATE_OUTLINES = [
+    "壹　神的经纶\n一　神的经纶是要将祂自己分赐到人里面\n（一）作人的生命\n（二）作人的一切\n二　召会是基督的身体",
+    "壹　生命的灵\n一　生命之灵的律\n1　在我们灵里运行\n2　使我们与神调和\n二　凭着灵而行",
+]
+
+
+def _total_zero(data) -> bool:
+    return isinstance(data, dict) and not data.get("total")
+
+
+def _no_sources(data) -> bool:
+    return isinstance(data, dict) and not data.get("sources")
+
+
+async def search(call, rng):
+    await call("search", "POST", "/api/search", empty=_total_zero,
+               data={"input": rng.choice(SEARCH_KEYWORDS), "args": rng.choice(SEARCH_ARGS)})
+
+
+async def cws(call, rng):
+    await call("cws", "POST", "/api/cws", empty=_total_zero,
+               data={"input": rng.choice(SEARCH_KEYWORDS), "fwds": rng.choice(CWS_FWDS),
+                     "index": rng.choice(CWS_INDEXES)})
+
+
+async def getvers(call, rng):
+    await call("getvers", "POST", "/api/getvers", empty=lambda data: not data,
+               data={"input": rng.choice(VERSE_OUTLINES)})
+
+
+async def ai_search(call, rng):
+    await call("ai_search", "POST", "/api/ai_search", empty=_no_sources,
+               json={"question": rng.choice(AI_QUESTIONS), "max_results": 30,
+                     "depth": "deep" if rng.random() < 0.2 else "general"})
+
+
+async def ai_two_step(call, rng):
+    """方案A：先检索返回来源（可能同时开始投机生成），再凭 search_id 生成答案。"""
+    question = rng.choice(AI_QUESTIONS)
+    resp = await call("ai_search/search", "POST", "/api/ai_search/search", empty=_no_sources,
+                      json={"question": question, "depth": "deep" if rng.random() < 0.2 else "general"})
+    if resp is None or resp.status_code != 200:
+        return
+    search_id = resp.json().get("search_id")
+    if not search_id:
+        return
+    await call("ai_search/generate", "POST", "/api/ai_search/generate",
+               json={"question": question, "search_id": search_id})
+
+
+async def translate(call, rng):
+    await call("translate_outline", "POST", "/api/ai_search/translate_outline",
+               json={"chinese_outline": rng.choice(TRANSLATE_OUTLINES), "outline_topic": "神的经纶"})
+
+
+SCENARIOS = {
+    "search": search,
+    "cws": cws,
+    "getvers": getvers,
+    "ai_search": ai_search,
+    "ai_two_step": ai_two_step,
+    "translate": translate,
+}
+
+# 默认混合比例（权重），接近线上以检索为主、AI 请求为辅的分布
+DEFAULT_MIX = {"search": 40, "cws": 25, "getvers": 10, "ai_search": 8, "ai_two_step": 12, "translate": 5}
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """解析 "search=40,cws=25,ai_two_step=10"；未列出的场景不发送。"""
+    if not text:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"未知场景: {name}（可选 {', '.join(SCENARIOS)}）")
+        mix[name] = float(weight or 1)
+    if not any(w > 0 for w in mix.values()):
+        raise ValueError("混合比例中至少需要一个正权重")
+    return mix
@@ -0,0 +1,411 @@
+"""
+负载测试用的外部依赖替身
+
+- FakeClaude：messages.create 按配置的延迟（含抖动）等待后返回纲目格式的答案；usage 中的 input_tokens 按 prompt 字数估算，
+  同一 system prompt 首次调用记为 cache_creation_input_tokens、之后记为 cache_read_input_tokens，与真实的 prompt 缓存计费一致
+- FakeGemini：models.generate_content 逐行返回"译文"，caches.create 返回 cached content 名称
+- EsRecorder / EsReplay：替换 elasticsearch-py 7.x 连接层的 perform_request（序列化、异常与 /metrics、/api/es_stats 的
+  包装照常生效）。录制时把真实集群的每个响应按"精确请求"与 utils.es_stats 的查询指纹两级索引写入文件；
+  回放时先按精确请求、再按指纹（同结构不同参数的查询轮流复用录到的响应）查找，都没有时交给 fallback
+  （默认 synthetic_response：按操作返回空结果），并统计各级命中数；客户端版本由 requirements.txt 固定为 7.x
+- install()：把 Claude / Gemini 替身装入已导入的 ai_search.ai_service；ES 替身以 attach(es_config.es) 装入
+"""
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.es_memory import ES_HEADERS, ES_VERSION, connections, decode_body, raise_for_status
+from utils.es_stats import fingerprint
+
+logger = logging.getLogger("loadtest")
+
+RECORDING_VERSION = 1
+RECORD_MAX_PER_FINGERPRINT = 20  # 同一指纹最多录制的不同请求数
+RECORD_MAX_ENTRIES = 5000
+
+
+def _sleep_ms(ms: float, jitter: float, rng: random.Random) -> None:
+    if ms <= 0:
+        return
+    if jitter:
+        ms *= rng.uniform(1 - jitter, 1 + jitter)
+    time.sleep(ms / 1000)
+
+
+def _estimate_tokens(text: str) -> int:
+    # 与 ai_service 估算上下文时的口径相近：中文约 1.5 字 / token
+    return max(1, int(len(text) / 1.5))
+
+
+def _text_of(content: Any) -> str:
+    """把 Anthropic system / messages 的 content（字符串或 block 列表）拼成文本。"""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(_text_of(c.get("text", "") if isinstance(c, dict) else c) for c in content)
+    return str(content or "")
+
+
+# ---------- Claude ----------
+
+class _FakeMessages:
+    def __init__(self, owner: "FakeClaude"):
+        self._owner = owner
+
+    def create(self, **kwargs):
+        return self._owner._create(**kwargs)
+
+
+class FakeClaude:
+    """anthropic.Anthropic 的替身，只实现 messages.create。"""
+
+    def __init__(self, latency_ms: float = 2000, jitter: float = 0.25, output_tokens: int = 1500,
+                 error_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.output_tokens = output_tokens
+        self.error_rate = error_rate
+        self.messages = _FakeMessages(self)
+        self.calls = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._seen_system = set()
+        self._lock = threading.Lock()
+
+    def _create(self, model: str = "", max_tokens: int = 4000, system: Any = None, messages: Any = None, **kwargs):
+        system_text = _text_of(system)
+        user_text = "".join(_text_of(m.get("content")) for m in (messages or []) if isinstance(m, dict))
+        with self._lock:
+            self.calls += 1
+            fail = self.error_rate and self._rng.random() < self.error_rate
+            key = hashlib.md5(system_text.encode("utf-8")).hexdigest()
+            first = key not in self._seen_system
+            self._seen_system.add(key)
+        _sleep_ms(self.latency_ms, self.jitter, self._rng)
+        if fail:
+            with self._lock:
+                self.errors += 1
+            raise RuntimeError("FakeClaude: 模拟的 API 错误（overloaded）")
+
+        system_tokens = _estimate_tokens(system_text) if system_text else 0
+        output_tokens = min(self.output_tokens, max_tokens or self.output_tokens)
+        usage = SimpleNamespace(
+            input_tokens=_estimate_tokens(user_text),
+            output_tokens=output_tokens,
+            cache_creation_input_tokens=system_tokens if first else 0,
+            cache_read_input_tokens=0 if first else system_tokens,
+        )
+        return SimpleNamespace(
+            id=f"msg_fake_{self.calls}",
+            model=model,
+            role="assistant",
+            stop_reason="end_turn",
+            content=[SimpleNamespace(type="text", text=self._answer(user_text, output_tokens))],
+            usage=usage,
+        )
+
+    @staticmethod
+    def _answer(user_text: str, output_tokens: int) -> str:
+        topic = user_text.strip().splitlines()[0][:30] if user_text.strip() else "负载测试"
+        lines = [f"壹 {topic}"]
+        n = max(1, int(output_tokens * 1.5 / 60))
+        for i in range(n):
+            lines.append(f"{'一二三四五六七八九十'[i % 10]}　神的经纶是要将祂自己分赐到人里面作生命（参考来源 {i % 5 + 1}）。")
+        return "\n".join(lines)
+
+
+# ---------- Gemini ----------
+
+class FakeGenaiTypes:
+    """未安装 google-genai 时代替 google.genai.types，只提供 ai_service / gemini_cache 用到的配置类型。"""
+
+    @staticmethod
+    def GenerateContentConfig(**kwargs):
+        return SimpleNamespace(**kwargs)
+
+    @staticmethod
+    def CreateCachedContentConfig(**kwargs):
+        return SimpleNamespace(**kwargs)
+
+
+class _FakeModels:
+    def __init__(self, owner: "FakeGemini"):
+        self._owner = owner
+
+    def generate_content(self, model: str = "", contents: Any = None, config: Any = None):
+        return self._owner._generate(model, contents, config)
+
+
+class _FakeCaches:
+    def __init__(self, owner: "FakeGemini"):
+        self._owner = owner
+
+    def create(self, model: str = "", config: Any = None):
+        return self._owner._create_cache(model, config)
+
+
+class FakeGemini:
+    """google.genai.Client 的替身，只实现 models.generate_content 与 caches.create。"""
+
+    def __init__(self, latency_ms: float = 3000, jitter: float = 0.25, error_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.models = _FakeModels(self)
+        self.caches = _FakeCaches(self)
+        self.calls = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._cache_tokens: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _create_cache(self, model: str, config: Any):
+        instruction = str(getattr(config, "system_instruction", "") or "")
+        with self._lock:
+            name = f"cachedContents/fake-{len(self._cache_tokens) + 1}"
+            self._cache_tokens[name] = _estimate_tokens(instruction)
+        return SimpleNamespace(name=name, model=model, usage_metadata=SimpleNamespace(
+            total_token_count=self._cache_tokens[name]))
+
+    def _generate(self, model: str, contents: Any, config: Any):
+        text = _text_of(contents)
+        with self._lock:
+            self.calls += 1
+            fail = self.error_rate and self._rng.random() < self.error_rate
+        _sleep_ms(self.latency_ms, self.jitter, self._rng)
+        if fail:
+            with self._lock:
+                self.errors += 1
+            raise RuntimeError("FakeGemini: 模拟的 API 错误（RESOURCE_EXHAUSTED）")
+        cached_name = getattr(config, "cached_content", None)
+        instruction = str(getattr(config, "system_instruction", "") or "")
+        cached_tokens = self._cache_tokens.get(cached_name, 0) if cached_name else 0
+        lines = [line for line in text.splitlines() if line.strip()] or ["-"]
+        translated = "\n".join(f"{i + 1}. Translated line {i + 1}" for i in range(len(lines)))
+        return SimpleNamespace(
+            text=translated,
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=_estimate_tokens(text + instruction) + cached_tokens,
+                candidates_token_count=_estimate_tokens(translated),
+                cached_content_token_count=cached_tokens,
+            ),
+        )
+
+
+# ---------- Elasticsearch ----------
+
+def _exact_key(method: str, path: str, params: Optional[Dict[str, Any]], body: Any) -> str:
+    raw = json.dumps([method, path, params or {}, body], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def synthetic_response(method: str, path: str, params: Optional[Dict[str, Any]], body: Any) -> Tuple[int, Any]:
+    """没有录制时按操作返回的最小合法响应：(status, data)。"""
+    path = path.split("?", 1)[0]
+    if path in ("", "/"):
+        return 200, {
+            "name": "loadtest", "cluster_name": "loadtest", "tagline": "You Know, for Search",
+            "version": {"number": ES_VERSION, "build_flavor": "default"},
+        }
+    op = fingerprint(method, path, None)[1]["op"]
+    if method == "HEAD":
+        return 404, ""
+    if op in ("search", "search_template"):
+        return 200, {
+            "took": 1, "timed_out": False,
+            "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0},
+            "hits": {"total": {"value": 0, "relation": "eq"}, "max_score": None, "hits": []},
+        }
+    if op == "msearch":
+        n = max(1, len([line for line in str(body or "").splitlines() if line.strip()]) // 2)
+        empty = {"took": 1, "hits": {"total": {"value": 0, "relation": "eq"}, "max_score": None, "hits": []},
+                 "status": 200}
+        return 200, {"took": 1, "responses": [empty] * n}
+    if op == "mget":
+        ids = []
+        if isinstance(body, dict):
+            ids = body.get("ids") or [d.get("_id") for d in body.get("docs", [])]
+        return 200, {"docs": [{"_id": i, "found": False} for i in ids]}
+    if op == "count":
+        return 200, {"count": 0, "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0}}
+    if op == "analyze":
+        text = body.get("text", "") if isinstance(body, dict) else ""
+        if isinstance(text, list):
+            text = " ".join(text)
+        tokens = [{"token": t, "start_offset": 0, "end_offset": len(t), "type": "word", "position": i}
+                  for i, t in enumerate(str(text).split())]
+        return 200, {"tokens": tokens}
+    if op in ("doc", "source") and method == "GET":
+        return 404, {"found": False, "_id": path.rsplit("/", 1)[-1]}
+    if method in ("PUT", "POST", "DELETE"):
+        return 200, {"acknowledged": True, "result": "noop"}
+    return 200, {}
+
+
+class EsRecorder:
+    """包装真实连接，把响应录制下来；save() 写出文件供 EsReplay 使用。"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._per_fp: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def attach(self, client) -> None:
+        for conn in connections(client):
+            conn.perform_request = self._wrap(conn.perform_request)
+
+    def _wrap(self, fn: Callable):
+        def perform_request(method, url, params=None, body=None, timeout=None, ignore=(), headers=None):
+            start = time.perf_counter()
+            try:
+                status, resp_headers, raw = fn(method, url, params, body, timeout=timeout, ignore=ignore,
+                                               headers=headers)
+            except Exception as e:
+                status = getattr(e, "status_code", None)
+                if isinstance(status, int):
+                    self._record(method, url, params, body, status, getattr(e, "info", None), start)
+                raise
+            self._record(method, url, params, body, status, raw, start)
+            return status, resp_headers, raw
+        return perform_request
+
+    def _record(self, method, url, params, body, status, raw, start) -> None:
+        wall_ms = (time.perf_counter() - start) * 1000
+        body = decode_body(body)
+        data = decode_body(raw) if not isinstance(raw, dict) else raw
+        fp = fingerprint(method, url, body, params)[0]
+        key = _exact_key(method, url, params, body)
+        with self._lock:
+            if key in self._entries or len(self._entries) >= RECORD_MAX_ENTRIES:
+                return
+            if self._per_fp[fp] >= RECORD_MAX_PER_FINGERPRINT:
+                return
+            self._per_fp[fp] += 1
+            self._entries[key] = {
+                "key": key, "fp": fp, "method": method, "path": url, "params": params or {},
+                "status": status, "wall_ms": round(wall_ms, 2), "data": data,
+            }
+
+    def save(self) -> int:
+        with self._lock:
+            entries = list(self._entries.values())
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps({"version": RECORDING_VERSION, "es_version": ES_VERSION,
+                                         "entries": entries}, ensure_ascii=False), encoding="utf-8")
+        logger.info("已录制 %d 个 ES 响应 -> %s", len(entries), self.path)
+        return len(entries)
+
+
+class EsReplay:
+    """
+    不访问网络的 ES 连接替身。
+    replay_latency：按录制时的耗时乘以该系数等待（0 不等待）；synthetic_latency_ms：fallback 响应的固定等待。
+    fallback(method, path, params, body) -> (status, data)，默认 synthetic_response；
+    可传入 utils.es_memory.MemoryBackend().handle，未录到的请求由内存索引执行。
+    """
+
+    def __init__(self, path: Optional[str] = None, replay_latency: float = 1.0, synthetic_latency_ms: float = 5.0,
+                 fallback: Optional[Callable[..., Tuple[int, Any]]] = None, seed: Optional[int] = None):
+        self.replay_latency = replay_latency
+        self.synthetic_latency_ms = synthetic_latency_ms
+        self.fallback = fallback or synthetic_response
+        self.hits: Counter = Counter()
+        self.missed: Counter = Counter()  # 未命中的 "method op index"
+        self._exact: Dict[str, Dict[str, Any]] = {}
+        self._by_fp: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._cursor: Counter = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        if path:
+            self.load(path)
+
+    def load(self, path: str) -> int:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        for entry in data.get("entries", []):
+            self._exact[entry["key"]] = entry
+            self._by_fp[entry["fp"]].append(entry)
+        logger.info("已加载 %d 个 ES 录制响应（%d 个指纹）", len(self._exact), len(self._by_fp))
+        return len(self._exact)
+
+    def attach(self, client) -> None:
+        for conn in connections(client):
+            conn.perform_request = self.perform_request
+
+    def _lookup(self, method, url, params, body) -> Tuple[str, Optional[Dict[str, Any]]]:
+        entry = self._exact.get(_exact_key(method, url, params, body))
+        if entry is not None:
+            return "exact", entry
+        fp, desc = fingerprint(method, url, body, params)
+        candidates = self._by_fp.get(fp)
+        if candidates:
+            with self._lock:
+                i = self._cursor[fp]
+                self._cursor[fp] = i + 1
+            return "fingerprint", candidates[i % len(candidates)]
+        with self._lock:
+            self.missed[f"{desc['method']} {desc['op']} {desc['index']}"] += 1
+        return "fallback", None
+
+    def perform_request(self, method, url, params=None, body=None, timeout=None, ignore=(), headers=None):
+        body = decode_body(body)
+        level, entry = self._lookup(method, url, params, body)
+        with self._lock:
+            self.hits[level] += 1
+        if entry is not None:
+            status, data = entry["status"], entry["data"]
+            _sleep_ms(entry.get("wall_ms", 0) * self.replay_latency, 0.1, self._rng)
+        else:
+            status, data = self.fallback(method, url, params, body)
+            _sleep_ms(self.synthetic_latency_ms, 0.25, self._rng)
+        raise_for_status(status, data, ignore)
+        raw = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)
+        return status, dict(ES_HEADERS), raw
+
+    def summary(self) -> Dict[str, Any]:
+        return {"hits": dict(self.hits), "missed": dict(self.missed.most_common(20))}
+
+
+# ---------- 装入 ----------
+
+def install(claude: Optional[FakeClaude] = None, gemini: Optional[FakeGemini] = None) -> None:
+    """把 Claude / Gemini 替身装入 ai_search.ai_service（需在导入 main 之后调用）。"""
+    import ai_search.ai_service as svc
+    from utils.metrics import instrument_call
+
+    if claude is not None:
+        instrument_call(claude.messages, "create", "claude", "messages.create")
+        svc.claude_client = claude
+        svc.ai_service.claude = claude
+    if gemini is not None:
+        instrument_call(gemini.models, "generate_content", "gemini", "generate_content")
+        instrument_call(gemini.caches, "create", "gemini", "caches.create")
+        try:
+            from google.genai import types
+        except ImportError:
+            types = FakeGenaiTypes
+        from ai_search.gemini_cache import GeminiInstructionCache
+        from ai_search.gemini_translation_instruction import GEMINI_TRANSLATION_SYSTEM_INSTRUCTION
+
+        svc.gemini_client = gemini
+        svc.types = types
+        svc._gemini_system_instruction = GEMINI_TRANSLATION_SYSTEM_INSTRUCTION
+        if svc._gemini_system_instruction_en2zh is None:
+            try:
+                from ai_search.gemini_translation_instruction_en2zh import GEMINI_TRANSLATION_SYSTEM_INSTRUCTION_EN2ZH
+                svc._gemini_system_instruction_en2zh = GEMINI_TRANSLATION_SYSTEM_INSTRUCTION_EN2ZH
+            except ImportError:
+                pass
+        svc.gemini_instruction_cache = None
+        if svc.os.getenv("GEMINI_CONTEXT_CACHE", "1") != "0":
+            svc.gemini_instruction_cache = GeminiInstructionCache(
+                gemini, svc.GEMINI_MODEL, types, ttl_seconds=svc.GEMINI_CACHE_TTL,
+            )
@@ -1,5 +1,6 @@
-from typing import Annotated, List
+from typing import Annotated, List, Optional
 import json
+import os
 from fastapi import (
     FastAPI,
     Depends,
@@ -11,19 +12,32 @@ from fastapi import (
     WebSocketDisconnect,
 )
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from elasticsearch import NotFoundError
 from user.token import set_token, test_token
 from user.add_user import signup as signup_fun
 from user.changePass import change_pass
 from search.search import search as search_fun
 from search.search_map import search_cwws
-from search.search_reading import search_reading
+from search.search_reading import get_reading, etag_matches
+from search.search_read_more import read_more
+from search.analyzer import fenci
 from utils.jwt_op import jwt_decode
 from database.uplaod import up_load
 from response.excptions import ERR_403
 from database.upopt import opt
 from database.datalist import datalist
+from database.map_sections import maybe_annotate
+from database.section_docs import mark_touched, sync_touched_messages
+from search.result_cache import bump_index_versions
+from utils.request_log import setup_logging, request_context_middleware
+from utils.compression import CompressionMiddleware
+from utils.json_response import FastJSONResponse
+from utils import metrics
+from utils.tracing import tracing_middleware
+from utils import profiler
+from utils.es_stats import query_stats
 from user.users import user_opt
 from user.ivcode import iv_opt
 from tools.biblecollection import biblecollection
@@ -37,8 +51,23 @@ from es_config import es
 
 app = FastAPI()
 
+# 日志经队列异步写出，并为每个请求附带 request_id
+setup_logging()
+# 先注册的中间件在内层：追踪与请求分析需读取 request_id，放在 request_id 中间件之内
+# 管理员启用后对匹配路由的后续 N 个请求做采样分析（纯 ASGI 中间件，未启用时只读一次本地变量）
+app.add_middleware(profiler.ProfilerMiddleware)
+# 请求追踪（根 span + ES / Redis / Claude / Gemini 子 span，慢请求导出）
+app.middleware("http")(tracing_middleware)
+app.middleware("http")(request_context_middleware)
+# 按路由统计请求数与耗时，GET /metrics 输出（Prometheus 格式）
+app.middleware("http")(metrics.metrics_middleware)
+
 # 应用启动时初始化监控模块（复用 ai_search 的 Redis 客户端）
 get_monitoring(redis_client)
+# 请求分析的启用状态经 Redis 在各 worker 间共享
+profiler.configure(redis_client)
+# ES 查询指纹统计定期合并进 Redis，/api/es_stats 展示各 worker 汇总
+query_stats.configure(redis_client)
 
 # 创建API路由器（所有路由带/api前缀）
 from fastapi import APIRouter
@@ -63,8 +92,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["X-Retrieval-Log"],
+    expose_headers=["X-Retrieval-Log", "X-Request-ID"],
 )
+# 大于阈值的 JSON / 文本响应按 Accept-Encoding 做 br / gzip 压缩
+app.add_middleware(CompressionMiddleware)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -141,7 +172,7 @@ def chanPass(username: str = Form(), old_pass: str = Form(), new_pass: str = For
         pass
 
 
-@api_router.post("/search", dependencies=[Depends(test_token)])
+@api_router.post("/search", dependencies=[Depends(test_token)], response_class=FastJSONResponse)
 def search(input: str = Form(), args: str = Form()):
     try:
         result = search_fun(input, args)
@@ -152,7 +183,7 @@ def search(input: str = Form(), args: str = Form()):
         return {"total": 0, "msg": []}
 
 
-@api_router.post("/cws", dependencies=[Depends(test_token)])
+@api_router.post("/cws", dependencies=[Depends(test_token)], response_class=FastJSONResponse)
 def get_map(input: str = Form(), fwds: str = Form(), index: str = Form()):
     try:
         return search_cwws(input, fwds, index)
@@ -160,14 +191,58 @@ def get_map(input: str = Form(), fwds: str = Form(), index: str = Form()):
         pass
 
 
-@api_router.post("/reading", dependencies=[Depends(test_token)])
-def get_map(refid: str = Form()):
+# 阅读文档只在重新导入时变化：返回 ETag，If-None-Match 命中时 304
+READING_CACHE_CONTROL = os.getenv("READING_CACHE_CONTROL", "private, no-cache")
+
+
+def _reading_response(r: Request, refid: str):
+    etag, body = get_reading(refid)
+    headers = {"ETag": etag, "Cache-Control": READING_CACHE_CONTROL}
+    if etag_matches(r.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@api_router.get("/reading", dependencies=[Depends(test_token)])
+def get_reading_doc(r: Request, refid: str):
+    # 只有文档不存在时返回 404；ES 不可用、超时等错误照常抛出（5xx），以免客户端把故障当作「没有该文档」
     try:
-        return search_reading(refid)
+        return _reading_response(r, refid)
+    except NotFoundError:
+        return JSONResponse(content={"error": "404 Not Found"}, status_code=404)
+
+
+@api_router.post("/reading", dependencies=[Depends(test_token)], response_class=FastJSONResponse)
+def get_map(r: Request, refid: str = Form()):
+    try:
+        return _reading_response(r, refid)
     except:
         pass
 
 
+@api_router.post("/read_more", dependencies=[Depends(test_token)], response_class=FastJSONResponse)
+def read_more_fun(
+    book_id: str = Form(),
+    type: str = Form("all"),
+    keywords: str = Form(""),
+    mode: str = Form(""),
+    start: Optional[int] = Form(None),
+    size: Optional[int] = Form(None),
+):
+    try:
+        return read_more(book_id, type, keywords, mode, start, size)
+    except Exception:
+        return {"msg": {"zh": [], "en": []}, "fenci": [], "range": None}
+
+
+@api_router.post("/fenci", dependencies=[Depends(test_token)])
+def fenci_fun(keywords: str = Form(""), mode: str = Form(""), analyzer: str = Form("")):
+    try:
+        return fenci(keywords, mode, analyzer)
+    except Exception:
+        return []
+
+
 @api_router.post("/getvers", dependencies=[Depends(test_token)])
 def get_vers(input: str = Form()):
     try:
@@ -204,6 +279,7 @@ async def websocket_endpoint(websocket: WebSocket):
 @api_router.post("/process")
 async def start_process(r: Request, filename: str = Form(), action: str = Form()):
     session = r.cookies.get("session")
+    written = {}
     try:
         await checkAdmin(session)
         jddir = (pt(__file__).parent / "database" / "upload").rglob("*.json")
@@ -213,6 +289,7 @@ async def start_process(r: Request, filename: str = Form(), action: str = Form()
         sn = 0
         old = 0
         pgs = 0
+        touched = {}
         if filename in jds:
             jd = json.loads(jds[filename].read_text("utf"))
             jdlen = len(jd)
@@ -230,9 +307,18 @@ async def start_process(r: Request, filename: str = Form(), action: str = Form()
                 else:
                     idx = i["id"]
                 for index in indexs:
-                    es.index(index=index, id=idx, body=i)
+                    es.index(index=index, id=idx, body=maybe_annotate(index, i))
+                    mark_touched(touched, index, idx)
+                    written[index] = written.get(index, 0) + 1
+            # 增量更新小节 / 整篇伴生索引
+            await asyncio.to_thread(sync_touched_messages, es, touched)
+            # 使涉及索引的 /api/search、/api/cws 结果缓存失效
+            bump_index_versions(written)
+            metrics.record_import("process", written)
         return {"tip": f"{filename}: 导入完成！"}
     except Exception as e:
+        if written:
+            metrics.record_import("process", written, ok=False)
         return JSONResponse(content={"error": str(e)}, status_code=403)
 
 
@@ -302,6 +388,79 @@ async def upload_file_fun(r: Request, file: UploadFile = File(...)):
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
 
+@api_router.post("/profiler/arm")
+async def profiler_arm(r: Request, route: str = Form(), count: int = Form(1)):
+    session = r.cookies.get("session")
+    try:
+        await checkAdmin(session)
+        return profiler.arm(route, count)
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)}, status_code=403)
+
+
+@api_router.post("/profiler/disarm")
+async def profiler_disarm(r: Request):
+    session = r.cookies.get("session")
+    try:
+        await checkAdmin(session)
+        profiler.disarm()
+        return profiler.status()
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)}, status_code=403)
+
+
+@api_router.get("/profiler/profiles")
+async def profiler_profiles(r: Request):
+    session = r.cookies.get("session")
+    try:
+        await checkAdmin(session)
+        return {"armed": profiler.status(), "profiles": await asyncio.to_thread(profiler.list_profiles)}
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)}, status_code=403)
+
+
+@api_router.get("/profiler/profiles/{name}")
+async def profiler_download(r: Request, name: str):
+    session = r.cookies.get("session")
+    await checkAdmin(session)
+    path = profiler.profile_path(name)
+    if path is None:
+        return JSONResponse(content={"error": "404 Not Found"}, status_code=404)
+    return FileResponse(path, media_type="text/plain; charset=utf-8", filename=name)
+
+
+@api_router.get("/es_stats")
+async def es_stats(r: Request, sort: str = "total_ms", limit: int = 50):
+    """ES 查询指纹统计：按总耗时 / 平均 / 最大 / 次数 / 错误数排序，每个指纹附最慢的样例。"""
+    session = r.cookies.get("session")
+    try:
+        await checkAdmin(session)
+        return await asyncio.to_thread(query_stats.report, sort, max(1, min(limit, 500)))
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)}, status_code=403)
+
+
+@api_router.post("/es_stats/reset")
+async def es_stats_reset(r: Request):
+    session = r.cookies.get("session")
+    try:
+        await checkAdmin(session)
+        await asyncio.to_thread(query_stats.reset)
+        return {"tip": "ES 查询统计已重置"}
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)}, status_code=403)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint(r: Request):
+    """Prometheus 抓取端点；配置了 METRICS_TOKEN 时需携带 Authorization: Bearer <token>。"""
+    if not metrics.enabled():
+        return Response("prometheus_client 未安装\n", status_code=503, media_type="text/plain")
+    if not metrics.authorized(r.headers.get("authorization", "")):
+        return Response(status_code=401)
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE_LATEST)
+
+
 # AI 搜索路由（Claude 问答 / RAG）
 app.include_router(ai_router)
 
@@ -0,0 +1,14 @@
+"""
+CPU 热点路径的微基准
+
+覆盖经文汇集（biblecollection.main）、搜索参数解析（get_search_index.get_info）、AI 上下文构建
+（_build_context_from_hits / _extract_map_note_sections_from_inner_hits）、中英文纲目格式刷、简转繁与信息检索导出。
+输入为 corpus.py 中固定种子生成的纲目与 ES 命中，ES 调用由内存替身应答；结果写入 JSON，可与之前的结果比较，
+让每次性能改动都有可复现的前后对比。
+
+用法：在 back_mic/backend 目录下执行
+    python -m microbench.run --list
+    python -m microbench.run -o logs/microbench-base.json                     # 改动前
+    python -m microbench.run --baseline logs/microbench-base.json             # 改动后，回退时以 1 退出
+    python -m microbench.run -k build_context -r 15 --baseline logs/microbench-base.json
+"""
@@ -0,0 +1,176 @@
+"""
+微基准用例
+
+每个用例的 setup(ctx) 返回 (run, prepare)：run() 为被计时的一次调用；prepare 不为 None 时在每次 run 之前执行且不计时
+（如为格式刷准备一份未格式化的 DOCX）。ES 调用全部由 corpus.FixtureEs 应答，计时只包含 Python 侧的处理。
+"""
+import os
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from microbench import corpus
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+class Context:
+    """用例共用的语料与被测服务（按需创建，同一次运行内复用）。"""
+
+    def __init__(self, corpus_dir: Optional[str] = None):
+        self.corpus_dir = corpus_dir
+        self._corpus = None
+        self._service = None
+        self.tmpdir = tempfile.mkdtemp(prefix="microbench-")
+
+    @property
+    def corpus(self) -> corpus.Corpus:
+        if self._corpus is None:
+            self._corpus = corpus.Corpus()
+        return self._corpus
+
+    @property
+    def service(self):
+        if self._service is None:
+            from ai_search.ai_service import AISearchService
+
+            self._service = AISearchService()
+            self._service.es = corpus.FixtureEs(self.corpus)
+        return self._service
+
+    def text(self, name: str, default: Callable[[], str]) -> str:
+        return corpus.load_override(self.corpus_dir, name) or default()
+
+    def ai_hits(self, n: int, legacy_map_ratio: float = 0.0) -> List[Dict]:
+        hits = corpus.load_override(self.corpus_dir, "ai_hits.json")
+        return hits[:n] if hits else self.corpus.ai_hits(n, legacy_map_ratio)
+
+
+Setup = Callable[[Context], Tuple[Callable[[], object], Optional[Callable[[], None]]]]
+CASES: Dict[str, Tuple[str, Setup]] = {}
+
+
+def case(name: str, description: str):
+    def decorator(fn: Setup) -> Setup:
+        CASES[name] = (description, fn)
+        return fn
+    return decorator
+
+
+# ---------- 经文汇集 / 搜索参数 ----------
+
+@case("biblecollection.main", "经文汇集：40 行纲目解析出处并取经文")
+def _biblecollection(ctx: Context):
+    import tools.biblecollection as bc
+
+    bc.es = corpus.FixtureEs()
+    text = ctx.text("verses.txt", corpus.verse_text)
+    return (lambda: bc.main(text)), None
+
+
+@case("get_search_index.get_info", "搜索参数解析与查询条件构建：98 组 (args, input)，分词结果已缓存")
+def _get_info(ctx: Context):
+    import search.analyzer as analyzer
+    from search.get_search_index import get_info
+
+    analyzer.es = corpus.FixtureEs()
+    inputs = corpus.search_inputs()
+
+    def run():
+        for args, q in inputs:
+            get_info(args, q)
+    return run, None
+
+
+@case("get_search_index.get_info[cold]", "同上，每次调用前清空分词缓存")
+def _get_info_cold(ctx: Context):
+    import search.analyzer as analyzer
+
+    run, _ = _get_info(ctx)
+    return run, analyzer._cache.clear
+
+
+# ---------- AI 检索上下文 ----------
+
+@case("ai._build_context_from_hits[general]", "一般模式上下文构建：60 条命中全部构建为候选")
+def _build_context_general(ctx: Context):
+    svc = ctx.service
+    hits = ctx.ai_hits(60)
+    return (lambda: svc._build_context_from_hits(hits)), None
+
+
+@case("ai._build_context_from_hits[deep]", "深度模式上下文构建：250 条命中全部构建为候选，含 20% 未预计算的 map 命中")
+def _build_context_deep(ctx: Context):
+    svc = ctx.service
+    hits = ctx.ai_hits(250, legacy_map_ratio=0.2)
+    return (lambda: svc._build_context_from_hits(hits)), None
+
+
+@case("ai._extract_map_note_sections[precomputed]", "200 条 map 命中由 inner_hits 的 sec_end / sec_text 还原小节")
+def _extract_precomputed(ctx: Context):
+    svc = ctx.service
+    hits = ctx.corpus.map_hits(200, precomputed=True)
+
+    def run():
+        for hit in hits:
+            svc._extract_map_note_sections_from_inner_hits(hit["_source"], hit)
+    return run, None
+
+
+@case("ai._extract_map_note_sections[legacy]", "200 条未预计算的 map 命中逐项扫描 msg 数组")
+def _extract_legacy(ctx: Context):
+    svc = ctx.service
+    hits = ctx.corpus.map_hits(200, precomputed=False)
+
+    def run():
+        for hit in hits:
+            svc._extract_map_note_sections_from_inner_hits(hit["_source"], hit)
+    return run, None
+
+
+# ---------- 纲目 ----------
+
+def _filled_docx(ctx: Context, template_name: str, text: str) -> Tuple[str, bytes]:
+    """与 ai_service 格式化前相同：复制模板、清空段落、按行写入，返回 (工作路径, 未格式化的 DOCX 内容)。"""
+    from docx import Document
+
+    doc = Document(str(BACKEND_DIR / template_name))
+    for para in list(doc.paragraphs):
+        para._element.getparent().remove(para._element)
+    for line in text.split("\n"):
+        if line.strip() or len(doc.paragraphs) == 0:
+            doc.add_paragraph(line)
+    path = os.path.join(ctx.tmpdir, template_name)
+    doc.save(path)
+    return path, Path(path).read_bytes()
+
+
+@case("format_chinese_outline_docx", "中文纲目格式刷：6 个大点的纲目（含职事信息摘录）")
+def _format_zh(ctx: Context):
+    from format_chinese_outline import format_chinese_outline_docx
+
+    path, data = _filled_docx(ctx, "中文纲目模板.docx", ctx.text("outline_zh.txt", corpus.zh_outline))
+    return (lambda: format_chinese_outline_docx(path)), (lambda: Path(path).write_bytes(data))
+
+
+@case("format_english_outline_docx", "英文纲目格式刷：6 个大点的纲目")
+def _format_en(ctx: Context):
+    from format_english_outline import format_english_outline_docx
+
+    path, data = _filled_docx(ctx, "英文纲目模板.docx", ctx.text("outline_en.txt", corpus.en_outline))
+    return (lambda: format_english_outline_docx(path)), (lambda: Path(path).write_bytes(data))
+
+
+@case("ai.outline_to_traditional", "简体纲目转台湾繁体：术语表占位替换 + OpenCC / zhconv")
+def _to_traditional(ctx: Context):
+    svc = ctx.service
+    text = ctx.text("outline_zh.txt", corpus.zh_outline)
+    return (lambda: svc.outline_to_traditional(text)), None
+
+
+# ---------- 信息检索导出 ----------
+
+@case("ai.info_retrieval_export", "信息检索导出：8 个索引的命中去重、整篇拼装、分批并生成 DOCX")
+def _info_retrieval(ctx: Context):
+    svc = ctx.service
+    return (lambda: svc.info_retrieval_export("神")), None
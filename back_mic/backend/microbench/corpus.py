@@ -0,0 +1,306 @@
+"""
+微基准的固定语料
+
+所有语料由固定种子生成，同一版本代码每次得到完全相同的输入，结果之间才能比较：
+
+- 纲目：中文纲目（标题 / 读经 / 壹一1a（一）各级 / 职事信息摘录）、英文纲目、含经文出处的经文汇集输入
+- ES 命中：cwwl / cwwn / life / others 的 heading 与 text 段落（同篇所有段落可按 id 前缀取回，一半 heading 有预组装小节），
+  map_note / map_7feasts / map_dictionary 带 inner_hits 的命中（经 annotate_map_doc 预计算，与导入后一致）与未预计算的旧数据
+- FixtureEs：只实现被测代码用到的 search / mget / get / indices.analyze，直接返回上述语料，不做任何 I/O
+
+--corpus-dir 目录中放入 ai_hits.json（_multi_index_search 返回的命中列表）、outline_zh.txt、outline_en.txt、
+verses.txt 时，以实际数据代替对应的生成语料。
+"""
+import copy
+import json
+import random
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from database.map_sections import annotate_map_doc
+from database.section_docs import build_message_doc, build_section_docs
+
+SEED = 20240601
+
+_ZH = "神的经纶是要将祂自己分赐到人里面作生命召会是基督的身体新人的实际在于基督与我们调和为一灵我们需要操练灵"
+_EN = ("God's economy is to dispense Himself into man as life the church is the Body of Christ "
+       "we need to exercise our spirit to contact the Lord in His word ")
+_CN_NUM = "一二三四五六七八九十"
+_BIG_NUM = "壹贰叁肆伍陆柒捌玖拾"
+_ROMAN = ["I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X"]
+_BOOKS = [("创", 50), ("出", 40), ("诗", 150), ("赛", 66), ("太", 28), ("约", 21), ("罗", 16), ("林前", 16),
+          ("弗", 6), ("西", 4), ("来", 13), ("启", 22)]
+
+TEXT_INDEXES = ("cwwl", "cwwn", "life", "others")
+MAP_INDEXES = ("map_note", "map_7feasts", "map_dictionary")
+
+
+def _zh(rng: random.Random, n: int) -> str:
+    start = rng.randrange(len(_ZH))
+    return "".join(_ZH[(start + i) % len(_ZH)] for i in range(n))
+
+
+def _en(rng: random.Random, n: int) -> str:
+    words = _EN.split()
+    start = rng.randrange(len(words))
+    return " ".join(words[(start + i) % len(words)] for i in range(n)).capitalize()
+
+
+def _cn_num(n: int) -> str:
+    """1..99 的中文数字（经文出处的章数）。"""
+    if n <= 10:
+        return _CN_NUM[n - 1]
+    tens, ones = divmod(n, 10)
+    return ("" if tens == 1 else _CN_NUM[tens - 1]) + "十" + (_CN_NUM[ones - 1] if ones else "")
+
+
+def _verse_ref(rng: random.Random) -> str:
+    book, chapters = rng.choice(_BOOKS)
+    chapter = rng.randint(1, min(chapters, 30))
+    verse = rng.randint(1, 20)
+    ref = f"{book}{_cn_num(chapter)}{verse}"
+    if rng.random() < 0.4:
+        ref += f"～{verse + rng.randint(1, 6)}"
+    if rng.random() < 0.3:
+        ref += f"，{verse + rng.randint(7, 12)}"
+    return ref
+
+
+# ---------- 纲目 ----------
+
+def zh_outline(points: int = 6, seed: int = SEED) -> str:
+    """中文纲目全文：标题、读经、壹~各级纲目（每级带经文出处）、职事信息摘录。"""
+    rng = random.Random(seed)
+    lines = ["第一篇", _zh(rng, 12), "读经：" + "，".join(_verse_ref(rng) for _ in range(4))]
+    for i in range(points):
+        lines.append(f"{_BIG_NUM[i % 10]}　{_zh(rng, 24)}——{_verse_ref(rng)}。")
+        for j in range(rng.randint(2, 4)):
+            lines.append(f"{_CN_NUM[j]}　{_zh(rng, 30)}——{_verse_ref(rng)}：")
+            for k in range(rng.randint(1, 3)):
+                lines.append(f"{k + 1}　{_zh(rng, 40)}——{_verse_ref(rng)}。")
+                if rng.random() < 0.4:
+                    lines.append(f"a　{_zh(rng, 36)}。")
+                    lines.append(f"b　{_zh(rng, 36)}。")
+            if rng.random() < 0.3:
+                lines.append(f"（一）{_zh(rng, 32)}。")
+    lines.append("职事信息摘录：")
+    for _ in range(points):
+        lines.append(_zh(rng, 120) + "（李常受文集一九六五年第二册，四〇八页）")
+    return "\n".join(lines)
+
+
+def en_outline(points: int = 6, seed: int = SEED) -> str:
+    """英文纲目全文：标题、Scripture Reading、I. / A. / 1. / a. 各级。"""
+    rng = random.Random(seed)
+    lines = ["Message One", _en(rng, 8), "Scripture Reading: Eph. 1:3-14; 3:8-11; 1 Tim. 1:4"]
+    for i in range(points):
+        lines.append(f"{_ROMAN[i % 10]}. {_en(rng, 18)}—Eph. {i + 1}:{rng.randint(1, 20)}.")
+        for j in range(rng.randint(2, 4)):
+            lines.append(f"{'ABCDEFGH'[j]}. {_en(rng, 24)}—John {j + 1}:{rng.randint(1, 30)}.")
+            for k in range(rng.randint(1, 3)):
+                lines.append(f"{k + 1}. {_en(rng, 30)}.")
+                if rng.random() < 0.4:
+                    lines.append(f"a. {_en(rng, 20)}.")
+    return "\n".join(lines)
+
+
+def verse_text(lines: int = 40, seed: int = SEED) -> str:
+    """经文汇集（/api/getvers）的输入：每行一段纲目，带若干经文出处。"""
+    rng = random.Random(seed)
+    out = []
+    for i in range(lines):
+        refs = "，".join(_verse_ref(rng) for _ in range(rng.randint(1, 4)))
+        out.append(f"{_CN_NUM[i % 10]}　{_zh(rng, 20)}——{refs}。")
+    return "\n".join(out)
+
+
+SEARCH_QUERIES = [
+    "神的经纶", "生命的灵", "召会是基督的身体", "新耶路撒冷", "三一神的分赐", "基督的丰富", "国度", "圣别",
+    "economy of God", "the Body of Christ", "the mingled spirit", "God's eternal purpose", "灵 生命", "基督 召会 新人",
+]
+SEARCH_ARGS = ["a-a-a-1-10", "a-a-b-1-10", "b-a-a-1-20", "c-b-a-1-10", "a-a-c-1-10", "a-a-a-2-50", "1-c-b-1-10"]
+
+
+def search_inputs() -> List[tuple]:
+    """(args, input) 组合，覆盖中英文、模糊 / 平衡 / 全文与不同索引类别。"""
+    return [(args, q) for q in SEARCH_QUERIES for args in SEARCH_ARGS]
+
+
+# ---------- ES 命中 ----------
+
+def _message_docs(rng: random.Random, index: str, n: int) -> Dict[str, List[Dict]]:
+    """{message 前缀: 按段号排序的段落}；每篇 heading 后跟若干 text，偶有空段与 ot 段。"""
+    messages = {}
+    for m in range(n):
+        prefix = f"{index}_{m // 10 + 1}_{m % 10 + 1}-"
+        title = f"{_zh(rng, 6)}（第{m + 1}篇）"
+        docs = []
+        seg = 1
+        for _ in range(rng.randint(3, 6)):
+            docs.append({"id": f"{prefix}{seg}", "type": rng.choice(["heading", "heading_1", "heading_2"]),
+                         "text": _zh(rng, 16), "title": title, "book": title})
+            seg += 1
+            for _ in range(rng.randint(2, 8)):
+                kind = "text" if rng.random() < 0.9 else rng.choice(["ot1", "ot2"])
+                text = "" if rng.random() < 0.05 else _zh(rng, rng.randint(80, 400))
+                docs.append({"id": f"{prefix}{seg}", "type": kind, "text": text, "title": title, "book": title})
+                seg += 1
+        messages[prefix] = docs
+    return messages
+
+
+def _map_doc(rng: random.Random, index: str, n: int) -> Dict:
+    msg = [{"type": "bookname", "text": _zh(rng, 6)}, {"type": "title", "text": _zh(rng, 10)}]
+    for _ in range(rng.randint(3, 6)):
+        msg.append({"type": "ot1", "text": _zh(rng, 30), "source": f"（{_zh(rng, 8)}）"})
+        for _ in range(rng.randint(1, 4)):
+            msg.append({"type": "ot2", "text": _zh(rng, 60)})
+            for _ in range(rng.randint(0, 3)):
+                msg.append({"type": "ot3", "text": _zh(rng, 80)})
+        if rng.random() < 0.3:
+            msg.append({"type": "note", "text": _zh(rng, 40)})
+    return {"id": f"{index}_{n}", "text": "", "sn": str(n), "source": f"（{_zh(rng, 10)}）",
+            "bookname": _zh(rng, 6), "title": _zh(rng, 10), "msg": msg}
+
+
+def _map_hit(rng: random.Random, index: str, doc: Dict, precomputed: bool) -> Dict:
+    """map 类命中：_source 不含 msg（与检索时的 _source 过滤一致），inner_hits 为命中的 msg 项。"""
+    msg = doc["msg"]
+    ot = [i for i, m in enumerate(msg) if m.get("type", "").startswith("ot")]
+    picked = sorted(rng.sample(ot, min(len(ot), rng.randint(1, 4))))
+    inner = []
+    for i in picked:
+        src = {"type": msg[i]["type"], "text": msg[i]["text"]}
+        if precomputed:
+            src = {"sec_end": msg[i]["sec_end"], "sec_text": msg[i]["sec_text"]}
+        inner.append({"_nested": {"field": "msg", "offset": i}, "_source": src, "_score": rng.random() * 10})
+    source = {k: v for k, v in doc.items() if k != "msg"}
+    if not precomputed:
+        source["msg"] = msg
+    return {
+        "_index": index, "_index_name": index, "_id": doc["id"], "_score": rng.random() * 20,
+        "_source": source,
+        "inner_hits": {"matched_msg": {"hits": {"total": {"value": len(inner)}, "hits": inner}}},
+    }
+
+
+class Corpus:
+    """AI 检索上下文构建与信息检索导出用的命中与 ES 数据。"""
+
+    def __init__(self, messages_per_index: int = 40, map_docs_per_index: int = 60, seed: int = SEED):
+        rng = random.Random(seed)
+        self.messages: Dict[str, Dict[str, List[Dict]]] = {
+            index: _message_docs(rng, index, messages_per_index) for index in TEXT_INDEXES
+        }
+        # 一半 heading 有伴生索引中的预组装小节，另一半走逐段拼装
+        self.sections: Dict[tuple, Dict] = {}
+        self.message_docs: Dict[tuple, Dict] = {}
+        for index, messages in self.messages.items():
+            for n, (prefix, docs) in enumerate(messages.items()):
+                if n % 2 == 0:
+                    for section in build_section_docs(prefix, docs):
+                        self.sections[(index + "_sections", section["id"])] = section
+                    self.message_docs[(index + "_messages", prefix)] = build_message_doc(prefix, docs)
+        self.map_docs: Dict[str, List[Dict]] = {}
+        for index in MAP_INDEXES:
+            docs = [_map_doc(rng, index, n) for n in range(map_docs_per_index)]
+            self.map_docs[index] = [annotate_map_doc(copy.deepcopy(d)) for d in docs]
+        self._rng = rng
+
+    def ai_hits(self, n: int, legacy_map_ratio: float = 0.0, seed: int = SEED) -> List[Dict]:
+        """_multi_index_search 形态的命中：约 60% 文集段落（heading / text），40% map 类。"""
+        rng = random.Random(seed + n)
+        hits = []
+        while len(hits) < n:
+            if rng.random() < 0.6:
+                index = rng.choice(TEXT_INDEXES)
+                docs = rng.choice(list(self.messages[index].values()))
+                doc = rng.choice([d for d in docs if d["text"]])
+                hits.append({"_index": index, "_index_name": index, "_id": doc["id"], "_score": rng.random() * 20,
+                             "_weighted_score": rng.random() * 30, "_source": dict(doc)})
+            else:
+                index = rng.choice(MAP_INDEXES)
+                doc = rng.choice(self.map_docs[index])
+                hits.append(_map_hit(rng, index, doc, precomputed=rng.random() >= legacy_map_ratio))
+        return hits
+
+    def map_hits(self, n: int, precomputed: bool, seed: int = SEED) -> List[Dict]:
+        rng = random.Random(seed + n + (1 if precomputed else 2))
+        return [_map_hit(rng, idx, rng.choice(self.map_docs[idx]), precomputed)
+                for idx in (rng.choice(MAP_INDEXES) for _ in range(n))]
+
+    def export_hits(self, index: str) -> List[Dict]:
+        """信息检索导出时某个索引的全部命中（size=10000 的 _source 形态）。"""
+        if index in self.map_docs:
+            return [{"_index": index, "_id": d["id"], "_source": d} for d in self.map_docs[index]]
+        hits = []
+        for docs in self.messages.get(index, {}).values():
+            hits.extend({"_index": index, "_id": d["id"], "_source": d} for d in docs)
+        return hits
+
+
+def load_override(corpus_dir: Optional[str], name: str):
+    """读取 --corpus-dir 中的实际语料；不存在时返回 None。"""
+    if not corpus_dir:
+        return None
+    path = Path(corpus_dir) / name
+    if not path.exists():
+        return None
+    text = path.read_text(encoding="utf-8")
+    return json.loads(text) if name.endswith(".json") else text
+
+
+# ---------- ES 替身 ----------
+
+def _hits(hits: List[Dict]) -> Dict:
+    return {"took": 0, "timed_out": False,
+            "hits": {"total": {"value": len(hits), "relation": "eq"}, "max_score": None, "hits": hits}}
+
+
+class FixtureEs:
+    """以内存语料应答被测代码的 ES 调用，使计时只包含 Python 侧的处理。"""
+
+    def __init__(self, corpus: Optional[Corpus] = None):
+        self.corpus = corpus
+        self.indices = SimpleNamespace(analyze=self._analyze)
+
+    def search(self, index=None, body=None, **kwargs):
+        body = body or {}
+        query = body.get("query", {})
+        prefix = (query.get("prefix") or {}).get("id")
+        if prefix is not None:
+            docs = self.corpus.messages.get(index, {}).get(prefix, []) if self.corpus else []
+            return _hits([{"_index": index, "_id": d["id"], "_source": d} for d in docs])
+        if self.corpus is None:
+            return _hits([])
+        return _hits(self.corpus.export_hits(index))
+
+    def mget(self, body=None, index=None, **kwargs):
+        body = body or {}
+        out = []
+        if "ids" in body:
+            for doc_id in body["ids"]:
+                src = self.corpus.message_docs.get((index, doc_id)) if self.corpus else None
+                out.append({"_index": index, "_id": doc_id, "found": src is not None, "_source": src})
+        for d in body.get("docs", []):
+            src = self.corpus.sections.get((d["_index"], d["_id"])) if self.corpus else None
+            out.append({"_index": d["_index"], "_id": d["_id"], "found": src is not None, "_source": src})
+        return {"docs": out}
+
+    def get(self, index=None, id=None, **kwargs):
+        return {"_index": index, "_id": id, "found": True,
+                "_source": {"text": f"经文 {id} 的内容，" + _ZH[:40], "source": [f"（圣经恢复本，{id}）"]}}
+
+    @staticmethod
+    def _analyze(body=None, **kwargs):
+        texts = (body or {}).get("text", [])
+        if isinstance(texts, str):
+            texts = [texts]
+        tokens = []
+        offset = 0
+        for t in texts:
+            for word in t.split():
+                tokens.append({"token": word, "start_offset": offset, "end_offset": offset + len(word)})
+            offset += len(t.encode("utf-16-le")) // 2 + 1
+        return {"tokens": tokens}
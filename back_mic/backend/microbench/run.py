@@ -0,0 +1,160 @@
+"""
+微基准入口：python -m microbench.run --help（在 back_mic/backend 目录下执行，说明见 microbench/__init__.py）
+
+每个用例先预热，再自动确定每轮调用次数（一轮不少于 --min-time 秒），共测 --rounds 轮，报告单次调用的
+最小 / 中位 / 平均耗时与轮间标准差。比较以中位数为准：超过基线 (1 + tolerance) 倍记为回退，
+低于 (1 - tolerance) 倍记为改进；基线中有结果而本次出错的用例也记为回退。有回退时以 1 退出。
+"""
+import argparse
+import json
+import logging
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from microbench.cases import CASES, Context  # noqa: E402
+
+DEFAULT_OUT = str(BACKEND_DIR / "logs" / "microbench.json")
+MAX_NUMBER = 100000
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _time_round(run, prepare, number: int) -> float:
+    """执行 number 次，返回被计时部分的总秒数。"""
+    if prepare is None:
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        return time.perf_counter() - start
+    total = 0.0
+    for _ in range(number):
+        prepare()
+        start = time.perf_counter()
+        run()
+        total += time.perf_counter() - start
+    return total
+
+
+def measure(run, prepare, rounds: int, min_time: float, warmup: int) -> Dict[str, Any]:
+    for _ in range(warmup):
+        if prepare is not None:
+            prepare()
+        run()
+    # 校准：每轮调用次数翻倍直到一轮耗时不少于 min_time
+    number = 1
+    while number < MAX_NUMBER:
+        if _time_round(run, prepare, number) >= min_time:
+            break
+        number *= 2
+    per_call = [_time_round(run, prepare, number) / number * 1000 for _ in range(rounds)]
+    return {
+        "number": number,
+        "rounds": rounds,
+        "min_ms": round(min(per_call), 4),
+        "median_ms": round(statistics.median(per_call), 4),
+        "mean_ms": round(statistics.mean(per_call), 4),
+        "stdev_ms": round(statistics.stdev(per_call), 4) if len(per_call) > 1 else 0.0,
+    }
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> Dict[str, List[str]]:
+    """按中位数与基线比较；基线中有结果、本次却出错的用例同样记为回退（如新代码抛异常或依赖丢失）。"""
+    out = {"regressions": [], "improvements": []}
+    for name, r in results.items():
+        base = baseline.get(name)
+        if not base or not base.get("median_ms"):
+            continue
+        if "median_ms" not in r:
+            out["regressions"].append(f"{name}: {base['median_ms']}ms -> 出错 {r.get('error', '')}"[:300])
+            continue
+        ratio = r["median_ms"] / base["median_ms"]
+        r["vs_baseline"] = round(ratio, 3)
+        line = f"{name}: {base['median_ms']}ms -> {r['median_ms']}ms ({ratio - 1:+.0%})"
+        if ratio > 1 + tolerance:
+            out["regressions"].append(line)
+        elif ratio < 1 - tolerance:
+            out["improvements"].append(line)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", "--filter", help="只运行名称匹配该正则的用例")
+    parser.add_argument("--list", action="store_true", help="列出用例后退出")
+    parser.add_argument("-r", "--rounds", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.2, help="每轮最短秒数")
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--corpus-dir", help="以该目录中的实际数据代替生成语料（见 microbench/corpus.py）")
+    parser.add_argument("-o", "--out", default=DEFAULT_OUT, help="结果文件")
+    parser.add_argument("--baseline", help="与该结果文件比较")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="中位数允许偏离基线的比例")
+    opts = parser.parse_args()
+
+    names = [n for n in CASES if not opts.filter or re.search(opts.filter, n)]
+    if opts.list:
+        for name in names:
+            print(f"{name:<45} {CASES[name][0]}")
+        return
+    logging.basicConfig(level=logging.ERROR)  # 被测代码的 info 日志会干扰计时与输出
+
+    ctx = Context(opts.corpus_dir)
+    results: Dict[str, Dict] = {}
+    print(f"{'用例':<45}{'次/轮':>8}{'min':>11}{'median':>11}{'mean':>11}{'stdev':>10}")
+    for name in names:
+        description, setup = CASES[name]
+        try:
+            run, prepare = setup(ctx)
+            r = measure(run, prepare, opts.rounds, opts.min_time, opts.warmup)
+        except Exception as e:
+            # 缺少可选依赖（如 python-docx、opencc）的用例跳过，不影响其余用例；基线中有该用例时记为回退
+            results[name] = {"description": description, "error": repr(e)[:300]}
+            print(f"{name:<45} 跳过: {e!r}"[:160])
+            continue
+        results[name] = {"description": description, **r}
+        print(f"{name:<45}{r['number']:>8}{r['min_ms']:>11.3f}{r['median_ms']:>11.3f}{r['mean_ms']:>11.3f}"
+              f"{r['stdev_ms']:>10.3f}")
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    status = 0
+    if opts.baseline:
+        baseline = json.loads(Path(opts.baseline).read_text(encoding="utf-8"))
+        diff = compare(results, baseline.get("results", {}), opts.tolerance)
+        report["baseline"] = {"file": opts.baseline, "commit": baseline.get("commit"), **diff}
+        print(f"\n相对基线（{baseline.get('commit')}，容差 ±{opts.tolerance:.0%}）：")
+        for line in diff["improvements"]:
+            print(f"  改进 {line}")
+        for line in diff["regressions"]:
+            print(f"  回退 {line}")
+        if not diff["improvements"] and not diff["regressions"]:
+            print("  无显著变化")
+        status = 1 if diff["regressions"] else 0
+
+    Path(opts.out).parent.mkdir(parents=True, exist_ok=True)
+    Path(opts.out).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\n结果已写入 {opts.out}")
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
@@ -14,22 +14,12 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent))
 
 from es_config import es
+from database.map_sections import MAP_MAPPING, annotate_map_doc
+from search.result_cache import bump_index_versions
 
 SOURCE_DIR = r"C:\Users\Administrator\Desktop\note、7feasts、dictionary、pano\map_note"
 INDEX_NAME = "map_note"
 
-MAP_MAPPING = {
-    "mappings": {
-        "properties": {
-            "id": {"type": "keyword"},
-            "text": {"type": "text"},
-            "msg": {"type": "nested"},
-            "sn": {"type": "keyword"},
-            "source": {"type": "keyword"},
-        }
-    }
-}
-
 
 def main():
     print("=" * 60)
@@ -74,6 +64,8 @@ def main():
             if not idx:
                 continue
             body = {k: v for k, v in item.items() if k != "index"}
+            # 预计算 ot1~ot4 小节范围，供 AI 检索按 inner_hits 直接取小节
+            annotate_map_doc(body)
             try:
                 es.index(index=INDEX_NAME, id=idx, body=body)
                 total += 1
@@ -82,6 +74,7 @@ def main():
 
         print(f"    已处理: {jf.name}")
 
+    bump_index_versions([INDEX_NAME])
     print(f"\n  ✓ 共导入 {total} 条文档")
     print("\n" + "=" * 60)
     print("  替换完成")
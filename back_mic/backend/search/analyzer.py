@@ -0,0 +1,143 @@
+"""
+分词服务（ES _analyze + 进程内 LRU）
+
+zh 字段使用 ik_max_word 分词。本模块通过 ES _analyze 取得 ik_max_word / ik_smart 的分词结果：
+
+- analyze_many：分析多条字符串，每条未缓存的字符串单独一次 _analyze（text 传数组时 ES 按上一条的 final offset 累加，
+  ik 丢弃末尾标点等未切分字符时 offset 会错位，无法可靠地归属回各条），已缓存的不再请求
+- 结果按 (分词器, 字符串) 缓存在进程内 LRU（ANALYZE_CACHE_SIZE 条），/api/fenci、get_matchs、
+  AI 检索的 _multi_index_search 共用，同一查询只分析一次
+- query_strategy：ik_smart 只切出一个词时按词项检索（term），否则按短语加权（phrase）；
+  standard 分词字段上的多字中文词同样需要 phrase
+- ES 不可用或未安装 ik 插件时回退为按空白切分，且不写入缓存；失败后 ANALYZE_RETRY 秒内不再请求
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Tuple
+
+from es_config import es
+
+logger = logging.getLogger("search.analyzer")
+
+ANALYZERS = ("ik_max_word", "ik_smart")
+DEFAULT_ANALYZER = "ik_max_word"
+ANALYZE_CACHE_SIZE = int(os.getenv("ANALYZE_CACHE_SIZE", "4096"))
+ANALYZE_TIMEOUT = 3
+# 分词请求失败后的静默期（秒），期间直接按空白切分，避免每次查询都等待超时
+ANALYZE_RETRY = 60
+# 单条超过此长度的字符串不缓存（长文本几乎不会重复出现）
+ANALYZE_CACHE_MAX_CHARS = 240
+
+_RE_CJK = re.compile(r"[\u4e00-\u9fff]")
+
+_cache: "OrderedDict[Tuple[str, str], List[str]]" = OrderedDict()
+_cache_lock = threading.Lock()
+_failed_at = 0.0
+
+
+def _split(text: str) -> List[str]:
+    return [w for w in text.split() if w]
+
+
+def _cache_get(key):
+    with _cache_lock:
+        value = _cache.get(key)
+        if value is not None:
+            _cache.move_to_end(key)
+        return value
+
+
+def _cache_put(key, value):
+    if len(key[1]) > ANALYZE_CACHE_MAX_CHARS:
+        return
+    with _cache_lock:
+        _cache[key] = value
+        _cache.move_to_end(key)
+        while len(_cache) > ANALYZE_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def _es_analyze(text: str, analyzer: str) -> List[str]:
+    res = es.indices.analyze(body={"analyzer": analyzer, "text": text}, request_timeout=ANALYZE_TIMEOUT)
+    return [tok["token"] for tok in res.get("tokens", [])]
+
+
+def analyze_many(texts: Iterable[str], analyzer: str = DEFAULT_ANALYZER) -> List[List[str]]:
+    """返回每条字符串的分词结果（顺序与 texts 一致）。"""
+    if analyzer not in ANALYZERS:
+        analyzer = DEFAULT_ANALYZER
+    texts = [(t or "").strip() for t in texts]
+    results: List = [None] * len(texts)
+    missing: Dict[str, List[int]] = {}
+    for i, t in enumerate(texts):
+        if not t:
+            results[i] = []
+            continue
+        cached = _cache_get((analyzer, t))
+        if cached is not None:
+            results[i] = cached
+        else:
+            missing.setdefault(t, []).append(i)
+
+    global _failed_at
+    if missing and _failed_at and time.time() - _failed_at < ANALYZE_RETRY:
+        for t, idxs in missing.items():
+            for i in idxs:
+                results[i] = _split(t)
+        return results
+
+    if missing:
+        todo = list(missing)
+        for n, t in enumerate(todo):
+            try:
+                tokens = _es_analyze(t, analyzer)
+            except Exception as e:
+                _failed_at = time.time()
+                logger.warning("ES 分词失败，%d 秒内按空白切分: %r", ANALYZE_RETRY, e)
+                # 本批剩余的字符串同样按空白切分，不再逐条等待超时
+                for rest in todo[n:]:
+                    for i in missing[rest]:
+                        results[i] = _split(rest)
+                break
+            _cache_put((analyzer, t), tokens)
+            for i in missing[t]:
+                results[i] = tokens
+    return results
+
+
+def analyze(text: str, analyzer: str = DEFAULT_ANALYZER) -> List[str]:
+    return analyze_many([text], analyzer)[0]
+
+
+def query_strategy(query: str, standard_field: bool = False) -> str:
+    """
+    ik_smart 只切出一个词：term（match 即可）；多个词：phrase（另加短语匹配，避免散落的命中排在前面）。
+    standard_field=True 表示目标字段用 standard 分词（中文按单字切分），此时多字中文词也需要 phrase 保证字序相邻。
+    """
+    tokens = analyze(query, "ik_smart")
+    if len(tokens) > 1:
+        return "phrase"
+    if standard_field and tokens and len(tokens[0]) > 1 and _RE_CJK.search(tokens[0]):
+        return "phrase"
+    return "term"
+
+
+def fenci(keywords: str, mode: str = "", analyzer: str = "") -> List[str]:
+    """
+    /api/fenci：关键词的分词结果（去重，按长度降序，便于前端先替换长词再替换短词）。
+    全文模式（mode 为 c / text）按空白切分，与 match_phrase 的检索方式一致；其余按 analyzer（默认 ik_max_word）。
+    """
+    words = _split(keywords or "")
+    if not words:
+        return []
+    if mode in ("c", "text"):
+        tokens = words
+    else:
+        # 丢弃多字关键词切出的单字（如「的」），避免满屏高亮
+        analyzed = analyze_many(words, analyzer or DEFAULT_ANALYZER)
+        tokens = [tok for w, toks in zip(words, analyzed) for tok in toks if len(tok) > 1 or len(w) == 1]
+    return sorted(set(tokens), key=lambda w: (-len(w), w))
@@ -2,7 +2,8 @@ import re
 
 
 def _get_highlight_text(item, preferred_field):
-    """从 highlight 中取高亮片段，优先 preferred_field，否则用 zh/text/en/title 中第一个存在的"""
+    """从 highlight 中取高亮片段，优先 preferred_field，否则用 zh/text/en/title 中第一个存在的
+    （查询只请求 preferred_field 的高亮；命中 title 等其它字段时这里为空）"""
     hl = item.get("highlight") or {}
     for key in (preferred_field, "zh", "text", "en", "title"):
         if key in hl and hl[key]:
@@ -21,7 +22,7 @@ def clear_bib(item, field):
 
     return {
         "id": _id,
-        "up": highlight or (zh if field == "en" else en),
+        "up": highlight or (en if field == "en" else zh),
         "down": zh if field == "en" else en,
         "title": title,
         "tags": tags,
@@ -16,7 +16,9 @@ args 正确格式（5 段，用 "-" 连接）：
   若 args 为空、不是 5 段、或某段非法，则使用默认 "a-a-a-1-10"。
 """
 import re
+from functools import lru_cache
 from response.excptions import ERR_403
+from search.analyzer import query_strategy
 
 DEFAULT_ARGS = "a-a-a-1-10"
 
@@ -105,6 +107,18 @@ def get_index(cat1, cat2):
     return index
 
 
+# 导入时预计算全部 (cat1, cat2) 组合对应的索引列表，请求时直接查表
+INDEX_TABLE = {
+    (cat1, cat2): tuple(get_index(cat1, cat2))
+    for cat1 in sorted(VALID_CAT1)
+    for cat2 in sorted(VALID_CAT2)
+}
+
+
+def lookup_index(cat1, cat2):
+    return list(INDEX_TABLE.get((cat1, cat2), ()))
+
+
 def get_match_info(cat3, input):
     # 与前端约定：a=模糊(or), b=平衡(and), c=全文(text)
     operator = "or"
@@ -136,7 +150,7 @@ def _escape_wildcard(s):
 def get_matchs(field, operator, input):
     """
     构建 ES 查询条件：同时查 zh、text、title，任一匹配即可。
-    - zh/text/en 用 match；title 为 keyword 用 wildcard 支持包含匹配。
+    - zh/text/en 用 match；zh/en 多词查询另加 match_phrase 加权；title 为 keyword 用 wildcard 支持包含匹配。
     """
     q = (input or "").strip()
     should = []
@@ -150,6 +164,9 @@ def get_matchs(field, operator, input):
             should.append({"match": {"text": {"query": q, "operator": "or"}}})
     else:
         should.append({"match": {field: {"query": q, "operator": operator}}})
+        # 多词查询另加短语匹配加权，词序一致的结果排在前面（分词结果有缓存，见 search/analyzer.py）
+        if q and query_strategy(q, standard_field=field != "zh") == "phrase":
+            should.append({"match_phrase": {field: {"query": q, "boost": 2}}})
 
     # 全文 text 字段（与主字段不同时也查，operator 与主字段一致，平衡时才能真 and）
     if field != "text":
@@ -163,6 +180,7 @@ def get_matchs(field, operator, input):
     return should
 
 
+@lru_cache(maxsize=1024)
 def parse_args(args):
     """
     解析 args 字符串，格式应为 "cat1-cat2-cat3-page-pageSize"（5 段）。
@@ -205,8 +223,20 @@ def get_info(args, input):
     input = input.strip()
     if len(input) > 240:
         input = input[:240]
-    cat1, cat2, cat3, cat4, cat5 = parse_args(args)
-    index = get_index(cat1, cat2)
-    field, operator = get_match_info(cat3, input)
+    index, field, operator, input, cat4, cat5 = get_query_info(args, input)
     matchs = get_matchs(field, operator, input)
     return index, matchs, field, cat4, cat5
+
+
+def get_query_info(args, input):
+    """
+    与 get_info 相同，但不构建查询条件，供 search_templates 以模板参数发送。
+    返回 (index, field, operator, input, page, pageSize)，input 已截断为 240 字。
+    """
+    input = input.strip()
+    if len(input) > 240:
+        input = input[:240]
+    cat1, cat2, cat3, cat4, cat5 = parse_args(args)
+    index = lookup_index(cat1, cat2)
+    field, operator = get_match_info(cat3, input)
+    return index, field, operator, input, cat4, cat5
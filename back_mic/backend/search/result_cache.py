@@ -0,0 +1,167 @@
+"""
+/api/search 与 /api/cws 的结果缓存（进程内 LRU + Redis）
+
+会议期间大量用户执行相同的查询、参数与页码，每次都打到 ES。本模块按「规范化输入 + 解析后的参数」缓存结果：
+
+- 第一级：进程内 LRU（最多 RESULT_CACHE_LRU_SIZE 条）
+- 第二级：Redis（search_cache:result:<hash>，TTL RESULT_CACHE_TTL 秒），多 worker 共享
+- 失效：Redis hash search_cache:index_versions 记录每个索引的版本号，缓存 key 包含本次查询涉及索引的版本；
+  /api/process、upopt.ins_data、datalist 清空索引及各导入脚本写入后调用 bump_index_versions，旧条目自然不再命中
+- 全局版本（字段 "*"）由 bump_all_versions 递增，用于重建索引等无法逐个列出索引的场景
+
+Redis 不可用时只使用进程内 LRU 与进程内版本号。
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Iterable, List, Optional
+
+from utils.metrics import instrument_redis
+
+logger = logging.getLogger("search.result_cache")
+
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE", "1") != "0"
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", "3600"))
+RESULT_CACHE_LRU_SIZE = int(os.getenv("RESULT_CACHE_LRU_SIZE", "512"))
+# 超过此大小（JSON 字节）的结果不写入 Redis（如 /api/cws 的 10000 条结果）
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(2 * 1024 * 1024)))
+
+KEY_VERSIONS = "search_cache:index_versions"
+KEY_RESULT_PREFIX = "search_cache:result:"
+GLOBAL_VERSION_FIELD = "*"
+
+_redis = None
+_redis_checked = False
+_redis_lock = threading.Lock()
+
+# key -> (过期时间戳, 结果)
+_lru: "OrderedDict[str, Any]" = OrderedDict()
+_lru_lock = threading.Lock()
+# Redis 不可用时的进程内版本号
+_local_versions = {}
+
+
+def _get_redis():
+    """惰性创建 Redis 客户端（decode_responses=True）；连接失败后不再重试。"""
+    global _redis, _redis_checked
+    if _redis_checked:
+        return _redis
+    with _redis_lock:
+        if not _redis_checked:
+            try:
+                import redis
+                client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+                client.ping()
+                _redis = instrument_redis(client)
+            except Exception as e:
+                logger.warning(f"Redis 未启用，搜索结果缓存仅使用进程内 LRU: {e}")
+                _redis = None
+            _redis_checked = True
+    return _redis
+
+
+def get_index_versions(indexes: Iterable[str]) -> List[str]:
+    """返回全局版本与各索引版本（顺序与 indexes 一致）。"""
+    fields = [GLOBAL_VERSION_FIELD] + list(indexes)
+    r = _get_redis()
+    if r is not None:
+        try:
+            return [v or "0" for v in r.hmget(KEY_VERSIONS, fields)]
+        except Exception as e:
+            logger.debug(f"读取索引版本失败: {e}")
+    return [str(_local_versions.get(f, 0)) for f in fields]
+
+
+def bump_index_versions(indexes: Iterable[str]) -> None:
+    """索引数据变更后调用：递增这些索引的版本号，使相关缓存失效。"""
+    names = sorted({i for i in indexes if i})
+    if not names:
+        return
+    for name in names:
+        _local_versions[name] = _local_versions.get(name, 0) + 1
+    r = _get_redis()
+    if r is not None:
+        try:
+            pipe = r.pipeline()
+            for name in names:
+                pipe.hincrby(KEY_VERSIONS, name, 1)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"递增索引版本失败: {e}")
+
+
+def bump_all_versions() -> None:
+    """使全部搜索结果缓存失效（重建 / 删除索引等）。"""
+    bump_index_versions([GLOBAL_VERSION_FIELD])
+
+
+def _lru_get(key: str) -> Optional[Any]:
+    with _lru_lock:
+        entry = _lru.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.time():
+            del _lru[key]
+            return None
+        _lru.move_to_end(key)
+        return entry[1]
+
+
+def _lru_put(key: str, value: Any) -> None:
+    with _lru_lock:
+        _lru[key] = (time.time() + RESULT_CACHE_TTL, value)
+        _lru.move_to_end(key)
+        while len(_lru) > RESULT_CACHE_LRU_SIZE:
+            _lru.popitem(last=False)
+
+
+def cached_result(namespace: str, parts: Iterable[Any], indexes: Iterable[str], compute: Callable[[], Any]) -> Any:
+    """
+    读取或计算并缓存结果。compute 抛出的异常不会被缓存，原样抛出。
+
+    :param namespace: 接口名（search / cws）
+    :param parts: 规范化后的输入与参数
+    :param indexes: 本次查询涉及的 ES 索引，用于版本失效
+    """
+    if not RESULT_CACHE_ENABLED:
+        return compute()
+    indexes = list(indexes)
+    raw_key = json.dumps(
+        [namespace, list(parts), indexes, get_index_versions(indexes)],
+        ensure_ascii=False,
+        default=str,
+    )
+    key = KEY_RESULT_PREFIX + hashlib.sha1(raw_key.encode()).hexdigest()
+
+    value = _lru_get(key)
+    if value is not None:
+        return value
+
+    r = _get_redis()
+    if r is not None:
+        try:
+            raw = r.get(key)
+            if raw:
+                value = json.loads(raw)
+                _lru_put(key, value)
+                return value
+        except Exception as e:
+            logger.debug(f"读取结果缓存失败: {e}")
+
+    value = compute()
+    _lru_put(key, value)
+    if r is not None:
+        try:
+            payload = json.dumps(value, ensure_ascii=False)
+            if len(payload.encode()) <= RESULT_CACHE_MAX_BYTES:
+                r.setex(key, RESULT_CACHE_TTL, payload)
+        except Exception as e:
+            logger.debug(f"写入结果缓存失败: {e}")
+    return value
@@ -1,70 +1,136 @@
 import json
-from search.get_search_index import get_info, parse_args
+import logging
+import threading
+import time
+from search.get_search_index import get_matchs, get_query_info, parse_args
 from es_config import es
 from search.clear_data import clear_data
+from search.result_cache import cached_result
+from search.search_templates import ensure_templates, mark_missing, template_request
+from utils.request_log import diag, should_log_query
+
+logger = logging.getLogger("search")
+
+# clear_bib 只用到这些 _source 字段，其余字段不必从 ES 传回
+SOURCE_FIELDS = ["zh", "en", "tags", "source", "title"]
+
+# (索引, 字段) -> 该字段是否存了 term_vector=with_positions_offsets，可用 fvh 高亮
+_term_vector_cache = {}
+_term_vector_lock = threading.Lock()
 
 
 def get_page(page, pageSize):
     return (int(page) - 1) * int(pageSize)
 
 
-def search(input: str, args: str):
-    print("[search] ========== START ==========")
-    print("[search] 收到参数: input=%r, args=%r" % (input, args))
-    print("[search] args 原始值: %r" % (args,))
+def _has_term_vectors(index, field):
+    key = (index, field)
+    if key in _term_vector_cache:
+        return _term_vector_cache[key]
+    try:
+        mapping = es.indices.get_mapping(index=index)
+        props = next(iter(dict(mapping).values()))["mappings"].get("properties", {})
+        value = props.get(field, {}).get("term_vector") == "with_positions_offsets"
+    except Exception as e:
+        logger.debug("读取 %s 的 mapping 失败，按无 term_vector 处理: %r", index, e)
+        value = False
+    with _term_vector_lock:
+        _term_vector_cache[key] = value
+    return value
+
+
+def get_highlighter(indexes, field):
+    """所有索引的该字段都存了 term_vector 时用 fvh，否则用 unified。"""
+    if indexes and all(_has_term_vectors(i, field) for i in indexes):
+        return "fvh"
+    return "unified"
+
+
+def build_body(index, matchs, field, page, pageSize):
+    """/api/search 查询体：只取 clear_bib 需要的 _source，只高亮匹配字段。"""
+    return {
+        "size": pageSize,
+        "from": get_page(page, pageSize),
+        "_source": SOURCE_FIELDS,
+        "query": {
+            "bool": {
+                "should": matchs,
+                "minimum_should_match": 1,
+            }
+        },
+        "highlight": {
+            "type": get_highlighter(index, field),
+            "number_of_fragments": 0,
+            "fields": {field: {}},
+        },
+    }
 
+
+def _run_query(index, field, operator, q, page, pageSize):
+    """优先以存储模板查询（只发送参数），模板不可用时直接发送查询体。"""
+    highlighter = get_highlighter(index, field)
+    if ensure_templates(es):
+        req = template_request(field, operator, q, page, pageSize, highlighter)
+        # 完整查询参数只在调试请求或抽样命中时记录
+        if should_log_query():
+            logger.info("ES 模板查询: index=%s body=%s", index, json.dumps(req, ensure_ascii=False))
+        try:
+            return es.search_template(index=index, body=req, ignore_unavailable=True)
+        except Exception as e:
+            if "script" not in str(e).lower():
+                raise
+            # 模板丢失（集群重建等），下次请求重新注册，本次直接发送查询体
+            logger.warning("搜索模板不可用，改为直接发送查询体: %r", e)
+            mark_missing()
+
+    setting = build_body(index, get_matchs(field, operator, q), field, page, pageSize)
+    if should_log_query():
+        logger.info("ES 查询: index=%s body=%s", index, json.dumps(setting, ensure_ascii=False))
+    return es.search(index=index, body=setting, ignore_unavailable=True)
+
+
+def search(input: str, args: str):
+    start = time.time()
     try:
         parsed = parse_args(args)
-        print("[search] args 解析后: cat1=%r, cat2=%r, cat3=%r, page=%s, pageSize=%s" % parsed)
-
-        index, matchs, field, page, pageSize = get_info(args, input)
-        print("[search] 查询索引列表: %s" % (index,))
+        index, field, operator, q, page, pageSize = get_query_info(args, input)
+        diag(
+            logger,
+            "收到参数: input=%r, args=%r, 解析后 cat1=%r cat2=%r cat3=%r page=%s pageSize=%s, 索引=%s",
+            input, args, *parsed, index,
+        )
 
         if not index:
-            out = {"total": 0, "msg": []}
-            print("[search] 索引为空，返回: %s" % (out,))
-            print("[search] ========== END ==========")
-            return out
-
-        setting = {
-            "size": pageSize,
-            "from": get_page(page, pageSize),
-            "query": {
-                "bool": {
-                    "should": matchs,
-                    "minimum_should_match": 1,
-                }
-            },
-            "highlight": {
-                "number_of_fragments": 0,
-                "fields": {"zh": {}, "text": {}, "en": {}, "title": {}},
-            },
-        }
-
-        print("[search] 完整 ES 查询 JSON:")
-        print(json.dumps(setting, ensure_ascii=False, indent=2))
-
-        # 忽略不可用（红）索引，只从可用索引返回结果
-        res = es.search(index=index, body=setting, ignore_unavailable=True)
-        print("[search] ES 原始返回: hits.total=%s, hits 条数=%d" % (
-            res.get("hits", {}).get("total"),
-            len(res.get("hits", {}).get("hits", [])),
-        ))
-
-        data = clear_data(res, field)
-        # 保证 msg 为列表
-        if data.get("msg") is None:
-            data["msg"] = []
-        print("[search] 最终返回给前端: total=%s, msg 条数=%d" % (
+            diag(logger, "索引为空，返回空结果")
+            return {"total": 0, "msg": []}
+
+        def query():
+            # 忽略不可用（红）索引，只从可用索引返回结果
+            res = _run_query(index, field, operator, q, page, pageSize)
+            diag(
+                logger,
+                "ES 原始返回: hits.total=%s, hits 条数=%d",
+                res.get("hits", {}).get("total"),
+                len(res.get("hits", {}).get("hits", [])),
+            )
+
+            data = clear_data(res, field)
+            # 保证 msg 为列表
+            if data.get("msg") is None:
+                data["msg"] = []
+            return data
+
+        # 相同输入与参数的结果走缓存；相关索引导入新数据后自动失效
+        data = cached_result("search", (q,) + parsed, index, query)
+        diag(
+            logger,
+            "返回: total=%s, msg 条数=%d, 耗时%.0fms",
             data.get("total"),
             len(data.get("msg", [])),
-        ))
-        print("[search] ========== END ==========")
+            (time.time() - start) * 1000,
+        )
         return data
 
     except Exception as e:
-        print("[search] 查询异常: %r" % (e,))
-        out = {"total": 0, "msg": []}
-        print("[search] 返回空结果: %s" % (out,))
-        print("[search] ========== END ==========")
-        return out
+        logger.warning("查询异常，返回空结果: %r", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+        return {"total": 0, "msg": []}
@@ -1,5 +1,6 @@
 import re
 from es_config import es
+from search.result_cache import cached_result
 
 
 def get_words(text):
@@ -119,11 +120,12 @@ def search_map(input, fwds, index):
         "highlight": {"number_of_fragments": 0, "fields": {"text": {}}},
     }
 
-    sres = es.search(index=search_index, body=setting)
+    def query():
+        sres = es.search(index=search_index, body=setting)
+        return get_data(index, sres)
 
-    res = get_data(index, sres)
-
-    return res
+    # 按分词后的关键词缓存；索引导入新数据后自动失效
+    return cached_result("cws", (input, fwds, index), [search_index], query)
 
 
 def search_cwws(input, fwds, index):
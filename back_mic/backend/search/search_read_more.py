@@ -0,0 +1,139 @@
+"""
+/api/read_more：按段号分页读取命中段落前后的上下文
+
+段落 id 形如 cwwl_1_1-4（message 前缀 cwwl_1_1- + 段号 4，与 parse_doc_id 一致），ES 文档 _id 即该 id。
+因此一个窗口只需按段号拼出 id 做一次 mget，只取回几 KB，而不必拉取整本书：
+
+- book_id 为段落 id（带段号）：返回该段前后各 READ_MORE_WINDOW 段
+- book_id 为 message 前缀（以 "-" 结尾）：从第一段开始分页
+- 显式传 start / size 时按段号分页，返回的 range.prev / range.next 即上一页 / 下一页的 start
+- type 为 title / bookname 时只列出该前缀下的标题类段落（小节标题目录）
+
+关键词按 /api/fenci 相同的分词结果（search/analyzer.py，有缓存）在服务端高亮（<em>），返回格式与前端 Content.vue 约定一致：
+{"msg": {"zh": [{"type", "text"}], "en": [...]}, "fenci": [...], "range": {...}}
+"""
+import os
+import re
+
+from es_config import es
+from database.section_docs import HEADING_TYPES, parse_doc_id
+from search.analyzer import fenci as get_fenci
+from search.get_search_index import cats, indies
+
+READ_MORE_WINDOW = int(os.getenv("READ_MORE_WINDOW", "10"))
+READ_MORE_MAX_SIZE = 200
+# type=title / bookname 时列出的段落类型（与阅读页 ShowRes.vue 的标题过滤一致）
+TITLE_TYPES = sorted(HEADING_TYPES | {"ot1", "bible_reading", "b_read", "title", "bookname"})
+TITLE_LIST_LIMIT = 1000
+
+SOURCE_FIELDS = ["id", "type", "zh", "en"]
+# 允许读取的源索引（与 /api/search 的分类一致）
+READABLE_INDEXES = frozenset([i for i in indies.values() if i] + [i for i in cats["a"] if len(i) > 1])
+
+
+def get_source_index(book_id):
+    """段落 id 的第一段即源索引名，如 cwwl_1_1-4 -> cwwl；不在可读索引内时返回空串。"""
+    index = (book_id or "").split("_", 1)[0]
+    return index if index in READABLE_INDEXES else ""
+
+
+def compile_fenci(fenci):
+    if not fenci:
+        return None
+    return re.compile("|".join(re.escape(w) for w in fenci), re.IGNORECASE)
+
+
+def highlight(text, pattern):
+    if not text or pattern is None:
+        return text or ""
+    return pattern.sub(lambda m: f"<em>{m.group(0)}</em>", text)
+
+
+def _as_text(value):
+    if isinstance(value, list):
+        return "".join(str(v) for v in value)
+    return value or ""
+
+
+def _to_msg(docs, fenci):
+    pattern = compile_fenci(fenci)
+    msg = {"zh": [], "en": []}
+    for src in docs:
+        tp = src.get("type", "")
+        msg["zh"].append({"type": tp, "text": highlight(_as_text(src.get("zh")), pattern)})
+        msg["en"].append({"type": tp, "text": highlight(_as_text(src.get("en")), pattern)})
+    return msg
+
+
+def _mget_segments(index, prefix, first, last):
+    """取段号 first~last（含）的段落，返回 {段号: _source}。"""
+    ids = [f"{prefix}{i}" for i in range(max(first, 0), last + 1)]
+    if not ids:
+        return {}
+    res = es.mget(index=index, body={"ids": ids}, _source_includes=SOURCE_FIELDS)
+    found = {}
+    for doc in res.get("docs", []):
+        if doc.get("found"):
+            _, seg = parse_doc_id(doc["_id"])
+            found[seg] = doc.get("_source") or {}
+    return found
+
+
+def read_window(index, prefix, start, size):
+    """按段号读取 [start, start + size) 的段落；多取首尾各一段以判断是否还有上一页 / 下一页。"""
+    found = _mget_segments(index, prefix, start - 1, start + size)
+    end = start + size
+    docs = [found[s] for s in sorted(found) if start <= s < end]
+    return docs, {
+        "start": start,
+        "end": end - 1,
+        "prev": max(start - size, 0) if any(s < start for s in found) else None,
+        "next": end if end in found else None,
+    }
+
+
+def read_titles(index, prefix):
+    """列出前缀下的标题类段落，按段号排序。"""
+    res = es.search(
+        index=index,
+        body={
+            "size": TITLE_LIST_LIMIT,
+            "_source": SOURCE_FIELDS,
+            "query": {
+                "bool": {
+                    "filter": [
+                        {"prefix": {"id": prefix}},
+                        {"terms": {"type": TITLE_TYPES}},
+                    ]
+                }
+            },
+        },
+    )
+    docs = [h.get("_source") or {} for h in res.get("hits", {}).get("hits", [])]
+    docs.sort(key=lambda src: tuple(int(n) for n in re.findall(r"\d+", str(src.get("id", "")))))
+    return docs
+
+
+def read_more(book_id, tp="all", keywords="", mode="", start=None, size=None):
+    book_id = (book_id or "").strip()
+    index = get_source_index(book_id)
+    fenci = get_fenci(keywords, mode)
+    if not index:
+        return {"msg": {"zh": [], "en": []}, "fenci": fenci, "range": None}
+
+    size = max(1, min(int(size or 2 * READ_MORE_WINDOW + 1), READ_MORE_MAX_SIZE))
+    prefix, seg = parse_doc_id(book_id)
+
+    if tp in ("title", "bookname") or not prefix:
+        # 标题目录；不带段号的 id（如书名）按前缀列出其下的标题
+        docs = read_titles(index, prefix or book_id)
+        page_range = None
+    else:
+        if start is None:
+            if book_id.endswith("-"):
+                start = 0
+            else:
+                start = max(seg - READ_MORE_WINDOW, 0)
+        docs, page_range = read_window(index, prefix, max(int(start), 0), size)
+
+    return {"msg": _to_msg(docs, fenci), "fenci": fenci, "range": page_range}
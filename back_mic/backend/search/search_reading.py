@@ -1,5 +1,21 @@
+import hashlib
+import os
 import re
+import threading
+from collections import OrderedDict
+
 from es_config import es
+from search.result_cache import get_index_versions
+from utils.json_response import dumps
+
+READING_INDEX = "pan_reading"
+# 进程内缓存已序列化的文档（按总字节数淘汰最久未用的）
+READING_CACHE_BYTES = int(os.getenv("READING_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+# refid -> (索引版本, ETag, JSON 字节)
+_reading_cache: "OrderedDict[str, tuple]" = OrderedDict()
+_reading_cache_size = 0
+_reading_lock = threading.Lock()
 
 
 def get_words(text):
@@ -101,6 +117,68 @@ def get_data(index, sres):
 
 def search_reading(refid):
 
-    sres = es.get(index="pan_reading", id=refid)
+    sres = es.get(index=READING_INDEX, id=refid)
 
     return sres
+
+
+def _make_etag(version, sres, body):
+    """
+    强 ETag：优先用 _primary_term/_seq_no（文档每次写入都会变化），否则用内容哈希。
+    加上索引版本，避免删除重建索引后 _seq_no 从头计数而与旧文档撞号。
+    """
+    prefix = ".".join(version)
+    if sres.get("_seq_no") is not None and sres.get("_primary_term") is not None:
+        return f'"{prefix}-{sres["_primary_term"]}-{sres["_seq_no"]}"'
+    return f'"{prefix}-{hashlib.sha1(body).hexdigest()}"'
+
+
+def _cache_put(refid, entry):
+    global _reading_cache_size
+    size = len(entry[2])
+    if size > READING_CACHE_BYTES:
+        return
+    with _reading_lock:
+        old = _reading_cache.pop(refid, None)
+        if old is not None:
+            _reading_cache_size -= len(old[2])
+        _reading_cache[refid] = entry
+        _reading_cache_size += size
+        while _reading_cache_size > READING_CACHE_BYTES:
+            _, evicted = _reading_cache.popitem(last=False)
+            _reading_cache_size -= len(evicted[2])
+
+
+def get_reading(refid):
+    """
+    返回 (etag, JSON 字节)，内容与 search_reading 的返回一致。
+    缓存以 pan_reading 的索引版本校验：重新导入（bump_index_versions）后自动重新读取。
+    """
+    version = get_index_versions([READING_INDEX])
+    with _reading_lock:
+        entry = _reading_cache.get(refid)
+        if entry is not None and entry[0] == version:
+            _reading_cache.move_to_end(refid)
+            return entry[1], entry[2]
+
+    sres = dict(search_reading(refid))
+    body = dumps(sres)
+    etag = _make_etag(version, sres, body)
+    _cache_put(refid, (version, etag, body))
+    return etag, body
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match 弱比较（忽略 W/ 前缀，压缩中间件会把 ETag 改为弱 ETag）。"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == bare:
+            return True
+    return False
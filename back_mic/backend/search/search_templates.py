@@ -0,0 +1,120 @@
+"""
+/api/search 的 ES 存储搜索模板（mustache）
+
+get_matchs 的三种查询形态各注册为一个存储模板，请求时只发送模板 id 与参数，
+ES 端缓存已解析的模板：
+
+- phrase：全文（text）模式，每个关键词一个 match_phrase，均需匹配
+- text：全文模式但无关键词时的 match text 兜底
+- field：zh / en 主字段 match（多词查询另加 match_phrase 加权），另查 text 字段，operator 一致
+
+三种形态都附带 title 包含匹配（wildcard，输入非空时）；_source 与高亮设置与 search.build_body 一致。
+模板在首次使用时注册（put_script 幂等）；注册失败时 search 回退为直接发送查询体，
+SEARCH_TEMPLATE_RETRY 秒后再次尝试注册。SEARCH_TEMPLATES=0 关闭模板。
+"""
+import logging
+import os
+import threading
+import time
+
+from search.analyzer import query_strategy
+from search.get_search_index import _escape_wildcard, get_kws
+
+logger = logging.getLogger("search.templates")
+
+SEARCH_TEMPLATES_ENABLED = os.getenv("SEARCH_TEMPLATES", "1") != "0"
+SEARCH_TEMPLATE_RETRY = int(os.getenv("SEARCH_TEMPLATE_RETRY", "60"))
+# 模板内容有变动时递增版本，避免与旧版本模板混用
+TEMPLATE_VERSION = 2
+TEMPLATE_PREFIX = f"copypan_search_v{TEMPLATE_VERSION}_"
+
+_HEAD = (
+    '{"size": {{size}}, "from": {{from}}, '
+    '"_source": ["zh", "en", "tags", "source", "title"], '
+    '"query": {"bool": {"minimum_should_match": 1, "should": ['
+)
+_TITLE = '{{#title}}, {"wildcard": {"title": "{{title}}"}}{{/title}}'
+_TAIL = (
+    "]}}, "
+    '"highlight": {"type": "{{highlighter}}", "number_of_fragments": 0, "fields": {"{{field}}": {}}}}'
+)
+
+TEMPLATES = {
+    "phrase": _HEAD
+    + '{"bool": {"must": [{{#kws}}{"match_phrase": {"text": "{{kw}}"}}{{^last}}, {{/last}}{{/kws}}]}}'
+    + _TITLE
+    + _TAIL,
+    "text": _HEAD + '{"match": {"text": {"query": "{{q}}", "operator": "or"}}}' + _TITLE + _TAIL,
+    "field": _HEAD
+    + '{"match": {"{{field}}": {"query": "{{q}}", "operator": "{{operator}}"}}}, '
+    + '{{#phrase}}{"match_phrase": {"{{field}}": {"query": "{{q}}", "boost": 2}}}, {{/phrase}}'
+    + '{"match": {"text": {"query": "{{q}}", "operator": "{{operator}}"}}}'
+    + _TITLE
+    + _TAIL,
+}
+
+_registered = False
+_failed_at = 0.0
+_lock = threading.Lock()
+
+
+def template_id(shape):
+    return TEMPLATE_PREFIX + shape
+
+
+def ensure_templates(es) -> bool:
+    """注册全部模板（每个进程一次）。返回模板是否可用。"""
+    global _registered, _failed_at
+    if not SEARCH_TEMPLATES_ENABLED:
+        return False
+    if _registered:
+        return True
+    if _failed_at and time.time() - _failed_at < SEARCH_TEMPLATE_RETRY:
+        return False
+    with _lock:
+        if _registered:
+            return True
+        try:
+            for shape, source in TEMPLATES.items():
+                es.put_script(
+                    id=template_id(shape),
+                    body={"script": {"lang": "mustache", "source": source}},
+                )
+            _registered = True
+            logger.info("已注册 %d 个搜索模板 (%s*)", len(TEMPLATES), TEMPLATE_PREFIX)
+        except Exception as e:
+            _failed_at = time.time()
+            logger.warning("注册搜索模板失败，改为直接发送查询体: %r", e)
+    return _registered
+
+
+def mark_missing() -> None:
+    """ES 报告模板不存在（如集群重建）时调用，下次请求重新注册。"""
+    global _registered
+    _registered = False
+
+
+def template_request(field, operator, q, page, pageSize, highlighter):
+    """返回 search_template 请求体 {"id", "params"}，对应 get_matchs(field, operator, q) 的查询。"""
+    params = {
+        "size": pageSize,
+        "from": (int(page) - 1) * int(pageSize),
+        "field": field,
+        "highlighter": highlighter,
+    }
+    if q:
+        params["title"] = "*" + _escape_wildcard(q) + "*"
+    if field == "text":
+        kws = get_kws(q)
+        if kws:
+            shape = "phrase"
+            params["kws"] = [{"kw": kw, "last": i == len(kws) - 1} for i, kw in enumerate(kws)]
+        else:
+            shape = "text"
+            params["q"] = q
+    else:
+        shape = "field"
+        params["q"] = q
+        params["operator"] = operator
+        params["phrase"] = bool(q) and query_strategy(q, standard_field=field != "zh") == "phrase"
+    return {"id": template_id(shape), "params": params}
@@ -0,0 +1,47 @@
+"""
+测试公共设置：把 back_mic/backend 加入 sys.path。
+
+用例不连接 ES / Redis / 外部 API，被测模块持有的客户端在各用例中替换为桩对象。
+未安装 elasticsearch 时以占位的 es_config 代替（其中的 es 同样由用例替换）。
+
+用法：在 back_mic/backend 目录下执行 python -m pytest -q tests
+"""
+import importlib
+import importlib.util
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+BACKEND = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND))
+
+try:
+    import es_config  # noqa: F401
+except ImportError:
+    _placeholder = types.ModuleType("es_config")
+    _placeholder.es = None
+    sys.modules["es_config"] = _placeholder
+
+
+_ai_modules = {}
+
+
+@pytest.fixture(scope="session")
+def ai_module():
+    """
+    按名称导入 ai_search 下的模块。ai_search/__init__ 导入 ai_router（依赖 fastapi），
+    未安装时按文件单独加载不依赖 Web 框架的模块（gemini_cache、context_packer 等）。
+    """
+    def load(name):
+        if name not in _ai_modules:
+            try:
+                _ai_modules[name] = importlib.import_module(f"ai_search.{name}")
+            except ImportError:
+                spec = importlib.util.spec_from_file_location(f"ai_search.{name}", BACKEND / "ai_search" / f"{name}.py")
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                _ai_modules[name] = module
+        return _ai_modules[name]
+    return load
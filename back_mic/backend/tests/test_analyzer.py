@@ -0,0 +1,82 @@
+"""search.analyzer：批量分词的归属、缓存与失败回退。"""
+import re
+
+import pytest
+
+import search.analyzer as analyzer
+
+_WORDS = ("经纶", "召会")
+_RE_PUNCT = re.compile(r"[？，。！、\s]")
+
+
+def _ik_tokens(text):
+    """近似 ik：词典词整体切出，其余汉字单字成词，标点不产出词条。"""
+    out = []
+    i = 0
+    while i < len(text):
+        word = next((w for w in _WORDS if text.startswith(w, i)), None)
+        if word:
+            out.append((word, i, i + len(word)))
+            i += len(word)
+            continue
+        if not _RE_PUNCT.match(text[i]):
+            out.append((text[i], i, i + 1))
+        i += 1
+    return out
+
+
+class FakeIkEs:
+    """
+    只实现 indices.analyze。text 传数组时按 ES 的方式累加 offset：下一条从上一条的 final offset + 1 开始，
+    而 ik 的 final offset 是最后一个词条的 end_offset（末尾标点不计入），与各条的真实长度不一致。
+    """
+
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+        self.indices = self
+
+    def analyze(self, body=None, **kwargs):
+        self.calls.append(body["text"])
+        if self.fail:
+            raise ConnectionError("es down")
+        texts = body["text"] if isinstance(body["text"], list) else [body["text"]]
+        tokens = []
+        base = 0
+        for text in texts:
+            toks = _ik_tokens(text)
+            for word, start, end in toks:
+                tokens.append({"token": word, "start_offset": base + start, "end_offset": base + end,
+                               "position": len(tokens)})
+            base += (toks[-1][2] if toks else 0) + 1
+        return {"tokens": tokens}
+
+
+@pytest.fixture
+def fake_es(monkeypatch):
+    es = FakeIkEs()
+    monkeypatch.setattr(analyzer, "es", es)
+    monkeypatch.setattr(analyzer, "_cache", type(analyzer._cache)())
+    monkeypatch.setattr(analyzer, "_failed_at", 0.0)
+    return es
+
+
+def test_batch_with_trailing_punctuation(fake_es):
+    assert analyzer.analyze_many(["神的经纶？", "召会"]) == [["神", "的", "经纶"], ["召会"]]
+
+
+def test_cached_strings_are_not_requested_again(fake_es):
+    analyzer.analyze_many(["神的经纶？", "召会"])
+    fake_es.calls.clear()
+    assert analyzer.analyze_many(["召会", "经纶", "召会"]) == [["召会"], ["经纶"], ["召会"]]
+    assert fake_es.calls == ["经纶"]
+
+
+def test_failure_falls_back_to_whitespace_split(fake_es):
+    fake_es.fail = True
+    assert analyzer.analyze_many(["神的 经纶", "召会"]) == [["神的", "经纶"], ["召会"]]
+    # 失败后静默期内不再请求，也不写入缓存
+    assert len(fake_es.calls) == 1
+    assert analyzer.analyze_many(["召会"]) == [["召会"]]
+    assert len(fake_es.calls) == 1
+    assert not analyzer._cache
@@ -0,0 +1,48 @@
+"""ai_search.context_packer.pack_context：按分数填充 token 预算。"""
+import pytest
+
+
+@pytest.fixture
+def packer(ai_module):
+    return ai_module("context_packer")
+
+
+def _item(ref, content, score):
+    return {"reference": ref, "content": content, "source_type": "生命读经", "score": score}
+
+
+def test_high_score_section_not_crowded_out_by_fragments(packer):
+    section = _item("整节", "神的经纶是要将祂自己分赐到人里面。" * 40, 10.0)
+    fragments = [_item(f"片段{i}", f"召会是基督的身体{i}", 1.0) for i in range(20)]
+    section_tokens = packer.estimate_tokens(section["content"])
+    budget = section_tokens + 100
+
+    packed, stats = packer.pack_context([section] + fragments, budget, max_item_tokens=budget, max_items=50)
+
+    assert packed[0]["reference"] == "整节"
+    assert packed[0]["content"] == section["content"]
+    assert 1 < stats["packed"] < 21
+    assert stats["tokens"] <= budget
+
+
+def test_keeps_retrieval_order_and_caps_items(packer):
+    items = [_item(f"第{i}条", f"第{i}条内容：神圣的分赐。" * (i + 1), 10.0 - i) for i in range(6)]
+    items.insert(2, _item("重复", items[0]["content"], 9.5))
+
+    packed, stats = packer.pack_context(items, token_budget=100000, max_item_tokens=5000, max_items=4)
+
+    assert [p["reference"] for p in packed] == ["第0条", "第1条", "第2条", "第3条"]
+    assert stats["deduped"] == 1
+    assert all(p["tokens"] == packer.estimate_tokens(p["content"]) for p in packed)
+
+
+def test_truncates_to_remaining_budget(packer):
+    first = _item("第一", "神" * 300, 5.0)
+    second = _item("第二", "人" * 400, 4.0)
+    budget = packer.estimate_tokens(first["content"]) + packer.MIN_TRUNCATED_TOKENS + 50
+
+    packed, stats = packer.pack_context([first, second], budget, max_item_tokens=10000, max_items=10)
+
+    assert [p["reference"] for p in packed] == ["第一", "第二"]
+    assert packed[1]["content"].endswith(packer.ELLIPSIS)
+    assert stats["truncated"] == 1 and stats["tokens"] <= budget
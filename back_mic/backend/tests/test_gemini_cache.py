@@ -0,0 +1,114 @@
+"""ai_search.gemini_cache：cached content 的创建、回退与失效。"""
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+INSTRUCTION = "术语表：经纶 economy；召会 church。"
+
+
+class StubTypes:
+    """google.genai.types 的替身：配置类型原样保存参数。"""
+
+    @staticmethod
+    def GenerateContentConfig(**kwargs):
+        return SimpleNamespace(**kwargs)
+
+    @staticmethod
+    def CreateCachedContentConfig(**kwargs):
+        return SimpleNamespace(**kwargs)
+
+
+class StubCaches:
+    def __init__(self, fail=False, gate=None):
+        self.created = []
+        self.fail = fail
+        self.gate = gate
+
+    def create(self, model=None, config=None):
+        # gate 只挂起 INSTRUCTION 的创建请求
+        if self.gate is not None and config.system_instruction == INSTRUCTION:
+            self.gate.wait(5)
+        if self.fail:
+            raise RuntimeError("400 INVALID_ARGUMENT. Cached content is too small. total_token_count=10")
+        self.created.append(config)
+        return SimpleNamespace(name=f"cachedContents/{len(self.created)}",
+                               usage_metadata=SimpleNamespace(total_token_count=4096))
+
+
+@pytest.fixture
+def gemini_cache(ai_module):
+    return ai_module("gemini_cache")
+
+
+def _make(gemini_cache, **kwargs):
+    caches = StubCaches(**kwargs)
+    written = []
+    cache = gemini_cache.GeminiInstructionCache(
+        SimpleNamespace(caches=caches), "gemini-test", StubTypes, on_create=written.append,
+    )
+    return cache, caches, written
+
+
+def test_config_for_uses_cached_content(gemini_cache):
+    cache, caches, written = _make(gemini_cache)
+    config, used = cache.config_for(INSTRUCTION)
+    assert used and config.cached_content == "cachedContents/1"
+    assert caches.created[0].system_instruction == INSTRUCTION
+    assert written == [4096]
+    # 有效期内复用，不再创建
+    assert cache.config_for(INSTRUCTION)[0].cached_content == "cachedContents/1"
+    assert len(caches.created) == 1
+
+
+def test_config_for_falls_back_when_create_fails(gemini_cache):
+    cache, caches, written = _make(gemini_cache, fail=True)
+    config, used = cache.config_for(INSTRUCTION)
+    assert not used and config.system_instruction == INSTRUCTION
+    # 退避期内不再请求创建
+    caches.fail = False
+    assert cache.config_for(INSTRUCTION)[1] is False
+    assert caches.created == [] and written == []
+
+
+def test_config_for_after_cache_error(gemini_cache):
+    cache, caches, _ = _make(gemini_cache)
+    cache.config_for(INSTRUCTION)
+    error = RuntimeError("404 NOT_FOUND. {'error': {'message': 'CachedContent not found (or permission denied)'}}")
+    assert gemini_cache.is_cache_error(error)
+    cache.invalidate(INSTRUCTION)
+    config, used = cache.config_for(INSTRUCTION)
+    assert used and config.cached_content == "cachedContents/2"
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("404 NOT_FOUND. CachedContent not found (or permission denied)", True),
+    ("403 PERMISSION_DENIED. Permission denied on resource cachedContents/abc", True),
+    ("400 INVALID_ARGUMENT. Cache content abc is expired.", True),
+    ("404 NOT_FOUND. models/gemini-9 is not found for API version v1beta", False),
+    ("403 PERMISSION_DENIED. API key not valid.", False),
+    ("429 RESOURCE_EXHAUSTED. Quota exceeded.", False),
+])
+def test_is_cache_error(gemini_cache, message, expected):
+    assert gemini_cache.is_cache_error(RuntimeError(message)) is expected
+
+
+def test_create_in_progress_does_not_block_other_callers(gemini_cache):
+    gate = threading.Event()
+    cache, caches, _ = _make(gemini_cache, gate=gate)
+    creator = threading.Thread(target=cache.get_name, args=(INSTRUCTION,))
+    creator.start()
+    try:
+        # 创建请求挂起期间：同一 instruction 直接回退，其他 instruction 照常创建，不被锁阻塞
+        for _ in range(100):
+            if cache._creating:
+                break
+            threading.Event().wait(0.01)
+        assert cache.config_for(INSTRUCTION)[1] is False
+        assert cache.get_name("另一份术语表") == "cachedContents/1"
+        assert creator.is_alive()
+    finally:
+        gate.set()
+        creator.join(5)
+    assert cache.config_for(INSTRUCTION)[0].cached_content == "cachedContents/2"
+    assert len(caches.created) == 2
@@ -0,0 +1,178 @@
+"""
+prompt cache：Claude 的 cache_control system 块、Gemini 缓存失效后的回退，以及 record_prompt_cache 的统计。
+
+ai_service 依赖 fastapi / anthropic / elasticsearch 等，未安装时相关用例跳过；Claude / Gemini 客户端均为桩对象。
+"""
+from collections import defaultdict
+from types import SimpleNamespace
+
+import pytest
+
+INSTRUCTION = "术语表：经纶 economy；召会 church。"
+
+
+class FakeRedis:
+    """只实现 record_prompt_cache 用到的 pipeline().hincrby / expire / execute。"""
+
+    def __init__(self):
+        self.hashes = defaultdict(dict)
+        self.expires = {}
+
+    def pipeline(self):
+        return _FakePipeline(self)
+
+
+class _FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    def hincrby(self, key, field, amount=1):
+        self.ops.append(("hincrby", key, field, amount))
+        return self
+
+    def expire(self, key, seconds):
+        self.ops.append(("expire", key, seconds))
+        return self
+
+    def execute(self):
+        for op in self.ops:
+            if op[0] == "hincrby":
+                h = self.redis.hashes[op[1]]
+                h[op[2]] = int(h.get(op[2], 0)) + op[3]
+            else:
+                self.redis.expires[op[1]] = op[2]
+        self.ops = []
+
+
+class StubTypes:
+    @staticmethod
+    def GenerateContentConfig(**kwargs):
+        return SimpleNamespace(**kwargs)
+
+    @staticmethod
+    def CreateCachedContentConfig(**kwargs):
+        return SimpleNamespace(**kwargs)
+
+
+class StubClaude:
+    """anthropic.Anthropic 的替身：记录 messages.create 的参数，usage 中带缓存读写 token。"""
+
+    def __init__(self, cache_read=0, cache_write=0):
+        self.requests = []
+        self.messages = self
+        self.usage = SimpleNamespace(input_tokens=200, output_tokens=50,
+                                     cache_read_input_tokens=cache_read, cache_creation_input_tokens=cache_write)
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        return SimpleNamespace(content=[SimpleNamespace(text="壹 神的经纶")], usage=self.usage)
+
+
+class StubGeminiModels:
+    """generate_content：带 cached_content 的请求按 error 抛错，否则返回译文。"""
+
+    def __init__(self, error=None, cached_tokens=0):
+        self.configs = []
+        self.error = error
+        self.cached_tokens = cached_tokens
+
+    def generate_content(self, model=None, contents=None, config=None):
+        self.configs.append(config)
+        if self.error and getattr(config, "cached_content", None):
+            raise RuntimeError(self.error)
+        return SimpleNamespace(text="译文", usage_metadata=SimpleNamespace(cached_content_token_count=self.cached_tokens))
+
+
+def test_record_prompt_cache_accounting(ai_module):
+    pytest.importorskip("dotenv")
+    monitoring = ai_module("monitoring")
+    redis = FakeRedis()
+    mon = monitoring.AIMonitoring(redis_client=redis)
+    mon.record_prompt_cache("claude", cache_read_tokens=900, cache_write_tokens=100)
+    mon.record_prompt_cache("claude", cache_read_tokens=900)
+    mon.record_prompt_cache("gemini", cache_write_tokens=4096)
+    # 无用量与未知提供方不记录
+    mon.record_prompt_cache("gemini")
+    mon.record_prompt_cache("openai", cache_read_tokens=5)
+
+    day_key = monitoring.KEY_DAILY_PREFIX + mon._today_str()
+    assert set(redis.hashes) == {monitoring.KEY_STATS, day_key}
+    for key in (monitoring.KEY_STATS, day_key):
+        assert mon._prompt_cache_stats(redis.hashes[key]) == {
+            "claude": {"read_tokens": 1800, "write_tokens": 100},
+            "gemini": {"read_tokens": 0, "write_tokens": 4096},
+        }
+    assert redis.expires[day_key] == monitoring.DAILY_TTL_SECONDS
+
+
+@pytest.fixture
+def svc(monkeypatch):
+    """导入 ai_service 并把 get_monitoring 换成记录 record_prompt_cache 调用的桩，返回 (模块, 记录列表)。"""
+    module = pytest.importorskip("ai_search.ai_service")
+    recorded = []
+    monitor = SimpleNamespace(record_prompt_cache=lambda *args, **kwargs: recorded.append((args, kwargs)))
+    monkeypatch.setattr(module, "get_monitoring", lambda redis_client=None: monitor)
+    return module, recorded
+
+
+def _service(module, **attrs):
+    service = module.AISearchService.__new__(module.AISearchService)
+    service.redis = None
+    for name, value in attrs.items():
+        setattr(service, name, value)
+    return service
+
+
+def test_claude_system_prompt_sent_as_cache_control_block(svc):
+    module, recorded = svc
+    claude = StubClaude(cache_read=3000)
+    service = _service(module, claude=claude)
+    result = service._generate_answer("神的经纶", [{"reference": "（以弗所书1:10）", "content": "神永远的经纶", "source_type": "圣经"}])
+
+    assert claude.requests[0]["system"] == [
+        {"type": "text", "text": module.OUTLINE_SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}},
+    ]
+    # input 统计包含缓存读取部分
+    assert result["tokens"]["input"] == 3200 and result["tokens"]["cache_read"] == 3000
+    assert recorded == [(("claude",), {"cache_read_tokens": 3000, "cache_write_tokens": 0})]
+
+
+def _install_gemini(module, monkeypatch, models):
+    client = SimpleNamespace(
+        models=models,
+        caches=SimpleNamespace(create=lambda model=None, config=None: SimpleNamespace(name="cachedContents/1")),
+    )
+    cache = module.GeminiInstructionCache(client, "gemini-test", StubTypes)
+    monkeypatch.setattr(module, "gemini_client", client)
+    monkeypatch.setattr(module, "types", StubTypes, raising=False)
+    monkeypatch.setattr(module, "gemini_instruction_cache", cache)
+    return cache
+
+
+def test_gemini_generate_records_cached_tokens(svc, monkeypatch):
+    module, recorded = svc
+    models = StubGeminiModels(cached_tokens=4096)
+    _install_gemini(module, monkeypatch, models)
+    assert _service(module)._gemini_generate("原文", INSTRUCTION).text == "译文"
+    assert models.configs[0].cached_content == "cachedContents/1"
+    assert recorded == [(("gemini",), {"cache_read_tokens": 4096})]
+
+
+def test_gemini_generate_falls_back_after_cache_error(svc, monkeypatch):
+    module, _ = svc
+    models = StubGeminiModels(error="404 NOT_FOUND. CachedContent not found (or permission denied)")
+    cache = _install_gemini(module, monkeypatch, models)
+    assert _service(module)._gemini_generate("原文", INSTRUCTION).text == "译文"
+    assert [getattr(c, "cached_content", None) for c in models.configs] == ["cachedContents/1", None]
+    assert models.configs[1].system_instruction == INSTRUCTION
+    assert cache._entries == {}
+
+
+def test_gemini_generate_raises_other_errors(svc, monkeypatch):
+    module, _ = svc
+    models = StubGeminiModels(error="429 RESOURCE_EXHAUSTED. Quota exceeded.")
+    _install_gemini(module, monkeypatch, models)
+    with pytest.raises(RuntimeError, match="RESOURCE_EXHAUSTED"):
+        _service(module)._gemini_generate("原文", INSTRUCTION)
+    assert len(models.configs) == 1
@@ -0,0 +1,141 @@
+"""
+本地追踪接收端（OTLP/HTTP JSON 的简易替身）与追踪文件查看
+
+- 接收：TRACE_EXPORT=otlp、TRACE_OTLP_ENDPOINT=http://localhost:4318/v1/traces 时，后端把慢请求追踪 POST 到这里；
+  每条追踪追加为 --out 文件中的一行 JSON（格式与 TRACE_EXPORT=file 相同），并在终端打印耗时最长的 span
+- 查看：--show 读取 traces.jsonl（TRACE_EXPORT=file 或本脚本写出的文件），按根 span 耗时倒序列出
+
+用法：在 back_mic/backend 目录下执行
+    python trace_collector.py --port 4318 --out logs/traces.jsonl
+    python trace_collector.py --show logs/traces.jsonl --top 20
+"""
+import argparse
+import json
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+
+def _attr_value(value):
+    for k in ("stringValue", "doubleValue", "boolValue"):
+        if k in value:
+            return value[k]
+    if "intValue" in value:
+        return int(value["intValue"])
+    return None
+
+
+def otlp_to_records(payload):
+    """把 OTLP resourceSpans 还原为按 trace 分组的记录（与 utils/tracing 的文件格式一致）。"""
+    traces = defaultdict(list)
+    for rs in payload.get("resourceSpans", []):
+        for ss in rs.get("scopeSpans", []):
+            for s in ss.get("spans", []):
+                traces[s["traceId"]].append(s)
+    records = []
+    for trace_id, spans in traces.items():
+        items = []
+        request_id = None
+        for s in spans:
+            attrs = {a["key"]: _attr_value(a["value"]) for a in s.get("attributes", [])}
+            start = int(s["startTimeUnixNano"]) / 1e9
+            end = int(s["endTimeUnixNano"]) / 1e9
+            if not s.get("parentSpanId"):
+                request_id = attrs.pop("request_id", None)
+            item = {
+                "span_id": s["spanId"],
+                "parent_id": s.get("parentSpanId"),
+                "name": s["name"],
+                "start": start,
+                "duration_ms": round((end - start) * 1000, 3),
+            }
+            if attrs:
+                item["attrs"] = attrs
+            if s.get("status", {}).get("code") == 2:
+                item["error"] = s["status"].get("message")
+            items.append(item)
+        root = next((i for i in items if not i["parent_id"]), items[0])
+        records.append({
+            "trace_id": trace_id,
+            "request_id": request_id,
+            "name": root["name"],
+            "duration_ms": root["duration_ms"],
+            "spans": items,
+        })
+    return records
+
+
+def summarize(record, top=5):
+    lines = [f"{record['duration_ms']:>10.1f}ms  {record['name']}  request_id={record.get('request_id')}"]
+    # 按 span 名称合计，便于看出时间花在哪类调用上
+    totals = defaultdict(lambda: [0, 0.0])
+    for s in record["spans"][1:]:
+        totals[s["name"]][0] += 1
+        totals[s["name"]][1] += s["duration_ms"]
+    for name, (n, ms) in sorted(totals.items(), key=lambda kv: -kv[1][1])[:top]:
+        lines.append(f"{'':>14}{ms:>10.1f}ms  x{n:<4} {name}")
+    return "\n".join(lines)
+
+
+def make_handler(out_path, top):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0) or 0)
+            try:
+                records = otlp_to_records(json.loads(self.rfile.read(length) or b"{}"))
+            except (ValueError, KeyError) as e:
+                self.send_response(400)
+                self.end_headers()
+                self.wfile.write(str(e).encode("utf-8"))
+                return
+            with out_path.open("a", encoding="utf-8") as f:
+                for r in records:
+                    f.write(json.dumps(r, ensure_ascii=False) + "\n")
+                    print(summarize(r, top), flush=True)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def show(path, top):
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    records.sort(key=lambda r: -r.get("duration_ms", 0))
+    for r in records[:top]:
+        print(summarize(r))
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=4318)
+    parser.add_argument("--out", default="logs/traces.jsonl")
+    parser.add_argument("--show", help="查看追踪文件而不启动接收端")
+    parser.add_argument("--top", type=int, default=10)
+    opts = parser.parse_args()
+
+    if opts.show:
+        show(opts.show, opts.top)
+        return
+    out_path = Path(opts.out)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    server = ThreadingHTTPServer(("127.0.0.1", opts.port), make_handler(out_path, 5))
+    print(f"接收 OTLP/HTTP JSON: http://127.0.0.1:{opts.port}/v1/traces -> {out_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
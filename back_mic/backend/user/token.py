@@ -35,9 +35,8 @@ def get_token_from_header_or_cookie(
 def set_token(username: str, password: str, remember: str):
     USER_DIR = Path(__file__).parent / "users.json"
     try:
-        logger.info(f"尝试登录: 用户名={username}, users.json路径={USER_DIR.absolute()}, 文件存在={USER_DIR.exists()}")
         USERS = json.loads(USER_DIR.read_text("utf-8"))
-        logger.debug(f"users.json 加载成功，用户列表: {list(USERS.keys())}")
+        logger.debug("users.json 加载成功，共 %d 个用户", len(USERS))
     except FileNotFoundError:
         logger.error(f"users.json 文件不存在: {USER_DIR.absolute()}")
         raise ERR_401
@@ -62,10 +61,10 @@ def set_token(username: str, password: str, remember: str):
                     "exp": int(exp_date.timestamp()),
                 }
             )
-            logger.info(f"登录成功: 用户名={username}, 角色={USERS[username]['role']}")
+            logger.info("登录成功: 用户名=%s, 角色=%s", username, USERS[username]["role"])
             return Token(access_token=token, token_type="Bearer")
         else:
-            logger.warning(f"登录失败: 用户名={username}, 用户存在={username in USERS}, 密码匹配={username in USERS and USERS[username]['pass'] == password if username in USERS else False}")
+            logger.warning("登录失败: 用户名=%s", username)
             raise ERR_401
     except ERR_401:
         raise
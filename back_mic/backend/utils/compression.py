@@ -0,0 +1,143 @@
+"""
+响应压缩中间件（brotli / gzip 协商）
+
+- 按请求头 Accept-Encoding 选择：安装了 brotli 且客户端接受 br 时用 br，否则接受 gzip 时用 gzip
+- 只压缩一次性返回、大小不低于 COMPRESS_MIN_SIZE 字节、类型为 JSON / 文本的响应；
+  已带 Content-Encoding 的响应与流式响应（SSE、文件下载）原样透传
+- COMPRESS_GZIP_LEVEL / COMPRESS_BROTLI_QUALITY 默认取偏快的等级，压缩耗时远小于传输节省；
+  大响应在线程池中压缩
+"""
+import gzip
+import os
+
+import anyio
+
+try:
+    import brotli
+except ImportError:  # 可选依赖，未安装时只用 gzip
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "1"))
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "4"))
+# 超过此大小的响应在线程池中压缩，避免阻塞事件循环
+COMPRESS_THREAD_SIZE = int(os.getenv("COMPRESS_THREAD_SIZE", str(256 * 1024)))
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "text/",
+)
+
+
+def _parse_accept_encoding(value: str) -> set:
+    """返回客户端接受（q > 0）的编码集合。"""
+    accepted = set()
+    for part in value.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 1.0
+        if q > 0:
+            accepted.add(name)
+    return accepted
+
+
+def choose_encoding(accept_encoding: str) -> str:
+    accepted = _parse_accept_encoding(accept_encoding or "")
+    if brotli is not None and ("br" in accepted or "*" in accepted):
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return ""
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESS_GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """ASGI 中间件：app.add_middleware(CompressionMiddleware)"""
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = ""
+        for key, value in scope.get("headers") or []:
+            if key == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept)
+        if not encoding:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            headers = list(start_message.get("headers") or [])
+            names = {k.lower(): v for k, v in headers}
+            content_type = names.get(b"content-type", b"").decode("latin-1").lower()
+            if (
+                message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or b"content-encoding" in names
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            ):
+                # 流式或不需压缩：原样发出（后续消息直接透传）
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            if len(body) >= COMPRESS_THREAD_SIZE:
+                compressed = await anyio.to_thread.run_sync(compress, body, encoding)
+            else:
+                compressed = compress(body, encoding)
+            headers = [(k, v) for k, v in headers if k.lower() not in (b"content-length", b"vary", b"etag")]
+            etag = names.get(b"etag")
+            if etag:
+                # 压缩后的字节与原 ETag 对应的表示不同，按惯例降为弱 ETag
+                headers.append((b"etag", etag if etag.startswith(b"W/") else b"W/" + etag))
+            vary = names.get(b"vary", b"")
+            if b"accept-encoding" not in vary.lower():
+                vary = vary + b", Accept-Encoding" if vary else b"Accept-Encoding"
+            headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+                (b"vary", vary),
+            ]
+            start_message["headers"] = headers
+            passthrough = True
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed, "more_body": False})
+
+        await self.app(scope, receive, send_wrapper)
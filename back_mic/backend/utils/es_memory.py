@@ -0,0 +1,1398 @@
+"""
+进程内的 Elasticsearch 替身（离线测试与基准）
+
+各模块都通过 es_config.es 访问 ES，没有装了 IK 插件的集群就无法运行。本模块在 elasticsearch-py 7.x 的连接层
+（transport.connection_pool 中各连接的 perform_request）接入可替换的后端：客户端的参数处理、序列化、异常，
+以及 /metrics、/api/es_stats 的包装照常生效，只是请求不再经过网络。
+
+- SearchBackend：后端接口 handle(method, path, params, body) -> (status, data)，
+  与 loadtest.stubs.synthetic_response、EsReplay 的 fallback 签名相同
+- MemoryBackend：内存实现，覆盖本代码库用到的接口：
+  search / search_template（存储的 mustache 模板）/ scroll（helpers.scan）/ count / msearch、
+  get / mget / index / bulk（helpers.bulk）/ delete_by_query、indices.exists / create / delete / refresh /
+  open / close / get_mapping / put_mapping / analyze、cat.indices、put_script 与 GET /（含 product check）；
+  查询支持 bool、match、match_phrase、term、terms、wildcard、prefix、ids、range、exists、match_all
+  与带 inner_hits 的 nested，另支持 highlight、_source 过滤、sort、from / size
+- load_dump_dir：读取 import_all_data.py 使用的备份目录（<目录>/<索引名>/*.json）
+- attach(client, backend)：把后端装到客户端的连接上（es_config 中 ES_BACKEND=memory 时自动完成）
+
+与真实集群的差异：
+- 分词按 standard 分词器近似（中文逐字、其余按字母数字连续段切分并转小写），ik_max_word / ik_smart 同样如此，
+  因此 search.analyzer.query_strategy 的结果与装了 IK 的集群可能不同
+- 打分为去掉 idf、以固定平均字段长度近似的 BM25，只保证相对顺序大致合理；match 的 fuzziness、match_phrase 的 slop 忽略
+- 高亮返回整个字段值（相当于 number_of_fragments=0），相邻词条分别加标签
+- 写入立即可见（相当于 refresh=true）；每次查询线性扫描目标索引，适合测试与基准规模的数据
+
+用法：在 back_mic/backend 目录下执行
+    ES_BACKEND=memory ES_MEMORY_DATA=/path/to/backup uvicorn main:app
+    python -m loadtest.run --es memory --es-data /path/to/backup -c 8 -d 60
+"""
+import fnmatch
+import json
+import logging
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import unquote
+
+logger = logging.getLogger("es_memory")
+
+ES_VERSION = "7.17.0"
+ES_HEADERS = {"content-type": "application/json", "x-elastic-product": "Elasticsearch"}
+MAX_RESULT_WINDOW = 10000
+DEFAULT_TRACK_TOTAL_HITS = 10000
+DEFAULT_INNER_HITS_SIZE = 3
+MAX_SCROLLS = 256  # 同时保留的 scroll 上下文数，超出时丢弃最早的
+ANALYZE_CACHE_SIZE = 1 << 18
+POSITION_INCREMENT_GAP = 100
+
+_SHARDS = {"total": 1, "successful": 1, "skipped": 0, "failed": 0}
+_EXACT_TYPES = frozenset({"keyword", "integer", "long", "short", "byte", "double", "float", "boolean", "date"})
+
+# BM25 的 k1 / b；没有全局统计，平均字段长度取固定值
+_K1 = 1.2
+_B = 0.75
+_AVG_FIELD_TERMS = 32.0
+
+
+# ---------- 连接层 ----------
+
+def connections(client) -> List[Any]:
+    pool = getattr(getattr(client, "transport", None), "connection_pool", None)
+    conns = getattr(pool, "connections", None)
+    if not conns:
+        raise RuntimeError(
+            "ES 替身只支持 elasticsearch-py 7.x 的连接层（transport.connection_pool），"
+            "请按 requirements.txt 安装 elasticsearch>=7.17,<8"
+        )
+    return list(conns)
+
+
+def decode_body(body: Any) -> Any:
+    """连接层拿到的是序列化后的 body：能解析为单个 JSON 的还原为对象，NDJSON（msearch / bulk）保留原文。"""
+    if body is None:
+        return None
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", "replace")
+    if isinstance(body, str):
+        try:
+            return json.loads(body)
+        except ValueError:
+            return body
+    return body
+
+
+def raise_for_status(status: int, data: Any, ignore) -> None:
+    """与连接层相同：非 2xx 且不在 ignore 中时抛出 elasticsearch.exceptions 中对应的异常。"""
+    if 200 <= status < 300 or status in (ignore or ()):
+        return
+    from elasticsearch.exceptions import HTTP_EXCEPTIONS, TransportError
+
+    error = data.get("error", data) if isinstance(data, dict) else data
+    if isinstance(error, dict):
+        error = error.get("type", error)
+    raise HTTP_EXCEPTIONS.get(status, TransportError)(status, error, data)
+
+
+class SearchBackend:
+    """ES REST 请求的处理者。path 为不含查询串的 URL 路径，params 为查询参数，body 为已解析的请求体。"""
+
+    def handle(self, method: str, path: str, params: Optional[Dict[str, Any]] = None,
+               body: Any = None) -> Tuple[int, Any]:
+        raise NotImplementedError
+
+
+def attach(client, backend: SearchBackend) -> None:
+    """把 backend 装到 elasticsearch-py 7.x 客户端的每个连接上。"""
+    def perform_request(method, url, params=None, body=None, timeout=None, ignore=(), headers=None):
+        status, data = backend.handle(method, url, params, decode_body(body))
+        raise_for_status(status, data, ignore)
+        raw = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)
+        return status, dict(ES_HEADERS), raw
+
+    for conn in connections(client):
+        conn.perform_request = perform_request
+
+
+# ---------- 分词 ----------
+
+_CJK = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+_RE_TOKEN = re.compile(rf"[{_CJK}]|[^\W_{_CJK}]+")
+_TERM_SEP = "\x1f"
+
+
+@lru_cache(maxsize=ANALYZE_CACHE_SIZE)
+def analyze(text: str) -> Tuple[Tuple[str, int, int], ...]:
+    """standard 分词器的近似：返回 (词条, 起, 止)，起止为 Python 字符下标。"""
+    return tuple((m.group().lower(), m.start(), m.end()) for m in _RE_TOKEN.finditer(text))
+
+
+@lru_cache(maxsize=ANALYZE_CACHE_SIZE)
+def _terms(text: str) -> Tuple[str, ...]:
+    return tuple(t for t, _, _ in analyze(text))
+
+
+@lru_cache(maxsize=ANALYZE_CACHE_SIZE)
+def _term_stats(text: str) -> Tuple[Counter, int]:
+    """(词频, 词条数)。"""
+    terms = _terms(text)
+    return Counter(terms), len(terms)
+
+
+@lru_cache(maxsize=ANALYZE_CACHE_SIZE)
+def _joined_terms(text: str) -> str:
+    """以分隔符连接的词条序列，match_phrase 以子串查找代替逐位置比较。"""
+    return _TERM_SEP + _TERM_SEP.join(_terms(text)) + _TERM_SEP
+
+
+def _utf16_offsets(text: str) -> Optional[List[int]]:
+    """字符下标 -> UTF-16 码元下标；全部在 BMP 内时返回 None（两者相同）。"""
+    if len(text.encode("utf-16-le")) == 2 * len(text):
+        return None
+    out = [0]
+    for ch in text:
+        out.append(out[-1] + (2 if ord(ch) > 0xFFFF else 1))
+    return out
+
+
+def _tf_score(tf: float, length: int) -> float:
+    return tf * (_K1 + 1) / (tf + _K1 * (1 - _B + _B * length / _AVG_FIELD_TERMS))
+
+
+# ---------- mustache（存储搜索模板） ----------
+
+_RE_MUSTACHE_TAG = re.compile(r"\{\{\{\s*([\w.]+)\s*\}\}\}|\{\{\s*([#^/&]?)\s*([\w.]+)\s*\}\}")
+
+
+def _parse_mustache(source: str) -> List[Any]:
+    root: List[Any] = []
+    stack = [(None, root)]
+    pos = 0
+    for m in _RE_MUSTACHE_TAG.finditer(source):
+        stack[-1][1].append(source[pos:m.start()])
+        pos = m.end()
+        triple, sigil, name = m.groups()
+        name = name or triple
+        if sigil in ("#", "^"):
+            children: List[Any] = []
+            stack[-1][1].append(("section", name, children, sigil == "^"))
+            stack.append((name, children))
+        elif sigil == "/":
+            if stack[-1][0] != name:
+                raise ValueError(f"Mismatched end tag [{name}]")
+            stack.pop()
+        else:
+            stack[-1][1].append(("var", name, not (triple or sigil == "&")))
+    if len(stack) != 1:
+        raise ValueError(f"Unclosed section [{stack[-1][0]}]")
+    stack[-1][1].append(source[pos:])
+    return root
+
+
+def _mustache_lookup(stack: List[Any], name: str) -> Any:
+    if name == ".":
+        return stack[-1]
+    first, *rest = name.split(".")
+    for ctx in reversed(stack):
+        if isinstance(ctx, dict) and first in ctx:
+            value = ctx[first]
+            break
+    else:
+        return None
+    for key in rest:
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+
+def _render_nodes(nodes: List[Any], stack: List[Any], out: List[str]) -> None:
+    for node in nodes:
+        if isinstance(node, str):
+            out.append(node)
+            continue
+        if node[0] == "var":
+            value = _mustache_lookup(stack, node[1])
+            if value is None:
+                continue
+            if isinstance(value, bool):
+                out.append("true" if value else "false")
+            elif isinstance(value, (int, float)):
+                out.append(str(value))
+            elif isinstance(value, str):
+                # ES 以 JSON 转义模板变量
+                out.append(json.dumps(value, ensure_ascii=False)[1:-1] if node[2] else value)
+            else:
+                out.append(json.dumps(value, ensure_ascii=False))
+            continue
+        _, name, children, inverted = node
+        value = _mustache_lookup(stack, name)
+        if inverted:
+            if not value:
+                _render_nodes(children, stack, out)
+        elif isinstance(value, list):
+            for item in value:
+                _render_nodes(children, stack + [item], out)
+        elif value:
+            _render_nodes(children, stack + [value] if isinstance(value, dict) else stack, out)
+
+
+def render_mustache(source: str, params: Optional[Dict[str, Any]]) -> str:
+    out: List[str] = []
+    _render_nodes(_parse_mustache(source), [params or {}], out)
+    return "".join(out)
+
+
+# ---------- 错误 ----------
+
+class _EsError(Exception):
+    def __init__(self, status: int, error_type: str, reason: str, **extra):
+        super().__init__(reason)
+        cause = {"type": error_type, "reason": reason, **extra}
+        self.status = status
+        self.body = {"error": {"root_cause": [cause], **cause}, "status": status}
+
+
+def _index_not_found(name: str) -> _EsError:
+    return _EsError(404, "index_not_found_exception", f"no such index [{name}]", index=name,
+                    **{"resource.type": "index_or_alias", "resource.id": name})
+
+
+def _bad_request(reason: str, error_type: str = "illegal_argument_exception") -> _EsError:
+    return _EsError(400, error_type, reason)
+
+
+# ---------- 查询求值 ----------
+
+def _as_list(value: Any) -> List[Any]:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _flag(value: Any) -> bool:
+    return value is True or str(value).lower() == "true"
+
+
+def _csv(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v) for v in value]
+    return [v for v in str(value).split(",") if v]
+
+
+def _values(obj: Any, path: str) -> List[Any]:
+    """按点号路径取字段值（途经列表时展开），返回非 None 的叶子值。"""
+    if "." not in path and isinstance(obj, dict):
+        v = obj.get(path)
+        if v is None:
+            return []
+        return [x for x in v if x is not None] if isinstance(v, list) else [v]
+    current = [obj]
+    for key in path.split("."):
+        nxt = []
+        for o in current:
+            for item in (o if isinstance(o, list) else (o,)):
+                if isinstance(item, dict) and key in item:
+                    nxt.append(item[key])
+        current = nxt
+    flat: List[Any] = []
+    for v in current:
+        if isinstance(v, list):
+            flat.extend(x for x in v if x is not None)
+        elif v is not None:
+            flat.append(v)
+    return flat
+
+
+def _nest(path: str, item: Any) -> Dict[str, Any]:
+    """把 nested 项放回其路径下，使内层查询可以继续按完整字段名（如 msg.text）取值。"""
+    for key in reversed(path.split(".")):
+        item = {key: item}
+    return item
+
+
+def _field_type(props: Dict[str, Any], path: str) -> Optional[str]:
+    spec: Dict[str, Any] = {"properties": props}
+    for key in path.split("."):
+        spec = (spec.get("properties") or {}).get(key)
+        if not isinstance(spec, dict):
+            return None
+    return spec.get("type")
+
+
+def _field_query(spec: Dict[str, Any], key: str) -> Tuple[str, Any, Dict[str, Any]]:
+    """{"字段": 值} 或 {"字段": {key: 值, ...选项}} -> (字段, 值, 选项)。"""
+    items = [(k, v) for k, v in spec.items() if k not in ("boost", "_name")]
+    if len(items) != 1:
+        raise _bad_request(f"query must target exactly one field: {json.dumps(spec, ensure_ascii=False)}",
+                           "parsing_exception")
+    field, value = items[0]
+    options = {k: v for k, v in spec.items() if k in ("boost", "_name")}
+    if isinstance(value, dict):
+        options.update(value)
+        value = options.pop(key, options.pop("value", None))
+    return field, value, options
+
+
+def _min_should(spec: Any, n: int, default: int) -> int:
+    if spec is None:
+        return default
+    text = str(spec).strip()
+    if text.endswith("%"):
+        pct = int(text[:-1])
+        need = int(n * abs(pct) / 100)
+        return need if pct >= 0 else n - need
+    need = int(text)
+    return need if need >= 0 else max(n + need, 0)
+
+
+@lru_cache(maxsize=1024)
+def _wildcard_regex(pattern: str) -> "re.Pattern":
+    out = []
+    i = 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == "\\" and i + 1 < len(pattern):
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        out.append(".*" if ch == "*" else "." if ch == "?" else re.escape(ch))
+        i += 1
+    return re.compile("".join(out), re.DOTALL)
+
+
+
+def _term_test(kind: str, value: Any) -> Callable[[str], bool]:
+    """term / terms / prefix / wildcard 对单个候选值（keyword 整值或 text 词条）的判定。"""
+    if kind == "terms":
+        wanted = {str(v) for v in _as_list(value)}
+        return wanted.__contains__
+    if kind == "prefix":
+        prefix = str(value)
+        return lambda c: c.startswith(prefix)
+    if kind == "wildcard":
+        regex = _wildcard_regex(str(value))
+        return lambda c: regex.fullmatch(c) is not None
+    exact = str(value)
+    return exact.__eq__
+
+
+def _phrase_positions(doc_terms: Tuple[str, ...], phrase: Tuple[str, ...]) -> List[int]:
+    n = len(phrase)
+    first = phrase[0]
+    return [i for i, t in enumerate(doc_terms) if t == first and doc_terms[i:i + n] == phrase]
+
+
+class _Env:
+    """对单个文档求值时的上下文：文档 id（ids 查询）与命中的 nested 项（inner_hits）。"""
+
+    __slots__ = ("doc_id", "inner")
+
+    def __init__(self, doc_id: str = ""):
+        self.doc_id = doc_id
+        self.inner: List[Tuple[str, int, float, Any]] = []
+
+
+# matcher(doc, env, collect)：文档匹配时返回得分，否则返回 None；collect 为 False 时不记录 inner_hits（must_not 中的条件）
+Matcher = Callable[[Any, _Env, bool], Optional[float]]
+
+
+def _never(doc, env, collect):
+    return None
+
+
+def compile_query(query: Any, props: Dict[str, Any]) -> Matcher:
+    """把查询编译为 matcher，字段类型取自索引 mapping 的 properties。每次查询对每个目标索引编译一次。"""
+    if not isinstance(query, dict) or len(query) != 1:
+        raise _bad_request(f"[_na] query malformed, must start with a single query name: "
+                           f"{json.dumps(query, ensure_ascii=False)[:200]}", "parsing_exception")
+    kind, spec = next(iter(query.items()))
+    builder = _BUILDERS.get(kind)
+    if builder is None:
+        raise _bad_request(f"unknown query [{kind}]", "parsing_exception")
+    return builder(spec or {}, props)
+
+
+def _c_match_all(spec, props) -> Matcher:
+    boost = float(spec.get("boost", 1.0))
+    return lambda doc, env, collect: boost
+
+
+def _c_bool(spec, props) -> Matcher:
+    must = [compile_query(c, props) for c in _as_list(spec.get("must"))]
+    filters = [compile_query(c, props) for c in _as_list(spec.get("filter"))]
+    must_not = [compile_query(c, props) for c in _as_list(spec.get("must_not"))]
+    should = [compile_query(c, props) for c in _as_list(spec.get("should"))]
+    need = _min_should(spec.get("minimum_should_match"), len(should), 0 if must or filters else 1) if should else 0
+    boost = float(spec.get("boost", 1.0))
+
+    def clauses(doc, env, collect) -> Optional[float]:
+        score = 0.0
+        for m in must:
+            s = m(doc, env, collect)
+            if s is None:
+                return None
+            score += s
+        for m in filters:
+            if m(doc, env, collect) is None:
+                return None
+        for m in must_not:
+            if m(doc, env, False) is not None:
+                return None
+        hits = 0
+        for m in should:
+            s = m(doc, env, collect)
+            if s is not None:
+                hits += 1
+                score += s
+        return score if hits >= need else None
+
+    def match(doc, env, collect):
+        mark = len(env.inner)
+        score = clauses(doc, env, collect)
+        if score is None:
+            # 整个 bool 不匹配时，其中已命中的 nested 项不应出现在 inner_hits 中
+            del env.inner[mark:]
+            return None
+        return score * boost
+    return match
+
+
+def _exact_matcher(field: str, value: str, boost: float) -> Matcher:
+    def match(doc, env, collect):
+        return boost if any(str(v) == value for v in _values(doc, field)) else None
+    return match
+
+
+def _c_match(spec, props) -> Matcher:
+    field, query, opts = _field_query(spec, "query")
+    if query is None:
+        return _never
+    boost = float(opts.get("boost", 1.0))
+    if _field_type(props, field) in _EXACT_TYPES:
+        return _exact_matcher(field, str(query), boost)
+    wanted = tuple(dict.fromkeys(_terms(str(query))))
+    if not wanted:
+        return _never
+    if str(opts.get("operator", "or")).lower() == "and":
+        need = len(wanted)
+    else:
+        need = max(_min_should(opts.get("minimum_should_match"), len(wanted), 1), 1)
+
+    def match(doc, env, collect):
+        values = _values(doc, field)
+        if not values:
+            return None
+        if len(values) == 1:
+            counts, length = _term_stats(str(values[0]))
+        else:
+            counts, length = Counter(), 0
+            for v in values:
+                c, n = _term_stats(str(v))
+                counts.update(c)
+                length += n
+        tfs = [counts[t] for t in wanted if t in counts]
+        if len(tfs) < need:
+            return None
+        return boost * sum(_tf_score(tf, length) for tf in tfs)
+    return match
+
+
+def _c_match_phrase(spec, props) -> Matcher:
+    field, query, opts = _field_query(spec, "query")
+    if query is None:
+        return _never
+    boost = float(opts.get("boost", 1.0))
+    if _field_type(props, field) in _EXACT_TYPES:
+        return _exact_matcher(field, str(query), boost)
+    phrase = _terms(str(query))
+    if not phrase:
+        return _never
+    needle = _TERM_SEP + _TERM_SEP.join(phrase) + _TERM_SEP
+
+    def match(doc, env, collect):
+        found = 0
+        length = 0
+        for v in _values(doc, field):
+            text = str(v)
+            length += _term_stats(text)[1]
+            found += _joined_terms(text).count(needle)
+        if not found:
+            return None
+        return boost * len(phrase) * _tf_score(found, length)
+    return match
+
+
+def _c_term_level(kind: str):
+    def build(spec, props) -> Matcher:
+        if kind == "terms":
+            field = next((k for k in spec if k not in ("boost", "_name")), None)
+            value, opts = spec.get(field), spec
+        else:
+            field, value, opts = _field_query(spec, "wildcard" if kind == "wildcard" else "value")
+        if field is None or value is None:
+            return _never
+        folded = bool(opts.get("case_insensitive"))
+        if folded:
+            value = [str(v).lower() for v in value] if isinstance(value, list) else str(value).lower()
+        test = _term_test(kind, value)
+        analyzed = _field_type(props, field) == "text"
+        boost = float(opts.get("boost", 1.0))
+
+        def match(doc, env, collect):
+            for v in _values(doc, field):
+                for c in (_terms(str(v)) if analyzed else (str(v),)):
+                    if test(c.lower() if folded else c):
+                        return boost
+            return None
+        return match
+    return build
+
+
+def _c_ids(spec, props) -> Matcher:
+    ids = {str(v) for v in spec.get("values", [])}
+    boost = float(spec.get("boost", 1.0))
+    return lambda doc, env, collect: boost if env.doc_id in ids else None
+
+
+def _c_exists(spec, props) -> Matcher:
+    field = spec.get("field", "")
+    boost = float(spec.get("boost", 1.0))
+    return lambda doc, env, collect: boost if any(v != "" for v in _values(doc, field)) else None
+
+
+def _c_range(spec, props) -> Matcher:
+    field, bounds = next(iter(spec.items()))
+    opts = bounds if isinstance(bounds, dict) else {}
+    checks = [(op, opts[op]) for op in ("gt", "gte", "lt", "lte") if op in opts]
+    boost = float(opts.get("boost", 1.0))
+
+    def within(v) -> bool:
+        for op, bound in checks:
+            try:
+                a, b = float(v), float(bound)
+            except (TypeError, ValueError):
+                a, b = str(v), str(bound)
+            if (op == "gt" and not a > b) or (op == "gte" and not a >= b) or \
+                    (op == "lt" and not a < b) or (op == "lte" and not a <= b):
+                return False
+        return True
+
+    return lambda doc, env, collect: boost if any(within(v) for v in _values(doc, field)) else None
+
+
+def _c_nested(spec, props) -> Matcher:
+    path = spec.get("path", "")
+    inner_query = compile_query(spec.get("query") or {"match_all": {}}, props)
+    inner_spec = spec.get("inner_hits")
+    name = (inner_spec.get("name") or path) if inner_spec is not None else None
+    mode = spec.get("score_mode", "avg")
+    boost = float(spec.get("boost", 1.0))
+
+    def match(doc, env, collect):
+        scores = []
+        for offset, item in enumerate(_values(doc, path)):
+            if not isinstance(item, dict):
+                continue
+            # 内层 nested 的 inner_hits 不支持，只记录本层
+            s = inner_query(_nest(path, item), env, False)
+            if s is None:
+                continue
+            scores.append(s)
+            if collect and name is not None:
+                env.inner.append((name, offset, s, item))
+        if not scores:
+            return None
+        if mode == "none":
+            score = 0.0
+        elif mode == "max":
+            score = max(scores)
+        elif mode == "min":
+            score = min(scores)
+        elif mode == "sum":
+            score = sum(scores)
+        else:
+            score = sum(scores) / len(scores)
+        return score * boost
+    return match
+
+
+_BUILDERS: Dict[str, Callable[[Dict[str, Any], Dict[str, Any]], Matcher]] = {
+    "match_all": _c_match_all,
+    "bool": _c_bool,
+    "match": _c_match,
+    "match_phrase": _c_match_phrase,
+    "term": _c_term_level("term"),
+    "terms": _c_term_level("terms"),
+    "prefix": _c_term_level("prefix"),
+    "wildcard": _c_term_level("wildcard"),
+    "ids": _c_ids,
+    "exists": _c_exists,
+    "range": _c_range,
+    "nested": _c_nested,
+}
+
+
+# ---------- 高亮 / _source ----------
+
+def _highlight_terms(query: Any, out: Dict[str, List[Tuple[str, Any]]]) -> None:
+    """收集查询中各字段可用于高亮的条件（must_not 中的不算）：字段 -> [(查询类型, 取值)]。"""
+    if not isinstance(query, dict) or len(query) != 1:
+        return
+    kind, spec = next(iter(query.items()))
+    if kind == "bool":
+        for key in ("must", "filter", "should"):
+            for clause in _as_list(spec.get(key)):
+                _highlight_terms(clause, out)
+    elif kind == "nested":
+        _highlight_terms(spec.get("query"), out)
+    elif kind == "terms":
+        field = next((k for k in spec if k not in ("boost", "_name")), None)
+        if field:
+            out.setdefault(field, []).append((kind, spec[field]))
+    elif kind in ("match", "match_phrase", "term", "prefix", "wildcard"):
+        field, value, _ = _field_query(spec, "wildcard" if kind == "wildcard" else
+                                       "query" if kind.startswith("match") else "value")
+        if value is not None:
+            out.setdefault(field, []).append((kind, value))
+
+
+def _highlight_value(text: str, conditions: List[Tuple[str, Any]], exact: bool, analyzed: bool,
+                     pre: str, post: str) -> Optional[str]:
+    spans: List[Tuple[int, int]] = []
+    tokens = analyze(text)
+    for kind, value in conditions:
+        if exact or (not analyzed and kind not in ("match", "match_phrase")):
+            if text == str(value) if kind.startswith("match") else _term_test(kind, value)(text):
+                spans.append((0, len(text)))
+        elif kind == "match":
+            wanted = set(_terms(str(value)))
+            spans.extend((s, e) for t, s, e in tokens if t in wanted)
+        elif kind == "match_phrase":
+            phrase = _terms(str(value))
+            if phrase:
+                for i in _phrase_positions(_terms(text), phrase):
+                    spans.append((tokens[i][1], tokens[i + len(phrase) - 1][2]))
+        else:
+            test = _term_test(kind, value)
+            spans.extend((s, e) for t, s, e in tokens if test(t))
+    if not spans:
+        return None
+    spans.sort()
+    merged = [list(spans[0])]
+    for s, e in spans[1:]:
+        if s < merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], e)
+        else:
+            merged.append([s, e])
+    parts = []
+    pos = 0
+    for s, e in merged:
+        parts.append(text[pos:s])
+        parts.append(pre + text[s:e] + post)
+        pos = e
+    parts.append(text[pos:])
+    return "".join(parts)
+
+
+def _highlight(spec: Dict[str, Any], query: Any, src: Dict[str, Any], props: Dict[str, Any]) -> Dict[str, List[str]]:
+    conditions: Dict[str, List[Tuple[str, Any]]] = {}
+    _highlight_terms(query, conditions)
+    fields = spec.get("fields") or {}
+    if isinstance(fields, list):
+        fields = {k: v for f in fields for k, v in f.items()}
+    out = {}
+    for field, opts in fields.items():
+        opts = opts or {}
+        pre = _as_list(opts.get("pre_tags", spec.get("pre_tags", ["<em>"])))[0]
+        post = _as_list(opts.get("post_tags", spec.get("post_tags", ["</em>"])))[0]
+        if not conditions.get(field):
+            continue
+        marked = [
+            h for h in (
+                _highlight_value(str(v), conditions[field], _field_type(props, field) in _EXACT_TYPES,
+                                 _field_type(props, field) == "text", pre, post)
+                for v in _values(src, field) if not isinstance(v, (dict, list))
+            ) if h is not None
+        ]
+        if marked:
+            out[field] = marked
+    return out
+
+
+def _source_filter(body_source: Any, params: Dict[str, Any]) -> Any:
+    """返回 False（不返回 _source）、None（完整）或 (includes, excludes)。"""
+    spec = params.get("_source", body_source)
+    includes = _csv(params.get("_source_includes"))
+    excludes = _csv(params.get("_source_excludes"))
+    if spec is not None and not isinstance(spec, (dict, list)):
+        if str(spec).lower() == "false":
+            return False if not includes else (includes, excludes)
+        if str(spec).lower() != "true":
+            includes = includes or _csv(spec)
+    elif isinstance(spec, list):
+        includes = includes or [str(s) for s in spec]
+    elif isinstance(spec, dict):
+        includes = includes or _csv(spec.get("includes", spec.get("include")))
+        excludes = excludes or _csv(spec.get("excludes", spec.get("exclude")))
+    return (includes, excludes) if includes or excludes else None
+
+
+def _filter_source(obj: Any, includes: List[str], excludes: List[str], prefix: str = "") -> Any:
+    if isinstance(obj, list):
+        return [_filter_source(v, includes, excludes, prefix) if isinstance(v, dict) else v for v in obj]
+    out = {}
+    for key, value in obj.items():
+        path = prefix + key
+        if any(fnmatch.fnmatchcase(path, p) for p in excludes):
+            continue
+        if not includes or any(fnmatch.fnmatchcase(path, p) for p in includes):
+            out[key] = _filter_source(value, [], excludes, path + ".") \
+                if excludes and isinstance(value, (dict, list)) else value
+        elif any(p.startswith(path + ".") for p in includes) and isinstance(value, (dict, list)):
+            sub = _filter_source(value, includes, excludes, path + ".")
+            if sub:
+                out[key] = sub
+    return out
+
+
+def _apply_source(src: Dict[str, Any], source_spec: Any) -> Any:
+    if source_spec is None:
+        return src
+    return _filter_source(src, *source_spec)
+
+
+def _sort_specs(sort: Any) -> List[Tuple[str, bool]]:
+    """sort -> [(字段, 是否倒序)]。"""
+    specs = []
+    for item in _as_list(sort):
+        if isinstance(item, str):
+            field, order = item, None
+        else:
+            field, order = next(iter(item.items()))
+            if isinstance(order, dict):
+                order = order.get("order")
+        if order is None:
+            order = "desc" if field == "_score" else "asc"
+        specs.append((field, str(order).lower() == "desc"))
+    return specs
+
+
+# ---------- 内存后端 ----------
+
+class _Index:
+    __slots__ = ("name", "docs", "versions", "mappings", "settings", "closed", "seq_no", "created_at")
+
+    def __init__(self, name: str, body: Optional[Dict[str, Any]] = None):
+        body = body or {}
+        self.name = name
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.versions: Dict[str, int] = {}
+        self.mappings: Dict[str, Any] = dict(body.get("mappings") or {})
+        self.settings: Dict[str, Any] = dict(body.get("settings") or {})
+        self.closed = False
+        self.seq_no = 0
+        self.created_at = int(time.time() * 1000)
+
+    @property
+    def props(self) -> Dict[str, Any]:
+        return self.mappings.get("properties") or {}
+
+
+class MemoryBackend(SearchBackend):
+    """在进程内存中保存索引并执行查询的后端（实现的接口与查询子集见模块说明）。"""
+
+    def __init__(self, cluster_name: str = "memory"):
+        self.cluster_name = cluster_name
+        self._indices: Dict[str, _Index] = {}
+        self._scripts: Dict[str, Dict[str, Any]] = {}
+        self._scrolls: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+
+    # ----- Python 接口 -----
+
+    def create_index(self, name: str, body: Optional[Dict[str, Any]] = None) -> None:
+        with self._lock:
+            if name not in self._indices:
+                self._indices[name] = _Index(name, body)
+
+    def index_doc(self, index: str, source: Dict[str, Any], doc_id: Optional[str] = None) -> str:
+        with self._lock:
+            return self._write(index, doc_id, source, "index")[0]
+
+    def load_dump_dir(self, root: str, indexes: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """
+        读取 import_all_data.py 的备份目录：<root>/<索引名>/*.json，每个文件为文档列表或单个文档，
+        _id 依次取 id、refid、_id 字段（与 import_all_data.py 一致）。返回各索引导入的文档数。
+        """
+        wanted = set(indexes) if indexes else None
+        counts: Dict[str, int] = {}
+        for index_dir in sorted(p for p in Path(root).iterdir() if p.is_dir()):
+            name = index_dir.name
+            if wanted is not None and name not in wanted:
+                continue
+            n = 0
+            for path in sorted(index_dir.glob("*.json")):
+                try:
+                    data = json.loads(path.read_text(encoding="utf-8"))
+                except (OSError, ValueError) as e:
+                    logger.warning("跳过无法读取的备份文件 %s: %r", path, e)
+                    continue
+                for doc in data if isinstance(data, list) else [data]:
+                    if not isinstance(doc, dict):
+                        continue
+                    doc_id = next((str(doc[k]) for k in ("id", "refid", "_id") if k in doc), None)
+                    self.index_doc(name, doc, doc_id)
+                    n += 1
+            self.create_index(name)
+            counts[name] = n
+        logger.info("已从 %s 载入 %d 个索引、%d 条文档", root, len(counts), sum(counts.values()))
+        return counts
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return {name: len(idx.docs) for name, idx in self._indices.items()}
+
+    # ----- REST 接口 -----
+
+    def handle(self, method: str, path: str, params: Optional[Dict[str, Any]] = None,
+               body: Any = None) -> Tuple[int, Any]:
+        method = method.upper()
+        params = {k: v for k, v in (params or {}).items() if v is not None}
+        segments = [unquote(s) for s in path.split("?", 1)[0].strip("/").split("/") if s]
+        try:
+            with self._lock:
+                return self._route(method, segments, params, body)
+        except _EsError as e:
+            return e.status, ("" if method == "HEAD" else e.body)
+
+    def _route(self, method: str, segs: List[str], params: Dict[str, Any], body: Any) -> Tuple[int, Any]:
+        if not segs:
+            if method == "HEAD":
+                return 200, ""
+            return 200, {
+                "name": self.cluster_name, "cluster_name": self.cluster_name, "tagline": "You Know, for Search",
+                "version": {"number": ES_VERSION, "build_flavor": "default", "lucene_version": "8.11.1"},
+            }
+        if segs[0].startswith("_") and segs[0] != "_all":
+            index, op, rest = None, segs[0], segs[1:]
+        else:
+            index, op, rest = segs[0], (segs[1] if len(segs) > 1 else ""), segs[2:]
+
+        if op in ("_doc", "_create", "_source", "_update") and index is not None:
+            return self._document(method, index, op, rest, params, body)
+        if op == "_search":
+            if rest[:1] == ["scroll"]:
+                return self._scroll(method, rest[1:], params, body)
+            if rest[:1] == ["template"]:
+                return self._search_template(index, params, body)
+            return 200, self._search(index, params, body)
+        handlers = {
+            "_count": self._count,
+            "_mget": self._mget,
+            "_bulk": self._bulk,
+            "_msearch": self._msearch,
+            "_delete_by_query": self._delete_by_query,
+            "_analyze": self._analyze,
+        }
+        if op in handlers:
+            return handlers[op](index, params, body)
+        if op in ("_refresh", "_flush"):
+            names = self._resolve(index, params)
+            return 200, {"_shards": {"total": len(names), "successful": len(names), "failed": 0}}
+        if op in ("_open", "_close"):
+            for name in self._resolve(index, params, open_only=False):
+                self._indices[name].closed = op == "_close"
+            return 200, {"acknowledged": True, "shards_acknowledged": True}
+        if op == "_mapping":
+            return self._mapping(method, index, params, body)
+        if op == "_settings" and method == "GET":
+            return 200, {n: {"settings": {"index": self._indices[n].settings}}
+                         for n in self._resolve(index, params, open_only=False)}
+        if op == "_scripts" and rest:
+            return self._script(method, rest[0], body)
+        if op == "_cat" and rest[:1] == ["indices"]:
+            return self._cat_indices(rest[1] if len(rest) > 1 else None, params)
+        if op == "_cluster" and rest[:1] == ["health"]:
+            return 200, {"cluster_name": self.cluster_name, "status": "green", "timed_out": False,
+                         "number_of_nodes": 1, "number_of_data_nodes": 1,
+                         "active_primary_shards": len(self._indices), "active_shards": len(self._indices)}
+        if index is not None and op == "":
+            return self._index_admin(method, index, params, body)
+        raise _bad_request(f"no handler found for uri [/{'/'.join(segs)}] and method [{method}]")
+
+    # ----- 索引 -----
+
+    def _resolve(self, expr: Optional[str], params: Dict[str, Any], open_only: bool = True) -> List[str]:
+        ignore = _flag(params.get("ignore_unavailable"))
+        names: List[str] = []
+        for part in (expr or "_all").split(","):
+            part = part.strip()
+            if part in ("_all", "*"):
+                names.extend(n for n in self._indices if not (open_only and self._indices[n].closed))
+                continue
+            if "*" in part or "?" in part:
+                names.extend(n for n in fnmatch.filter(self._indices, part)
+                             if not (open_only and self._indices[n].closed))
+                continue
+            idx = self._indices.get(part)
+            if idx is None:
+                if not ignore:
+                    raise _index_not_found(part)
+                continue
+            if open_only and idx.closed:
+                if not ignore:
+                    raise _bad_request("closed", "index_closed_exception")
+                continue
+            names.append(part)
+        return list(dict.fromkeys(names))
+
+    def _index_admin(self, method, index, params, body) -> Tuple[int, Any]:
+        if method == "HEAD":
+            self._resolve(index, {}, open_only=False)
+            return 200, ""
+        if method == "PUT":
+            if index in self._indices:
+                raise _EsError(400, "resource_already_exists_exception",
+                               f"index [{index}/memory] already exists", index=index)
+            self.create_index(index, body if isinstance(body, dict) else None)
+            return 200, {"acknowledged": True, "shards_acknowledged": True, "index": index}
+        if method == "DELETE":
+            for name in self._resolve(index, params, open_only=False):
+                del self._indices[name]
+            return 200, {"acknowledged": True}
+        if method == "GET":
+            return 200, {n: {"aliases": {}, "mappings": self._indices[n].mappings,
+                             "settings": {"index": self._indices[n].settings}}
+                         for n in self._resolve(index, params, open_only=False)}
+        raise _bad_request(f"Incorrect HTTP method for uri [/{index}] and method [{method}]")
+
+    def _mapping(self, method, index, params, body) -> Tuple[int, Any]:
+        names = self._resolve(index, params, open_only=False)
+        if method in ("PUT", "POST"):
+            props = (body or {}).get("properties") or {}
+            for name in names:
+                mappings = self._indices[name].mappings
+                mappings["properties"] = {**(mappings.get("properties") or {}), **props}
+            return 200, {"acknowledged": True}
+        return 200, {n: {"mappings": self._indices[n].mappings} for n in names}
+
+    def _cat_indices(self, expr, params) -> Tuple[int, Any]:
+        rows = []
+        for name in self._resolve(expr, {"ignore_unavailable": True}, open_only=False):
+            idx = self._indices[name]
+            rows.append({
+                "health": "green", "status": "close" if idx.closed else "open", "index": name,
+                "uuid": name, "pri": "1", "rep": "0", "docs.count": str(len(idx.docs)), "docs.deleted": "0",
+                "store.size": "0b", "pri.store.size": "0b",
+            })
+        columns = _csv(params.get("h"))
+        if columns:
+            rows = [{c: r.get(c) for c in columns} for r in rows]
+        if params.get("format") == "json":
+            return 200, rows
+        return 200, "".join(" ".join(str(v) for v in r.values()) + "\n" for r in rows)
+
+    def _script(self, method, script_id, body) -> Tuple[int, Any]:
+        if method in ("PUT", "POST"):
+            script = (body or {}).get("script")
+            if not isinstance(script, dict) or "source" not in script:
+                raise _bad_request("must specify [script] with [source]")
+            self._scripts[script_id] = script
+            return 200, {"acknowledged": True}
+        if method == "DELETE":
+            if self._scripts.pop(script_id, None) is None:
+                raise _EsError(404, "resource_not_found_exception", f"stored script [{script_id}] does not exist")
+            return 200, {"acknowledged": True}
+        script = self._scripts.get(script_id)
+        if script is None:
+            return 404, {"_id": script_id, "found": False}
+        return 200, {"_id": script_id, "found": True, "script": script}
+
+    # ----- 文档 -----
+
+    def _write(self, index: str, doc_id: Optional[str], source: Any, op: str) -> Tuple[str, str, int]:
+        if not isinstance(source, dict):
+            raise _bad_request("request body is required", "action_request_validation_exception")
+        idx = self._indices.get(index)
+        if idx is None:
+            idx = self._indices[index] = _Index(index)
+        elif idx.closed:
+            raise _bad_request("closed", "index_closed_exception")
+        doc_id = str(doc_id) if doc_id is not None else uuid.uuid4().hex[:20]
+        exists = doc_id in idx.docs
+        if op == "create" and exists:
+            raise _EsError(409, "version_conflict_engine_exception",
+                           f"[{doc_id}]: version conflict, document already exists", index=index)
+        if op == "update":
+            if not exists:
+                raise _EsError(404, "document_missing_exception", f"[_doc][{doc_id}]: document missing",
+                               index=index)
+            source = {**idx.docs[doc_id], **(source.get("doc") or {})}
+        idx.docs[doc_id] = source
+        idx.versions[doc_id] = idx.versions.get(doc_id, 0) + 1
+        idx.seq_no += 1
+        return doc_id, ("updated" if exists else "created"), idx.versions[doc_id]
+
+    def _write_result(self, index, doc_id, result, version) -> Dict[str, Any]:
+        return {"_index": index, "_type": "_doc", "_id": doc_id, "_version": version, "result": result,
+                "_shards": {"total": 1, "successful": 1, "failed": 0},
+                "_seq_no": self._indices[index].seq_no, "_primary_term": 1}
+
+    def _get_doc(self, index: str, doc_id: str, source_spec: Any) -> Dict[str, Any]:
+        idx = self._indices[index]
+        src = idx.docs.get(doc_id)
+        if src is None:
+            return {"_index": index, "_type": "_doc", "_id": doc_id, "found": False}
+        out = {"_index": index, "_type": "_doc", "_id": doc_id, "_version": idx.versions.get(doc_id, 1),
+               "_seq_no": 0, "_primary_term": 1, "found": True}
+        if source_spec is not False:
+            out["_source"] = _apply_source(src, source_spec)
+        return out
+
+    def _document(self, method, index, op, rest, params, body) -> Tuple[int, Any]:
+        doc_id = rest[0] if rest else None
+        if method in ("PUT", "POST") and op != "_source":
+            kind = {"_create": "create", "_update": "update"}.get(op, "index")
+            if op == "_doc" and params.get("op_type") == "create":
+                kind = "create"
+            doc_id, result, version = self._write(index, doc_id, body, kind)
+            return (201 if result == "created" else 200), self._write_result(index, doc_id, result, version)
+        if doc_id is None:
+            raise _bad_request(f"no handler found for uri [/{index}/{op}] and method [{method}]")
+        if index not in self._indices:
+            raise _index_not_found(index)
+        idx = self._indices[index]
+        if method == "DELETE":
+            if doc_id not in idx.docs:
+                return 404, {"_index": index, "_type": "_doc", "_id": doc_id, "result": "not_found"}
+            del idx.docs[doc_id]
+            version = idx.versions.pop(doc_id, 1) + 1
+            idx.seq_no += 1
+            return 200, self._write_result(index, doc_id, "deleted", version)
+        if method == "HEAD":
+            return (200 if doc_id in idx.docs else 404), ""
+        doc = self._get_doc(index, doc_id, _source_filter(None, params))
+        if not doc["found"]:
+            return 404, doc
+        return 200, (doc.get("_source", {}) if op == "_source" else doc)
+
+    def _mget(self, index, params, body) -> Tuple[int, Any]:
+        body = body or {}
+        if "ids" in body:
+            requests = [{"_index": index, "_id": i} for i in body["ids"]]
+        else:
+            requests = [{**d, "_index": d.get("_index", index)} for d in body.get("docs", [])]
+        default_source = _source_filter(None, params)
+        docs = []
+        for req in requests:
+            name, doc_id = req.get("_index"), str(req.get("_id"))
+            if name not in self._indices:
+                docs.append({"_index": name, "_type": "_doc", "_id": doc_id,
+                             "error": _index_not_found(str(name)).body["error"]})
+                continue
+            spec = _source_filter(req["_source"], {}) if "_source" in req else default_source
+            docs.append(self._get_doc(name, doc_id, spec))
+        return 200, {"docs": docs}
+
+    def _bulk(self, index, params, body) -> Tuple[int, Any]:
+        start = time.perf_counter()
+        lines = _ndjson(body)
+        items = []
+        i = 0
+        while i < len(lines):
+            action = lines[i]
+            kind, meta = next(iter(action.items()))
+            i += 1
+            source = None
+            if kind != "delete":
+                source = lines[i] if i < len(lines) else None
+                i += 1
+            name = meta.get("_index", index)
+            doc_id = meta.get("_id")
+            try:
+                if kind == "delete":
+                    status, result = self._document("DELETE", name, "_doc", [str(doc_id)], {}, None)
+                    item = {k: v for k, v in result.items() if k != "error"}
+                else:
+                    doc_id, res, version = self._write(name, doc_id, source, kind)
+                    status = 201 if res == "created" else 200
+                    item = self._write_result(name, doc_id, res, version)
+                item["status"] = status
+            except _EsError as e:
+                item = {"_index": name, "_type": "_doc", "_id": doc_id, "status": e.status,
+                        "error": e.body["error"]}
+            items.append({kind: item})
+        return 200, {"took": int((time.perf_counter() - start) * 1000),
+                     "errors": any("error" in next(iter(it.values())) for it in items), "items": items}
+
+    def _delete_by_query(self, index, params, body) -> Tuple[int, Any]:
+        start = time.perf_counter()
+        query = (body or {}).get("query") or {"match_all": {}}
+        deleted = 0
+        for name in self._resolve(index, params):
+            idx = self._indices[name]
+            matcher = compile_query(query, idx.props)
+            for doc_id in [d for d, src in idx.docs.items() if matcher(src, _Env(d), False) is not None]:
+                del idx.docs[doc_id]
+                idx.versions.pop(doc_id, None)
+                deleted += 1
+        return 200, {"took": int((time.perf_counter() - start) * 1000), "timed_out": False, "total": deleted,
+                     "deleted": deleted, "batches": 1 if deleted else 0, "version_conflicts": 0, "noops": 0,
+                     "failures": []}
+
+    # ----- 查询 -----
+
+    def _count(self, index, params, body) -> Tuple[int, Any]:
+        query = (body or {}).get("query") or {"match_all": {}}
+        n = 0
+        for name in self._resolve(index, params):
+            idx = self._indices[name]
+            matcher = compile_query(query, idx.props)
+            n += sum(1 for doc_id, src in idx.docs.items() if matcher(src, _Env(doc_id), False) is not None)
+        return 200, {"count": n, "_shards": dict(_SHARDS)}
+
+    def _matched(self, index, params, query) -> List[Tuple[float, int, str, str, Dict[str, Any], List]]:
+        found = []
+        seq = 0
+        for name in self._resolve(index, params):
+            idx = self._indices[name]
+            matcher = compile_query(query, idx.props)
+            for doc_id, src in idx.docs.items():
+                env = _Env(doc_id)
+                s = matcher(src, env, True)
+                if s is not None:
+                    found.append((s, seq, name, doc_id, src, env.inner))
+                seq += 1
+        return found
+
+    def _search(self, index, params, body) -> Dict[str, Any]:
+        start = time.perf_counter()
+        body = body if isinstance(body, dict) else {}
+        size = int(params.get("size", body.get("size", 10)))
+        frm = int(params.get("from", body.get("from", 0)))
+        scroll = params.get("scroll")
+        if not scroll and frm + size > MAX_RESULT_WINDOW:
+            raise _bad_request(
+                f"Result window is too large, from + size must be less than or equal to: [{MAX_RESULT_WINDOW}] "
+                f"but was [{frm + size}].", "search_phase_execution_exception")
+        query = body.get("query") or {"match_all": {}}
+        found = self._matched(index, params, query)
+        min_score = body.get("min_score")
+        if min_score is not None:
+            found = [f for f in found if f[0] >= float(min_score)]
+
+        specs = _sort_specs(params.get("sort") or body.get("sort"))
+        scored = not specs or any(f == "_score" for f, _ in specs)
+        for field, desc in reversed(specs or [("_score", True)]):
+            if field == "_score":
+                found.sort(key=lambda f: f[0], reverse=desc)
+            elif field == "_doc":
+                found.sort(key=lambda f: f[1], reverse=desc)
+            else:
+                present = [f for f in found if _values(f[4], field)]
+                missing = [f for f in found if not _values(f[4], field)]
+                present.sort(key=lambda f: _sort_key(f[4], field, desc), reverse=desc)
+                found = present + missing
+
+        render = self._hit_renderer(body, params, query, specs, scored)
+        if scroll:
+            page, rest = found[:size], found[size:]
+            scroll_id = self._open_scroll(rest, size, render)
+        else:
+            page = found[frm:frm + size]
+            scroll_id = None
+        hits = [render(f) for f in page]
+        result: Dict[str, Any] = {}
+        total = _total(len(found), body.get("track_total_hits", params.get("track_total_hits")))
+        if total is not None:
+            result["total"] = total
+        result["max_score"] = max((f[0] for f in found), default=None) if scored else None
+        result["hits"] = hits
+        out: Dict[str, Any] = {"_scroll_id": scroll_id} if scroll_id else {}
+        out.update({"took": int((time.perf_counter() - start) * 1000), "timed_out": False,
+                    "_shards": dict(_SHARDS), "hits": result})
+        return out
+
+    def _hit_renderer(self, body, params, query, specs, scored) -> Callable[[Tuple], Dict[str, Any]]:
+        source_spec = _source_filter(body.get("_source"), params)
+        highlight = body.get("highlight")
+        with_inner = _has_inner_hits(query)
+
+        def render(found) -> Dict[str, Any]:
+            score, _, name, doc_id, src, inner = found
+            hit: Dict[str, Any] = {"_index": name, "_type": "_doc", "_id": doc_id,
+                                   "_score": score if scored else None}
+            if source_spec is not False:
+                hit["_source"] = _apply_source(src, source_spec)
+            if highlight:
+                marked = _highlight(highlight, query, src, self._indices[name].props)
+                if marked:
+                    hit["highlight"] = marked
+            if with_inner:
+                hit["inner_hits"] = _inner_hits(name, doc_id, inner, query)
+            if specs and specs != [("_score", True)]:
+                hit["sort"] = [score if f == "_score" else found[1] if f == "_doc" else
+                               (_values(src, f) or [None])[0] for f, _ in specs]
+            return hit
+        return render
+
+    def _open_scroll(self, rest, size, render) -> str:
+        scroll_id = uuid.uuid4().hex
+        self._scrolls[scroll_id] = {"rest": rest, "size": size, "render": render, "total": None}
+        while len(self._scrolls) > MAX_SCROLLS:
+            self._scrolls.pop(next(iter(self._scrolls)))
+        return scroll_id
+
+    def _scroll(self, method, rest, params, body) -> Tuple[int, Any]:
+        body = body if isinstance(body, dict) else {}
+        ids = _csv(body.get("scroll_id", params.get("scroll_id"))) or list(rest)
+        if method == "DELETE":
+            if ids == ["_all"]:
+                ids = list(self._scrolls)
+            freed = sum(1 for i in ids if self._scrolls.pop(i, None) is not None)
+            return 200, {"succeeded": True, "num_freed": freed}
+        ctx = self._scrolls.get(ids[0]) if ids else None
+        if ctx is None:
+            raise _EsError(404, "search_context_missing_exception", "No search context found for id")
+        page, ctx["rest"] = ctx["rest"][:ctx["size"]], ctx["rest"][ctx["size"]:]
+        return 200, {"_scroll_id": ids[0], "took": 0, "timed_out": False, "_shards": dict(_SHARDS),
+                     "hits": {"total": {"value": len(page) + len(ctx["rest"]), "relation": "eq"},
+                              "max_score": None, "hits": [ctx["render"](f) for f in page]}}
+
+    def _search_template(self, index, params, body) -> Tuple[int, Any]:
+        body = body or {}
+        source = body.get("source")
+        if source is None:
+            script = self._scripts.get(str(body.get("id")))
+            if script is None:
+                raise _EsError(404, "resource_not_found_exception",
+                               f"unable to find script [{body.get('id')}] in cluster state")
+            source = script["source"]
+        if not isinstance(source, str):
+            source = json.dumps(source, ensure_ascii=False)
+        try:
+            rendered = json.loads(render_mustache(source, body.get("params")))
+        except ValueError as e:
+            raise _bad_request(f"failed to parse rendered search template: {e}", "parsing_exception")
+        return 200, self._search(index, params, rendered)
+
+    def _msearch(self, index, params, body) -> Tuple[int, Any]:
+        lines = _ndjson(body)
+        responses = []
+        for header, search_body in zip(lines[0::2], lines[1::2]):
+            target = header.get("index", index)
+            if isinstance(target, list):
+                target = ",".join(target)
+            sub_params = {k: header[k] for k in ("ignore_unavailable",) if k in header}
+            try:
+                responses.append({**self._search(target, sub_params, search_body), "status": 200})
+            except _EsError as e:
+                responses.append({**e.body})
+        return 200, {"took": 0, "responses": responses}
+
+    def _analyze(self, index, params, body) -> Tuple[int, Any]:
+        body = body if isinstance(body, dict) else {}
+        texts = body.get("text", params.get("text", ""))
+        tokens = []
+        offset = 0
+        position = 0
+        for text in _as_list(texts):
+            text = str(text)
+            u16 = _utf16_offsets(text)
+            for term, s, e in analyze(text):
+                tokens.append({
+                    "token": term,
+                    "start_offset": offset + (u16[s] if u16 else s),
+                    "end_offset": offset + (u16[e] if u16 else e),
+                    "type": "<IDEOGRAPHIC>" if re.match(f"[{_CJK}]", term) else "<ALPHANUM>",
+                    "position": position,
+                })
+                position += 1
+            offset += (u16[-1] if u16 else len(text)) + 1
+            position += POSITION_INCREMENT_GAP
+        return 200, {"tokens": tokens}
+
+
+# ---------- 辅助 ----------
+
+def _ndjson(body: Any) -> List[Dict[str, Any]]:
+    if body is None:
+        return []
+    if isinstance(body, dict):
+        return [body]
+    if isinstance(body, list):
+        return body
+    if isinstance(body, bytes):
+        body = body.decode("utf-8")
+    try:
+        return [json.loads(line) for line in str(body).splitlines() if line.strip()]
+    except ValueError as e:
+        raise _bad_request(f"Failed to parse NDJSON body: {e}", "parsing_exception")
+
+
+def _sort_key(src: Dict[str, Any], field: str, desc: bool) -> Any:
+    values = _values(src, field)
+    value = max(values, key=str) if desc else min(values, key=str)
+    return (0, value) if isinstance(value, (int, float)) else (1, str(value))
+
+
+def _total(n: int, track: Any) -> Optional[Dict[str, Any]]:
+    if track is False or str(track).lower() == "false":
+        return None
+    if track is True or str(track).lower() == "true":
+        return {"value": n, "relation": "eq"}
+    cap = DEFAULT_TRACK_TOTAL_HITS if track is None else int(track)
+    return {"value": min(n, cap), "relation": "eq" if n <= cap else "gte"}
+
+
+def _has_inner_hits(query: Any) -> bool:
+    return bool(_inner_specs(query))
+
+
+def _inner_specs(query: Any, out: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Dict[str, Any]]:
+    """查询中带 inner_hits 的 nested 子句：名称 -> inner_hits 设置（含 path）。"""
+    out = {} if out is None else out
+    if not isinstance(query, dict) or len(query) != 1:
+        return out
+    kind, spec = next(iter(query.items()))
+    if kind == "bool":
+        for key in ("must", "filter", "should"):
+            for clause in _as_list(spec.get(key)):
+                _inner_specs(clause, out)
+    elif kind == "nested" and spec.get("inner_hits") is not None:
+        inner = spec["inner_hits"]
+        out[inner.get("name") or spec.get("path", "")] = {**inner, "path": spec.get("path", "")}
+    return out
+
+
+def _inner_hits(index: str, doc_id: str, inner: List[Tuple], query: Any) -> Dict[str, Any]:
+    out = {}
+    for name, spec in _inner_specs(query).items():
+        matched = {}
+        for n, offset, score, item in inner:
+            if n == name:
+                matched[offset] = (score, item)  # 同一 nested 项被多次求值时只保留一次
+        ordered = sorted(matched.items(), key=lambda kv: (-kv[1][0], kv[0]))
+        frm = int(spec.get("from", 0))
+        size = int(spec.get("size", DEFAULT_INNER_HITS_SIZE))
+        source_spec = _source_filter(spec.get("_source"), {})
+        path = spec["path"]
+        hits = []
+        for offset, (score, item) in ordered[frm:frm + size]:
+            hit = {"_index": index, "_type": "_doc", "_id": doc_id,
+                   "_nested": {"field": path, "offset": offset}, "_score": score}
+            if source_spec is not False:
+                src = _apply_source(_nest(path, item), source_spec)
+                for key in path.split("."):
+                    src = src.get(key, {}) if isinstance(src, dict) else {}
+                hit["_source"] = src
+            hits.append(hit)
+        out[name] = {"hits": {"total": {"value": len(ordered), "relation": "eq"},
+                              "max_score": ordered[0][1][0] if ordered else None, "hits": hits}}
+    return out
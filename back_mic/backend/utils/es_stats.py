@@ -0,0 +1,367 @@
+"""
+ES 查询指纹统计与慢查询样例
+
+包装 ES 客户端的 transport.perform_request，对每次请求：
+- 指纹：请求体去掉具体取值后的结构（键名、查询类型、字段名保留，字符串 / 数字等取值替换为 ?，
+  同构的列表元素合并），加上操作（search / mget / _analyze…）、目标索引与参数档位（size 档位、是否翻页）。
+  get_matchs、get_infos、_multi_index_search、_fetch_message_docs、info_retrieval_export 各自的查询形态因此落入少数几个指纹
+- 耗时：客户端总耗时，ES 返回的 took（服务端执行耗时），二者之差即网络与序列化耗时
+- 每个指纹保留耗时最长的 ES_STATS_TOP_N 个样例（截断后的请求体、request_id、时间）；
+  超过 ES_SLOW_MS 的请求另记一条 WARNING 日志
+
+统计先在进程内累加，后台线程每 ES_STATS_FLUSH 秒合并进 Redis（es_stats:* 键，ES_STATS_TTL 秒过期），
+管理员接口 /api/es_stats 读取各 worker 汇总后的结果；无 Redis 时只返回本进程的统计。ES_STATS=0 关闭。
+"""
+import hashlib
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.request_log import request_id_var
+
+logger = logging.getLogger("es_stats")
+
+ES_STATS_ENABLED = os.getenv("ES_STATS", "1") != "0"
+ES_SLOW_MS = float(os.getenv("ES_SLOW_MS", "500"))
+ES_STATS_TOP_N = int(os.getenv("ES_STATS_TOP_N", "5"))
+ES_STATS_FLUSH = float(os.getenv("ES_STATS_FLUSH", "30"))
+ES_STATS_TTL = 7 * 24 * 3600
+EXAMPLE_MAX_CHARS = 4000
+SHAPE_MAX_CHARS = 2000
+
+KEY_FINGERPRINTS = "es_stats:fingerprints"
+KEY_AGG_PREFIX = "es_stats:agg:"
+KEY_SLOW_PREFIX = "es_stats:slow:"
+
+_SIZE_CLASSES = (0, 1, 10, 50, 100, 1000, 10000)
+
+
+# ---------- 指纹 ----------
+
+def _shape(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _shape(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        if all(not isinstance(v, (dict, list, tuple)) for v in value):
+            return ["?"] if value else []
+        shapes = []
+        seen = set()
+        for v in value:
+            s = _shape(v)
+            key = json.dumps(s, sort_keys=True, ensure_ascii=False)
+            if key not in seen:
+                seen.add(key)
+                shapes.append(s)
+        return shapes
+    return "?"
+
+
+def _size_class(size: Any) -> str:
+    try:
+        n = int(size)
+    except (TypeError, ValueError):
+        return "default"
+    label = "0"
+    for bound in _SIZE_CLASSES:
+        if n >= bound:
+            label = f">={bound}"
+    return label
+
+
+def _split_path(path: str) -> Tuple[str, str]:
+    """(索引, 操作)：/cwwl,bible/_search -> ("cwwl,bible", "search")；/_mget -> ("", "mget")。"""
+    segments = (path or "").split("?", 1)[0].strip("/").split("/")
+    index = segments[0] if segments and not segments[0].startswith("_") else ""
+    op = ""
+    for i, seg in enumerate(segments):
+        if seg.startswith("_"):
+            op = seg[1:]
+            if i + 1 < len(segments) and segments[i + 1] == "template":
+                op += "_template"
+            break
+    return index, op or "doc"
+
+
+def fingerprint(method: str, path: str, body: Any, params: Optional[Dict[str, Any]] = None):
+    """返回 (指纹, 描述)；描述含 op、index、params（参数档位）、shape（结构）。"""
+    index, op = _split_path(path)
+    if isinstance(body, (bytes, str)):
+        shape: Any = "<raw>"
+    else:
+        shape = _shape(body) if body is not None else None
+    size = None
+    page = False
+    if isinstance(body, dict):
+        size = body.get("size", (body.get("params") or {}).get("size") if isinstance(body.get("params"), dict) else None)
+        frm = body.get("from", (body.get("params") or {}).get("from") if isinstance(body.get("params"), dict) else None)
+        page = bool(frm)
+        if op == "search_template" and body.get("id"):
+            # 存储模板按模板 id 区分
+            shape = {"id": body["id"], "params": shape.get("params") if isinstance(shape, dict) else None}
+    if params:
+        size = params.get("size", size)
+        page = page or bool(params.get("from"))
+    param_class = f"size{_size_class(size)}" + (",paged" if page else "")
+    shape_json = json.dumps(shape, sort_keys=True, ensure_ascii=False)
+    raw = f"{method}|{op}|{index}|{param_class}|{shape_json}"
+    fp = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+    return fp, {
+        "method": method,
+        "op": op,
+        "index": index,
+        "params": param_class,
+        "shape": shape_json[:SHAPE_MAX_CHARS],
+    }
+
+
+def _took_of(response: Any) -> Optional[float]:
+    data = getattr(response, "body", response)
+    if isinstance(data, dict):
+        took = data.get("took")
+        if isinstance(took, (int, float)):
+            return float(took)
+    return None
+
+
+# ---------- 统计 ----------
+
+class _Agg:
+    __slots__ = ("desc", "count", "errors", "total_ms", "max_ms", "took_ms", "took_count", "slow")
+
+    def __init__(self, desc: Dict[str, str]):
+        self.desc = desc
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.took_ms = 0.0
+        self.took_count = 0
+        # (耗时, 序号, 样例) 的小顶堆，只留最慢的 TOP_N 个
+        self.slow: List[Tuple[float, int, Dict[str, Any]]] = []
+
+
+class QueryStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 进程启动以来的全部统计（无 Redis 时直接展示）与尚未合并进 Redis 的增量
+        self._total: Dict[str, _Agg] = {}
+        self._pending: Dict[str, _Agg] = {}
+        self._seq = 0
+        self._redis = None
+        self._flusher = None
+
+    def configure(self, redis_client) -> None:
+        self._redis = redis_client
+        if redis_client is not None and self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="es-stats-flush", daemon=True)
+            self._flusher.start()
+
+    def record(self, fp: str, desc: Dict[str, str], wall_ms: float, took_ms: Optional[float],
+               error: bool, make_example: Callable[[], Dict[str, Any]]) -> None:
+        """make_example 只在该请求进入某个指纹的最慢 TOP_N 时才调用（序列化请求体有开销）。"""
+        with self._lock:
+            self._seq += 1
+            example = None
+            for table in (self._total, self._pending):
+                agg = table.get(fp)
+                if agg is None:
+                    agg = table[fp] = _Agg(desc)
+                agg.count += 1
+                agg.errors += int(error)
+                agg.total_ms += wall_ms
+                agg.max_ms = max(agg.max_ms, wall_ms)
+                if took_ms is not None:
+                    agg.took_ms += took_ms
+                    agg.took_count += 1
+                if len(agg.slow) < ES_STATS_TOP_N or wall_ms > agg.slow[0][0]:
+                    if example is None:
+                        example = make_example()
+                    item = (wall_ms, self._seq, example)
+                    if len(agg.slow) < ES_STATS_TOP_N:
+                        heapq.heappush(agg.slow, item)
+                    else:
+                        heapq.heapreplace(agg.slow, item)
+
+    # ---------- Redis ----------
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(ES_STATS_FLUSH)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning("ES 查询统计写入 Redis 失败: %s", e)
+
+    def flush(self) -> None:
+        if self._redis is None:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        pipe = self._redis.pipeline(transaction=False)
+        for fp, agg in pending.items():
+            agg_key = KEY_AGG_PREFIX + fp
+            slow_key = KEY_SLOW_PREFIX + fp
+            pipe.sadd(KEY_FINGERPRINTS, fp)
+            for k, v in agg.desc.items():
+                pipe.hsetnx(agg_key, k, v)
+            pipe.hincrby(agg_key, "count", agg.count)
+            pipe.hincrby(agg_key, "errors", agg.errors)
+            pipe.hincrbyfloat(agg_key, "total_ms", agg.total_ms)
+            pipe.hincrbyfloat(agg_key, "took_ms", agg.took_ms)
+            pipe.hincrby(agg_key, "took_count", agg.took_count)
+            if agg.slow:
+                pipe.zadd(slow_key, {json.dumps(ex, ensure_ascii=False, default=str): ms for ms, _, ex in agg.slow})
+                pipe.zremrangebyrank(slow_key, 0, -(ES_STATS_TOP_N + 1))
+                pipe.expire(slow_key, ES_STATS_TTL)
+            pipe.expire(agg_key, ES_STATS_TTL)
+        pipe.expire(KEY_FINGERPRINTS, ES_STATS_TTL)
+        pipe.execute()
+
+    # ---------- 查询 ----------
+
+    @staticmethod
+    def _row(fp: str, desc: Dict[str, Any], count: int, errors: int, total_ms: float,
+             max_ms: float, took_ms: float, took_count: int, examples: List[Dict[str, Any]]) -> Dict[str, Any]:
+        avg_took = took_ms / took_count if took_count else None
+        avg_ms = total_ms / count if count else 0.0
+        return {
+            "fingerprint": fp,
+            **desc,
+            "count": count,
+            "errors": errors,
+            "total_ms": round(total_ms, 1),
+            "avg_ms": round(avg_ms, 2),
+            "max_ms": round(max_ms, 2),
+            "avg_took_ms": round(avg_took, 2) if avg_took is not None else None,
+            # 客户端耗时减去 ES took：网络传输与序列化
+            "avg_network_ms": round(max(avg_ms - avg_took, 0.0), 2) if avg_took is not None else None,
+            "examples": examples,
+        }
+
+    def _local_rows(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            items = list(self._total.items())
+            return [
+                self._row(fp, a.desc, a.count, a.errors, a.total_ms, a.max_ms, a.took_ms, a.took_count,
+                          [ex for _, _, ex in sorted(a.slow, reverse=True)])
+                for fp, a in items
+            ]
+
+    def _redis_rows(self) -> List[Dict[str, Any]]:
+        self.flush()
+        fps = sorted(self._redis.smembers(KEY_FINGERPRINTS) or [])
+        if not fps:
+            return []
+        pipe = self._redis.pipeline(transaction=False)
+        for fp in fps:
+            pipe.hgetall(KEY_AGG_PREFIX + fp)
+            pipe.zrevrange(KEY_SLOW_PREFIX + fp, 0, ES_STATS_TOP_N - 1, withscores=True)
+        results = pipe.execute()
+        rows = []
+        for i, fp in enumerate(fps):
+            raw, slow = results[2 * i] or {}, results[2 * i + 1] or []
+            if not raw:
+                continue
+            desc = {k: raw.get(k, "") for k in ("method", "op", "index", "params", "shape")}
+            examples = []
+            for member, _ in slow:
+                try:
+                    examples.append(json.loads(member))
+                except ValueError:
+                    pass
+            rows.append(self._row(
+                fp, desc,
+                int(raw.get("count", 0) or 0), int(raw.get("errors", 0) or 0),
+                float(raw.get("total_ms", 0) or 0), float(slow[0][1]) if slow else 0.0,
+                float(raw.get("took_ms", 0) or 0), int(raw.get("took_count", 0) or 0),
+                examples,
+            ))
+        return rows
+
+    def report(self, sort: str = "total_ms", limit: int = 50) -> Dict[str, Any]:
+        source = "local"
+        rows = None
+        if self._redis is not None:
+            try:
+                rows = self._redis_rows()
+                source = "redis"
+            except Exception as e:
+                logger.warning("读取 ES 查询统计失败，改为本进程统计: %s", e)
+        if rows is None:
+            rows = self._local_rows()
+        if sort not in ("total_ms", "avg_ms", "max_ms", "count", "errors"):
+            sort = "total_ms"
+        rows.sort(key=lambda r: r[sort], reverse=True)
+        return {"source": source, "pid": os.getpid(), "fingerprints": len(rows), "items": rows[:limit]}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._total.clear()
+            self._pending.clear()
+        if self._redis is not None:
+            fps = self._redis.smembers(KEY_FINGERPRINTS) or []
+            keys = [KEY_FINGERPRINTS] + [p + fp for fp in fps for p in (KEY_AGG_PREFIX, KEY_SLOW_PREFIX)]
+            self._redis.unlink(*keys)
+
+
+query_stats = QueryStats()
+
+
+def _truncate(body: Any) -> Any:
+    if isinstance(body, (bytes, str)):
+        text = body.decode("utf-8", "replace") if isinstance(body, bytes) else body
+        return text[:EXAMPLE_MAX_CHARS]
+    text = json.dumps(body, ensure_ascii=False, default=str)
+    return body if len(text) <= EXAMPLE_MAX_CHARS else text[:EXAMPLE_MAX_CHARS] + "…"
+
+
+def instrument_query_stats(client):
+    """包装 ES 客户端的 transport.perform_request，记录每次请求的指纹、耗时与 took。"""
+    if client is None or not ES_STATS_ENABLED:
+        return client
+    transport = getattr(client, "transport", None)
+    fn = getattr(transport, "perform_request", None)
+    if fn is None or getattr(fn, "_es_stats_wrapped", False):
+        return client
+
+    def perform_request(method, path, *args, **kwargs):
+        body = kwargs.get("body")
+        params = kwargs.get("params")
+        start = time.perf_counter()
+        response = None
+        error = False
+        try:
+            response = fn(method, path, *args, **kwargs)
+            return response
+        except BaseException:
+            error = True
+            raise
+        finally:
+            wall_ms = (time.perf_counter() - start) * 1000
+            try:
+                fp, desc = fingerprint(method, path, body, params if isinstance(params, dict) else None)
+                took = _took_of(response)
+                rid = request_id_var.get()
+                query_stats.record(fp, desc, wall_ms, took, error, lambda: {
+                    "wall_ms": round(wall_ms, 2),
+                    "took_ms": took,
+                    "path": path,
+                    "request_id": rid,
+                    "ts": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    "error": error,
+                    "body": _truncate(body),
+                })
+                if wall_ms >= ES_SLOW_MS:
+                    logger.warning("ES 慢查询 %.0fms (took=%s) fp=%s %s %s", wall_ms, took, fp, method, path)
+            except Exception as e:
+                logger.debug("ES 查询统计失败: %r", e)
+
+    perform_request._es_stats_wrapped = True
+    transport.perform_request = perform_request
+    return client
@@ -0,0 +1,336 @@
+"""
+Prometheus / OpenMetrics 指标
+
+GET /metrics 输出以下指标（prometheus_client 为可选依赖，未安装时全部为空操作，/metrics 返回 503）：
+
+- http_requests_total / http_request_duration_seconds / http_requests_in_progress：按路由模板（如 /api/search）、
+  方法、状态码统计（处理中数量只按方法），由 metrics_middleware 记录；未匹配路由的请求归入 route="<unmatched>"，避免标签基数失控
+- dependency_calls_total / dependency_call_duration_seconds / dependency_in_flight：外部依赖调用
+  （elasticsearch、redis、claude、gemini、libreoffice），按 dependency、operation、outcome 统计；
+  ES / Redis 客户端由 instrument_elasticsearch / instrument_redis 包装，其余调用处用 track() 包住；
+  track() 同时把调用记为请求追踪的子 span（utils/tracing.py），未安装 prometheus_client 时追踪照常工作
+- pool_in_use / pool_capacity / pool_queued：线程池与并发信号量的占用（anyio 同步路由线程池、
+  投机生成线程池、Claude / Gemini 并发限制），由 register_pool 注册的采样函数在抓取时（及请求结束时，至多每秒一次）写入
+- import_documents_total / import_runs_total：/api/process 与 /api/upopt 导入的文档数与导入次数
+
+多进程部署（多个 uvicorn / gunicorn worker）时设置 PROMETHEUS_MULTIPROC_DIR 为每次启动前清空的目录，
+各进程把数值写入该目录下的 mmap 文件，/metrics 由 MultiProcessCollector 汇总所有进程；
+gauge 按存活进程求和（livesum）。进程内记录只是对已解析的子指标加减，不经过 Redis 或网络。
+METRICS_TOKEN 非空时，/metrics 需携带 Authorization: Bearer <METRICS_TOKEN>。
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from utils import tracing
+
+try:
+    import prometheus_client
+    from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+    from prometheus_client import multiprocess
+except ImportError:  # 可选依赖
+    prometheus_client = None
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+logger = logging.getLogger("metrics")
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR") or os.getenv("prometheus_multiproc_dir")
+# 请求结束时刷新线程池 / 信号量采样的最小间隔（秒）
+POOL_REFRESH_INTERVAL = 1.0
+
+# 秒；覆盖毫秒级的 ES / Redis 调用到数分钟的深度 AI 生成
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+DEPENDENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class _NoopMetric:
+    """未安装 prometheus_client 时的替身，所有操作均为空。"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+if prometheus_client is not None:
+    HTTP_REQUESTS = Counter(
+        "http_requests_total", "HTTP 请求数", ["route", "method", "status"]
+    )
+    HTTP_DURATION = Histogram(
+        "http_request_duration_seconds", "HTTP 请求耗时（秒，至响应头发出）", ["route", "method"],
+        buckets=HTTP_BUCKETS,
+    )
+    HTTP_IN_PROGRESS = Gauge(
+        "http_requests_in_progress", "处理中的 HTTP 请求数", ["method"],
+        multiprocess_mode="livesum",
+    )
+    DEPENDENCY_CALLS = Counter(
+        "dependency_calls_total", "外部依赖调用次数", ["dependency", "operation", "outcome"]
+    )
+    DEPENDENCY_DURATION = Histogram(
+        "dependency_call_duration_seconds", "外部依赖调用耗时（秒）", ["dependency", "operation"],
+        buckets=DEPENDENCY_BUCKETS,
+    )
+    DEPENDENCY_IN_FLIGHT = Gauge(
+        "dependency_in_flight", "进行中的外部依赖调用数", ["dependency"],
+        multiprocess_mode="livesum",
+    )
+    POOL_IN_USE = Gauge("pool_in_use", "线程池 / 信号量已占用数", ["pool"], multiprocess_mode="livesum")
+    POOL_CAPACITY = Gauge("pool_capacity", "线程池 / 信号量容量", ["pool"], multiprocess_mode="livesum")
+    POOL_QUEUED = Gauge("pool_queued", "线程池排队中的任务数", ["pool"], multiprocess_mode="livesum")
+    IMPORT_DOCUMENTS = Counter("import_documents_total", "导入写入 ES 的文档数", ["index"])
+    IMPORT_RUNS = Counter("import_runs_total", "导入次数", ["source", "outcome"])
+else:
+    HTTP_REQUESTS = HTTP_DURATION = HTTP_IN_PROGRESS = _NoopMetric()
+    DEPENDENCY_CALLS = DEPENDENCY_DURATION = DEPENDENCY_IN_FLIGHT = _NoopMetric()
+    POOL_IN_USE = POOL_CAPACITY = POOL_QUEUED = _NoopMetric()
+    IMPORT_DOCUMENTS = IMPORT_RUNS = _NoopMetric()
+
+
+def enabled() -> bool:
+    return prometheus_client is not None
+
+
+def _instrumented() -> bool:
+    """指标或追踪任一开启时才包装客户端。"""
+    return prometheus_client is not None or tracing.TRACING_ENABLED
+
+
+# ---------- 外部依赖 ----------
+
+class _Call:
+    """track() 产出的对象；调用方可把 outcome 改为 "error"（如子进程返回非 0）。"""
+
+    __slots__ = ("outcome",)
+
+    def __init__(self):
+        self.outcome = "ok"
+
+
+@contextmanager
+def track(dependency: str, operation: str, **attrs):
+    """
+    记录一次外部依赖调用的次数、耗时与进行中数量；抛出异常时 outcome 记为 error。
+    请求追踪进行中时同时记为子 span（名称 dependency.operation，attrs 为 span 属性）。
+        with track("libreoffice", "convert") as call:
+            ...
+    """
+    call = _Call()
+    in_flight = DEPENDENCY_IN_FLIGHT.labels(dependency)
+    in_flight.inc()
+    start = time.perf_counter()
+    try:
+        with tracing.span(f"{dependency}.{operation}", **attrs) as sp:
+            yield call
+            if sp is not None and call.outcome != "ok":
+                sp.set("outcome", call.outcome)
+    except BaseException:
+        call.outcome = "error"
+        raise
+    finally:
+        DEPENDENCY_DURATION.labels(dependency, operation).observe(time.perf_counter() - start)
+        DEPENDENCY_CALLS.labels(dependency, operation, call.outcome).inc()
+        in_flight.dec()
+
+
+def instrument_call(obj, attr: str, dependency: str, operation: str = None):
+    """把 obj.attr（如 claude_client.messages 的 create）替换为带 track() 的同名包装，返回 obj。"""
+    if obj is None or not _instrumented():
+        return obj
+    fn = getattr(obj, attr, None)
+    if fn is None or getattr(fn, "_metrics_wrapped", False):
+        return obj
+    op = operation or attr
+
+    def wrapper(*args, **kwargs):
+        with track(dependency, op):
+            return fn(*args, **kwargs)
+
+    wrapper._metrics_wrapped = True
+    setattr(obj, attr, wrapper)
+    return obj
+
+
+def es_operation(method: str, path: str) -> str:
+    """由 ES 请求路径得出操作名：第一个以 _ 开头的路径段（_search -> search，_search/template -> search_template），
+    没有时按方法区分索引级操作（如 HEAD /idx -> index_head）。"""
+    segments = (path or "").split("?", 1)[0].strip("/").split("/")
+    for i, seg in enumerate(segments):
+        if seg.startswith("_"):
+            op = seg[1:]
+            if i + 1 < len(segments) and segments[i + 1] == "template":
+                op += "_template"
+            return op or "root"
+    return "index_" + (method or "get").lower()
+
+
+def instrument_elasticsearch(client):
+    """包装 ES 客户端的 transport.perform_request（7.x / 8.x 均为 (method, path, ...)），所有 API 调用都会经过这里。"""
+    if client is None or not _instrumented():
+        return client
+    transport = getattr(client, "transport", None)
+    fn = getattr(transport, "perform_request", None)
+    if fn is None or getattr(fn, "_metrics_wrapped", False):
+        return client
+
+    def perform_request(method, path, *args, **kwargs):
+        with track("elasticsearch", es_operation(method, path), path=path):
+            return fn(method, path, *args, **kwargs)
+
+    perform_request._metrics_wrapped = True
+    transport.perform_request = perform_request
+    return client
+
+
+def instrument_redis(client):
+    """包装 Redis 客户端的 execute_command（operation 为命令名）与 pipeline().execute（operation=pipeline）。"""
+    if client is None or not _instrumented() or getattr(client, "_metrics_wrapped", False):
+        return client
+    execute_command = client.execute_command
+    pipeline = client.pipeline
+
+    def instrumented_execute_command(*args, **options):
+        op = str(args[0]).lower() if args else "unknown"
+        with track("redis", op, key=str(args[1])[:120] if len(args) > 1 else ""):
+            return execute_command(*args, **options)
+
+    def instrumented_pipeline(*args, **kwargs):
+        return instrument_call(pipeline(*args, **kwargs), "execute", "redis", "pipeline")
+
+    client.execute_command = instrumented_execute_command
+    client.pipeline = instrumented_pipeline
+    client._metrics_wrapped = True
+    return client
+
+
+# ---------- 线程池 / 信号量 ----------
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_refreshed_at = 0.0
+
+
+def register_pool(name: str, sampler) -> None:
+    """注册一个采样函数，返回 (已占用, 容量, 排队数)。"""
+    with _pools_lock:
+        _pools[name] = sampler
+
+
+def semaphore_sampler(semaphore, capacity: int):
+    """threading.Semaphore 的采样函数：占用 = 容量 - 剩余许可。"""
+    return lambda: (capacity - semaphore._value, capacity, 0)
+
+
+def executor_sampler(executor, capacity: int):
+    """ThreadPoolExecutor 的采样函数：占用按已启动的忙碌线程估算，排队为工作队列长度。"""
+    def sample():
+        queued = executor._work_queue.qsize()
+        idle = getattr(executor, "_idle_semaphore", None)
+        idle_count = idle._value if idle is not None else 0
+        return (max(len(executor._threads) - idle_count, 0), capacity, queued)
+    return sample
+
+
+def _anyio_sample():
+    # FastAPI 同步路由在 anyio 默认线程池中执行，只能在事件循环内读取
+    import anyio.to_thread
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    return (limiter.borrowed_tokens, int(limiter.total_tokens), limiter.statistics().tasks_waiting)
+
+
+def refresh_pools(force: bool = False) -> None:
+    global _pools_refreshed_at
+    now = time.monotonic()
+    if not force and now - _pools_refreshed_at < POOL_REFRESH_INTERVAL:
+        return
+    _pools_refreshed_at = now
+    with _pools_lock:
+        pools = list(_pools.items())
+    for name, sampler in pools:
+        try:
+            in_use, capacity, queued = sampler()
+        except Exception as e:
+            logger.debug("线程池采样失败 %s: %r", name, e)
+            continue
+        POOL_IN_USE.labels(name).set(in_use)
+        POOL_CAPACITY.labels(name).set(capacity)
+        POOL_QUEUED.labels(name).set(queued)
+
+
+register_pool("anyio_threads", _anyio_sample)
+
+
+# ---------- 导入 ----------
+
+def record_import(source: str, indexes_docs: dict, ok: bool = True) -> None:
+    """记录一次导入：source 为 process / upopt，indexes_docs 为 {索引名: 写入文档数}。"""
+    for index, n in indexes_docs.items():
+        if n:
+            IMPORT_DOCUMENTS.labels(index).inc(n)
+    IMPORT_RUNS.labels(source, "ok" if ok else "error").inc()
+
+
+# ---------- HTTP ----------
+
+def _route_of(request) -> str:
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+async def metrics_middleware(request, call_next):
+    """FastAPI http 中间件：按路由模板记录请求数、耗时与处理中数量。"""
+    if not enabled():
+        return await call_next(request)
+    method = request.method
+    start = time.perf_counter()
+    # 路由在 call_next 内才匹配，进行中数量只按方法统计
+    in_progress = HTTP_IN_PROGRESS.labels(method)
+    in_progress.inc()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        in_progress.dec()
+        route = _route_of(request)
+        HTTP_DURATION.labels(route, method).observe(time.perf_counter() - start)
+        HTTP_REQUESTS.labels(route, method, str(status)).inc()
+        refresh_pools()
+
+
+def authorized(authorization: str) -> bool:
+    if not METRICS_TOKEN:
+        return True
+    return (authorization or "") == f"Bearer {METRICS_TOKEN}"
+
+
+def render() -> bytes:
+    """生成 /metrics 响应体；多进程模式下汇总 PROMETHEUS_MULTIPROC_DIR 中所有进程的数值。"""
+    refresh_pools(force=True)
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
+
+
+def mark_process_dead(pid: int) -> None:
+    """gunicorn child_exit 钩子中调用，清理已退出 worker 的 livesum gauge 文件。"""
+    if enabled() and MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
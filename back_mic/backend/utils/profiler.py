@@ -0,0 +1,275 @@
+"""
+管理员触发的请求采样分析
+
+管理员通过 /api/profiler/arm 指定路由前缀（如 /api/search、/api/ai_search/info_retrieval）与次数 N，
+之后匹配该前缀的 N 个请求在处理期间由采样线程每 PROFILE_INTERVAL 秒抓取一次所有线程的调用栈
+（sys._current_frames），请求结束后写出 collapsed stack 文件（flamegraph.pl / speedscope / inferno 可直接读取），
+另存同名 .json 记录路由、耗时、采样数，供列表与下载。
+
+- 采样覆盖所有线程：同步路由在线程池中执行、AI 检索经 asyncio.to_thread 转入其他线程，只采当前线程会漏掉；
+  只保留含本项目源码帧的栈（空闲的线程池 / 事件循环等待不计入）。分析期间若有其他请求并发，它们的栈也会出现
+- ProfilerMiddleware 为纯 ASGI 中间件，未启用时只比较一次本地变量即透传；启用状态保存在 Redis（profiler:route /
+  profiler:remaining，多 worker 共享，剩余次数以 DECR 原子领取），由各 worker 的后台线程每 PROFILE_POLL_SECONDS 秒
+  读取到本地，事件循环中不做同步 Redis 调用；无 Redis 时只对本进程生效
+- 启用状态 PROFILE_ARM_TTL 秒后自动失效；PROFILE_DIR 中最多保留 PROFILE_KEEP 个结果
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from utils.request_log import request_id_var
+
+logger = logging.getLogger("profiler")
+
+BASE_DIR = str(Path(__file__).resolve().parent.parent)
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", str(Path(BASE_DIR) / "logs" / "profiles")))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+PROFILE_POLL_SECONDS = 2.0
+PROFILE_ARM_TTL = 3600
+PROFILE_MAX_REQUESTS = 50
+PROFILE_KEEP = 50
+PROFILE_MAX_SECONDS = 600  # 单个请求最长采样时间，超过后停止采样（请求照常完成）
+
+KEY_ROUTE = "profiler:route"
+KEY_REMAINING = "profiler:remaining"
+
+_RE_PROFILE_NAME = re.compile(r"^[\w.-]+\.collapsed$")
+
+_redis = None
+_poller: Optional[threading.Thread] = None
+# 本地启用状态：route 为 None 表示未启用；Redis 可用时为后台线程定期读取的缓存
+_state = {"route": None, "remaining": 0, "polled_at": 0.0}
+_state_lock = threading.Lock()
+
+
+def configure(redis_client) -> None:
+    """设置共享启用状态用的 Redis 客户端（decode_responses=True）并启动轮询线程；为 None 时只在本进程生效。"""
+    global _redis, _poller
+    _redis = redis_client
+    if _redis is not None and _poller is None:
+        _poller = threading.Thread(target=_poll_loop, name="profiler-poll", daemon=True)
+        _poller.start()
+
+
+def _poll_loop() -> None:
+    """每 PROFILE_POLL_SECONDS 秒把 Redis 中的启用路由读入 _state。读取期间本进程 arm / disarm 过则以本地为准。"""
+    while True:
+        client = _redis
+        if client is not None:
+            started = time.monotonic()
+            try:
+                route = client.get(KEY_ROUTE)
+            except Exception:
+                route = None
+            with _state_lock:
+                if _state["polled_at"] <= started:
+                    _state.update(route=route, polled_at=time.monotonic())
+        time.sleep(PROFILE_POLL_SECONDS)
+
+
+# ---------- 启用 / 停用 ----------
+
+def arm(route: str, count: int) -> Dict[str, object]:
+    route = (route or "").strip()
+    if not route.startswith("/"):
+        raise ValueError("route 需为以 / 开头的路径前缀，如 /api/search")
+    count = max(1, min(int(count), PROFILE_MAX_REQUESTS))
+    if _redis is not None:
+        pipe = _redis.pipeline(transaction=True)
+        pipe.set(KEY_ROUTE, route, ex=PROFILE_ARM_TTL)
+        pipe.set(KEY_REMAINING, count, ex=PROFILE_ARM_TTL)
+        pipe.execute()
+    with _state_lock:
+        _state.update(route=route, remaining=count, polled_at=time.monotonic())
+    logger.info("已启用请求分析: route=%s count=%d", route, count)
+    return status()
+
+
+def disarm() -> None:
+    if _redis is not None:
+        try:
+            _redis.delete(KEY_ROUTE, KEY_REMAINING)
+        except Exception as e:
+            logger.warning("停用请求分析失败: %s", e)
+    with _state_lock:
+        _state.update(route=None, remaining=0, polled_at=time.monotonic())
+
+
+def status() -> Dict[str, object]:
+    if _redis is not None:
+        try:
+            route, remaining = _redis.mget(KEY_ROUTE, KEY_REMAINING)
+            return {"route": route, "remaining": max(int(remaining or 0), 0) if route else 0}
+        except Exception as e:
+            logger.warning("读取请求分析状态失败: %s", e)
+    return {"route": _state["route"], "remaining": _state["remaining"]}
+
+
+def _claim() -> bool:
+    """领取一次分析名额。"""
+    if _redis is not None:
+        try:
+            remaining = _redis.decr(KEY_REMAINING)
+        except Exception:
+            return False
+        if remaining <= 0:
+            try:
+                _redis.delete(KEY_ROUTE, KEY_REMAINING)
+            except Exception:
+                pass
+            _state["route"] = None
+        return remaining >= 0
+    with _state_lock:
+        if _state["remaining"] <= 0:
+            return False
+        _state["remaining"] -= 1
+        if _state["remaining"] == 0:
+            _state["route"] = None
+        return True
+
+
+# ---------- 采样 ----------
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    if _is_own(filename):
+        filename = filename[len(BASE_DIR) + 1:]
+    else:
+        filename = os.path.basename(filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _is_own(filename: str) -> bool:
+    return filename.startswith(BASE_DIR) and "site-packages" not in filename
+
+
+class _Sampler(threading.Thread):
+    def __init__(self):
+        super().__init__(name="request-profiler", daemon=True)
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        deadline = time.monotonic() + PROFILE_MAX_SECONDS
+        while not self._stop_event.wait(PROFILE_INTERVAL) and time.monotonic() < deadline:
+            self.samples += 1
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack = []
+                own = False
+                while frame is not None:
+                    code = frame.f_code
+                    own = own or _is_own(code.co_filename)
+                    stack.append(_frame_label(code))
+                    frame = frame.f_back
+                if not own:
+                    continue
+                if tid not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(names.get(tid, f"thread-{tid}"))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+def _save(sampler: _Sampler, meta: Dict[str, object]) -> None:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    route = re.sub(r"[^\w]+", "_", str(meta["route"])).strip("_") or "root"
+    rid = re.sub(r"[^\w-]+", "", str(meta["request_id"]))[:32] or "-"
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}_{route}_{rid}"
+    with (PROFILE_DIR / f"{name}.collapsed").open("w", encoding="utf-8") as f:
+        for stack, n in sampler.stacks.most_common():
+            f.write(f"{stack} {n}\n")
+    (PROFILE_DIR / f"{name}.json").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+    # 只保留最近 PROFILE_KEEP 个
+    old = sorted(PROFILE_DIR.glob("*.collapsed"), key=lambda p: p.stat().st_mtime)[:-PROFILE_KEEP]
+    for p in old:
+        p.unlink(missing_ok=True)
+        p.with_suffix(".json").unlink(missing_ok=True)
+
+
+def list_profiles() -> List[Dict[str, object]]:
+    if not PROFILE_DIR.exists():
+        return []
+    items = []
+    for p in sorted(PROFILE_DIR.glob("*.collapsed"), key=lambda p: p.stat().st_mtime, reverse=True):
+        meta = {}
+        try:
+            meta = json.loads(p.with_suffix(".json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            pass
+        items.append({"name": p.name, "size": p.stat().st_size, **meta})
+    return items
+
+
+def profile_path(name: str) -> Optional[Path]:
+    """校验文件名并返回结果文件路径，不存在时返回 None。"""
+    if not _RE_PROFILE_NAME.match(name or ""):
+        return None
+    path = PROFILE_DIR / name
+    return path if path.is_file() else None
+
+
+# ---------- HTTP ----------
+
+class ProfilerMiddleware:
+    """
+    纯 ASGI 中间件：请求匹配已启用的路由前缀且领取到名额时，采样整个请求处理过程（含响应体发送）。
+    未启用时直接调用下层应用，不经 BaseHTTPMiddleware 的 call_next 包装。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        route = _state["route"]
+        if route is None or scope["type"] != "http" or not scope["path"].startswith(route):
+            return await self.app(scope, receive, send)
+        # 领取名额可能访问 Redis（DECR），放到线程中执行
+        if not await asyncio.to_thread(_claim):
+            return await self.app(scope, receive, send)
+
+        sampler = _Sampler()
+        start = time.time()
+        sampler.start()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.stop()
+            meta = {
+                "route": scope["path"],
+                "method": scope.get("method", ""),
+                "status": status,
+                "request_id": request_id_var.get(),
+                "started_at": start,
+                "duration_ms": round((time.time() - start) * 1000, 1),
+                "samples": sampler.samples,
+                "interval_ms": PROFILE_INTERVAL * 1000,
+            }
+            try:
+                await asyncio.to_thread(_save, sampler, meta)
+                logger.info("请求分析已保存: %s %s %.0fms", meta["method"], meta["route"], meta["duration_ms"])
+            except Exception as e:
+                logger.warning("保存请求分析失败: %s", e)
@@ -0,0 +1,126 @@
+"""
+请求级结构化日志
+
+- setup_logging：根 logger 只挂 QueueHandler，由后台 QueueListener 线程负责格式化与写 stdout，
+  请求线程不再被终端 I/O 阻塞；LOG_FORMAT=json 输出 JSON 行，默认文本
+- 每条日志带 request_id（由中间件写入 contextvar，响应头 X-Request-ID 返回给前端便于对照）
+- 请求头 X-Debug-Log: 1（若配置了 LOG_DEBUG_TOKEN 则需等于该值）时，本次请求的诊断日志（diag）提升为 INFO 输出，
+  完整 ES 查询体也一定记录；其余请求按 LOG_QUERY_SAMPLE_RATE 抽样记录查询体
+"""
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import uuid
+from contextvars import ContextVar
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+# 无调试头时记录完整 ES 查询体的抽样比例（0~1）
+LOG_QUERY_SAMPLE_RATE = float(os.getenv("LOG_QUERY_SAMPLE_RATE", "0") or 0)
+LOG_DEBUG_TOKEN = os.getenv("LOG_DEBUG_TOKEN", "")
+
+REQUEST_ID_HEADER = "X-Request-ID"
+DEBUG_HEADER = "X-Debug-Log"
+
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+debug_var: ContextVar[bool] = ContextVar("debug_log", default=False)
+
+_listener = None
+
+
+class RequestContextFilter(logging.Filter):
+    """为每条日志补上 request_id。"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """JSON 行格式；extra={"fields": {...}} 中的键值一并输出。"""
+
+    def format(self, record):
+        item = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if isinstance(fields, dict):
+            item.update(fields)
+        if record.exc_info:
+            item["exc"] = self.formatException(record.exc_info)
+        return json.dumps(item, ensure_ascii=False, default=str)
+
+
+def setup_logging() -> None:
+    """以 QueueHandler + QueueListener 替换根 logger 的处理器（重复调用无副作用）。"""
+    global _listener
+    if _listener is not None:
+        return
+    if LOG_FORMAT == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s"
+        )
+    stream = logging.StreamHandler()
+    stream.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+
+
+def new_request_id(incoming: str = "") -> str:
+    incoming = (incoming or "").strip()
+    return incoming[:64] if incoming else uuid.uuid4().hex[:16]
+
+
+def is_debug_request(header_value: str) -> bool:
+    if not header_value:
+        return False
+    if LOG_DEBUG_TOKEN:
+        return header_value == LOG_DEBUG_TOKEN
+    return header_value.lower() in ("1", "true", "yes")
+
+
+def diag(logger: logging.Logger, msg: str, *args, **kwargs) -> None:
+    """诊断日志：携带调试头的请求以 INFO 输出，否则为 DEBUG（默认不输出，也不做格式化）。"""
+    level = logging.INFO if debug_var.get() else logging.DEBUG
+    if logger.isEnabledFor(level):
+        logger.log(level, msg, *args, **kwargs)
+
+
+def should_log_query() -> bool:
+    """本次请求是否记录完整查询体：调试请求必记，其余按 LOG_QUERY_SAMPLE_RATE 抽样。"""
+    if debug_var.get():
+        return True
+    return LOG_QUERY_SAMPLE_RATE > 0 and random.random() < LOG_QUERY_SAMPLE_RATE
+
+
+async def request_context_middleware(request, call_next):
+    """FastAPI http 中间件：写入 request_id / 调试标记，并在响应头返回 X-Request-ID。"""
+    rid_token = request_id_var.set(new_request_id(request.headers.get(REQUEST_ID_HEADER, "")))
+    debug_token = debug_var.set(is_debug_request(request.headers.get(DEBUG_HEADER, "")))
+    try:
+        response = await call_next(request)
+        response.headers[REQUEST_ID_HEADER] = request_id_var.get()
+        return response
+    finally:
+        request_id_var.reset(rid_token)
+        debug_var.reset(debug_token)
@@ -0,0 +1,304 @@
+"""
+进程内请求追踪
+
+- tracing_middleware 为每个 HTTP 请求打开根 span，span()/traced 在 contextvar 中嵌套子 span；
+  ES / Redis / Claude / Gemini / LibreOffice 调用经 utils.metrics 的包装（track）自动记为子 span，
+  asyncio.to_thread 与 FastAPI 同步路由的线程池会复制 contextvar，子线程中的调用同样归入本请求
+- 无进行中的追踪（后台线程、启动阶段）时 span() 只读一次 contextvar，不做任何记录
+- 请求结束后按采样规则决定是否导出整条追踪：根 span 耗时 ≥ TRACE_SLOW_MS、请求出错（5xx / 异常）、
+  携带调试头（X-Debug-Log），或按 TRACE_SAMPLE_RATE 随机抽样；其余丢弃，只为异常请求保留完整追踪
+- 导出在后台线程进行，不阻塞请求：
+  TRACE_EXPORT=off（默认）：关闭追踪
+  TRACE_EXPORT=file：每条追踪一行 JSON 追加到 TRACE_FILE；超过 TRACE_FILE_MAX_MB 后轮转为 .1 … .N
+  （保留 TRACE_FILE_BACKUPS 个），磁盘占用有上限
+  TRACE_EXPORT=otlp：以 OTLP/HTTP JSON POST 到 TRACE_OTLP_ENDPOINT（可用 trace_collector.py 作本地接收端）
+"""
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from utils.request_log import debug_var, request_id_var
+
+logger = logging.getLogger("tracing")
+
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "off").lower()
+TRACING_ENABLED = TRACE_EXPORT in ("file", "otlp")
+TRACE_FILE = os.getenv("TRACE_FILE", str(Path(__file__).resolve().parent.parent / "logs" / "traces.jsonl"))
+TRACE_FILE_MAX_BYTES = int(float(os.getenv("TRACE_FILE_MAX_MB", "50")) * 1024 * 1024)
+TRACE_FILE_BACKUPS = max(int(os.getenv("TRACE_FILE_BACKUPS", "3")), 0)
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "1000"))
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0") or 0)
+# 单条追踪最多记录的 span 数（超出后只计数），避免深度检索的大量 Redis / ES 调用占用内存
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "2000"))
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "copypan-backend")
+EXPORT_QUEUE_SIZE = 1000
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start", "end", "attrs", "error")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], attrs: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time()
+        self.end = 0.0
+        self.attrs = attrs
+        self.error = None
+
+    def set(self, key: str, value: Any) -> None:
+        self.attrs[key] = value
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end or time.time()) - self.start) * 1000
+
+    def to_dict(self) -> Dict[str, Any]:
+        item = {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration_ms": round(self.duration_ms, 3),
+        }
+        if self.attrs:
+            item["attrs"] = self.attrs
+        if self.error:
+            item["error"] = self.error
+        return item
+
+
+class Trace:
+    __slots__ = ("trace_id", "request_id", "spans", "dropped")
+
+    def __init__(self, request_id: str):
+        self.trace_id = uuid.uuid4().hex
+        self.request_id = request_id
+        self.spans: List[Span] = []
+        self.dropped = 0
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("trace_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """在当前追踪中打开子 span；没有进行中的追踪时为空操作（yield None）。"""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    trace = parent.trace
+    child = Span(trace, name, parent.span_id, attrs)
+    if len(trace.spans) < TRACE_MAX_SPANS:
+        trace.spans.append(child)
+    else:
+        trace.dropped += 1
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = repr(e)[:300]
+        raise
+    finally:
+        child.end = time.time()
+        _current_span.reset(token)
+
+
+def traced(name: Optional[str] = None):
+    """函数装饰器：调用时记为一个 span（默认以函数限定名命名）。"""
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return fn(*args, **kwargs)
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ---------- 采样与导出 ----------
+
+def _should_keep(root: Span, status: int) -> bool:
+    if root.error or status >= 500:
+        return True
+    if root.duration_ms >= TRACE_SLOW_MS:
+        return True
+    if debug_var.get():
+        return True
+    return TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE
+
+
+def _trace_record(trace: Trace) -> Dict[str, Any]:
+    root = trace.spans[0]
+    return {
+        "trace_id": trace.trace_id,
+        "request_id": trace.request_id,
+        "name": root.name,
+        "duration_ms": round(root.duration_ms, 3),
+        "dropped_spans": trace.dropped,
+        "spans": [s.to_dict() for s in trace.spans],
+    }
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_payload(traces: List[Trace]) -> Dict[str, Any]:
+    spans = []
+    for trace in traces:
+        for s in trace.spans:
+            attrs = dict(s.attrs)
+            if s.parent_id is None:
+                attrs["request_id"] = trace.request_id
+            item = {
+                "traceId": trace.trace_id,
+                "spanId": s.span_id,
+                "name": s.name,
+                "kind": 2 if s.parent_id is None else 3,  # SERVER / CLIENT
+                "startTimeUnixNano": str(int(s.start * 1e9)),
+                "endTimeUnixNano": str(int((s.end or s.start) * 1e9)),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in attrs.items()],
+                "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+            }
+            if s.parent_id:
+                item["parentSpanId"] = s.parent_id
+            spans.append(item)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "copypan.tracing"}, "spans": spans}],
+        }]
+    }
+
+
+class _Exporter:
+    """后台线程批量导出；队列满时丢弃新追踪，不阻塞请求。"""
+
+    def __init__(self):
+        self._queue: "queue.Queue[Trace]" = queue.Queue(maxsize=EXPORT_QUEUE_SIZE)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, trace: Trace) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name="trace-exporter", daemon=True)
+                    self._thread.start()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            logger.debug("追踪导出队列已满，丢弃 %s", trace.trace_id)
+
+    def _loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 50:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if TRACE_EXPORT == "otlp":
+                    self._export_otlp(batch)
+                else:
+                    self._export_file(batch)
+            except Exception as e:
+                logger.warning("导出追踪失败（%d 条）: %r", len(batch), e)
+
+    @staticmethod
+    def _rotate_file(path: Path) -> None:
+        """path 超过 TRACE_FILE_MAX_BYTES 时轮转：path.N-1 → path.N … path → path.1，最旧的一份丢弃。"""
+        try:
+            if path.stat().st_size < TRACE_FILE_MAX_BYTES:
+                return
+        except FileNotFoundError:
+            return
+        if TRACE_FILE_BACKUPS == 0:
+            path.unlink(missing_ok=True)
+            return
+        # 多个 worker 共用同一文件时可能同时轮转：源文件已被其他 worker 移走则跳过
+        for i in range(TRACE_FILE_BACKUPS - 1, -1, -1):
+            src = path.with_name(f"{path.name}.{i}") if i else path
+            try:
+                os.replace(src, path.with_name(f"{path.name}.{i + 1}"))
+            except FileNotFoundError:
+                pass
+
+    @classmethod
+    def _export_file(cls, batch: List[Trace]) -> None:
+        path = Path(TRACE_FILE)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        cls._rotate_file(path)
+        with path.open("a", encoding="utf-8") as f:
+            for trace in batch:
+                f.write(json.dumps(_trace_record(trace), ensure_ascii=False, default=str) + "\n")
+
+    @staticmethod
+    def _export_otlp(batch: List[Trace]) -> None:
+        body = json.dumps(_otlp_payload(batch), default=str).encode("utf-8")
+        req = urllib.request.Request(
+            TRACE_OTLP_ENDPOINT, data=body, headers={"Content-Type": "application/json"}, method="POST"
+        )
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            resp.read()
+
+
+_exporter = _Exporter()
+
+
+# ---------- HTTP ----------
+
+async def tracing_middleware(request, call_next):
+    """FastAPI http 中间件：为请求打开根 span，结束后按采样规则导出。需在 request_context_middleware 之内执行。"""
+    if not TRACING_ENABLED:
+        return await call_next(request)
+    trace = Trace(request_id_var.get())
+    root = Span(trace, f"{request.method} {request.url.path}", None, {"http.method": request.method})
+    trace.spans.append(root)
+    token = _current_span.set(root)
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    except BaseException as e:
+        root.error = repr(e)[:300]
+        raise
+    finally:
+        root.end = time.time()
+        _current_span.reset(token)
+        route = request.scope.get("route")
+        if getattr(route, "path", None):
+            root.name = f"{request.method} {route.path}"
+        root.attrs["http.status_code"] = status
+        if _should_keep(root, status):
+            _exporter.submit(trace)
@@ -1,8 +1,15 @@
 from elasticsearch import Elasticsearch
 from elasticsearch.helpers import bulk
 import json
+import sys
 from pathlib import Path
 
+# 导入时需预计算 map 类小节字段，导入后需重建伴生索引、使后端的搜索结果缓存失效
+sys.path.insert(0, str(Path(__file__).resolve().parent / "back_mic" / "backend"))
+from database.map_sections import MAP_MAPPING, MAP_SECTION_INDEXES, maybe_annotate
+from database.section_docs import SECTION_SOURCE_INDEXES, materialize_index
+from search.result_cache import bump_index_versions
+
 es = Elasticsearch(hosts=['http://localhost:9200'])
 
 # 原始数据目录
@@ -53,6 +60,7 @@ print(f"\n找到 {len(index_dirs)} 个索引文件夹")
 total_imported = 0
 total_skipped = 0
 errors = []
+written_indexes = set()
 
 for index_dir in sorted(index_dirs):
     index_name = index_dir.name
@@ -94,6 +102,17 @@ for index_dir in sorted(index_dirs):
     
     print(f"  → 开始导入...")
     
+    # map 类索引先补上小节预计算字段的 mapping（不参与检索），避免动态 mapping 把 sec_text 建成可检索字段
+    if index_name in MAP_SECTION_INDEXES:
+        try:
+            if es.indices.exists(index=index_name):
+                es.indices.put_mapping(index=index_name, body=MAP_MAPPING["mappings"])
+            else:
+                es.indices.create(index=index_name, body=MAP_MAPPING)
+        except Exception as e:
+            errors.append(f"{index_name} mapping: {str(e)[:100]}")
+            print(f"  ⚠ mapping: {str(e)[:50]}")
+    
     imported = 0
     failed = 0
     
@@ -118,7 +137,7 @@ for index_dir in sorted(index_dirs):
             for doc in data:
                 action = {
                     '_index': index_name,
-                    '_source': doc
+                    '_source': maybe_annotate(index_name, doc)
                 }
                 
                 # 使用文档中的ID
@@ -135,6 +154,8 @@ for index_dir in sorted(index_dirs):
             if actions:
                 success, failed_list = bulk(es, actions, raise_on_error=False, chunk_size=500)
                 imported += success
+                if success:
+                    written_indexes.add(index_name)
                 
                 # 显示详细错误（仅第一个文件的第一个错误）
                 if failed_list:
@@ -158,6 +179,22 @@ for index_dir in sorted(index_dirs):
     if failed > 0:
         print(f"  ✗ 失败: {failed} 条")
 
+# 重建被写入索引的 <index>_sections / <index>_messages（否则 AI 上下文与信息检索导出仍读到旧正文）
+rebuild = sorted(written_indexes.intersection(SECTION_SOURCE_INDEXES))
+if rebuild:
+    print("\n重建小节 / 整篇伴生索引...")
+for index_name in rebuild:
+    try:
+        es.indices.refresh(index=index_name)
+        messages, written = materialize_index(es, index_name)
+        print(f"  ✓ {index_name}: {messages} 篇，写入 {written} 条")
+    except Exception as e:
+        errors.append(f"{index_name} 伴生索引: {str(e)[:100]}")
+        print(f"  ✗ {index_name}: {str(e)[:50]}")
+
+# 使涉及索引的 /api/search、/api/cws 结果缓存失效（否则最长 RESULT_CACHE_TTL 内仍返回旧结果）
+bump_index_versions(written_indexes)
+
 print("\n" + "=" * 70)
 print(f"导入完成！")
 print(f"  新导入: {total_imported:,} 条")